@@ -21,6 +21,7 @@ import { useNavigate } from 'react-router-dom'
 import { Toaster } from 'react-hot-toast'
 
 const PROD_API_URL = window.PROD_URL_API
+const FUNCTIONS_PAGE_SIZE = 500
 
 const Analysis = () => {
 	const {
@@ -87,10 +88,21 @@ const Analysis = () => {
 			// 	}
 			// )
 
-			// API call to fetch lambda functions without any parameters
-
-			const response = await axios.get(`${PROD_API_URL}/lambda-functions`)
-			const functions = response.data
+			// Fetch the inventory page by page, only the displayed fields
+
+			const functions = []
+			let continuationToken = ''
+			do {
+				const response = await axios.get(`${PROD_API_URL}/lambda-functions`, {
+					params: {
+						rowsPerPage: FUNCTIONS_PAGE_SIZE,
+						continuationToken,
+						fields: columns.map((column) => column.accessor).join(','),
+					},
+				})
+				functions.push(...response.data.functions)
+				continuationToken = response.data.continuationToken
+			} while (continuationToken)
 
 			handleFilters(functions)
 			setSelectedFunctions(functions)
@@ -169,7 +181,8 @@ const Analysis = () => {
 
 		const unixStartDate = new Date(startDate.setHours(0, 0, 0, 0)).toISOString()
 		const unixEndDate = new Date(endDate.setHours(23, 59, 59, 999)).toISOString()
-		const reportID = analysisID || Math.floor(Date.now() / 1000)
+		// Generated by the API unless one is typed in
+		const reportID = analysisID || null
 
 		setConfirmationData({
 			reportID,
@@ -185,32 +198,49 @@ const Analysis = () => {
 
 		const { reportID, startDate: unixStartDate, endDate: unixEndDate } = confirmationData
 
-		localStorage.setItem('reportID', reportID.toString())
 		setMaxAttemptsReached(false)
-		setCurrentReportID(reportID)
 
 		const payload = {
 			lambda_functions_name: selectedFunctions.map(
 				(lambdaFunction) => lambdaFunction['FunctionName']
 			),
-			report_id: reportID,
+			...(reportID && { report_id: reportID }),
 			start_date: unixStartDate,
 			end_date: unixEndDate,
 		}
 		setIsFetching(true)
 
 		try {
-			const response = await axios.post(`${PROD_API_URL}/startExecution`, payload)
-			customToast('Analysis launched successfully', '✅', successMsgStyle)
+			// Small selections complete within the request, others are queued
+			const response = await axios.post(`${PROD_API_URL}/analysis/express`, payload)
+			// An identical analysis may already be running or done
+			const launchedReportID = response.data.reportID
+			localStorage.setItem('reportID', launchedReportID.toString())
+			setCurrentReportID(launchedReportID)
+			customToast(
+				response.data.attached
+					? 'Identical analysis found'
+					: response.data.express
+						? 'Analysis completed'
+						: 'Analysis launched successfully',
+				'✅',
+				successMsgStyle
+			)
 
 			// Wait for a few seconds with spinner before redirecting
 			await delay(3000)
 
 			// Navigate immediately to the report details page
-			navigate(`/report/reportID=${reportID}`)
+			navigate(`/report/reportID=${launchedReportID}`)
 		} catch (error) {
 			console.error('Error launching analysis: ', error)
-			customToast('Failed to launch analysis', '❌', errorMsgStyle)
+			customToast(
+				error.response?.status === 409
+					? 'Analysis ID already used'
+					: 'Failed to launch analysis',
+				'❌',
+				errorMsgStyle
+			)
 			setIsFetching(false)
 		}
 	}
@@ -414,7 +444,9 @@ const Analysis = () => {
 							<div className='space-y-3 text-sm text-white/80'>
 								<div className='flex justify-between'>
 									<span className='text-gray-400'>Analysis ID:</span>
-									<span className='font-medium text-white'>{confirmationData.reportID}</span>
+									<span className='font-medium text-white'>
+										{confirmationData.reportID || 'Generated'}
+									</span>
 								</div>
 								<div className='flex justify-between'>
 									<span className='text-gray-400'>Start Date:</span>
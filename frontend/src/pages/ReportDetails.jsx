@@ -37,6 +37,7 @@ const ReportDetails = () => {
     } = useContext(AnalysisContext)
 
     const [loading, setLoading] = useState(false)
+    const [progress, setProgress] = useState(null)
     //
     // useEffect(() => {
     //     setSummary(analysisDetail.summary)
@@ -108,17 +109,25 @@ const ReportDetails = () => {
     useEffect(() => {
         setAnalysis([])
         setAnalysisDetail({})
+        // Rows of a running report by batch, only new batches are fetched
+        const rowsByBatch = {}
+        let cursor = 0
         const fetchData = async () => {
             setLoading(true)
             try {
-                const response = await axios.get(`${PROD_API_URL}/report?${reportID}`)
+                const response = await axios.get(`${PROD_API_URL}/report?${reportID}&since=${cursor}`)
                 if (response.status === 200) {
                     setStatus(response.data.summary.status)
                     setSummary(response.data.summary)
-                    if (response.data.summary.status === 'Failed') {
+                    if (['Failed', 'Cancelled'].includes(response.data.summary.status)) {
                         customToast('The Analysis Encountered an Error', '❌', errorMsgStyle)
                         setLoading(false)
-                    } else if (response.data.summary.status === 'Running') {
+                    } else if (['Queued', 'Running'].includes(response.data.summary.status)) {
+                        // Rows of the batches done so far
+                        setProgress(response.data.progress || null)
+                        Object.assign(rowsByBatch, response.data.batches || {})
+                        cursor = response.data.cursor ?? cursor
+                        setAnalysis(Object.values(rowsByBatch).flat())
                         // console.log('Fetching Data Again')
                         await delay(3000)
                         return await fetchData()
@@ -180,7 +189,7 @@ const ReportDetails = () => {
                             <CostSummaryBoxes summary={summary} analysis={analysis}/>
                         </div>
                     </>
-                ) : status === 'Running' ? (
+                ) : ['Queued', 'Running'].includes(status) ? (
                     <div className='flex flex-col justify-center items-center h-64 gap-4'>
                         <ThreeDots
                             visible={true}
@@ -195,6 +204,12 @@ const ReportDetails = () => {
                         <p className='text-base text-yellow-500 font-medium'>
                             Report is still processing...
                         </p>
+                        {progress && (
+                            <p className='text-sm text-gray-300'>
+                                {progress.batchesDone} of {progress.batchesTotal} batches
+                                done, {progress.functionsAnalyzed} functions analyzed
+                            </p>
+                        )}
                         <p className='text-sm text-gray-400'>
                             This page will automatically update when complete
                         </p>
@@ -230,7 +245,7 @@ const ReportDetails = () => {
                     </div>
                 )}
 
-                {status === 'Completed' && (
+                {(status === 'Completed' || (status === 'Running' && analysis.length > 0)) && (
                     <div className='pt-4'>
                         {' '}
                         <DynamicTable data={analysis} onCopyOptimizationScript={copyOptimizationScript}/>{' '}
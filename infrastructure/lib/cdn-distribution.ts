@@ -1,9 +1,9 @@
 import * as cdk from "aws-cdk-lib";
 import {Construct} from "constructs";
-import {CfnOutput} from "aws-cdk-lib";
+import {CfnOutput, Duration} from "aws-cdk-lib";
 import {
     AllowedMethods,
-    CachePolicy,
+    CachePolicy, CacheQueryStringBehavior,
     Distribution, LambdaEdgeEventType,
     OriginAccessIdentity, OriginProtocolPolicy, OriginRequestPolicy,
     ViewerProtocolPolicy
@@ -42,6 +42,15 @@ export class CdnDistributionStack extends cdk.Stack {
             encryption: s3.BucketEncryption.S3_MANAGED,
         });
         // const apiOriginPath = `/prod`;
+        // Only responses the API marks cacheable (completed reports) are cached;
+        // everything else is sent with no-cache and revalidated through ETags
+        const apiCachePolicy = new CachePolicy(this, 'ApiCachePolicy', {
+            minTtl: Duration.seconds(0),
+            defaultTtl: Duration.seconds(0),
+            maxTtl: Duration.days(365),
+            queryStringBehavior: CacheQueryStringBehavior.all(),
+            enableAcceptEncodingGzip: true,
+        });
         const websiteCloudfront = new Distribution(
             this,
             "SiteDistribution",
@@ -69,7 +78,7 @@ export class CdnDistributionStack extends cdk.Stack {
                             originPath: apiOriginPath,
                         }),
                         viewerProtocolPolicy: ViewerProtocolPolicy.HTTPS_ONLY,
-                        cachePolicy: CachePolicy.CACHING_DISABLED,
+                        cachePolicy: apiCachePolicy,
                         allowedMethods: AllowedMethods.ALLOW_ALL,
                         originRequestPolicy: OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
                     },
@@ -7,6 +7,8 @@ import {StateMachine} from "aws-cdk-lib/aws-stepfunctions";
 import * as iam from 'aws-cdk-lib/aws-iam';
 import {Bucket} from "aws-cdk-lib/aws-s3";
 import * as ssm from "aws-cdk-lib/aws-ssm";
+import * as events from "aws-cdk-lib/aws-events";
+import * as targets from "aws-cdk-lib/aws-events-targets";
 import {DockerLambdaFunction} from "./constructs/docker-lambda-function";
 
 export interface ReportApiStackProps extends cdk.StackProps {
@@ -27,20 +29,66 @@ export class ReportApiStack extends cdk.Stack {
             timeout: Duration.seconds(29),
             memorySize: 512,
             environment: {
-                BUCKET_NAME: props.analysisBucket.bucketName
+                BUCKET_NAME: props.analysisBucket.bucketName,
+                STATE_MACHINE_ARN: props.analysisStepFunction.stateMachineArn
             }
         });
 
         // Grant permissions
         const listFunctionsPolicy = new iam.PolicyStatement({
-            actions: ['lambda:ListFunctions'],
+            actions: ['lambda:ListFunctions', 'tag:GetResources'],
             resources: ['*'],
         });
         apiFunction.addToRolePolicy(listFunctionsPolicy);
         props.analysisBucket.grantRead(apiFunction);
+        props.analysisBucket.grantPut(apiFunction, 'inventory/*');
+        // Starting or resuming a report starts an execution, once fewer than
+        // the maximum number of analyses run
+        props.analysisStepFunction.grantStartExecution(apiFunction);
+        props.analysisStepFunction.grantRead(apiFunction);
+        props.analysisBucket.grantPut(apiFunction, '*/summary.json');
+        props.analysisBucket.grantPut(apiFunction, 'analyses/*');
+        props.analysisBucket.grantDelete(apiFunction, 'analyses/*');
+        // Queued analyses start when a running one ends
+        new events.Rule(this, 'AnalysisExecutionEndedRule', {
+            eventPattern: {
+                source: ['aws.states'],
+                detailType: ['Step Functions Execution Status Change'],
+                detail: {
+                    stateMachineArn: [props.analysisStepFunction.stateMachineArn],
+                    status: ['SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED'],
+                },
+            },
+            targets: [new targets.LambdaFunction(apiFunction, {
+                event: events.RuleTargetInput.fromObject({drain_analysis_queue: true}),
+            })],
+        });
+        // Cancelling a report marks it and stops its registered queries
+        props.analysisBucket.grantPut(apiFunction, '*/cancellation.json');
+        props.analysisBucket.grantDelete(apiFunction, '*/queries/*');
+        apiFunction.addToRolePolicy(new iam.PolicyStatement({
+            actions: ['logs:DescribeLogGroups', 'logs:GetQueryResults', 'logs:StopQuery', 'sts:AssumeRole'],
+            resources: ['*'],
+        }));
+        // Express analyses query the logs in process and publish the report
+        // artifacts like the state machine does
+        props.analysisBucket.grantReadWrite(apiFunction);
+        apiFunction.addToRolePolicy(new iam.PolicyStatement({
+            actions: ['lambda:GetFunctionConfiguration', 'logs:StartQuery'],
+            resources: ['*'],
+        }));
+        // Background inventory refresh invokes the API function asynchronously.
+        // The ARN is built from the stack name to avoid a role <-> function cycle.
+        apiFunction.addToRolePolicy(new iam.PolicyStatement({
+            actions: ['lambda:InvokeFunction'],
+            resources: [`arn:${Aws.PARTITION}:lambda:${Aws.REGION}:${Aws.ACCOUNT_ID}:function:${this.stackName}-*`],
+        }));
 
 
-        this.api = new apigateway.RestApi(this, 'analysisAPI', );
+        this.api = new apigateway.RestApi(this, 'analysisAPI', {
+            // Lets gzip compressed (base64 encoded) Lambda responses through as binary
+            binaryMediaTypes: ['*/*'],
+        });
 
         // Use proxy integration to route all /api/* requests to the single Lambda
         const api_resource_prefix = this.api.root.addResource('api');
@@ -66,6 +114,8 @@ export class ReportApiStack extends cdk.Stack {
             action: 'StartExecution',
             options: {
                 credentialsRole: apiGatewayRole,
+                // Request bodies count as binary with the */* media type, keep the mapping template on text
+                contentHandling: apigateway.ContentHandling.CONVERT_TO_TEXT,
                 requestTemplates: {
                     'application/json': `{
             "input": "$util.escapeJavaScript($input.json('$'))",
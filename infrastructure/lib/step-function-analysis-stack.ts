@@ -26,13 +26,18 @@ export class StepFunctionAnalysisStack extends cdk.Stack {
 
         // Attach the DescribeLogGroups policy to the role
         describeLogGroupsRole.addToPolicy(new iam.PolicyStatement({
-            actions: ['logs:DescribeLogGroups', 'logs:StartQuery', 'logs:GetQueryResults'],
+            actions: ['logs:DescribeLogGroups', 'logs:StartQuery', 'logs:GetQueryResults', 'logs:StopQuery'],
             resources: ['*'],
         }));
         describeLogGroupsRole.addToPolicy(new iam.PolicyStatement({
             actions: ['lambda:GetFunctionConfiguration'],
             resources: ['*'],
         }));
+        // Cross-account targets: the target roles must trust this account
+        describeLogGroupsRole.addToPolicy(new iam.PolicyStatement({
+            actions: ['sts:AssumeRole'],
+            resources: ['*'],
+        }));
 
         this.analysisBucket = new s3.Bucket(this, 'AnalysisBucket');
 
@@ -83,6 +88,7 @@ export class StepFunctionAnalysisStack extends cdk.Stack {
         });
         const analysisGeneratorJob = new tasks.LambdaInvoke(this, 'analysisGeneratorJob', {
             lambdaFunction: analysisGenerator,
+            outputPath: '$.Payload'
         });
         const analysisInitializerJob = new tasks.LambdaInvoke(this, 'analysisInitializerJob', {
             lambdaFunction: analysisInitializer,
@@ -99,7 +105,8 @@ export class StepFunctionAnalysisStack extends cdk.Stack {
         const mapLambdaBJob = new sfn.Map(this, 'analysisMap', {
             maxConcurrency: 4,
             itemsPath: sfn.JsonPath.stringAt('$.lambda_functions_name'),
-            outputPath: '$[*].Payload',
+            // Keeps the report parameters: a resumed report may have no batch left to run
+            resultPath: '$.batches',
             itemSelector: {
                 'lambda_functions_name.$': '$$.Map.Item.Value',
                 'report_id.$': '$.report_id',
@@ -123,10 +130,21 @@ export class StepFunctionAnalysisStack extends cdk.Stack {
             definitionBody: sfn.DefinitionBody.fromChainable(definition),
         });
 
-        this.analysisBucket.grantPut(analysisInitializer)
+        // Reads back the per-run tag selection on retries, and batches the
+        // functions by log group
+        this.analysisBucket.grantReadWrite(analysisInitializer)
+        analysisInitializer.addToRolePolicy(new iam.PolicyStatement({
+            actions: ['tag:GetResources', 'lambda:GetFunctionConfiguration', 'sts:AssumeRole'],
+            resources: ['*'],
+        }));
         this.analysisBucket.grantReadWrite(analysisGenerator)
         this.analysisBucket.grantReadWrite(analysisAggregator)
-        this.analysisBucket.grantPut(analysisErrorHandler)
+        // Reads the report's query registry and stops the queries still running
+        this.analysisBucket.grantReadWrite(analysisErrorHandler)
+        analysisErrorHandler.addToRolePolicy(new iam.PolicyStatement({
+            actions: ['logs:DescribeLogGroups', 'logs:GetQueryResults', 'logs:StopQuery', 'sts:AssumeRole'],
+            resources: ['*'],
+        }));
 
     }
 }
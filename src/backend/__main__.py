@@ -0,0 +1,646 @@
+"""Run a whole analysis on this machine, without Step Functions.
+
+Functions are analyzed in a thread or process pool with the generator's
+queries, one per function or shared log group, and the report is aggregated
+like the state machine does. One-off audits of large accounts aren't bound by
+the Lambda timeout, the Map state concurrency or the payload limits, and the
+pipeline can be profiled end to end in a single process.
+
+The analysis of each function is cached on disk by function, target and
+period, a rerun only queries the functions that failed or weren't analyzed.
+The report is written to a local directory, or to the analysis bucket where it
+shows in the history like any other report.
+
+Usage (from ``src``)::
+
+    python -m backend --functions my-function other-function \\
+        --start-date 2024-06-01T00:00:00Z --end-date 2024-06-30T23:59:59Z \\
+        --output-dir reports
+    python -m backend --tag-expression "team=payments" --pool process \\
+        --workers 8 --start-date ... --end-date ... --bucket my-analysis-bucket
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from backend.utils.straggler_utils import StragglerDetector
+from backend.utils.target_utils import target_key
+
+default_cache_dir = ".lambda-cost-cache"
+default_workers = 4
+# Functions analyzed between two progress lines
+progress_interval = 50
+
+# Peers the queries of a worker process are compared with to find stragglers
+straggler_detector = StragglerDetector()
+
+
+def cache_path(
+    cache_dir: str, lambda_name: str, target: dict[str, Any], start: str, end: str
+) -> Path:
+    """
+    Path of the cached analysis of a function.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Cache directory
+    lambda_name : str
+        Lambda function name
+    target : dict
+        Account role and region of the function
+    start : str
+        Analysis start date
+    end : str
+        Analysis end date
+
+    Returns
+    -------
+    Path
+        Cache file of the function over the period
+    """
+    key = json.dumps([target_key(target), lambda_name, start, end])
+    return Path(cache_dir) / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+
+def analyze_functions(
+    lambda_names: list[str],
+    target: dict[str, Any],
+    start_date: str,
+    end_date: str,
+    report_id: str | None,
+    cache_dir: str | None,
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """
+    Analyze functions, from the cache for those analyzed before.
+
+    Runs in the worker threads or processes, failures are returned rather than
+    raised so they cross process boundaries. Functions logging to the same
+    custom log group share a query of the log group, as in the generator.
+
+    Parameters
+    ----------
+    lambda_names : list of str
+        Lambda function names, a single function or those of a log group
+    target : dict
+        Account role and region of the functions
+    start_date : str
+        Analysis start date
+    end_date : str
+        Analysis end date
+    report_id : str, optional
+        Report registering the queries, none when writing to a local directory
+    cache_dir : str, optional
+        Cache directory, no caching if not set
+
+    Returns
+    -------
+    tuple
+        functionName, target, row (None without invocations), failure (reason
+        and retryable, None on success) and cached of each function, and the
+        spans of the queries
+    """
+    from botocore.exceptions import ClientError
+
+    from backend.step_function.analysis_generator import (
+        QueryFailedError,
+        submit_cost_queries,
+    )
+    from backend.utils.timeline_utils import Timeline
+
+    results = {}
+    uncached = []
+    for lambda_name in lambda_names:
+        result: dict[str, Any] = {
+            "functionName": lambda_name,
+            "target": target,
+            "row": None,
+            "failure": None,
+            "cached": False,
+        }
+        results[lambda_name] = result
+        path = (
+            cache_path(cache_dir, lambda_name, target, start_date, end_date)
+            if cache_dir
+            else None
+        )
+        if path is not None and path.exists():
+            row = json.loads(path.read_text())["row"]
+            if row is not None:
+                # Nothing scanned by this run
+                row["analysisCost"] = 0
+            result.update(row=row, cached=True)
+        else:
+            uncached.append(lambda_name)
+
+    timeline = Timeline(report_id)
+    if uncached:
+        # The pool runs the units in parallel, their queries one after another
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            futures = submit_cost_queries(
+                executor,
+                uncached,
+                start_date,
+                end_date,
+                target,
+                timeline,
+                report_id,
+                straggler_detector,
+            )
+            for future, names in futures.items():
+                try:
+                    rows = future.result()
+                except QueryFailedError as e:
+                    for lambda_name in names:
+                        results[lambda_name]["failure"] = {
+                            "reason": e.reason,
+                            "retryable": e.retryable,
+                        }
+                    continue
+                except ClientError as e:
+                    # Deleted since selected, or not readable with the role
+                    for lambda_name in names:
+                        results[lambda_name]["failure"] = {
+                            "reason": str(e),
+                            "retryable": False,
+                        }
+                    continue
+                for lambda_name, row in zip(names, rows):
+                    results[lambda_name]["row"] = row
+                    if cache_dir:
+                        store_cached(
+                            cache_path(
+                                cache_dir, lambda_name, target, start_date, end_date
+                            ),
+                            row,
+                        )
+    return list(results.values()), timeline.spans
+
+
+def plan_units(
+    selection: list[tuple[str, dict[str, Any]]],
+    cache_dir: str | None,
+    args: argparse.Namespace,
+) -> list[tuple[list[str], dict[str, Any]]]:
+    """
+    Divide the functions into units of work, those sharing a log group together.
+
+    Only the log groups of the functions to query are looked up.
+
+    Parameters
+    ----------
+    selection : list of tuple
+        Function name and target of each function
+    cache_dir : str, optional
+        Cache directory, no caching if not set
+    args : argparse.Namespace
+        Command line arguments
+
+    Returns
+    -------
+    list of tuple
+        Function names and target of each unit
+    """
+    from backend.utils.log_group_utils import group_by_log_group, lookup_log_groups
+
+    names_per_target: dict[str, list[str]] = {}
+    targets: dict[str, dict[str, Any]] = {}
+    for lambda_name, target in selection:
+        targets[target_key(target)] = target
+        names_per_target.setdefault(target_key(target), []).append(lambda_name)
+    units = []
+    for key, lambda_names in names_per_target.items():
+        uncached = [
+            lambda_name
+            for lambda_name in lambda_names
+            if not (
+                cache_dir
+                and cache_path(
+                    cache_dir,
+                    lambda_name,
+                    targets[key],
+                    args.start_date,
+                    args.end_date,
+                ).exists()
+            )
+        ]
+        # A single function has no log group to share
+        log_groups = (
+            dict(zip(uncached, lookup_log_groups(uncached, targets[key])))
+            if len(uncached) > 1
+            else {}
+        )
+        units.extend(
+            (group, targets[key])
+            for group in group_by_log_group(
+                lambda_names, [log_groups.get(name) for name in lambda_names]
+            )
+        )
+    return units
+
+
+def store_cached(path: Path, row: dict[str, Any] | None) -> None:
+    """
+    Cache the analysis of a function.
+
+    Parameters
+    ----------
+    path : Path
+        Cache file of the function
+    row : dict, optional
+        Cost analysis of the function, None without invocations
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written whole, a concurrent reader never sees part of it
+    temporary = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    temporary.write_text(json.dumps({"row": row}))
+    temporary.replace(path)
+
+
+def select_functions(args: argparse.Namespace) -> list[tuple[str, dict[str, Any]]]:
+    """
+    List the functions to analyze.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        Command line arguments
+
+    Returns
+    -------
+    list of tuple
+        Function name and target of each function, explicitly selected ones
+        first
+    """
+    from backend.utils.tag_utils import resolve_tag_expression
+    from backend.utils.target_utils import get_client
+
+    target = {"role_arn": args.role_arn, "region": args.region}
+    names = list(args.functions or [])
+    if args.functions_file:
+        names.extend(
+            line.strip()
+            for line in Path(args.functions_file).read_text().splitlines()
+            if line.strip()
+        )
+    if args.tag_expression:
+        names.extend(
+            resolve_tag_expression(
+                args.tag_expression, get_client("resourcegroupstaggingapi", target)
+            )
+        )
+    return [(name, target) for name in dict.fromkeys(names)]
+
+
+def run_analysis(
+    selection: list[tuple[str, dict[str, Any]]],
+    args: argparse.Namespace,
+    report_id: str | None,
+) -> tuple[list[dict[str, Any]], list[dict[str, str]], list[dict[str, Any]]]:
+    """
+    Analyze the functions in the worker pool, then retry the deferred ones.
+
+    Functions sharing a log group are analyzed by the same worker, with a
+    single query (see ``plan_units``).
+
+    Parameters
+    ----------
+    selection : list of tuple
+        Function name and target of each function
+    args : argparse.Namespace
+        Command line arguments
+    report_id : str, optional
+        Report registering the queries
+
+    Returns
+    -------
+    tuple
+        Cost analysis of the functions with invocations, functionName and
+        reason of those that failed, and the spans of every function
+    """
+    from backend.step_function.analysis_generator import retry_deferred_functions
+    from backend.utils.timeline_utils import Timeline
+
+    cache_dir = None if args.no_cache else args.cache_dir
+    executor_class = (
+        concurrent.futures.ProcessPoolExecutor
+        if args.pool == "process"
+        else concurrent.futures.ThreadPoolExecutor
+    )
+    lambda_costs = []
+    deferred: dict[str, list[str]] = {}
+    targets: dict[str, dict[str, Any]] = {}
+    failed_functions = []
+    spans = []
+    cached = 0
+    done = 0
+    with executor_class(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(
+                analyze_functions,
+                lambda_names,
+                target,
+                args.start_date,
+                args.end_date,
+                report_id,
+                cache_dir,
+            )
+            for lambda_names, target in plan_units(selection, cache_dir, args)
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            results, unit_spans = future.result()
+            spans.extend(unit_spans)
+            for result in results:
+                cached += result["cached"]
+                if result["failure"] is None:
+                    lambda_costs.append(result["row"])
+                elif result["failure"]["retryable"]:
+                    key = target_key(result["target"])
+                    targets[key] = result["target"]
+                    deferred.setdefault(key, []).append(result["functionName"])
+                else:
+                    failed_functions.append(
+                        {
+                            "functionName": result["functionName"],
+                            "reason": result["failure"]["reason"],
+                        }
+                    )
+            previous, done = done, done + len(results)
+            if done // progress_interval > previous // progress_interval or (
+                done == len(selection)
+            ):
+                print(
+                    f"Analyzed {done}/{len(selection)} functions ({cached} cached)",
+                    file=sys.stderr,
+                )
+
+    # One at a time over shorter windows, as in the generator
+    timeline = Timeline(report_id)
+    for key, lambda_names in deferred.items():
+        retried_costs, retry_failures = retry_deferred_functions(
+            lambda_names,
+            args.start_date,
+            args.end_date,
+            targets[key],
+            timeline,
+            report_id,
+        )
+        lambda_costs.extend(retried_costs)
+        failed_functions.extend(retry_failures)
+        if cache_dir:
+            failed_names = {failure["functionName"] for failure in retry_failures}
+            retried_names = [name for name in lambda_names if name not in failed_names]
+            for lambda_name, row in zip(retried_names, retried_costs):
+                store_cached(
+                    cache_path(
+                        cache_dir,
+                        lambda_name,
+                        targets[key],
+                        args.start_date,
+                        args.end_date,
+                    ),
+                    row,
+                )
+    spans.extend(timeline.spans)
+    return (
+        [row for row in lambda_costs if row is not None],
+        failed_functions,
+        spans,
+    )
+
+
+def write_local_report(
+    output_dir: str,
+    report_id: str,
+    args: argparse.Namespace,
+    lambda_costs: list[dict[str, Any]],
+    failed_functions: list[dict[str, str]],
+    spans: list[dict[str, Any]],
+) -> str:
+    """
+    Write the analysis, timeline and summary of a report to a directory.
+
+    The files are those the state machine writes to the bucket.
+
+    Parameters
+    ----------
+    output_dir : str
+        Directory receiving a directory per report
+    report_id : str
+        Report identifier
+    args : argparse.Namespace
+        Command line arguments
+    lambda_costs : list of dict
+        Cost analysis of the functions
+    failed_functions : list of dict
+        Functions whose query failed
+    spans : list of dict
+        Spans of the run
+
+    Returns
+    -------
+    str
+        Serialized summary
+    """
+    from backend.step_function.analysis_aggregator import build_summary
+    from backend.utils.timeline_utils import build_timeline
+    from backend.utils.usage_utils import report_cost
+
+    aggregated_data = cost_rows_frame(lambda_costs)
+    report_directory = Path(output_dir) / report_id
+    report_directory.mkdir(parents=True, exist_ok=True)
+    aggregated_data.to_csv(report_directory / "analysis.csv")
+    timeline = build_timeline(report_id, sorted(spans, key=lambda span: span["start"]))
+    (report_directory / "timeline.json").write_text(json.dumps(timeline))
+    cost = report_cost(timeline["spans"], float(aggregated_data["analysisCost"].sum()))
+    summary = build_summary(
+        aggregated_data,
+        report_id,
+        args.start_date,
+        args.end_date,
+        cost,
+        failed_functions,
+    )
+    (report_directory / "summary.json").write_text(summary)
+    return summary
+
+
+def cost_rows_frame(lambda_costs: list[dict[str, Any]]) -> Any:
+    """
+    Turn cost analysis rows into the frame the aggregator builds.
+
+    Parameters
+    ----------
+    lambda_costs : list of dict
+        Cost analysis of the functions
+
+    Returns
+    -------
+    DataFrame
+        Rows parsed back like the batch outputs, for the same columns and types
+    """
+    import io
+
+    from backend.step_function.analysis_aggregator import read_analysis_csv
+    from backend.step_function.analysis_generator import write_cost_rows
+
+    csv_file = io.StringIO()
+    write_cost_rows(csv_file, lambda_costs)
+    csv_file.seek(0)
+    return read_analysis_csv(csv_file)
+
+
+def write_failed_summary(
+    report_id: str, bucket_name: str, error: BaseException
+) -> None:
+    """
+    Mark a report of the bucket as failed, like the state machine's error handler.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    bucket_name : str
+        Analysis bucket
+    error : BaseException
+        Error that stopped the run, an interruption cancels the report
+    """
+    from datetime import datetime
+
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    summary = {
+        "status": "Cancelled" if isinstance(error, KeyboardInterrupt) else "Failed",
+        "reportID": report_id,
+        "errorCode": type(error).__name__,
+        "errorMessage": str(error),
+        "failureTime": datetime.now().isoformat(),
+    }
+    try:
+        upload_file_to_s3(
+            body=json.dumps(summary),
+            file_name="summary.json",
+            bucket_name=bucket_name,
+            directory=report_id,
+        )
+    except Exception as e:
+        print(f"Failed to write the error summary: {e}", file=sys.stderr)
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run an analysis from the command line.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments, sys.argv if not set
+
+    Returns
+    -------
+    int
+        Exit status, 1 if no function was selected
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m backend", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument("--functions", nargs="+", help="Function names")
+    parser.add_argument("--functions-file", help="File with a function name per line")
+    parser.add_argument("--tag-expression", help="Select functions by tags")
+    parser.add_argument("--role-arn", help="Role to assume in the target account")
+    parser.add_argument("--region", help="Region of the functions")
+    parser.add_argument("--start-date", required=True)
+    parser.add_argument("--end-date", required=True)
+    parser.add_argument("--report-id", help="Defaults to the current timestamp")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="Write the report to this directory")
+    output.add_argument("--bucket", help="Write the report to this analysis bucket")
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=default_workers)
+    parser.add_argument("--cache-dir", default=default_cache_dir)
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    # The backend reads its configuration at import time
+    if args.bucket:
+        os.environ["BUCKET_NAME"] = args.bucket
+    else:
+        # Nothing goes to the bucket, query slots are shared within the process
+        os.environ.setdefault("BUCKET_NAME", "")
+        os.environ.setdefault("QUERY_SEMAPHORE", "local")
+
+    report_id = str(args.report_id or int(time.time()))
+    selection = select_functions(args)
+    if not selection:
+        print("No function selected", file=sys.stderr)
+        return 1
+    print(f"Analyzing {len(selection)} functions", file=sys.stderr)
+
+    from backend.utils.timeline_utils import Timeline
+    from backend.utils.usage_utils import UsageMeter
+
+    meter = UsageMeter()
+    if args.bucket:
+        from backend.utils.s3_utils import upload_file_to_s3
+
+        upload_file_to_s3(
+            body=json.dumps({"status": "Running"}),
+            file_name="summary.json",
+            bucket_name=args.bucket,
+            directory=report_id,
+        )
+    timeline = Timeline(report_id)
+    try:
+        with timeline.span("cli.run", functions=len(selection)):
+            lambda_costs, failed_functions, spans = run_analysis(
+                selection, args, report_id if args.bucket else None
+            )
+        timeline.spans.extend(spans)
+
+        if args.output_dir:
+            timeline.add_span(
+                "cli.invocation", meter.started_at, time.time(), **meter.usage()
+            )
+            summary = write_local_report(
+                args.output_dir,
+                report_id,
+                args,
+                lambda_costs,
+                failed_functions,
+                timeline.spans,
+            )
+            location = str(Path(args.output_dir) / report_id)
+        else:
+            from backend.step_function.analysis_aggregator import publish_report
+
+            summary = publish_report(
+                cost_rows_frame(lambda_costs),
+                report_id,
+                args.start_date,
+                args.end_date,
+                failed_functions,
+                timeline,
+                meter,
+                "cli",
+            )
+            location = f"s3://{args.bucket}/{report_id}"
+    except BaseException as e:
+        if args.bucket:
+            # Would show as running in the history forever
+            write_failed_summary(report_id, args.bucket, e)
+        raise
+    print(f"Report written to {location}", file=sys.stderr)
+    print(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,29 +4,114 @@ This module provides the shared APIGatewayRestResolver instance that
 route modules import and register their endpoints with.
 """
 
+import os
+import time
 from typing import Any
 
 from aws_lambda_powertools import Logger
-from aws_lambda_powertools.event_handler import APIGatewayRestResolver, CORSConfig
+from aws_lambda_powertools.event_handler import (
+    APIGatewayRestResolver,
+    CORSConfig,
+    Response,
+)
+from aws_lambda_powertools.event_handler.exceptions import ServiceError
+from aws_lambda_powertools.event_handler.middlewares import NextMiddleware
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+from backend.api.http_cache import http_cache_middleware, serializer
+from backend.utils.admission_utils import drain_analysis_queue
+from backend.utils.metrics_utils import add_report_dimension, metrics, record_metric
+from backend.utils.profiling_utils import profiled
+
 logger = Logger()
 
+bucket_name = os.environ["BUCKET_NAME"]
+
+api_prefix = "/api"
+
 # Shared CORS configuration
 cors_config = CORSConfig(allow_origin="*", max_age=300)
 
 # Shared API Gateway resolver - routes will register with this instance
-app = APIGatewayRestResolver(cors=cors_config, strip_prefixes=["/api"])
+app = APIGatewayRestResolver(
+    cors=cors_config, strip_prefixes=[api_prefix], serializer=serializer
+)
+
+
+def metrics_middleware(
+    app: APIGatewayRestResolver, next_middleware: NextMiddleware
+) -> Response[Any]:
+    """
+    Record the latency and status of API requests, per route and report.
+
+    Parameters
+    ----------
+    app : APIGatewayRestResolver
+        Resolver handling the current request
+    next_middleware : NextMiddleware
+        Next middleware or route handler in the chain
+
+    Returns
+    -------
+    Response
+        Route response
+    """
+    metrics.add_dimension(
+        name="route", value=app.current_event.path.removeprefix(api_prefix)
+    )
+    add_report_dimension(
+        (app.current_event.query_string_parameters or {}).get("reportID")
+    )
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response: Response[Any] = next_middleware(app)
+        status_code = response.status_code
+        return response
+    except ServiceError as e:
+        # Turned into a response by the resolver, after the middlewares
+        status_code = e.status_code
+        raise
+    finally:
+        record_metric(
+            "ApiLatency",
+            MetricUnit.Milliseconds,
+            (time.perf_counter() - started) * 1000,
+        )
+        record_metric(f"Api{status_code // 100}xx", MetricUnit.Count, 1)
+
+
+# Metrics of the whole request, then ETags, conditional GET and compression for
+# every route
+app.use(middlewares=[metrics_middleware, http_cache_middleware])
 
 
 # Import routes to register them with the app
 # These imports must come after app is defined so routes can import it
+from backend.api import cancel_report  # noqa: E402, F401
+from backend.api import express_analysis  # noqa: E402, F401
 from backend.api import get_analysis_report  # noqa: E402, F401
 from backend.api import historical_analysis_report  # noqa: E402, F401
 from backend.api import list_lambda_functions  # noqa: E402, F401
+from backend.api import report_timeline  # noqa: E402, F401
+from backend.api import resume_report  # noqa: E402, F401
+from backend.api import start_analysis  # noqa: E402, F401
 
 
 @logger.inject_lambda_context(log_event=True)  # type: ignore[misc]
+@metrics.log_metrics  # type: ignore[misc]
+@profiled("api", bucket_name)
 def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, Any]:
     """Lambda handler with Powertools event resolver."""
+    # Asynchronous self-invocation refreshing the function inventory snapshot
+    if event.get("inventory_refresh"):
+        list_lambda_functions.refresh_inventory_snapshot()
+        return {"status": "Refreshed"}
+    # EventBridge rule matching the end of an analysis execution
+    if event.get("drain_analysis_queue"):
+        started = drain_analysis_queue(
+            start_analysis.sfn_client, start_analysis.state_machine_arn, bucket_name
+        )
+        return {"status": "Drained", "started": list(started)}
     return app.resolve(event, context)  # type: ignore[no-any-return]
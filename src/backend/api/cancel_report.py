@@ -0,0 +1,91 @@
+"""API endpoint to cancel a running analysis report."""
+
+import json
+import os
+from datetime import datetime
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.event_handler.exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
+from aws_lambda_powertools.metrics import MetricUnit
+from botocore.exceptions import ClientError
+
+from backend.api.app import app
+from backend.utils.admission_utils import dequeue_analysis
+from backend.utils.metrics_utils import record_metric
+from backend.utils.query_registry_utils import (
+    cancel_report_queries,
+    record_cancellation,
+)
+from backend.utils.s3_utils import download_from_s3, upload_file_to_s3
+
+logger = Logger()
+
+bucket_name = os.environ["BUCKET_NAME"]
+
+
+@app.post("/report/cancel")  # type: ignore[misc]
+def cancel_report() -> dict[str, Any]:
+    """
+    Cancel a running report by report ID.
+
+    The cancellation marker makes the generators stop at their next poll, then
+    the queries they registered are stopped right away. Queued reports are
+    removed from the queue.
+    """
+    query_params = app.current_event.query_string_parameters or {}
+    report_id = query_params.get("reportID")
+
+    if not report_id:
+        raise NotFoundError("Report ID parameter is required")
+
+    try:
+        summary = json.loads(
+            download_from_s3(
+                file_name="summary.json", bucket_name=bucket_name, directory=report_id
+            )
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchKey":
+            raise NotFoundError("Report does not exist or has been deleted")
+        logger.exception("Error retrieving report", extra={"report_id": report_id})
+        raise
+
+    # Never started, nothing to stop
+    if summary["status"] == "Queued" and dequeue_analysis(report_id, bucket_name):
+        upload_file_to_s3(
+            body=json.dumps(
+                {
+                    "status": "Cancelled",
+                    "reportID": report_id,
+                    "errorCode": "Cancelled",
+                    "errorMessage": "Cancelled on request",
+                    "failureTime": datetime.now().isoformat(),
+                }
+            ),
+            file_name="summary.json",
+            bucket_name=bucket_name,
+            directory=report_id,
+        )
+        logger.info("Cancelled queued report", extra={"report_id": report_id})
+        return {"reportID": report_id, "status": "Cancelled"}
+    if summary["status"] not in ["Queued", "Running"]:
+        raise BadRequestError(f"Report is not running: {summary['status']}")
+
+    record_cancellation(
+        report_id,
+        bucket_name,
+        {
+            "reason": "Cancelled on request",
+            "cancelledAt": datetime.now().isoformat(),
+        },
+    )
+    stopped = cancel_report_queries(report_id, bucket_name)
+    marker = record_cancellation(report_id, bucket_name, stopped)
+    record_metric("QueriesCancelled", MetricUnit.Count, stopped["cancelledQueries"])
+
+    logger.info("Cancelled report", extra={"report_id": report_id, **marker})
+    return {"reportID": report_id, "status": "Cancelling", **marker}
@@ -0,0 +1,255 @@
+"""API endpoint analyzing a small selection of functions in process."""
+
+import concurrent.futures
+import io
+import json
+import os
+import threading
+import time
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit
+
+from backend.api.app import app
+from backend.api.start_analysis import (
+    new_report_id,
+    queue_analysis,
+    validate_analysis_request,
+)
+from backend.step_function.analysis_aggregator import publish_report, read_analysis_csv
+from backend.step_function.analysis_generator import (
+    QueryFailedError,
+    submit_cost_queries,
+    write_cost_rows,
+)
+from backend.utils.admission_utils import analysis_fingerprint, claim_analysis
+from backend.utils.metrics_utils import add_report_dimension, record_metric
+from backend.utils.query_registry_utils import cancel_report_queries
+from backend.utils.straggler_utils import StragglerDetector
+from backend.utils.target_utils import target_key
+from backend.utils.timeline_utils import Timeline
+from backend.utils.usage_utils import UsageMeter
+
+logger = Logger()
+
+bucket_name = os.environ["BUCKET_NAME"]
+
+# Larger selections, and tag expressions, run through the state machine
+express_max_functions = int(os.environ.get("EXPRESS_MAX_FUNCTIONS", "10"))
+# Left to publish the report, or to queue it, within the API Gateway timeout
+express_margin_seconds = 6.0
+express_workers = 4
+
+
+@app.post("/analysis/express")  # type: ignore[misc]
+def express_analysis() -> dict[str, Any]:
+    """
+    Analyze a few functions in process and return the report directly.
+
+    The report is published like one produced by the state machine, so it
+    shows in the history. Selections above ``express_max_functions``, with a
+    tag expression, whose queries don't complete in time or have to be
+    retried are queued as by ``/analysis/start`` instead.
+    """
+    request = app.current_event.json_body or {}
+    validate_analysis_request(request)
+    report_id = new_report_id(request)
+    attached_to = claim_analysis(analysis_fingerprint(request), report_id, bucket_name)
+    if attached_to is not None:
+        record_metric("AnalysesDeduplicated", MetricUnit.Count, 1)
+        return {"reportID": attached_to, "attached": True}
+
+    selection = express_selection(request)
+    if selection is None:
+        return {**queue_analysis(report_id, request), "express": False}
+    add_report_dimension(report_id)
+    meter = UsageMeter(app.lambda_context)
+    deadline = (
+        time.monotonic()
+        + app.lambda_context.get_remaining_time_in_millis() / 1000
+        - express_margin_seconds
+    )
+    timeline = Timeline(report_id)
+    with timeline.span("express.analysis", functions=len(selection)):
+        analyzed = analyze_functions(
+            selection,
+            report_id,
+            request["start_date"],
+            request["end_date"],
+            timeline,
+            deadline,
+        )
+    if analyzed is None:
+        record_metric("ExpressFallbacks", MetricUnit.Count, 1)
+        logger.info(
+            "Express analysis incomplete, queued", extra={"report_id": report_id}
+        )
+        # Priced with the report the state machine publishes
+        timeline.add_span(
+            "express.invocation", meter.started_at, time.time(), **meter.usage()
+        )
+        timeline.upload(bucket_name, "express")
+        return {**queue_analysis(report_id, request), "express": False}
+
+    lambda_costs, failed_functions = analyzed
+    # Parsed back like the batch outputs, for the same columns and types
+    csv_file = io.StringIO()
+    write_cost_rows(csv_file, lambda_costs)
+    csv_file.seek(0)
+    aggregated_data = read_analysis_csv(csv_file)
+    summary = publish_report(
+        aggregated_data,
+        report_id,
+        request["start_date"],
+        request["end_date"],
+        failed_functions,
+        timeline,
+        meter,
+        "express",
+    )
+    record_metric("ExpressAnalyses", MetricUnit.Count, 1)
+    return {
+        "reportID": report_id,
+        "attached": False,
+        "express": True,
+        "summary": json.loads(summary),
+        "analysis": json.loads(aggregated_data.to_json(orient="records")),
+    }
+
+
+def express_selection(
+    request: dict[str, Any],
+) -> list[tuple[str, dict[str, Any]]] | None:
+    """
+    List the functions of a request that can be analyzed in process.
+
+    Parameters
+    ----------
+    request : dict
+        Start request
+
+    Returns
+    -------
+    list of tuple or None
+        Function name and target of each selected function, None if the
+        selection has a tag expression or too many functions
+    """
+    targets = request.get("targets") or [request]
+    if any(target.get("tag_expression") for target in targets):
+        return None
+    selection: list[tuple[str, dict[str, Any]]] = []
+    for target in targets:
+        function_target = {
+            "role_arn": target.get("role_arn"),
+            "region": target.get("region"),
+        }
+        selection.extend(
+            (lambda_name, function_target)
+            for lambda_name in dict.fromkeys(target.get("lambda_functions_name", []))
+        )
+    if len(selection) > express_max_functions:
+        return None
+    return selection
+
+
+def analyze_functions(
+    selection: list[tuple[str, dict[str, Any]]],
+    report_id: str,
+    start_date: str,
+    end_date: str,
+    timeline: Timeline,
+    deadline: float,
+) -> tuple[list[dict[str, Any]], list[dict[str, str]]] | None:
+    """
+    Query the functions of an express analysis in parallel.
+
+    Functions of a target logging to the same custom log group share a query
+    of the log group, as in the generator. Retrying a failed query over shorter windows could outlast the request, so
+    the analysis is given up on instead and left to the state machine. Queries
+    that can't succeed (malformed) are reported as failed. Queries still
+    running at the deadline are stopped, and the bytes they scanned recorded
+    in an ``express.stopped_queries`` span.
+
+    Parameters
+    ----------
+    selection : list of tuple
+        Function name and target of each function
+    report_id : str
+        Report identifier, registering its queries
+    start_date : str
+        Analysis start date
+    end_date : str
+        Analysis end date
+    timeline : Timeline
+        Timeline receiving the spans of the functions
+    deadline : float
+        ``time.monotonic()`` by which the queries must have completed
+
+    Returns
+    -------
+    tuple or None
+        Cost analysis of the functions with invocations and the functionName
+        and reason of those that failed, None if the queries didn't complete
+        in time and were stopped, or have to be retried
+    """
+    lambda_costs = []
+    deferred = []
+    failed_functions: list[dict[str, str]] = []
+    stragglers = StragglerDetector()
+    cancel = threading.Event()
+    targets: dict[str, dict[str, Any]] = {}
+    names_per_target: dict[str, list[str]] = {}
+    for lambda_name, target in selection:
+        targets[target_key(target)] = target
+        names_per_target.setdefault(target_key(target), []).append(lambda_name)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=express_workers)
+    futures = {}
+    for key, lambda_names in names_per_target.items():
+        futures.update(
+            submit_cost_queries(
+                executor,
+                lambda_names,
+                start_date,
+                end_date,
+                targets[key],
+                timeline,
+                report_id,
+                stragglers,
+                cancel,
+            )
+        )
+    done, not_done = concurrent.futures.wait(
+        futures, timeout=max(deadline - time.monotonic(), 0)
+    )
+    if not_done:
+        # Stopped through the registry before the workers give up on them, to
+        # count what they scanned
+        stopped_at = time.time()
+        stopped = cancel_report_queries(report_id, bucket_name)
+        cancel.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        timeline.add_span(
+            "express.stopped_queries",
+            stopped_at,
+            time.time(),
+            queries=stopped["cancelledQueries"],
+            bytesScanned=stopped["bytesScanned"],
+        )
+        return None
+    executor.shutdown()
+    for future in done:
+        try:
+            lambda_costs.extend(future.result())
+        except QueryFailedError as e:
+            if e.retryable:
+                deferred.extend(futures[future])
+            else:
+                failed_functions.extend(
+                    {"functionName": lambda_name, "reason": e.reason}
+                    for lambda_name in futures[future]
+                )
+    if deferred:
+        logger.info("Express queries to retry", extra={"function_names": deferred})
+        return None
+    return [item for item in lambda_costs if item is not None], failed_functions
@@ -0,0 +1,162 @@
+"""In-memory index over the Lambda function inventory.
+
+Inverted indexes by runtime, package type and architecture plus a sorted name
+index answer filter, prefix, facet and pagination queries without scanning the
+whole inventory for every request.
+"""
+
+import bisect
+from typing import Any
+
+# Query facet name -> inventory field it indexes
+facet_fields = {
+    "runtime": "Runtime",
+    "packageType": "PackageType",
+    "architecture": "Architectures",
+}
+
+
+class FunctionIndex:
+    """
+    Indexed, read-only view of a Lambda function inventory.
+
+    Parameters
+    ----------
+    functions : list of dict
+        Lambda function details as stored in the inventory snapshot
+    """
+
+    def __init__(self, functions: list[dict[str, Any]]) -> None:
+        # Positions are assigned in name order so that any subset of positions,
+        # once sorted, is already in the order pages are served in
+        self.functions = sorted(functions, key=lambda f: f["FunctionName"].lower())
+        self.names = [f["FunctionName"].lower() for f in self.functions]
+        self.positions_by_name = {
+            f["FunctionName"]: position for position, f in enumerate(self.functions)
+        }
+        self.all_positions = frozenset(range(len(self.functions)))
+
+        self.inverted: dict[str, dict[str, set[int]]] = {
+            facet: {} for facet in facet_fields
+        }
+        for position, function in enumerate(self.functions):
+            for facet, field in facet_fields.items():
+                values = function[field]
+                for value in values if isinstance(values, list) else [values]:
+                    self.inverted[facet].setdefault(value, set()).add(position)
+
+        self.facet_counts = {
+            facet: {value: len(positions) for value, positions in index.items()}
+            for facet, index in self.inverted.items()
+        }
+
+    def prefix_positions(self, prefix: str) -> frozenset[int]:
+        """
+        Find the functions whose name starts with a prefix (case insensitive).
+
+        Parameters
+        ----------
+        prefix : str
+            Function name prefix
+
+        Returns
+        -------
+        frozenset of int
+            Positions of the matching functions
+        """
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + "\uffff", lo=start)
+        return frozenset(range(start, end))
+
+    def facet_positions(self, facet: str, values: list[str]) -> set[int]:
+        """
+        Find the functions matching any of the selected values of a facet.
+
+        Parameters
+        ----------
+        facet : str
+            Facet name (runtime, packageType or architecture)
+        values : list of str
+            Selected values
+
+        Returns
+        -------
+        set of int
+            Positions of the matching functions
+        """
+        index = self.inverted[facet]
+        return set().union(*(index.get(value, set()) for value in values))
+
+    def query(
+        self,
+        filters: dict[str, list[str]] | None = None,
+        name_prefix: str | None = None,
+        names: list[str] | None = None,
+        offset: int = 0,
+        limit: int | None = None,
+        fields: list[str] | None = None,
+    ) -> dict[str, Any]:
+        """
+        Filter, facet, paginate and project the inventory.
+
+        Facet counts are disjunctive: the counts of a facet apply every filter
+        except the facet's own, so the UI can show how many functions each
+        alternative value would add.
+
+        Parameters
+        ----------
+        filters : dict, optional
+            Facet name to selected values; values within a facet are OR-ed,
+            facets are AND-ed
+        name_prefix : str, optional
+            Function name prefix (case insensitive)
+        names : list of str, optional
+            Restrict results to these function names, such as a tag selection
+        offset : int, default=0
+            Number of matching functions to skip
+        limit : int, optional
+            Maximum number of functions to return, all if not set
+        fields : list of str, optional
+            Function fields to return, all if not set
+
+        Returns
+        -------
+        dict
+            Page of functions, total count of matches and facet counts
+        """
+        filters = filters or {}
+        base = self.prefix_positions(name_prefix) if name_prefix else self.all_positions
+        if names is not None:
+            base = base & {
+                self.positions_by_name[name]
+                for name in names
+                if name in self.positions_by_name
+            }
+        selections = {
+            facet: self.facet_positions(facet, values)
+            for facet, values in filters.items()
+        }
+
+        matches = set(base).intersection(*selections.values())
+
+        if not filters and not name_prefix and names is None:
+            facets = self.facet_counts
+        else:
+            facets = {}
+            for facet, index in self.inverted.items():
+                others = [s for f, s in selections.items() if f != facet]
+                candidates = set(base).intersection(*others)
+                facets[facet] = {
+                    value: count
+                    for value, positions in index.items()
+                    if (count := len(positions & candidates))
+                }
+
+        ordered = sorted(matches)
+        page_positions = ordered[offset : offset + limit if limit else None]
+        page = [self.functions[position] for position in page_positions]
+        if fields:
+            page = [{field: f[field] for field in fields if field in f} for f in page]
+
+        return {"functions": page, "totalCount": len(ordered), "facets": facets}
@@ -2,28 +2,56 @@
 
 import json
 import os
-from io import StringIO
-from typing import Any
+import time
+from typing import IO, Any
 
 import boto3
 import pandas as pd
 from aws_lambda_powertools import Logger
-from aws_lambda_powertools.event_handler.exceptions import NotFoundError
+from aws_lambda_powertools.event_handler import Response, content_types
+from aws_lambda_powertools.event_handler.exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
+from aws_lambda_powertools.metrics import MetricUnit
 from botocore.exceptions import ClientError
 
 from backend.api.app import app
-from backend.utils.s3_utils import download_from_s3
+from backend.api.http_cache import (
+    combine_etags,
+    compute_etag,
+    immutable_cache_control,
+    is_not_modified,
+    no_cache,
+    not_modified_response,
+)
+from backend.utils.metrics_utils import instrument_client, record_metric
+from backend.utils.multithread_utils import stream_map
+from backend.utils.progress_utils import load_progress, public_progress
+from backend.utils.s3_utils import download_from_s3, get_s3_etag, open_s3_reader
 
 logger = Logger()
 
-s3_client = boto3.client("s3")
+s3_client = instrument_client(boto3.client("s3"))
 
 bucket_name = os.environ["BUCKET_NAME"]
 
+presigned_url_expiry = 3600
+# Completed reports never change but their presigned download URL does. Responses
+# are cached until the end of the current URL window, long before any URL handed
+# out during that window expires.
+url_window_seconds = presigned_url_expiry // 2
+
 
 @app.get("/report")  # type: ignore[misc]
-def get_report() -> dict[str, Any]:
-    """Retrieve analysis report by report ID."""
+def get_report() -> dict[str, Any] | Response[Any]:
+    """
+    Retrieve analysis report by report ID.
+
+    Running reports come with their progress and the rows analyzed so far,
+    only those of the batches recorded after the ``since`` cursor if set (see
+    ``get_running_report``).
+    """
     query_params = app.current_event.query_string_parameters or {}
     report_id = query_params.get("reportID")
 
@@ -42,26 +70,49 @@ def get_report() -> dict[str, Any]:
             extra={"report_id": report_id, "status": summary.get("status")},
         )
 
-        if summary["status"] in ["Running", "Error", "Failed"]:
+        if summary["status"] == "Running":
+            return get_running_report(report_id, summary, summary_str)
+        if summary["status"] in ["Queued", "Error", "Failed", "Cancelled"]:
             return {"summary": summary}
         else:
-            analysis = download_from_s3(
-                file_name="analysis.csv", bucket_name=bucket_name, directory=report_id
+            url_window, window_elapsed = divmod(int(time.time()), url_window_seconds)
+            etag = combine_etags(
+                compute_etag(summary_str),
+                get_s3_etag(
+                    file_name="analysis.csv",
+                    bucket_name=bucket_name,
+                    directory=report_id,
+                ),
+                str(url_window),
             )
+            cache_control = immutable_cache_control(url_window_seconds - window_elapsed)
+            # Answer re-views before downloading and parsing the analysis CSV
+            if is_not_modified(app.current_event, etag):
+                return not_modified_response(etag, cache_control)
 
             download_url = s3_client.generate_presigned_url(
                 "get_object",
                 Params={"Bucket": bucket_name, "Key": f"{report_id}/analysis.csv"},
-                ExpiresIn=3600,
+                ExpiresIn=presigned_url_expiry,
+            )
+            with open_s3_reader(
+                file_name="analysis.csv", bucket_name=bucket_name, directory=report_id
+            ) as analysis:
+                records = read_analysis_records(analysis)
+            record_metric("RowsServed", MetricUnit.Count, len(records))
+            return Response(
+                status_code=200,
+                content_type=content_types.APPLICATION_JSON,
+                body={
+                    "analysis": records,
+                    "summary": summary,
+                    "url": download_url,
+                },
+                headers={"ETag": etag, "Cache-Control": cache_control},
             )
-            df = pd.read_csv(StringIO(analysis), sep=",", index_col=0)
-            return {
-                "analysis": json.loads(df.to_json(orient="records")),
-                "summary": summary,
-                "url": download_url,
-            }
     except ClientError as e:
-        if e.response["Error"]["Code"] == "NoSuchKey":
+        # head_object reports missing keys as a bare 404
+        if e.response["Error"]["Code"] in ["NoSuchKey", "404"]:
             raise NotFoundError("Analysis does not exist or has been deleted")
         else:
             logger.exception(
@@ -70,4 +121,131 @@ def get_report() -> dict[str, Any]:
             raise
 
 
+def get_running_report(
+    report_id: str, summary: dict[str, Any], summary_str: str
+) -> dict[str, Any] | Response[Any]:
+    """
+    Serve the progress of a running report with the rows analyzed so far.
+
+    The ETag follows the progress document, so polls between two batch
+    completions are answered before any batch output is read. With a
+    ``since`` cursor, the ``sequence`` of the progress a client last received,
+    only the batches recorded after it are read, their rows served by batch
+    so that a batch run again replaces its rows. The ``cursor`` of the
+    response is the one to poll with next, batches that couldn't be read are
+    served again.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    summary : dict
+        Summary of the report
+    summary_str : str
+        Serialized summary
+
+    Returns
+    -------
+    dict or Response
+        Summary, progress and rows, or a 304 when the client copy is current
+    """
+    loaded = load_progress(report_id, bucket_name)
+    # Started before progress was recorded
+    if loaded is None:
+        return {"summary": summary}
+    progress, progress_etag = loaded
+    since_param = (app.current_event.query_string_parameters or {}).get("since")
+    since = None
+    if since_param is not None:
+        try:
+            since = int(since_param)
+        except ValueError:
+            raise BadRequestError("since must be a progress sequence number")
+    etag = combine_etags(compute_etag(summary_str), progress_etag, str(since))
+    if is_not_modified(app.current_event, etag):
+        return not_modified_response(etag, no_cache)
+
+    # Recorded before contributions were numbered
+    batches = {
+        batch_id: batch
+        for batch_id, batch in progress["batches"].items()
+        if since is None or batch.get("sequence", 1) > since
+    }
+    rows_by_batch = {}
+    cursor = progress.get("sequence", 0)
+    for batch_id, result in zip(
+        batches,
+        stream_map(read_batch_records, batches.values(), max_workers=10, ordered=True),
+    ):
+        batch = result.item
+        if result.ok:
+            rows_by_batch[batch_id] = result.value
+        else:
+            # Rows of that batch show up once it's read successfully
+            logger.warning(
+                "Failed to read batch output",
+                extra={"file_name": batch["filename"], "error": str(result.error)},
+            )
+            cursor = min(cursor, batch.get("sequence", 1) - 1)
+    rows = sum(len(records) for records in rows_by_batch.values())
+    record_metric("RowsServed", MetricUnit.Count, rows)
+    body: dict[str, Any] = {"summary": summary, "progress": public_progress(progress)}
+    if since is None:
+        body["analysis"] = [
+            record for records in rows_by_batch.values() for record in records
+        ]
+    else:
+        body.update(batches=rows_by_batch, cursor=cursor)
+    return Response(
+        status_code=200,
+        content_type=content_types.APPLICATION_JSON,
+        body=body,
+        headers={"ETag": etag, "Cache-Control": no_cache},
+    )
+
+
+def read_batch_records(batch: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Read the rows of a completed batch.
+
+    Parameters
+    ----------
+    batch : dict
+        Contribution of the batch to the report progress
+
+    Returns
+    -------
+    list of dict
+        One record per function
+    """
+    with open_s3_reader(
+        file_name=batch["filename"],
+        bucket_name=bucket_name,
+        directory=batch["directory"],
+    ) as analysis:
+        return read_analysis_records(analysis, index_col=None)
+
+
+def read_analysis_records(
+    analysis: IO[Any], index_col: int | None = 0
+) -> list[dict[str, Any]]:
+    """
+    Convert the analysis CSV of a report to JSON records.
+
+    Parameters
+    ----------
+    analysis : file-like
+        analysis.csv content, or the output of a batch
+    index_col : int, optional
+        Column of the row index, none in batch outputs
+
+    Returns
+    -------
+    list of dict
+        One record per function
+    """
+    df = pd.read_csv(analysis, sep=",", index_col=index_col, dtype={"accountId": str})
+    return json.loads(df.to_json(orient="records"))  # type: ignore[no-any-return]
+
+
 # Lambda handler is in app.py - this module just registers routes
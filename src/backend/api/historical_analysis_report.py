@@ -8,15 +8,20 @@ import boto3
 from aws_lambda_powertools import Logger
 
 from backend.api.app import app
+from backend.utils.metrics_utils import instrument_client
+from backend.utils.multithread_utils import ExecutorStats, stream_map
 
 logger = Logger()
 
-s3_client = boto3.client("s3")
+s3_client = instrument_client(boto3.client("s3"))
 
 bucket_name = os.environ["BUCKET_NAME"]
 
 prefix = "summaries/"
 
+# Summaries downloaded concurrently, at most one page of them
+max_download_workers = 10
+
 
 @app.get("/reportSummaries")  # type: ignore[misc]
 def list_historical_reports() -> dict[str, Any]:
@@ -52,13 +57,24 @@ def list_historical_reports() -> dict[str, Any]:
         if content["Key"].endswith(".json")
     ]
 
-    # Fetch the content of each JSON file
+    # Fetch the content of each JSON file, newest first like the listing
     json_contents = []
-    # TODO: Add multithreading for faster retrieval
-    for file_key in json_files:
-        file_obj = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-        file_content = file_obj["Body"].read().decode("utf-8")
-        json_contents.append(json.loads(file_content))
+    download_stats = ExecutorStats()
+    for download in stream_map(
+        download_summary,
+        json_files,
+        max_workers=max_download_workers,
+        ordered=True,
+        stats=download_stats,
+    ):
+        if download.ok:
+            json_contents.append(download.value)
+        else:
+            # One unreadable summary shouldn't hide the rest of the page
+            logger.error(
+                "Failed to retrieve report summary",
+                extra={"key": download.item, "error": str(download.error)},
+            )
 
     result: dict[str, Any] = {
         "jsonContents": json_contents,
@@ -69,8 +85,29 @@ def list_historical_reports() -> dict[str, Any]:
     if response.get("IsTruncated"):
         result["continuationToken"] = response.get("NextContinuationToken")
 
-    logger.info("Retrieved historical reports", extra={"count": len(json_contents)})
+    logger.info(
+        "Retrieved historical reports",
+        extra={"count": len(json_contents), **download_stats.as_dict()},
+    )
     return result
 
 
+def download_summary(file_key: str) -> Any:
+    """
+    Download and parse a report summary.
+
+    Parameters
+    ----------
+    file_key : str
+        S3 key of the summary
+
+    Returns
+    -------
+    Any
+        Parsed summary
+    """
+    file_obj = s3_client.get_object(Bucket=bucket_name, Key=file_key)
+    return json.loads(file_obj["Body"].read().decode("utf-8"))
+
+
 # Lambda handler is in app.py - this module just registers routes
@@ -0,0 +1,185 @@
+"""HTTP caching helpers and middleware for API responses.
+
+Every successful response gets a strong ETag, conditional requests carrying a
+matching ``If-None-Match`` are answered with ``304 Not Modified`` and large
+bodies are gzip compressed when the client accepts it.
+"""
+
+import hashlib
+import json
+from functools import partial
+from typing import Any
+
+from aws_lambda_powertools.event_handler import APIGatewayRestResolver, Response
+from aws_lambda_powertools.event_handler.middlewares import NextMiddleware
+from aws_lambda_powertools.shared.json_encoder import Encoder
+from aws_lambda_powertools.utilities.data_classes.common import BaseProxyEvent
+
+# Same serializer as the resolver default, shared so the middleware can hash
+# exactly the bytes that will be sent
+serializer = partial(json.dumps, separators=(",", ":"), cls=Encoder)
+
+# Bodies below this size are not worth the gzip and base64 overhead
+gzip_min_size = 1024
+
+no_cache = "no-cache"
+
+
+def immutable_cache_control(max_age: int) -> str:
+    """
+    Build a Cache-Control value for content that never changes.
+
+    Parameters
+    ----------
+    max_age : int
+        Number of seconds shared caches and browsers may reuse the response
+
+    Returns
+    -------
+    str
+        Cache-Control header value
+    """
+    return f"public, max-age={max_age}, immutable"
+
+
+def compute_etag(body: str | bytes) -> str:
+    """
+    Compute a strong ETag from a response body.
+
+    Parameters
+    ----------
+    body : str or bytes
+        Serialized response body
+
+    Returns
+    -------
+    str
+        Quoted strong ETag
+    """
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    return f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+
+
+def combine_etags(*etags: str) -> str:
+    """
+    Derive a strong ETag from the ETags of the artifacts a response is built from.
+
+    Parameters
+    ----------
+    *etags : str
+        ETags (or any version identifiers) of the underlying artifacts
+
+    Returns
+    -------
+    str
+        Quoted strong ETag
+    """
+    return compute_etag("|".join(etag.strip('"') for etag in etags))
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    """
+    Check an ETag against an If-None-Match header value.
+
+    Parameters
+    ----------
+    etag : str
+        Current ETag of the resource
+    if_none_match : str, optional
+        Raw If-None-Match header value
+
+    Returns
+    -------
+    bool
+        True if the client already holds the current representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function, so W/ prefixes are ignored
+    candidates = {
+        candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")
+    }
+    return etag.removeprefix("W/") in candidates
+
+
+def is_not_modified(event: BaseProxyEvent, etag: str) -> bool:
+    """
+    Check whether the current request is a conditional GET for an unchanged resource.
+
+    Parameters
+    ----------
+    event : BaseProxyEvent
+        Current API Gateway event
+    etag : str
+        Current ETag of the resource
+
+    Returns
+    -------
+    bool
+        True if a 304 Not Modified should be returned
+    """
+    return etag_matches(etag, event.headers.get("if-none-match"))
+
+
+def not_modified_response(etag: str, cache_control: str = no_cache) -> Response[Any]:
+    """
+    Build an empty 304 Not Modified response.
+
+    Parameters
+    ----------
+    etag : str
+        Current ETag of the resource
+    cache_control : str, default="no-cache"
+        Cache-Control header value
+
+    Returns
+    -------
+    Response
+        304 response without body
+    """
+    return Response(
+        status_code=304, headers={"ETag": etag, "Cache-Control": cache_control}
+    )
+
+
+def http_cache_middleware(
+    app: APIGatewayRestResolver, next_middleware: NextMiddleware
+) -> Response[Any]:
+    """
+    Add ETag, Cache-Control, conditional GET and compression to route responses.
+
+    Routes may set their own ``ETag`` and ``Cache-Control`` headers (for example
+    derived from S3 ETags); otherwise the ETag is computed from the body and the
+    response must be revalidated on every use.
+
+    Parameters
+    ----------
+    app : APIGatewayRestResolver
+        Resolver handling the current request
+    next_middleware : NextMiddleware
+        Next middleware or route handler in the chain
+
+    Returns
+    -------
+    Response
+        Route response, or a 304 when the client copy is still current
+    """
+    response: Response[Any] = next_middleware(app)
+    if response.status_code != 200 or response.body is None:
+        return response
+
+    if response.is_json() and not isinstance(response.body, (str, bytes)):
+        response.body = serializer(response.body)
+
+    etag = str(response.headers.setdefault("ETag", compute_etag(response.body)))
+    cache_control = str(response.headers.setdefault("Cache-Control", no_cache))
+
+    if is_not_modified(app.current_event, etag):
+        return not_modified_response(etag, cache_control)
+
+    if response.compress is None and len(response.body) >= gzip_min_size:
+        # Powertools only compresses when the client sent Accept-Encoding: gzip
+        response.compress = True
+    return response
@@ -1,65 +1,343 @@
-"""API endpoint to list Lambda functions in AWS account."""
+"""API endpoint to list Lambda functions in AWS account.
 
+The function inventory is served from a snapshot persisted to S3 and cached in
+memory. Stale snapshots are still served while a refresh runs in the background
+(stale-while-revalidate), so listing never waits on ``ListFunctions`` unless no
+usable snapshot exists.
+"""
+
+import json
+import os
+import time
 from typing import Any
 
 import boto3
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.event_handler.exceptions import BadRequestError
+from botocore.exceptions import ClientError
 
 from backend.api.app import app
+from backend.api.function_index import FunctionIndex
+from backend.utils.metrics_utils import instrument_client
+from backend.utils.s3_utils import download_from_s3, upload_file_to_s3
+from backend.utils.tag_utils import normalize_tag_expression, resolve_tag_expression
 
 logger = Logger()
 
-client = boto3.client("lambda")
+client = instrument_client(boto3.client("lambda"))
+
+bucket_name = os.environ["BUCKET_NAME"]
+
+inventory_directory = "inventory"
+inventory_file_name = "lambda_functions.json"
+# Snapshots younger than this are served as is
+inventory_ttl_seconds = 300
+# Snapshots older than this are too stale to serve while refreshing
+inventory_max_stale_seconds = 24 * 3600
+# Minimum delay before the same container triggers another background refresh
+refresh_retrigger_seconds = 60
+
+# Snapshot cached for the lifetime of the Lambda container
+inventory_cache: dict[str, Any] = {}
+# Normalized tag expression -> (resolution time, function names)
+tag_selection_cache: dict[str, tuple[float, list[str]]] = {}
 
 
-def fetch_lambda_function(marker: str | None = None) -> list[dict[str, Any]]:
+def fetch_lambda_function() -> list[dict[str, Any]]:
     """
-    Fetch Lambda functions with pagination support.
+    Fetch all Lambda functions of the account.
 
-    Parameters
-    ----------
-    marker : str, optional
-        Pagination marker
+    ``ListFunctions`` pages are chained by marker, so pages are fetched one at a
+    time and projected as they arrive to keep memory bounded by the result.
 
     Returns
     -------
     list of dict
         Lambda function details
     """
-    response = (
-        client.list_functions(Marker=marker) if marker else client.list_functions()
-    )
     functions = []
-    for function in response["Functions"]:
-        functions.append(
-            {
-                "FunctionName": function["FunctionName"],
-                "Runtime": function.get("Runtime", "Docker Image"),
-                "PackageType": function["PackageType"],
-                "Architectures": function["Architectures"],
-                "MemorySize": function["MemorySize"],
-                "LastModified": function["LastModified"],
-            }
+    for page in client.get_paginator("list_functions").paginate():
+        for function in page["Functions"]:
+            functions.append(
+                {
+                    "FunctionName": function["FunctionName"],
+                    "Runtime": function.get("Runtime", "Docker Image"),
+                    "PackageType": function["PackageType"],
+                    "Architectures": function["Architectures"],
+                    "MemorySize": function["MemorySize"],
+                    "LastModified": function["LastModified"],
+                }
+            )
+    return functions
+
+
+def refresh_inventory_snapshot() -> dict[str, Any]:
+    """
+    List all Lambda functions and persist them as the inventory snapshot.
+
+    Returns
+    -------
+    dict
+        Snapshot with refreshedAt timestamp and functions
+    """
+    snapshot: dict[str, Any] = {
+        "refreshedAt": time.time(),
+        "functions": fetch_lambda_function(),
+    }
+    try:
+        upload_file_to_s3(
+            body=json.dumps(snapshot),
+            file_name=inventory_file_name,
+            bucket_name=bucket_name,
+            directory=inventory_directory,
         )
+    except ClientError:
+        # The listing is still valid for this request, only sharing it failed
+        logger.exception("Failed to persist inventory snapshot")
+    inventory_cache["snapshot"] = snapshot
+    logger.info(
+        "Inventory snapshot refreshed", extra={"count": len(snapshot["functions"])}
+    )
+    return snapshot
 
-    if "NextMarker" in response:
-        return functions + fetch_lambda_function(response["NextMarker"])
 
-    return functions
+def load_inventory_snapshot() -> dict[str, Any] | None:
+    """
+    Load the inventory snapshot from memory, falling back to S3.
+
+    Returns
+    -------
+    dict or None
+        Snapshot, or None if none has been persisted yet
+    """
+    cached: dict[str, Any] | None = inventory_cache.get("snapshot")
+    if cached and snapshot_age(cached) < inventory_ttl_seconds:
+        return cached
+
+    try:
+        snapshot: dict[str, Any] = json.loads(
+            download_from_s3(
+                file_name=inventory_file_name,
+                bucket_name=bucket_name,
+                directory=inventory_directory,
+            )
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ["NoSuchKey", "NoSuchBucket"]:
+            raise
+        return cached
+    # Another container may have refreshed the snapshot since it was cached here
+    if cached and cached["refreshedAt"] > snapshot["refreshedAt"]:
+        return cached
+    inventory_cache["snapshot"] = snapshot
+    return snapshot
+
+
+def snapshot_age(snapshot: dict[str, Any]) -> float:
+    """
+    Compute the age of an inventory snapshot.
+
+    Parameters
+    ----------
+    snapshot : dict
+        Inventory snapshot
+
+    Returns
+    -------
+    float
+        Age in seconds
+    """
+    return time.time() - float(snapshot["refreshedAt"])
+
+
+def trigger_background_refresh() -> None:
+    """Refresh the inventory snapshot through an asynchronous self-invocation."""
+    last_trigger = inventory_cache.get("refreshTriggeredAt", 0.0)
+    if time.time() - last_trigger < refresh_retrigger_seconds:
+        return
+    inventory_cache["refreshTriggeredAt"] = time.time()
+    try:
+        client.invoke(
+            FunctionName=app.lambda_context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json.dumps({"inventory_refresh": True}),
+        )
+        logger.info("Triggered background inventory refresh")
+    except ClientError:
+        logger.exception("Failed to trigger background inventory refresh")
+
+
+def get_inventory_snapshot(force_refresh: bool = False) -> dict[str, Any]:
+    """
+    Get the inventory snapshot with stale-while-revalidate semantics.
+
+    Parameters
+    ----------
+    force_refresh : bool, default=False
+        Whether to bypass the snapshot and list functions synchronously
+
+    Returns
+    -------
+    dict
+        Snapshot with refreshedAt timestamp and functions
+    """
+    snapshot = None if force_refresh else load_inventory_snapshot()
+    if snapshot is None or snapshot_age(snapshot) >= inventory_max_stale_seconds:
+        snapshot = refresh_inventory_snapshot()
+    elif snapshot_age(snapshot) >= inventory_ttl_seconds:
+        trigger_background_refresh()
+    return snapshot
+
+
+def get_function_index(force_refresh: bool = False) -> FunctionIndex:
+    """
+    Get the index of the current inventory snapshot, rebuilding it when it changed.
+
+    Parameters
+    ----------
+    force_refresh : bool, default=False
+        Whether to bypass the snapshot and list functions synchronously
+
+    Returns
+    -------
+    FunctionIndex
+        Index over the inventory snapshot
+    """
+    snapshot = get_inventory_snapshot(force_refresh)
+    if inventory_cache.get("indexRefreshedAt") != snapshot["refreshedAt"]:
+        inventory_cache["index"] = FunctionIndex(snapshot["functions"])
+        inventory_cache["indexRefreshedAt"] = snapshot["refreshedAt"]
+    return inventory_cache["index"]  # type: ignore[no-any-return]
+
+
+def get_tag_selection(expression: str) -> list[str]:
+    """
+    Resolve a tag expression to function names, cached like the inventory.
+
+    Parameters
+    ----------
+    expression : str
+        Tag expression (see ``backend.utils.tag_utils``)
+
+    Returns
+    -------
+    list of str
+        Names of the functions matching the expression
+    """
+    try:
+        key = normalize_tag_expression(expression)
+    except ValueError as e:
+        raise BadRequestError(str(e))
+    cached = tag_selection_cache.get(key)
+    if cached and time.time() - cached[0] < inventory_ttl_seconds:
+        return cached[1]
+    function_names = resolve_tag_expression(key)
+    tag_selection_cache[key] = (time.time(), function_names)
+    return function_names
+
+
+def get_list_param(name: str) -> list[str] | None:
+    """
+    Read a multi-valued query parameter.
+
+    Values may be repeated (``?a=x&a=y``) or comma separated (``?a=x,y``).
+
+    Parameters
+    ----------
+    name : str
+        Query parameter name
+
+    Returns
+    -------
+    list of str or None
+        Parameter values, or None if the parameter is absent
+    """
+    event = app.current_event
+    values = (event.multi_value_query_string_parameters or {}).get(name) or (
+        event.query_string_parameters or {}
+    ).get(name)
+    if values is None:
+        return None
+    if isinstance(values, str):
+        values = [values]
+    return [value for item in values for value in item.split(",") if value]
+
+
+def get_count_param(name: str, minimum: int) -> int | None:
+    """
+    Read a non-negative integer query parameter.
+
+    Parameters
+    ----------
+    name : str
+        Query parameter name
+    minimum : int
+        Smallest accepted value
+
+    Returns
+    -------
+    int or None
+        Parameter value, or None if the parameter is absent or empty
+
+    Raises
+    ------
+    BadRequestError
+        If the value is not an integer of at least ``minimum``
+    """
+    value = (app.current_event.query_string_parameters or {}).get(name)
+    if not value:
+        return None
+    if not value.isdigit() or int(value) < minimum:
+        raise BadRequestError(f"{name} must be an integer of at least {minimum}")
+    return int(value)
 
 
 @app.get("/lambda-functions")  # type: ignore[misc]
-def list_functions() -> list[dict[str, Any]]:
-    """List all Lambda functions in the AWS account."""
-    # TODO: Add filtering support
-    # query_params = app.current_event.query_string_parameters or {}
-    # selected_runtimes = query_params.get('selectedRuntime', [])
-    # selected_package_type = query_params.get('selectedPackageType', [])
-    # selected_architecture = query_params.get('selectedArchitecture', [])
-
-    lambda_functions = fetch_lambda_function()
-    logger.info("Listing Lambda functions", extra={"count": len(lambda_functions)})
-    return lambda_functions
+def list_functions() -> list[dict[str, Any]] | dict[str, Any]:
+    """
+    List Lambda functions in the AWS account.
+
+    Functions can be filtered by runtime, package type, architecture, name
+    prefix and tag expression (``tagExpression``). Without ``rowsPerPage``
+    the matching functions are returned as a list; with it, a page is
+    returned together with the total count, facet counts and a continuation
+    token.
+    """
+    query_params = app.current_event.query_string_parameters or {}
+    rows_per_page = get_count_param("rowsPerPage", 1)
+    offset = get_count_param("continuationToken", 0) or 0
+    index = get_function_index(query_params.get("refresh") == "true")
+
+    filters = {
+        facet: values
+        for facet, param in [
+            ("runtime", "selectedRuntime"),
+            ("packageType", "selectedPackageType"),
+            ("architecture", "selectedArchitecture"),
+        ]
+        if (values := get_list_param(param)) is not None
+    }
+    tag_expression = query_params.get("tagExpression")
+
+    result = index.query(
+        filters=filters,
+        name_prefix=query_params.get("namePrefix"),
+        names=get_tag_selection(tag_expression) if tag_expression else None,
+        offset=offset,
+        limit=rows_per_page,
+        fields=get_list_param("fields"),
+    )
+    logger.info(
+        "Listing Lambda functions",
+        extra={"count": len(result["functions"]), "total": result["totalCount"]},
+    )
+    if not rows_per_page:
+        return result["functions"]  # type: ignore[no-any-return]
+
+    next_offset = offset + rows_per_page
+    if next_offset < result["totalCount"]:
+        result["continuationToken"] = str(next_offset)
+    return result
 
 
 # Lambda handler is in app.py - this module just registers routes
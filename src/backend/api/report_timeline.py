@@ -0,0 +1,59 @@
+"""API endpoint to retrieve the execution timeline of a report."""
+
+import os
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.event_handler import Response, content_types
+from aws_lambda_powertools.event_handler.exceptions import NotFoundError
+from botocore.exceptions import ClientError
+
+from backend.api.app import app
+from backend.utils.s3_utils import download_from_s3
+from backend.utils.timeline_utils import build_timeline, load_spans, timeline_file_name
+
+logger = Logger()
+
+bucket_name = os.environ["BUCKET_NAME"]
+
+
+@app.get("/report/timeline")  # type: ignore[misc]
+def get_report_timeline() -> dict[str, Any] | Response[Any]:
+    """
+    Retrieve the timeline of a report by report ID.
+
+    Finished reports serve the compacted ``timeline.json``, running ones the
+    spans uploaded so far.
+    """
+    query_params = app.current_event.query_string_parameters or {}
+    report_id = query_params.get("reportID")
+
+    if not report_id:
+        raise NotFoundError("Report ID parameter is required")
+
+    try:
+        # Already serialized, served as is
+        return Response(
+            status_code=200,
+            content_type=content_types.APPLICATION_JSON,
+            body=download_from_s3(
+                file_name=timeline_file_name,
+                bucket_name=bucket_name,
+                directory=report_id,
+            ),
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            logger.exception(
+                "Error retrieving report timeline", extra={"report_id": report_id}
+            )
+            raise
+
+    spans = load_spans(report_id, bucket_name)
+    if not spans:
+        raise NotFoundError("Timeline does not exist or has been deleted")
+    logger.info(
+        "Built timeline of running report",
+        extra={"report_id": report_id, "num_spans": len(spans)},
+    )
+    return build_timeline(report_id, spans)
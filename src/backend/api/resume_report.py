@@ -0,0 +1,82 @@
+"""API endpoint to resume a failed or partial analysis report."""
+
+import json
+import os
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.event_handler.exceptions import (
+    BadRequestError,
+    NotFoundError,
+)
+from botocore.exceptions import ClientError
+
+from backend.api.app import app
+from backend.api.start_analysis import queue_execution
+from backend.utils.batch_utils import is_batch_complete, load_batch_markers, load_plan
+from backend.utils.s3_utils import client
+
+logger = Logger()
+
+bucket_name = os.environ["BUCKET_NAME"]
+
+
+@app.post("/report/resume")  # type: ignore[misc]
+def resume_report() -> dict[str, Any]:
+    """
+    Resume a report by report ID.
+
+    Only the batches without a complete output run again, then the report is
+    aggregated from the outputs of every run. The resume is queued like a new
+    analysis. Its execution is named after the summary it resumes from, so
+    concurrent resumes of the same failure start a single execution.
+    """
+    query_params = app.current_event.query_string_parameters or {}
+    report_id = query_params.get("reportID")
+
+    if not report_id:
+        raise NotFoundError("Report ID parameter is required")
+
+    try:
+        response = client.get_object(
+            Bucket=bucket_name, Key=f"{report_id}/summary.json"
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchKey":
+            raise NotFoundError("Report does not exist or has been deleted")
+        logger.exception("Error retrieving report", extra={"report_id": report_id})
+        raise
+    summary = json.loads(response["Body"].read())
+
+    if summary["status"] in ["Queued", "Running"]:
+        raise BadRequestError("Report is still running")
+    plan = load_plan(report_id, bucket_name)
+    if plan is None:
+        raise BadRequestError("Report was created before it could be resumed")
+
+    markers = load_batch_markers(report_id, bucket_name)
+    missing = [
+        batch["batch_id"]
+        for batch in plan["batches"]
+        if not is_batch_complete(markers.get(batch["batch_id"]))
+    ]
+    queued = queue_execution(
+        {
+            "report_id": report_id,
+            "resume": True,
+            "run_id": f"resume-{int(response['LastModified'].timestamp())}",
+        }
+    )
+    logger.info(
+        "Resumed report",
+        extra={
+            "report_id": report_id,
+            "num_batches": len(plan["batches"]),
+            "num_missing": len(missing),
+        },
+    )
+    return {
+        **queued,
+        "batches": len(plan["batches"]),
+        "batchesToRun": len(missing),
+    }
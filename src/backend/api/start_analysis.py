@@ -0,0 +1,196 @@
+"""API endpoint to start an analysis report."""
+
+import json
+import os
+import uuid
+from typing import Any
+
+import boto3
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.event_handler.exceptions import BadRequestError, ServiceError
+from aws_lambda_powertools.metrics import MetricUnit
+
+from backend.api.app import app
+from backend.utils.admission_utils import (
+    analysis_fingerprint,
+    claim_analysis,
+    drain_analysis_queue,
+    enqueue_analysis,
+    queue_position,
+    report_exists,
+)
+from backend.utils.metrics_utils import instrument_client, record_metric
+from backend.utils.s3_utils import upload_file_to_s3
+from backend.utils.tag_utils import normalize_tag_expression
+
+logger = Logger()
+
+sfn_client = instrument_client(boto3.client("stepfunctions"))
+
+bucket_name = os.environ["BUCKET_NAME"]
+state_machine_arn = os.environ.get("STATE_MACHINE_ARN", "")
+
+# Fields of the request passed on to the state machine
+execution_fields = [
+    "lambda_functions_name",
+    "tag_expression",
+    "targets",
+    "start_date",
+    "end_date",
+]
+
+
+@app.post("/analysis/start")  # type: ignore[misc]
+def start_analysis() -> dict[str, Any]:
+    """
+    Start an analysis, or attach to an identical one.
+
+    A request for the same functions and period as a report that is queued,
+    running or recently completed returns that report instead of scanning the
+    logs again. Otherwise the report is queued and started once fewer than the
+    maximum number of analyses run.
+    """
+    request = app.current_event.json_body or {}
+    validate_analysis_request(request)
+
+    report_id = new_report_id(request)
+    fingerprint = analysis_fingerprint(request)
+    attached_to = claim_analysis(fingerprint, report_id, bucket_name)
+    if attached_to is not None:
+        record_metric("AnalysesDeduplicated", MetricUnit.Count, 1)
+        logger.info(
+            "Attached to identical analysis",
+            extra={"report_id": attached_to, "requested_report_id": report_id},
+        )
+        return {"reportID": attached_to, "attached": True}
+
+    return queue_analysis(report_id, request)
+
+
+def validate_analysis_request(request: dict[str, Any]) -> None:
+    """
+    Check that an analysis request selects functions and a period.
+
+    Parameters
+    ----------
+    request : dict
+        Start request
+
+    Raises
+    ------
+    BadRequestError
+        If no function or no period is selected, or a tag expression is
+        invalid
+    """
+    targets = request.get("targets") or [request]
+    if not any(
+        target.get("lambda_functions_name") or target.get("tag_expression")
+        for target in targets
+    ):
+        raise BadRequestError("No function selected")
+    for target in targets:
+        if target.get("tag_expression"):
+            try:
+                normalize_tag_expression(target["tag_expression"])
+            except ValueError as e:
+                raise BadRequestError(str(e))
+    if not request.get("start_date") or not request.get("end_date"):
+        raise BadRequestError("start_date and end_date are required")
+
+
+def new_report_id(request: dict[str, Any]) -> str:
+    """
+    Identify the report of a start request.
+
+    Parameters
+    ----------
+    request : dict
+        Start request, with an optional report_id chosen by the client
+
+    Returns
+    -------
+    str
+        The client's report_id, or a generated one
+
+    Raises
+    ------
+    ServiceError
+        409 if the client's report_id already has a report or an execution
+    """
+    if not request.get("report_id"):
+        return str(uuid.uuid4())
+    report_id = str(request["report_id"])
+    if report_exists(report_id, sfn_client, state_machine_arn, bucket_name):
+        raise ServiceError(409, f"Report {report_id} already exists")
+    return report_id
+
+
+def queue_analysis(report_id: str, request: dict[str, Any]) -> dict[str, Any]:
+    """
+    Queue the execution of a claimed report and start it if a slot is free.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier, with a claimed fingerprint
+    request : dict
+        Start request
+
+    Returns
+    -------
+    dict
+        reportID and status, with the executionArn of a started report or the
+        queuePosition of a queued one
+    """
+    return queue_execution(
+        {
+            "report_id": report_id,
+            **{field: request[field] for field in execution_fields if field in request},
+        }
+    )
+
+
+def queue_execution(execution_input: dict[str, Any]) -> dict[str, Any]:
+    """
+    Queue an execution of the state machine and start it if a slot is free.
+
+    Parameters
+    ----------
+    execution_input : dict
+        State machine input, with report_id
+
+    Returns
+    -------
+    dict
+        reportID and status, with the executionArn of a started report or the
+        queuePosition of a queued one
+    """
+    report_id = execution_input["report_id"]
+    upload_file_to_s3(
+        body=json.dumps({"status": "Queued"}),
+        file_name="summary.json",
+        bucket_name=bucket_name,
+        directory=report_id,
+    )
+    enqueue_analysis(execution_input, bucket_name)
+    started = drain_analysis_queue(sfn_client, state_machine_arn, bucket_name)
+
+    if report_id in started:
+        logger.info("Started analysis", extra={"report_id": report_id})
+        return {
+            "reportID": report_id,
+            "attached": False,
+            "status": "Running",
+            "executionArn": started[report_id],
+        }
+    record_metric("AnalysesQueued", MetricUnit.Count, 1)
+    position = queue_position(report_id, bucket_name)
+    logger.info(
+        "Queued analysis", extra={"report_id": report_id, "queue_position": position}
+    )
+    return {
+        "reportID": report_id,
+        "attached": False,
+        "status": "Queued",
+        "queuePosition": position,
+    }
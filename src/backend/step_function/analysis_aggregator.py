@@ -1,16 +1,28 @@
 """Aggregate Lambda cost analysis results from multiple CSV files."""
 
+import json
 import os
+import time
 from datetime import datetime
-from io import StringIO
-from typing import Any
+from typing import IO, Any
 
 import pandas as pd
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
-from backend.utils.multithread_utils import multi_thread
-from backend.utils.s3_utils import download_from_s3, upload_file_to_s3
+from backend.utils.batch_utils import load_batch_markers, load_plan
+from backend.utils.metrics_utils import (
+    add_report_dimension,
+    metrics,
+    record_metric,
+    timed_stage,
+)
+from backend.utils.multithread_utils import ExecutorStats, stream_map
+from backend.utils.profiling_utils import profiled
+from backend.utils.s3_utils import open_s3_reader, open_s3_writer, upload_file_to_s3
+from backend.utils.timeline_utils import Timeline, compact_timeline
+from backend.utils.usage_utils import UsageMeter, report_cost
 
 logger = Logger()
 
@@ -31,53 +43,291 @@ def download_csv_file_wrapper(s3_info: dict[str, str]) -> pd.DataFrame:
     DataFrame
         Parsed CSV data
     """
-    csv_file_content = download_from_s3(
+    with open_s3_reader(
         file_name=s3_info["filename"],
         bucket_name=s3_info["bucket"],
         directory=s3_info["directory"],
-    )
-    return pd.read_csv(StringIO(csv_file_content), sep=",")
+    ) as csv_file:
+        return read_analysis_csv(csv_file)
 
 
-@logger.inject_lambda_context(log_event=True)  # type: ignore[misc]
-def lambda_handler(event: list[dict[str, Any]], context: LambdaContext) -> None:
+def read_analysis_csv(csv_file: IO[Any]) -> pd.DataFrame:
+    """
+    Parse a batch analysis CSV.
+
+    Parameters
+    ----------
+    csv_file : file-like
+        CSV content
+
+    Returns
+    -------
+    DataFrame
+        Analysis rows
+    """
+    # Account IDs may start with zeros
+    return pd.read_csv(csv_file, sep=",", dtype={"accountId": str})
+
+
+# The event lists every batch file, too large to be logged on each run
+@logger.inject_lambda_context  # type: ignore[misc]
+@metrics.log_metrics  # type: ignore[misc]
+@timed_stage("Aggregator")
+@profiled("aggregator", bucket_name)
+def lambda_handler(
+    event: dict[str, Any] | list[dict[str, Any]], context: LambdaContext
+) -> None:
     """
     Aggregate cost analysis results and generate summary.
 
     Parameters
     ----------
-    event : list of dict
-        List of S3 file locations with analysis results
+    event : dict or list of dict
+        Report parameters with the S3 locations of the analysis results of the
+        batches that ran, or only these locations. Resumed reports add the
+        results of the batches kept from earlier runs
     context : LambdaContext
         Lambda context object
     """
-    report_id = event[0]["report_id"]
-    start_date = event[0]["start_date"]
-    end_date = event[0]["end_date"]
+    meter = UsageMeter(context)
+    if isinstance(event, list):
+        event = {**event[0], "batches": event}
+    report_id = event["report_id"]
+    start_date = event["start_date"]
+    end_date = event["end_date"]
+    add_report_dimension(report_id)
+    batches = event["batches"]
+    if event.get("resumed"):
+        batches = collect_batch_results(report_id, batches)
     logger.info(
         "Aggregating data for report",
-        extra={"report_id": report_id, "num_files": len(event)},
+        extra={"report_id": report_id, "num_files": len(batches)},
+    )
+    timeline = Timeline(report_id)
+    download_started_at = time.time()
+    download_stats = ExecutorStats()
+    files_content = []
+    failed_files = []
+    for result in stream_map(
+        download_csv_file_wrapper,
+        batches,
+        max_workers=10,
+        ordered=True,
+        stats=download_stats,
+    ):
+        if result.ok:
+            files_content.append(result.value)
+        else:
+            logger.error(
+                "Failed to download analysis file",
+                extra={
+                    "file_name": result.item["filename"],
+                    "error": str(result.error),
+                },
+            )
+            failed_files.append(result)
+    logger.info("Downloaded analysis files", extra=download_stats.as_dict())
+    timeline.add_span(
+        "aggregator.download",
+        download_started_at,
+        time.time(),
+        files=len(batches),
+        failed=len(failed_files),
+    )
+    if failed_files:
+        # A partial report would silently understate costs
+        timeline.add_span(
+            "aggregator.invocation", meter.started_at, time.time(), **meter.usage()
+        )
+        timeline.upload(bucket_name, "aggregator")
+        failed_files[0].result()
+    with timeline.span("aggregator.merge"):
+        aggregated_data = pd.concat(files_content, ignore_index=False)
+    record_metric("FilesMerged", MetricUnit.Count, len(files_content))
+    record_metric("RowsProcessed", MetricUnit.Count, len(aggregated_data))
+
+    # Functions whose query failed even after the deferred retries
+    failed_functions = [
+        function
+        for result in batches
+        for function in result.get("failed_functions", [])
+    ]
+    publish_report(
+        aggregated_data,
+        report_id,
+        start_date,
+        end_date,
+        failed_functions,
+        timeline,
+        meter,
+        "aggregator",
     )
-    aggregated_data = pd.DataFrame()
-    files_content = multi_thread(download_csv_file_wrapper, event, max_workers=10)
-    for content in files_content:
-        aggregated_data = pd.concat([aggregated_data, content], ignore_index=False)
 
-    csv_buffer = StringIO()
-    aggregated_data.to_csv(csv_buffer)
+
+def publish_report(
+    aggregated_data: pd.DataFrame,
+    report_id: Any,
+    start_date: str,
+    end_date: str,
+    failed_functions: list[dict[str, str]],
+    timeline: Timeline,
+    meter: UsageMeter,
+    stage: str,
+) -> str:
+    """
+    Write the analysis, timeline and summary of a finished report.
+
+    Parameters
+    ----------
+    aggregated_data : DataFrame
+        Per-function analysis rows
+    report_id : Any
+        Report identifier
+    start_date : str
+        Analysis start date
+    end_date : str
+        Analysis end date
+    failed_functions : list of dict
+        Functions whose query failed
+    timeline : Timeline
+        Timeline of the current invocation
+    meter : UsageMeter
+        Usage of the current invocation
+    stage : str
+        Stage publishing the report, prefix of its spans
+
+    Returns
+    -------
+    str
+        Serialized summary
+    """
+    # Streamed as a multipart upload rather than built in memory first. Not
+    # compressed, as it is downloaded as is through a presigned URL
+    with (
+        timeline.span(f"{stage}.write_csv", rows=len(aggregated_data)),
+        open_s3_writer(
+            file_name="analysis.csv",
+            bucket_name=bucket_name,
+            directory=report_id,
+            content_type="text/csv",
+        ) as csv_file,
+    ):
+        aggregated_data.to_csv(csv_file)
+    timeline.add_span(
+        f"{stage}.invocation", meter.started_at, time.time(), **meter.usage()
+    )
+    # Compacted before the report shows as completed
+    timeline.upload(bucket_name, stage)
+    report_timeline = compact_timeline(report_id, bucket_name)
+    cost = report_cost(
+        report_timeline["spans"], float(aggregated_data["analysisCost"].sum())
+    )
+    result_json = build_summary(
+        aggregated_data, report_id, start_date, end_date, cost, failed_functions
+    )
     upload_file_to_s3(
-        csv_buffer.getvalue(),
-        file_name="analysis.csv",
+        body=result_json,
+        file_name="summary.json",
         bucket_name=bucket_name,
         directory=report_id,
     )
+    upload_file_to_s3(
+        body=result_json,
+        file_name=f"{generate_reversed_timestamp()}_{report_id}.json",
+        bucket_name=bucket_name,
+        directory="summaries",
+    )
+    return result_json
+
+
+def collect_batch_results(
+    report_id: Any, results: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """
+    Add the outputs of planned batches that didn't run this time.
+
+    A resumed report only runs its missing batches, the outputs of the other
+    ones are found from their completion markers.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    results : list of dict
+        Results of the batches that ran
+
+    Returns
+    -------
+    list of dict
+        Results of every batch of the report
+
+    Raises
+    ------
+    ValueError
+        If the report has no plan or a batch has no output
+    """
+    plan = load_plan(report_id, bucket_name)
+    if plan is None:
+        raise ValueError(f"Report {report_id} has no plan")
+    ran = {result.get("batch_id") for result in results}
+    markers = load_batch_markers(report_id, bucket_name)
+    missing = [
+        batch["batch_id"]
+        for batch in plan["batches"]
+        if batch["batch_id"] not in ran and batch["batch_id"] not in markers
+    ]
+    if missing:
+        raise ValueError(f"Batches without output: {', '.join(missing)}")
+    reused = [
+        markers[batch["batch_id"]]
+        for batch in plan["batches"]
+        if batch["batch_id"] not in ran
+    ]
+    logger.info(
+        "Reusing outputs of earlier runs",
+        extra={"report_id": report_id, "num_reused": len(reused)},
+    )
+    return reused + results
+
+
+def build_summary(
+    aggregated_data: pd.DataFrame,
+    report_id: Any,
+    start_date: str,
+    end_date: str,
+    report_cost: dict[str, Any] | None = None,
+    failed_functions: list[dict[str, str]] | None = None,
+) -> str:
+    """
+    Compute the summary of a report.
+
+    Parameters
+    ----------
+    aggregated_data : DataFrame
+        Per-function analysis rows
+    report_id : Any
+        Report identifier
+    start_date : str
+        Analysis start date
+    end_date : str
+        Analysis end date
+    report_cost : dict, optional
+        Cost of running the report (see ``backend.utils.usage_utils``)
+    failed_functions : list of dict, optional
+        functionName and reason of the functions missing from the analysis
+
+    Returns
+    -------
+    str
+        Summary JSON
+    """
     avg_columns_rename = {
         "provisionedMemoryMB": "avgProvisionedMemoryMB",
         "maxMemoryUsedMB": "avgMaxMemoryUsedMB",
         "overProvisionedMB": "avgOverProvisionedMB",
     }
 
-    aggregated_data.rename(columns=avg_columns_rename, inplace=True)
+    aggregated_data = aggregated_data.rename(columns=avg_columns_rename)
     agg_funcs = {
         "countInvocations": "sum",
         "allDurationInSeconds": "sum",
@@ -104,19 +354,44 @@ def lambda_handler(event: list[dict[str, Any]], context: LambdaContext) -> None:
     result["startDate"] = start_date
     result["endDate"] = end_date
     # Convert the result to JSON
-    result_json = result.to_json()
-    upload_file_to_s3(
-        body=result_json,
-        file_name="summary.json",
-        bucket_name=bucket_name,
-        directory=report_id,
-    )
-    upload_file_to_s3(
-        body=result_json,
-        file_name=f"{generate_reversed_timestamp()}_{report_id}.json",
-        bucket_name=bucket_name,
-        directory="summaries",
+    result_json: str = result.to_json()
+    extra_fields: dict[str, Any] = {}
+    if {"accountId", "region"}.issubset(aggregated_data.columns):
+        extra_fields["targets"] = summarize_targets(aggregated_data)
+    if report_cost is not None:
+        extra_fields["reportCost"] = report_cost
+    if failed_functions:
+        extra_fields["failedFunctions"] = failed_functions
+    if extra_fields:
+        summary = json.loads(result_json)
+        summary.update(extra_fields)
+        result_json = json.dumps(summary)
+    return result_json
+
+
+def summarize_targets(aggregated_data: pd.DataFrame) -> list[dict[str, Any]]:
+    """
+    Roll up the analysis by account and region.
+
+    Parameters
+    ----------
+    aggregated_data : DataFrame
+        Per-function analysis rows with accountId and region columns
+
+    Returns
+    -------
+    list of dict
+        Function count and cost totals per account and region
+    """
+    targets = aggregated_data.groupby(["accountId", "region"], as_index=False).agg(
+        functions=("functionName", "count"),
+        countInvocations=("countInvocations", "sum"),
+        totalCost=("totalCost", "sum"),
+        potentialSavings=("potentialSavings", "sum"),
+        logIngestionCost=("logIngestionCost", "sum"),
+        analysisCost=("analysisCost", "sum"),
     )
+    return json.loads(targets.to_json(orient="records"))  # type: ignore[no-any-return]
 
 
 def generate_reversed_timestamp() -> int:
@@ -6,9 +6,23 @@ from datetime import datetime
 from typing import Any
 
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 
+from backend.utils.metrics_utils import (
+    add_report_dimension,
+    metrics,
+    record_metric,
+    timed_stage,
+)
+from backend.utils.profiling_utils import profiled
+from backend.utils.query_registry_utils import (
+    cancel_report_queries,
+    load_cancellation,
+    record_cancellation,
+)
 from backend.utils.s3_utils import upload_file_to_s3
+from backend.utils.timeline_utils import compact_timeline
 
 logger = Logger()
 
@@ -16,6 +30,9 @@ bucket_name = os.environ["BUCKET_NAME"]
 
 
 @logger.inject_lambda_context(log_event=True)  # type: ignore[misc]
+@metrics.log_metrics  # type: ignore[misc]
+@timed_stage("ErrorHandler")
+@profiled("error_handler", bucket_name)
 def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, Any]:
     """
     Handle Step Function execution failures.
@@ -37,6 +54,8 @@ def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, A
     report_id = error_output.get("report_id") or event.get("report_id")
     error_code = event.get("error", "Unknown")
     error_cause = event.get("cause", "Unknown error occurred")
+    add_report_dimension(report_id)
+    record_metric("ReportsFailed", MetricUnit.Count, 1)
 
     logger.error(
         "Step Function execution failed",
@@ -47,14 +66,29 @@ def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, A
         },
     )
 
+    # Queries of batches still running keep scanning after the execution
+    # failed or timed out, stop them
+    cancellation: dict[str, Any] = {}
+    try:
+        if report_id:
+            cancellation = stop_report_queries(report_id, error_code)
+    except Exception as e:
+        logger.exception(
+            "Failed to stop the report queries",
+            extra={"report_id": report_id, "exception": str(e)},
+        )
+
     # Create error summary
     error_summary = {
-        "status": "Failed",
+        "status": "Cancelled" if cancellation.get("requested") else "Failed",
         "reportID": report_id,
         "errorCode": error_code,
         "errorMessage": error_cause,
         "failureTime": datetime.now().isoformat(),
     }
+    if cancellation:
+        error_summary["cancelledQueries"] = cancellation["cancelledQueries"]
+        error_summary["bytesScanAvoided"] = cancellation["bytesScanAvoided"]
 
     # Upload error summary to S3
     try:
@@ -71,4 +105,46 @@ def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, A
             extra={"report_id": report_id, "exception": str(e)},
         )
 
-    return {"status": "Failed", "reportID": report_id, "error_code": error_code}
+    # The timeline shows how far the report got before failing
+    try:
+        compact_timeline(report_id, bucket_name)
+    except Exception as e:
+        logger.exception(
+            "Failed to compact the report timeline",
+            extra={"report_id": report_id, "exception": str(e)},
+        )
+
+    return {
+        "status": error_summary["status"],
+        "reportID": report_id,
+        "error_code": error_code,
+    }
+
+
+def stop_report_queries(report_id: str, error_code: str) -> dict[str, Any]:
+    """
+    Stop the queries a failed report still has running.
+
+    The cancellation marker is written first so generators don't start new
+    queries while the registered ones are stopped.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    error_code : str
+        Step Function error code
+
+    Returns
+    -------
+    dict
+        Totals of the report cancellations, with ``requested`` set when the
+        report was cancelled through the API
+    """
+    requested = load_cancellation(report_id, bucket_name) is not None
+    if not requested:
+        record_cancellation(report_id, bucket_name, {"reason": error_code})
+    stopped = cancel_report_queries(report_id, bucket_name)
+    marker = record_cancellation(report_id, bucket_name, stopped)
+    record_metric("QueriesCancelled", MetricUnit.Count, stopped["cancelledQueries"])
+    return {**marker, "requested": requested}
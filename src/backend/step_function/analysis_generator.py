@@ -3,20 +3,48 @@
 import concurrent.futures
 import csv
 import os
+import threading
 import time
 import uuid
-from datetime import datetime
-from io import StringIO
-from typing import Any
+from datetime import datetime, timedelta
+from typing import IO, Any
 
-import boto3
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
-from backend.utils.s3_utils import upload_file_to_s3
+from backend.utils.batch_utils import batch_directory, upload_batch_marker
+from backend.utils.metrics_utils import (
+    add_report_dimension,
+    metrics,
+    record_metric,
+    throttling_error_codes,
+    timed_stage,
+)
+from backend.utils.multithread_utils import stream_map
+from backend.utils.profiling_utils import profiled
+from backend.utils.progress_utils import batch_contribution, record_batch_progress
+from backend.utils.query_registry_utils import (
+    ReportCancelledError,
+    finished_statuses,
+    is_report_cancelled,
+    register_query,
+    unregister_query,
+)
+from backend.utils.s3_utils import open_s3_writer
 from backend.utils.sf_utils import download_parameters_from_s3
+from backend.utils.straggler_utils import StragglerDetector
+from backend.utils.target_utils import (
+    get_circuit_breaker,
+    get_client,
+    get_query_semaphore,
+    get_rate_limiter,
+    target_key,
+)
+from backend.utils.timeline_utils import Timeline
+from backend.utils.usage_utils import UsageMeter
 
 logger = Logger()
 
@@ -28,11 +56,90 @@ retry_config = Config(
     }
 )
 
-lambda_client = boto3.client("lambda")
 bucket_name = os.environ["BUCKET_NAME"]
 
+# Columns of the per-batch analysis CSV
+report_fieldnames = [
+    "functionName",
+    "runtime",
+    "architecture",
+    "countInvocations",
+    "allDurationInSeconds",
+    "provisionedMemoryMB",
+    "MemoryCost",
+    "InvocationCost",
+    "StorageCost",
+    "totalCost",
+    "avgCostPerInvocation",
+    "maxMemoryUsedMB",
+    "overProvisionedMB",
+    "optimalMemory",
+    "potentialSavings",
+    "avgDurationPerInvocation",
+    "timeoutInvocations",
+    "logSizeGB",
+    "logIngestionCost",
+    "logStorageCost",
+    "analysisCost",
+    "accountId",
+    "region",
+]
+
+# CloudWatch Logs pricing per GB: ingested, stored per month and scanned by
+# Logs Insights. Regions not listed are priced like us-east-1.
+default_log_pricing = {"ingestion": 0.50, "storage": 0.03, "query": 0.005}
+log_pricing_by_region = {
+    "eu-central-1": {"ingestion": 0.63, "storage": 0.0324, "query": 0.0063},
+    "ap-northeast-1": {"ingestion": 0.76, "storage": 0.033, "query": 0.0076},
+    "ap-southeast-1": {"ingestion": 0.70, "storage": 0.033, "query": 0.007},
+    "ap-southeast-2": {"ingestion": 0.70, "storage": 0.033, "query": 0.007},
+}
+
+# Failed queries are retried once the rest of the batch is done, one function at
+# a time, split into shorter windows that each scan less
+deferred_query_shards = 4
+# Deferred retries don't start with less time left than this
+deferred_retry_margin_seconds = 120
+# Windows a straggling query is split into, queried in parallel as its hedge
+hedge_shards = 4
+# Query fields combined when merging the results of several windows, the others
+# are constants or derived from these
+summed_query_fields = [
+    "timeoutInvocations",
+    "countInvocations",
+    "allDurationInSeconds",
+    "logSizeGB",
+]
+max_query_fields = ["provisionedMemoryMB", "maxMemoryUsedMB"]
+# Log streams of functions logging to a custom log group are named
+# <yyyy>/<mm>/<dd>/<function name>[<version>]<execution environment>
+function_stream_pattern = "*/*/*/*[*]*"
+# Function configurations looked up at once before querying a batch
+config_workers = 5
+
+
+class QueryFailedError(Exception):
+    """
+    Raised when a Logs Insights query of a function failed.
+
+    Parameters
+    ----------
+    reason : str
+        Why the query failed
+    retryable : bool, default=True
+        Whether running the query again may succeed
+    """
+
+    def __init__(self, reason: str, retryable: bool = True) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retryable = retryable
+
 
 @logger.inject_lambda_context(log_event=True)  # type: ignore[misc]
+@metrics.log_metrics  # type: ignore[misc]
+@timed_stage("Generator")
+@profiled("generator", bucket_name)
 def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, Any]:
     """
     Generate cost analysis for a batch of Lambda functions.
@@ -40,7 +147,8 @@ def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, A
     Parameters
     ----------
     event : dict
-        Event with lambda_functions_name S3 location, report_id, start_date, end_date
+        Event with the S3 location of the batch (target and lambda_functions_name),
+        report_id, start_date, end_date
     context : LambdaContext
         Lambda context object
 
@@ -49,19 +157,67 @@ def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, A
     dict
         S3 location of generated CSV analysis file
     """
-    lambda_functions_name = download_parameters_from_s3(event["lambda_functions_name"])
+    meter = UsageMeter(context)
+    # Deferred retries stop early enough for the batch to be uploaded
+    deadline = (
+        time.monotonic()
+        + context.get_remaining_time_in_millis() / 1000
+        - deferred_retry_margin_seconds
+        if context
+        else None
+    )
+    batch = download_parameters_from_s3(event["lambda_functions_name"])
+    # Batches planned before multi-target support are plain lists of names
+    if isinstance(batch, list):
+        batch = {"target": None, "lambda_functions_name": batch}
+    lambda_functions_name = batch["lambda_functions_name"]
     report_id = event.get("report_id", "")
     start_date = event.get("start_date", "")
     end_date = event.get("end_date", "")
+    add_report_dimension(report_id)
     logger.info(
         "Processing lambda functions",
-        extra={"num_functions": len(lambda_functions_name), "report_id": report_id},
+        extra={
+            "num_functions": len(lambda_functions_name),
+            "report_id": report_id,
+            "target": batch["target"],
+        },
     )
-    return generate_cost_report(lambda_functions_name, report_id, start_date, end_date)
+    timeline = Timeline(report_id)
+    try:
+        with timeline.span(
+            "generator.batch",
+            target=target_key(batch["target"]),
+            functions=len(lambda_functions_name),
+        ):
+            return generate_cost_report(
+                lambda_functions_name,
+                report_id,
+                start_date,
+                end_date,
+                batch["target"],
+                timeline,
+                deadline,
+                batch.get("batch_id"),
+            )
+    finally:
+        timeline.add_span(
+            "generator.invocation", meter.started_at, time.time(), **meter.usage()
+        )
+        timeline.upload(bucket_name, "generator")
 
 
 def get_lambda_cost(
-    lambda_name: str, start_date: str, end_date: str
+    lambda_name: str,
+    start_date: str,
+    end_date: str,
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+    report_id: Any = None,
+    shards: int = 1,
+    stragglers: StragglerDetector | None = None,
+    config: dict[str, Any] | None = None,
+    cancel: threading.Event | None = None,
 ) -> dict[str, Any] | None:
     """
     Calculate cost metrics for a Lambda function.
@@ -74,56 +230,165 @@ def get_lambda_cost(
         Analysis start date (ISO format)
     end_date : str
         Analysis end date (ISO format)
+    target : dict, optional
+        Account role and region of the function, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the spans of the function
+    report_id : Any, optional
+        Report the function is analyzed for, sharing the query slots
+    shards : int, default=1
+        Number of windows the period is queried in, one after the other
+    stragglers : StragglerDetector, optional
+        Running times of the batch's queries, straggling queries are hedged
+    config : dict, optional
+        Result of ``get_function_config``, looked up if not set
+    cancel : threading.Event, optional
+        Stops the queries of the function, waiting or running, when set
 
     Returns
     -------
     dict or None
         Cost analysis metrics or None if log group doesn't exist
+
+    Raises
+    ------
+    QueryFailedError
+        If a query of the function failed
     """
     start_datetime = datetime.fromisoformat(start_date.replace("Z", "+00:00"))
     end_datetime = datetime.fromisoformat(end_date.replace("Z", "+00:00"))
-    response = lambda_client.get_function_configuration(FunctionName=lambda_name)
-
-    runtime, memory_size, architecture = (
-        response.get("Runtime", "Docker Image"),
-        response["MemorySize"],
-        response["Architectures"][0],
-    )
-    storage_size, log_group_name = (
-        response["EphemeralStorage"]["Size"],
-        response["LoggingConfig"]["LogGroup"],
-    )
-    if not check_log_group_exist(log_group_name):
+    timeline = timeline or Timeline()
+    config = config or get_function_config(lambda_name, target, timeline)
+    if not config["logGroupExists"]:
         return None
-    query_response = run_cloudwatch_query(
-        log_group_name,
-        start_datetime,
-        end_datetime,
-        memory_size,
-        storage_size,
-        architecture,
+    # A custom log group may hold the invocations of other functions
+    function_names = [lambda_name] if config["customLogGroup"] else None
+    query_response = merge_query_results(
+        [
+            run_cloudwatch_query(
+                config["logGroupName"],
+                window_start,
+                window_end,
+                config["memorySize"],
+                config["storageSize"],
+                config["architecture"],
+                target,
+                timeline,
+                report_id,
+                stragglers,
+                cancel,
+                function_names,
+            )
+            for window_start, window_end in split_window(
+                start_datetime, end_datetime, shards
+            )
+        ]
     )
     if not query_response:
         return None
 
     results, bytes_scanned = query_response
-    logger.info(f"Query results for {lambda_name}: {results}")
-    logger.info(f"Bytes scanned for {lambda_name}: {bytes_scanned}")
+    logger.debug(
+        "Query results",
+        extra={
+            "function_name": lambda_name,
+            "results": results,
+            "bytes_scanned": bytes_scanned,
+        },
+    )
+    return build_cost_answer(config, results, bytes_scanned)
 
-    answer = {
+
+def get_function_config(
+    lambda_name: str,
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+) -> dict[str, Any]:
+    """
+    Look up the configuration and log group of a Lambda function.
+
+    Parameters
+    ----------
+    lambda_name : str
+        Lambda function name
+    target : dict, optional
+        Account role and region of the function, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the span of the lookup
+
+    Returns
+    -------
+    dict
+        functionName, runtime, architecture, accountId, region, memorySize,
+        storageSize, logGroupName, whether it is a customLogGroup and whether
+        it exists (logGroupExists)
+    """
+    timeline = timeline or Timeline()
+    config_started_at = time.time()
+    lambda_client = get_client("lambda", target)
+    response = lambda_client.get_function_configuration(FunctionName=lambda_name)
+    # arn:aws:lambda:<region>:<account>:function:<name>
+    region, account_id = response["FunctionArn"].split(":")[3:5]
+    default_log_group_name = f"/aws/lambda/{lambda_name}"
+    # Functions without advanced logging controls log to the default group
+    log_group_name = response.get("LoggingConfig", {}).get(
+        "LogGroup", default_log_group_name
+    )
+    log_group_exists = check_log_group_exist(log_group_name, target)
+    timeline.add_span(
+        "generator.function_config",
+        config_started_at,
+        time.time(),
+        function=lambda_name,
+        logGroupExists=log_group_exists,
+    )
+    return {
         "functionName": lambda_name,
-        "runtime": runtime,
-        "architecture": architecture,
+        "runtime": response.get("Runtime", "Docker Image"),
+        "architecture": response["Architectures"][0],
+        "accountId": account_id,
+        "region": region,
+        "memorySize": response["MemorySize"],
+        "storageSize": response["EphemeralStorage"]["Size"],
+        "logGroupName": log_group_name,
+        "customLogGroup": log_group_name != default_log_group_name,
+        "logGroupExists": log_group_exists,
+    }
+
+
+def build_cost_answer(
+    config: dict[str, Any], results: list[dict[str, str]], bytes_scanned: float
+) -> dict[str, Any]:
+    """
+    Derive the cost analysis of a function from its query results.
+
+    Parameters
+    ----------
+    config : dict
+        Result of ``get_function_config``
+    results : list of dict
+        Fields of the function's query result row
+    bytes_scanned : float
+        Bytes scanned for the function
+
+    Returns
+    -------
+    dict
+        Cost analysis metrics
+    """
+    answer: dict[str, Any] = {
+        name: config[name]
+        for name in ["functionName", "runtime", "architecture", "accountId", "region"]
     }
     for result in results:
         field, value = result["field"], result["value"]
         answer[field] = value
 
     # Calculate log costs based on bytesScanned from CloudWatch
-    # CloudWatch Logs pricing (us-west-2)
-    log_ingestion_price_per_gb = 0.50  # $0.50 per GB ingested
-    log_storage_price_per_gb = 0.03  # $0.03 per GB-month stored
-    query_price_per_gb = 0.005  # $0.005 per GB scanned
+    log_pricing = log_pricing_by_region.get(config["region"], default_log_pricing)
+    log_ingestion_price_per_gb = log_pricing["ingestion"]
+    log_storage_price_per_gb = log_pricing["storage"]
+    query_price_per_gb = log_pricing["query"]
 
     bytes_scanned_gb = bytes_scanned / (1024**3)  # Convert bytes to GB
     log_size_gb = float(answer.get("logSizeGB", 0))
@@ -139,6 +404,97 @@ def get_lambda_cost(
     return answer
 
 
+def get_shared_log_group_costs(
+    configs: list[dict[str, Any]],
+    start_date: str,
+    end_date: str,
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+    report_id: Any = None,
+    cancel: threading.Event | None = None,
+) -> list[dict[str, Any] | None]:
+    """
+    Calculate cost metrics for functions logging to the same log group.
+
+    The log group is scanned once, its rows grouped by the function named in
+    the log stream, instead of once per function. The scan is billed to the
+    functions in proportion to their log volume.
+
+    Parameters
+    ----------
+    configs : list of dict
+        Results of ``get_function_config`` of functions with the same log
+        group, architecture and ephemeral storage size
+    start_date : str
+        Analysis start date (ISO format)
+    end_date : str
+        Analysis end date (ISO format)
+    target : dict, optional
+        Account role and region of the functions, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the spans of the query
+    report_id : Any, optional
+        Report the functions are analyzed for, sharing the query slots
+    cancel : threading.Event, optional
+        Stops the query of the log group, waiting or running, when set
+
+    Returns
+    -------
+    list
+        Cost analysis metrics of each function, None for the functions without
+        invocations
+
+    Raises
+    ------
+    QueryFailedError
+        If the query of the log group failed
+    """
+    query_response = run_cloudwatch_query(
+        configs[0]["logGroupName"],
+        datetime.fromisoformat(start_date.replace("Z", "+00:00")),
+        datetime.fromisoformat(end_date.replace("Z", "+00:00")),
+        configs[0]["memorySize"],
+        configs[0]["storageSize"],
+        configs[0]["architecture"],
+        target,
+        timeline,
+        report_id,
+        None,
+        cancel,
+        [config["functionName"] for config in configs],
+    )
+    record_metric("LogGroupScansShared", MetricUnit.Count, len(configs) - 1)
+    if not query_response:
+        return [None] * len(configs)
+    rows, bytes_scanned = query_response
+    rows_by_function = {
+        field["value"]: row
+        for row in rows
+        for field in row
+        if field["field"] == "functionName"
+    }
+    log_sizes = {
+        name: sum(
+            float(field["value"]) for field in row if field["field"] == "logSizeGB"
+        )
+        for name, row in rows_by_function.items()
+    }
+    total_log_size = sum(log_sizes.values())
+    answers: list[dict[str, Any] | None] = []
+    for config in configs:
+        row = rows_by_function.get(config["functionName"])
+        if row is None:
+            answers.append(None)
+            continue
+        share = (
+            log_sizes[config["functionName"]] / total_log_size
+            if total_log_size
+            else 1 / len(rows_by_function)
+        )
+        answers.append(build_cost_answer(config, row, bytes_scanned * share))
+    return answers
+
+
 def run_cloudwatch_query(
     log_group_name: str,
     start_datetime: datetime,
@@ -146,10 +502,21 @@ def run_cloudwatch_query(
     memory_size: int,
     storage_size: int,
     architecture: str,
-) -> tuple[list[dict[str, str]], float] | None:
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+    report_id: Any = None,
+    stragglers: StragglerDetector | None = None,
+    cancel: threading.Event | None = None,
+    function_names: list[str] | None = None,
+) -> tuple[list[Any], float] | None:
     """
     Execute CloudWatch Logs Insights query for cost analysis.
 
+    A query running much longer than the other queries of the batch is hedged:
+    its period is queried again over shorter windows in parallel, and whichever
+    of the query or its hedge completes first is used while the other one is
+    stopped.
+
     Parameters
     ----------
     log_group_name : str
@@ -164,62 +531,98 @@ def run_cloudwatch_query(
         Lambda ephemeral storage size in MB
     architecture : str
         Lambda architecture (arm64 or x86_64)
+    target : dict, optional
+        Account role and region of the log group, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the query start and query spans
+    report_id : Any, optional
+        Report running the query, for the fair share of the query slots
+    stragglers : StragglerDetector, optional
+        Running times of the batch's queries, no hedging if not set
+    cancel : threading.Event, optional
+        Set to stop the query, when it is the hedge of a query that completed
+    function_names : list of str, optional
+        Functions whose invocations are counted, named by the log streams of a
+        custom log group, all the invocations of the log group if not set
 
     Returns
     -------
     tuple or None
-        Tuple of (query results, bytes scanned) or None on error
-    """
-    gb_second_memory_price = (
-        "0.0000133334" if architecture == "arm64" else "0.0000166667"
-    )
-    gb_second_storage_price = "0.0000000309"
-    query = f"""
-    fields @timestamp, @message, @logStream
-    | parse @message "Task timed out after *" as timeout_number_1
-    | parse @message "Status: timeout" as timeout_number_2
-    | parse @message "REPORT RequestId: *" as REPORT
-    | stats  greatest(count(timeout_number_1) , 0) + greatest(count(timeout_number_2) , 0) as timeoutInvocations,
-    count(REPORT) as countInvocations,
-    0.20 / 1000000 as singleInvocationCost,
-    {gb_second_memory_price} as GBSecondMemoryPrice,
-    {gb_second_storage_price} as GBSecondStoragePrice,
-    {storage_size - 512} as StorageSizeMB,
-
-    max(@memorySize / 1000000 ) as provisionedMemoryMB,
-    sum(@billedDuration) / 1000 as allDurationInSeconds,
-    allDurationInSeconds * provisionedMemoryMB / 1024 as GbSecondsMemoryConsumed,
-    allDurationInSeconds * StorageSizeMB / 1024 as GbSecondsStorageConsumed,
-
-    sum(strlen(@message)) / 1024 / 1024 / 1024 as logSizeGB,
-
-    GbSecondsMemoryConsumed *  GBSecondMemoryPrice as MemoryCost,
-    GbSecondsStorageConsumed *  GBSecondStoragePrice as StorageCost,
-    countInvocations * singleInvocationCost as InvocationCost,
-
-    MemoryCost + InvocationCost +  StorageCost as totalCost,
-
-    max(@maxMemoryUsed  / 1000000 ) as maxMemoryUsedMB,
-    greatest(provisionedMemoryMB - maxMemoryUsedMB, 0) as overProvisionedMB,
-    greatest(maxMemoryUsedMB * 1.2, 128) as optimalMinMemory,
-    least(optimalMinMemory, provisionedMemoryMB) as optimalMemory,
-
-    allDurationInSeconds * optimalMemory * GBSecondMemoryPrice / 1024 as optimalMemoryCost,
-    greatest(MemoryCost - optimalMemoryCost, 0) as potentialSavings,
+        Tuple of (query results, bytes scanned) or None if the function had no
+        invocations. With several ``function_names``, the results hold a row
+        per function with invocations, with its functionName
 
-    totalCost / countInvocations as avgCostPerInvocation,
-    allDurationInSeconds / countInvocations as avgDurationPerInvocation
- """
+    Raises
+    ------
+    QueryFailedError
+        If the query failed, timed out or couldn't be started
+    ReportCancelledError
+        If the report was cancelled, the query is stopped
+    """
+    query = cost_query(storage_size, architecture, function_names)
     # Create CloudWatch client with retry configuration
-    cloudwatch_client = boto3.client("logs", config=retry_config)
+    cloudwatch_client = get_client("logs", target, retry_config)
+    timeline = timeline or Timeline()
+    # Reported in the timeline span of the query, however it ends
+    query_submitted_at = None
+    query_id = None
+    status = None
+    throttles = 0
+    bytes_scanned = 0
+    lease = None
+    semaphore = get_query_semaphore(target)
+    circuit_breaker = get_circuit_breaker(target)
+    hedge_executor = None
+    hedge: concurrent.futures.Future[Any] | None = None
+    hedge_cancel = threading.Event()
+    hedged = False
 
     try:
+        if report_id and is_report_cancelled(report_id, bucket_name):
+            raise ReportCancelledError(f"Report {report_id} was cancelled")
+        submit_started_at = time.time()
+        # No new query while the target keeps throttling
+        breaker_wait = circuit_breaker.wait(cancel)
+        # Account-wide slot, shared with the other generators and reports
+        lease, slot_wait = (
+            semaphore.acquire(report_id, cancel) if semaphore else (None, 0.0)
+        )
+        # Per-target limiter: a throttled target doesn't slow down the others
+        limiter_wait = get_rate_limiter(target).acquire()
+        if cancel is not None and cancel.is_set():
+            # No longer needed while waiting, nothing was scanned yet
+            raise QueryFailedError("Query cancelled")
+        query_started = time.perf_counter()
+        scheduled_wait = 0.0
         query_id = cloudwatch_client.start_query(
             logGroupName=log_group_name,
             startTime=int(start_datetime.timestamp()),
             endTime=int(end_datetime.timestamp()),
             queryString=query,
         )["queryId"]
+        circuit_breaker.record_success()
+        query_submitted_at = time.time()
+        if report_id:
+            # Stopped from the registry if the report fails or is cancelled
+            register_query(
+                report_id,
+                query_id,
+                log_group_name,
+                target,
+                start_datetime,
+                end_datetime,
+                bucket_name,
+            )
+        timeline.add_span(
+            "generator.query_start",
+            submit_started_at,
+            query_submitted_at,
+            logGroup=log_group_name,
+            limiterWait=round(limiter_wait, 3),
+            slotWait=round(slot_wait, 3),
+            breakerWait=round(breaker_wait, 3),
+            slot=lease.slot if lease else None,
+        )
 
         # Poll for query completion with exponential backoff
         max_attempts = 30
@@ -227,8 +630,15 @@ def run_cloudwatch_query(
         attempt = 0
 
         while attempt < max_attempts:
+            if lease:
+                lease.renew_if_due()
+            if cancel is not None and cancel.is_set():
+                raise QueryFailedError("Query cancelled")
+            if report_id and is_report_cancelled(report_id, bucket_name):
+                raise ReportCancelledError(f"Report {report_id} was cancelled")
             try:
                 response = cloudwatch_client.get_query_results(queryId=query_id)
+                status = response["status"]
 
                 if response["status"] == "Complete":
                     logger.debug(f"Query completed for {log_group_name}")
@@ -237,26 +647,80 @@ def run_cloudwatch_query(
                     logger.error(
                         f"Query {response['status'].lower()} for {log_group_name}"
                     )
-                    return None
+                    raise QueryFailedError(f"Query {response['status'].lower()}")
+
+                if hedge is not None and hedge.done():
+                    if hedge.exception() is None:
+                        # The hedge won, this query is stopped on the way out and
+                        # its partial scan is billed too
+                        bytes_scanned = response.get("statistics", {}).get(
+                            "bytesScanned", 0
+                        )
+                        record_metric("HedgeWins", MetricUnit.Count, 1)
+                        logger.info(f"Hedged query won for {log_group_name}")
+                        hedge_result = hedge.result()
+                        if not hedge_result:
+                            return None
+                        return (hedge_result[0], hedge_result[1] + bytes_scanned)
+                    logger.warning(
+                        f"Hedged query failed for {log_group_name}: "
+                        f"{hedge.exception()}"
+                    )
+                    hedge = None
+                running_time = time.perf_counter() - query_started - scheduled_wait
+                if (
+                    stragglers is not None
+                    and not hedged
+                    and response["status"] == "Running"
+                    and stragglers.is_straggler(running_time)
+                ):
+                    hedged = True
+                    record_metric("QueriesHedged", MetricUnit.Count, 1)
+                    logger.info(
+                        f"Hedging straggling query for {log_group_name}",
+                        extra={"running_time": running_time},
+                    )
+                    hedge_executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=1
+                    )
+                    hedge = hedge_executor.submit(
+                        run_hedged_query,
+                        log_group_name,
+                        start_datetime,
+                        end_datetime,
+                        memory_size,
+                        storage_size,
+                        architecture,
+                        target,
+                        timeline,
+                        report_id,
+                        hedge_cancel,
+                        function_names,
+                    )
 
                 # Exponential backoff: wait longer between each poll
                 wait_time = min(base_wait_time * (2**attempt), 30)
+                if response["status"] == "Scheduled":
+                    # Waiting for a free slot among the concurrent queries
+                    scheduled_wait += wait_time
                 logger.debug(
                     f"Query status for {log_group_name}: {response['status']}, "
                     f"waiting {wait_time}s before retry"
                 )
-                time.sleep(wait_time)
+                pause_polling(wait_time, hedge, cancel)
                 attempt += 1
 
             except ClientError as e:
                 if e.response["Error"]["Code"] == "ThrottlingException":
+                    throttles += 1
+                    circuit_breaker.record_throttle()
                     # Additional backoff for throttling
                     wait_time = min(base_wait_time * (2 ** (attempt + 2)), 60)
                     logger.warning(
                         f"Throttled while polling query for {log_group_name}, "
                         f"waiting {wait_time}s before retry"
                     )
-                    time.sleep(wait_time)
+                    pause_polling(wait_time, hedge, cancel)
                     attempt += 1
                 else:
                     raise
@@ -265,12 +729,24 @@ def run_cloudwatch_query(
             logger.error(
                 f"Query timed out after {max_attempts} attempts for {log_group_name}"
             )
-            return None
+            raise QueryFailedError(f"Query still running after {max_attempts} polls")
 
         logger.debug(f"Query response for {log_group_name}: {str(response)[:20]}")
 
         # Extract bytesScanned from the response (statistics)
         bytes_scanned = response.get("statistics", {}).get("bytesScanned", 0)
+        run_time = time.perf_counter() - query_started - scheduled_wait
+        record_metric("QuerySlotWait", MetricUnit.Seconds, slot_wait)
+        record_metric(
+            "QueryQueueWait",
+            MetricUnit.Seconds,
+            breaker_wait + slot_wait + limiter_wait + scheduled_wait,
+        )
+        record_metric("QueryRunTime", MetricUnit.Seconds, run_time)
+        if stragglers is not None:
+            stragglers.record(run_time)
+        # One value per function
+        record_metric("BytesScanned", MetricUnit.Bytes, bytes_scanned)
 
         # Check if results are empty (no invocations during the period)
         if not response.get("results") or len(response["results"]) == 0:
@@ -280,20 +756,326 @@ def run_cloudwatch_query(
             )
             return None
 
+    except (QueryFailedError, ReportCancelledError):
+        raise
     except cloudwatch_client.exceptions.MalformedQueryException as e:
         logger.error(f"Malformed query for {log_group_name}: {e}")
-        return None
+        raise QueryFailedError("Malformed query", retryable=False) from e
     except ClientError as e:
+        error_code = e.response["Error"]["Code"]
+        if error_code in throttling_error_codes:
+            # Retries of the client exhausted
+            circuit_breaker.record_throttle()
         logger.error(f"AWS error while querying {log_group_name}: {e}")
-        return None
+        raise QueryFailedError(error_code) from e
     except Exception as e:
         logger.error(f"Unexpected error while querying {log_group_name}: {e}")
-        return None
+        raise QueryFailedError(f"Unexpected error: {e}") from e
+    finally:
+        # Timed out, abandoned for its hedge or the report was cancelled
+        if query_id is not None and status not in finished_statuses:
+            stop_query(cloudwatch_client, query_id, log_group_name)
+            status = "Cancelled"
+        if query_id is not None and report_id:
+            unregister_query(report_id, query_id, bucket_name)
+        # Stops the queries of a hedge that lost, or is no longer needed, and
+        # waits for its windows to stop theirs
+        hedge_cancel.set()
+        if hedge_executor:
+            hedge_executor.shutdown(wait=True)
+        if lease:
+            lease.release()
+        if query_submitted_at is not None:
+            timeline.add_span(
+                "generator.query",
+                query_submitted_at,
+                time.time(),
+                logGroup=log_group_name,
+                status=status,
+                throttles=throttles,
+                bytesScanned=bytes_scanned,
+                hedged=hedged,
+            )
 
+    if function_names and len(function_names) > 1:
+        return (response["results"], bytes_scanned)
     return (response["results"][0], bytes_scanned)
 
 
-def check_log_group_exist(log_group_name: str) -> bool:
+def cost_query(
+    storage_size: int, architecture: str, function_names: list[str] | None = None
+) -> str:
+    """
+    Build the Logs Insights query of the cost analysis.
+
+    Parameters
+    ----------
+    storage_size : int
+        Lambda ephemeral storage size in MB
+    architecture : str
+        Lambda architecture (arm64 or x86_64)
+    function_names : list of str, optional
+        Functions whose invocations are counted, grouped by function when
+        there are several, all the invocations of the log group if not set
+
+    Returns
+    -------
+    str
+        Query string
+    """
+    gb_second_memory_price = (
+        "0.0000133334" if architecture == "arm64" else "0.0000166667"
+    )
+    gb_second_storage_price = "0.0000000309"
+    function_filter = ""
+    group_by = ""
+    if function_names:
+        names = ", ".join(f'"{name}"' for name in function_names)
+        function_filter = f"""
+    | parse @logStream "{function_stream_pattern}" as logYear, logMonth, logDay, functionName, functionVersion, executionEnvironment
+    | filter functionName in [{names}]"""
+        if len(function_names) > 1:
+            group_by = " by functionName"
+    query = f"""
+    fields @timestamp, @message, @logStream{function_filter}
+    | parse @message "Task timed out after *" as timeout_number_1
+    | parse @message "Status: timeout" as timeout_number_2
+    | parse @message "REPORT RequestId: *" as REPORT
+    | stats  greatest(count(timeout_number_1) , 0) + greatest(count(timeout_number_2) , 0) as timeoutInvocations,
+    count(REPORT) as countInvocations,
+    0.20 / 1000000 as singleInvocationCost,
+    {gb_second_memory_price} as GBSecondMemoryPrice,
+    {gb_second_storage_price} as GBSecondStoragePrice,
+    {storage_size - 512} as StorageSizeMB,
+
+    max(@memorySize / 1000000 ) as provisionedMemoryMB,
+    sum(@billedDuration) / 1000 as allDurationInSeconds,
+    allDurationInSeconds * provisionedMemoryMB / 1024 as GbSecondsMemoryConsumed,
+    allDurationInSeconds * StorageSizeMB / 1024 as GbSecondsStorageConsumed,
+
+    sum(strlen(@message)) / 1024 / 1024 / 1024 as logSizeGB,
+
+    GbSecondsMemoryConsumed *  GBSecondMemoryPrice as MemoryCost,
+    GbSecondsStorageConsumed *  GBSecondStoragePrice as StorageCost,
+    countInvocations * singleInvocationCost as InvocationCost,
+
+    MemoryCost + InvocationCost +  StorageCost as totalCost,
+
+    max(@maxMemoryUsed  / 1000000 ) as maxMemoryUsedMB,
+    greatest(provisionedMemoryMB - maxMemoryUsedMB, 0) as overProvisionedMB,
+    greatest(maxMemoryUsedMB * 1.2, 128) as optimalMinMemory,
+    least(optimalMinMemory, provisionedMemoryMB) as optimalMemory,
+
+    allDurationInSeconds * optimalMemory * GBSecondMemoryPrice / 1024 as optimalMemoryCost,
+    greatest(MemoryCost - optimalMemoryCost, 0) as potentialSavings,
+
+    totalCost / countInvocations as avgCostPerInvocation,
+    allDurationInSeconds / countInvocations as avgDurationPerInvocation{group_by}
+ """
+    return query
+
+
+def run_hedged_query(
+    log_group_name: str,
+    start_datetime: datetime,
+    end_datetime: datetime,
+    memory_size: int,
+    storage_size: int,
+    architecture: str,
+    target: dict[str, Any] | None,
+    timeline: Timeline | None,
+    report_id: Any,
+    cancel: threading.Event,
+    function_names: list[str] | None = None,
+) -> tuple[list[dict[str, str]], float] | None:
+    """
+    Query the period of a straggling query over shorter windows in parallel.
+
+    Parameters are those of ``run_cloudwatch_query``, ``cancel`` stops the
+    queries of the windows once the straggling query completed.
+
+    Returns
+    -------
+    tuple or None
+        Merged (query results, bytes scanned) of the windows or None if the
+        function had no invocations
+
+    Raises
+    ------
+    QueryFailedError
+        If the query of a window failed, the other windows are stopped
+    """
+    windows = split_window(start_datetime, end_datetime, hedge_shards)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(windows)) as executor:
+        futures = [
+            executor.submit(
+                run_cloudwatch_query,
+                log_group_name,
+                window_start,
+                window_end,
+                memory_size,
+                storage_size,
+                architecture,
+                target,
+                timeline,
+                report_id,
+                None,
+                cancel,
+                function_names,
+            )
+            for window_start, window_end in windows
+        ]
+        try:
+            return merge_query_results([future.result() for future in futures])
+        except QueryFailedError:
+            cancel.set()
+            raise
+
+
+def stop_query(cloudwatch_client: Any, query_id: str, log_group_name: str) -> None:
+    """
+    Stop a running query, its result is no longer needed.
+
+    Parameters
+    ----------
+    cloudwatch_client : botocore.client.BaseClient
+        CloudWatch Logs client that started the query
+    query_id : str
+        Query identifier
+    log_group_name : str
+        Log group of the query, for logging
+    """
+    try:
+        cloudwatch_client.stop_query(queryId=query_id)
+    except ClientError as e:
+        # Already ended
+        logger.debug(f"Could not stop query for {log_group_name}: {e}")
+
+
+def pause_polling(
+    seconds: float,
+    hedge: concurrent.futures.Future[Any] | None,
+    cancel: threading.Event | None,
+) -> None:
+    """
+    Wait before polling a query again.
+
+    Parameters
+    ----------
+    seconds : float
+        Longest wait
+    hedge : Future, optional
+        Hedge of the query, its completion ends the wait
+    cancel : threading.Event, optional
+        Cancellation of the query, ends the wait when set
+    """
+    if hedge is not None:
+        concurrent.futures.wait([hedge], timeout=seconds)
+    elif cancel is not None:
+        cancel.wait(seconds)
+    else:
+        time.sleep(seconds)
+
+
+def split_window(
+    start_datetime: datetime, end_datetime: datetime, shards: int
+) -> list[tuple[datetime, datetime]]:
+    """
+    Split a query period into consecutive windows.
+
+    Query bounds are whole seconds and both inclusive, so each window ends a
+    second before the next one starts.
+
+    Parameters
+    ----------
+    start_datetime : datetime
+        Period start
+    end_datetime : datetime
+        Period end
+    shards : int
+        Number of windows
+
+    Returns
+    -------
+    list of tuple
+        (start, end) of each window, the whole period if it can't be split
+    """
+    seconds = int(end_datetime.timestamp()) - int(start_datetime.timestamp())
+    shards = max(1, min(shards, seconds))
+    if shards == 1:
+        return [(start_datetime, end_datetime)]
+    step = seconds // shards
+    starts = [start_datetime + timedelta(seconds=step * i) for i in range(shards)]
+    ends = [start - timedelta(seconds=1) for start in starts[1:]] + [end_datetime]
+    return list(zip(starts, ends))
+
+
+def merge_query_results(
+    results: list[tuple[list[dict[str, str]], float] | None],
+) -> tuple[list[dict[str, str]], float] | None:
+    """
+    Combine the query results of consecutive windows of a period.
+
+    Totals and maxima are combined, then the costs and averages are derived
+    again the way the query derives them.
+
+    Parameters
+    ----------
+    results : list
+        Results of ``run_cloudwatch_query`` for each window
+
+    Returns
+    -------
+    tuple or None
+        Tuple of (query results, bytes scanned) of the whole period or None if
+        the function had no invocations
+    """
+    answered = [result for result in results if result]
+    if len(answered) <= 1:
+        return answered[0] if answered else None
+
+    rows = [
+        {field["field"]: float(field["value"]) for field in row} for row, _ in answered
+    ]
+    merged = dict(rows[0])
+    for name in summed_query_fields:
+        merged[name] = sum(row.get(name, 0.0) for row in rows)
+    for name in max_query_fields:
+        merged[name] = max(row.get(name, 0.0) for row in rows)
+
+    duration, count = merged["allDurationInSeconds"], merged["countInvocations"]
+    provisioned, max_used = merged["provisionedMemoryMB"], merged["maxMemoryUsedMB"]
+    memory_price = merged["GBSecondMemoryPrice"]
+    merged["GbSecondsMemoryConsumed"] = duration * provisioned / 1024
+    merged["GbSecondsStorageConsumed"] = duration * merged["StorageSizeMB"] / 1024
+    merged["MemoryCost"] = merged["GbSecondsMemoryConsumed"] * memory_price
+    merged["StorageCost"] = (
+        merged["GbSecondsStorageConsumed"] * merged["GBSecondStoragePrice"]
+    )
+    merged["InvocationCost"] = count * merged["singleInvocationCost"]
+    merged["totalCost"] = (
+        merged["MemoryCost"] + merged["InvocationCost"] + merged["StorageCost"]
+    )
+    merged["overProvisionedMB"] = max(provisioned - max_used, 0)
+    merged["optimalMinMemory"] = max(max_used * 1.2, 128)
+    merged["optimalMemory"] = min(merged["optimalMinMemory"], provisioned)
+    merged["optimalMemoryCost"] = (
+        duration * merged["optimalMemory"] * memory_price / 1024
+    )
+    merged["potentialSavings"] = max(
+        merged["MemoryCost"] - merged["optimalMemoryCost"], 0
+    )
+    merged["avgCostPerInvocation"] = merged["totalCost"] / count if count else 0.0
+    merged["avgDurationPerInvocation"] = duration / count if count else 0.0
+    return (
+        [{"field": name, "value": str(value)} for name, value in merged.items()],
+        sum(bytes_scanned for _, bytes_scanned in answered),
+    )
+
+
+def check_log_group_exist(
+    log_group_name: str, target: dict[str, Any] | None = None
+) -> bool:
     """
     Check if CloudWatch log group exists.
 
@@ -301,13 +1083,15 @@ def check_log_group_exist(log_group_name: str) -> bool:
     ----------
     log_group_name : str
         Log group name to check
+    target : dict, optional
+        Account role and region of the log group, local account if not set
 
     Returns
     -------
     bool
         True if log group exists
     """
-    cloudwatch_client = boto3.client("logs", config=retry_config)
+    cloudwatch_client = get_client("logs", target, retry_config)
 
     try:
         log_groups = cloudwatch_client.describe_log_groups(
@@ -323,11 +1107,23 @@ def check_log_group_exist(log_group_name: str) -> bool:
 
 
 def generate_cost_report(
-    lambda_list: list[str], report_id: Any, start_date: str, end_date: str
+    lambda_list: list[str],
+    report_id: Any,
+    start_date: str,
+    end_date: str,
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+    deadline: float | None = None,
+    batch_id: str | None = None,
 ) -> dict[str, Any]:
     """
     Generate cost report CSV for multiple Lambda functions.
 
+    Functions logging to the same custom log group are analyzed with a single
+    query of the log group (see ``get_shared_log_group_costs``). Functions
+    whose query failed are deferred, then retried once the other functions are
+    done (see ``retry_deferred_functions``).
+
     Parameters
     ----------
     lambda_list : list of str
@@ -338,75 +1134,364 @@ def generate_cost_report(
         Analysis start date
     end_date : str
         Analysis end date
+    target : dict, optional
+        Account role and region of the functions, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the spans of the functions and of the upload
+    deadline : float, optional
+        ``time.monotonic()`` after which deferred retries are given up
+    batch_id : str, optional
+        Planned batch identifier naming the CSV, whose completion is then
+        marked (see ``backend.utils.batch_utils``). Random file name if not set
 
     Returns
     -------
     dict
-        S3 location of generated CSV file
+        S3 location of generated CSV file and functions that still failed
     """
-    lambda_costs = []
-    logger.info(f"Processing lambda functions: {lambda_list}")
+    lambda_costs: list[dict[str, Any] | None] = []
+    deferred: list[str] = []
+    failed_functions: list[dict[str, str]] = []
+    timeline = timeline or Timeline(report_id)
     # Reduced from 5 to 2 workers to avoid CloudWatch Logs API rate limits
     with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
-        futures = [
-            executor.submit(get_lambda_cost, lambda_name, start_date, end_date)
-            for lambda_name in lambda_list
-        ]
+        futures = submit_cost_queries(
+            executor, lambda_list, start_date, end_date, target, timeline, report_id
+        )
         for future in concurrent.futures.as_completed(futures):
-            lambda_costs.append(future.result())
-    lambda_costs = [item for item in lambda_costs if item is not None]
-    logger.debug(f"Lambda costs: {lambda_costs}")
-    csv_buffer = StringIO()
-
-    fieldnames = [
-        "functionName",
-        "runtime",
-        "architecture",
-        "countInvocations",
-        "allDurationInSeconds",
-        "provisionedMemoryMB",
-        "MemoryCost",
-        "InvocationCost",
-        "StorageCost",
-        "totalCost",
-        "avgCostPerInvocation",
-        "maxMemoryUsedMB",
-        "overProvisionedMB",
-        "optimalMemory",
-        "potentialSavings",
-        "avgDurationPerInvocation",
-        "timeoutInvocations",
-        "logSizeGB",
-        "logIngestionCost",
-        "logStorageCost",
-        "analysisCost",
-    ]
-    # with open(output_file, "w", newline="") as csvfile:
-    writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames, extrasaction="ignore")
-    writer.writeheader()
-
-    for cost_data in lambda_costs:
-        if cost_data is not None:
-            writer.writerow(cost_data)
-    filename = f"{str(uuid.uuid4())}.csv"
-    directory = f"single_analysis/{report_id}"
-    upload_file_to_s3(
-        body=csv_buffer.getvalue(),
-        bucket_name=bucket_name,
-        file_name=filename,
-        directory=directory,
+            try:
+                lambda_costs.extend(future.result())
+            except QueryFailedError as e:
+                # Functions of a shared log group are retried one by one
+                if e.retryable:
+                    deferred.extend(futures[future])
+                else:
+                    failed_functions.extend(
+                        {"functionName": lambda_name, "reason": e.reason}
+                        for lambda_name in futures[future]
+                    )
+    if deferred:
+        retried_costs, retry_failures = retry_deferred_functions(
+            deferred, start_date, end_date, target, timeline, report_id, deadline
+        )
+        lambda_costs.extend(retried_costs)
+        failed_functions.extend(retry_failures)
+    record_metric("FunctionsFailed", MetricUnit.Count, len(failed_functions))
+    function_costs = [item for item in lambda_costs if item is not None]
+    record_metric("FunctionsAnalyzed", MetricUnit.Count, len(function_costs))
+    record_metric(
+        "FunctionsSkipped", MetricUnit.Count, len(lambda_costs) - len(function_costs)
     )
+
+    # A retried batch overwrites its own output rather than adding rows
+    filename = f"{batch_id or uuid.uuid4()}.csv"
+    directory = batch_directory(report_id)
+    # Intermediate results are only read back by the aggregator
+    with (
+        timeline.span("generator.upload", rows=len(function_costs)),
+        open_s3_writer(
+            file_name=filename,
+            bucket_name=bucket_name,
+            directory=directory,
+            content_encoding="gzip",
+            content_type="text/csv",
+        ) as csv_file,
+    ):
+        write_cost_rows(csv_file, function_costs)
     logger.info(
-        f"Lambda functions {lambda_list} for Report {report_id} have been uploaded to {filename}"
+        "Uploaded batch analysis",
+        extra={
+            "num_functions": len(function_costs),
+            "num_failed": len(failed_functions),
+            "file_name": filename,
+        },
     )
-    return {
+    result = {
         "filename": filename,
         "bucket": bucket_name,
         "directory": directory,
         "report_id": report_id,
         "start_date": start_date,
         "end_date": end_date,
+        "failed_functions": failed_functions,
     }
+    if batch_id:
+        result["batch_id"] = batch_id
+        upload_batch_marker(result, bucket_name)
+    # Only informs users while the report runs
+    try:
+        record_batch_progress(
+            report_id,
+            bucket_name,
+            batch_id or filename,
+            batch_contribution(result, function_costs),
+        )
+    except ClientError as e:
+        logger.warning("Failed to record the batch progress", extra={"error": str(e)})
+    return result
+
+
+def submit_cost_queries(
+    executor: concurrent.futures.Executor,
+    lambda_list: list[str],
+    start_date: str,
+    end_date: str,
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+    report_id: Any = None,
+    stragglers: StragglerDetector | None = None,
+    cancel: threading.Event | None = None,
+) -> dict[concurrent.futures.Future[list[dict[str, Any] | None]], list[str]]:
+    """
+    Submit the queries of functions, one per shared log group.
+
+    Functions logging to the same custom log group are analyzed with a single
+    query of the log group (see ``get_shared_log_group_costs``), the others
+    with their own query.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        Thread pool running the queries
+    lambda_list : list of str
+        Lambda function names to analyze
+    start_date : str
+        Analysis start date
+    end_date : str
+        Analysis end date
+    target : dict, optional
+        Account role and region of the functions, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the spans of the functions
+    report_id : Any, optional
+        Report the functions are analyzed for
+    stragglers : StragglerDetector, optional
+        Peers the queries are compared with to find stragglers, a new one for
+        these functions if not set
+    cancel : threading.Event, optional
+        Stops the queries, waiting or running, when set
+
+    Returns
+    -------
+    dict
+        Future of each query, giving the cost analysis of its functions (None
+        without invocations), to the names of its functions. A failed query
+        raises ``QueryFailedError``
+    """
+    stragglers = stragglers or StragglerDetector()
+    configs = get_function_configs(lambda_list, target, timeline)
+    shared_groups = group_shared_log_groups(configs)
+    shared_names = {
+        config["functionName"] for group in shared_groups for config in group
+    }
+    futures = {
+        executor.submit(
+            get_shared_log_group_costs,
+            group,
+            start_date,
+            end_date,
+            target,
+            timeline,
+            report_id,
+            cancel,
+        ): [config["functionName"] for config in group]
+        for group in shared_groups
+    }
+    for lambda_name in lambda_list:
+        if lambda_name in shared_names:
+            continue
+        future = executor.submit(
+            get_function_costs,
+            lambda_name,
+            start_date,
+            end_date,
+            target,
+            timeline,
+            report_id,
+            1,
+            stragglers,
+            configs.get(lambda_name),
+            cancel,
+        )
+        futures[future] = [lambda_name]
+    return futures
+
+
+def get_function_costs(lambda_name: str, *args: Any) -> list[dict[str, Any] | None]:
+    """
+    Calculate cost metrics for a function, as a list of one like shared groups.
+
+    Parameters
+    ----------
+    lambda_name : str
+        Lambda function name
+    *args
+        Other arguments of ``get_lambda_cost``
+
+    Returns
+    -------
+    list
+        Result of ``get_lambda_cost``
+    """
+    return [get_lambda_cost(lambda_name, *args)]
+
+
+def get_function_configs(
+    lambda_list: list[str],
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+) -> dict[str, dict[str, Any]]:
+    """
+    Look up the configuration of the functions of a batch.
+
+    Parameters
+    ----------
+    lambda_list : list of str
+        Lambda function names
+    target : dict, optional
+        Account role and region of the functions, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the spans of the lookups
+
+    Returns
+    -------
+    dict
+        Function name to result of ``get_function_config``. Functions whose
+        lookup failed are left out, and looked up again when analyzed
+    """
+    configs = {}
+    for result in stream_map(
+        lambda lambda_name: get_function_config(lambda_name, target, timeline),
+        lambda_list,
+        max_workers=config_workers,
+    ):
+        if result.ok:
+            configs[result.item] = result.value
+        else:
+            logger.warning(
+                "Failed to look up function configuration",
+                extra={"function_name": result.item, "error": str(result.error)},
+            )
+    return configs
+
+
+def group_shared_log_groups(
+    configs: dict[str, dict[str, Any]],
+) -> list[list[dict[str, Any]]]:
+    """
+    Group the functions logging to the same custom log group.
+
+    Only functions with the same architecture and ephemeral storage size are
+    grouped, their prices are constants of the query.
+
+    Parameters
+    ----------
+    configs : dict
+        Function name to result of ``get_function_config``
+
+    Returns
+    -------
+    list of list of dict
+        Configurations of each group of at least two functions
+    """
+    groups: dict[tuple[str, str, int], list[dict[str, Any]]] = {}
+    for config in configs.values():
+        if config["customLogGroup"] and config["logGroupExists"]:
+            key = (
+                config["logGroupName"],
+                config["architecture"],
+                config["storageSize"],
+            )
+            groups.setdefault(key, []).append(config)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def retry_deferred_functions(
+    lambda_list: list[str],
+    start_date: str,
+    end_date: str,
+    target: dict[str, Any] | None = None,
+    timeline: Timeline | None = None,
+    report_id: Any = None,
+    deadline: float | None = None,
+) -> tuple[list[dict[str, Any] | None], list[dict[str, str]]]:
+    """
+    Retry the functions whose query failed.
+
+    Functions are retried one at a time, so the retries don't compete with each
+    other for the throttled API, and over ``deferred_query_shards`` shorter
+    windows, so a query that timed out scans less each time.
+
+    Parameters
+    ----------
+    lambda_list : list of str
+        Lambda function names whose query failed
+    start_date : str
+        Analysis start date
+    end_date : str
+        Analysis end date
+    target : dict, optional
+        Account role and region of the functions, local account if not set
+    timeline : Timeline, optional
+        Timeline receiving the spans of the functions
+    report_id : Any, optional
+        Report the functions are analyzed for
+    deadline : float, optional
+        ``time.monotonic()`` after which the remaining functions are given up
+
+    Returns
+    -------
+    tuple
+        Cost analysis of the retried functions (None without invocations) and
+        the functionName and reason of those that failed again
+    """
+    lambda_costs = []
+    failed_functions = []
+    timeline = timeline or Timeline(report_id)
+    logger.info(
+        "Retrying deferred functions", extra={"num_functions": len(lambda_list)}
+    )
+    for lambda_name in lambda_list:
+        if deadline is not None and time.monotonic() > deadline:
+            failed_functions.append(
+                {"functionName": lambda_name, "reason": "No time left to retry"}
+            )
+            continue
+        try:
+            with timeline.span("generator.deferred_retry", function=lambda_name):
+                lambda_costs.append(
+                    get_lambda_cost(
+                        lambda_name,
+                        start_date,
+                        end_date,
+                        target,
+                        timeline,
+                        report_id,
+                        deferred_query_shards,
+                    )
+                )
+        except QueryFailedError as e:
+            failed_functions.append({"functionName": lambda_name, "reason": e.reason})
+    record_metric("DeferredRetries", MetricUnit.Count, len(lambda_list))
+    return lambda_costs, failed_functions
+
+
+def write_cost_rows(csv_file: IO[str], lambda_costs: list[dict[str, Any]]) -> None:
+    """
+    Write the cost analysis of functions as CSV.
+
+    Parameters
+    ----------
+    csv_file : file-like
+        Text stream the CSV is written to
+    lambda_costs : list of dict
+        Cost analysis of each function
+    """
+    writer = csv.DictWriter(
+        csv_file, fieldnames=report_fieldnames, extrasaction="ignore"
+    )
+    writer.writeheader()
+    writer.writerows(lambda_costs)
 
 
 if __name__ == "__main__":
@@ -2,13 +2,37 @@
 
 import json
 import os
+import time
+from itertools import zip_longest
 from typing import Any
 
 from aws_lambda_powertools import Logger
+from aws_lambda_powertools.metrics import MetricUnit
 from aws_lambda_powertools.utilities.typing import LambdaContext
+from botocore.exceptions import ClientError
 
-from backend.utils.s3_utils import upload_file_to_s3
-from backend.utils.sf_utils import upload_divided_params
+from backend.utils.batch_utils import (
+    is_batch_complete,
+    load_batch_markers,
+    load_plan,
+    upload_plan,
+)
+from backend.utils.log_group_utils import divide_by_log_group, lookup_log_groups
+from backend.utils.metrics_utils import (
+    add_report_dimension,
+    metrics,
+    record_metric,
+    timed_stage,
+)
+from backend.utils.profiling_utils import profiled
+from backend.utils.progress_utils import load_progress, start_progress
+from backend.utils.query_registry_utils import cancellation_file_name
+from backend.utils.s3_utils import client, download_from_s3, upload_file_to_s3
+from backend.utils.sf_utils import upload_params
+from backend.utils.tag_utils import normalize_tag_expression, resolve_tag_expression
+from backend.utils.target_utils import get_client, target_key
+from backend.utils.timeline_utils import Timeline, timeline_file_name
+from backend.utils.usage_utils import UsageMeter
 
 logger = Logger()
 
@@ -17,14 +41,30 @@ max_arn_per_invocation = 5
 
 
 @logger.inject_lambda_context(log_event=True)  # type: ignore[misc]
+@metrics.log_metrics  # type: ignore[misc]
+@timed_stage("Initializer")
+@profiled("initializer", bucket_name)
 def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, Any]:
     """
     Initialize cost analysis by creating report and dividing Lambda functions.
 
+    Functions are selected by name (lambda_functions_name) and/or tag expression
+    (tag_expression), either at the top level for the local account or per
+    entry of ``targets``, a list of (role_arn, region) pairs with their own
+    selection. Functions logging to the same custom log group are batched
+    together, to share its scan (see ``divide_by_log_group``). Batches of
+    different targets are interleaved so that every target progresses while
+    the Map state works through them.
+
+    With ``resume`` set, the report is resumed from its stored plan instead:
+    only the batches without a complete output run again (see
+    ``plan_resumed_batches``).
+
     Parameters
     ----------
     event : dict
-        Step Function event with lambda_functions_name, report_id, start_date, end_date
+        Step Function event with lambda_functions_name, tag_expression and/or
+        targets, report_id, start_date, end_date, or report_id and resume
     context : LambdaContext
         Lambda context object
 
@@ -33,30 +73,97 @@ def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, A
     dict
         Parameters for next step with divided Lambda functions
     """
-    lambda_functions_name = event["lambda_functions_name"]
-
+    meter = UsageMeter(context)
     report_id = event["report_id"]
+    if event.get("resume"):
+        return plan_resumed_batches(report_id, meter)
     start_date = event.get("start_date")
     end_date = event.get("end_date")
+    targets = event.get("targets") or [
+        {
+            "lambda_functions_name": event.get("lambda_functions_name", []),
+            "tag_expression": event.get("tag_expression"),
+        }
+    ]
+    add_report_dimension(report_id)
 
     logger.info(
         "Initializing analysis",
-        extra={"report_id": report_id, "num_functions": len(lambda_functions_name)},
+        extra={"report_id": report_id, "num_targets": len(targets)},
     )
 
+    planning_started_at = time.time()
     upload_file_to_s3(
         body=json.dumps({"status": "Running"}),
         file_name="summary.json",
         bucket_name=bucket_name,
         directory=report_id,
     )
-    sf_parameters = upload_divided_params(
-        lambda_functions_name,
-        divider=max_arn_per_invocation,
-        bucket_name=bucket_name,
-        directory_name="SF_PARAMS/SF_PARAMS",
+
+    tag_selections = load_tag_selections(report_id)
+    batches_per_target = []
+    for target in targets:
+        lambda_functions_name = target.get("lambda_functions_name", [])
+        if target.get("tag_expression"):
+            # Explicitly selected functions first, then the tag selection
+            lambda_functions_name = list(
+                dict.fromkeys(
+                    lambda_functions_name
+                    + resolve_tag_selection(
+                        target["tag_expression"], target, tag_selections, report_id
+                    )
+                )
+            )
+        batch_target = {
+            "role_arn": target.get("role_arn"),
+            "region": target.get("region"),
+        }
+        log_groups = lookup_log_groups(lambda_functions_name, batch_target)
+        batches_per_target.append(
+            [
+                {"target": batch_target, "lambda_functions_name": batch}
+                for batch in divide_by_log_group(
+                    lambda_functions_name, log_groups, max_arn_per_invocation
+                )
+            ]
+        )
+        record_metric("FunctionsSelected", MetricUnit.Count, len(lambda_functions_name))
+        logger.info(
+            "Planned target batches",
+            extra={
+                "target": target_key(batch_target),
+                "num_functions": len(lambda_functions_name),
+            },
+        )
+
+    # Stable IDs name the batch outputs, a resumed report finds them back
+    batches = [
+        {"batch_id": f"batch-{index:05d}", **batch}
+        for index, batch in enumerate(interleave_batches(batches_per_target))
+    ]
+    upload_plan(
+        report_id,
+        bucket_name,
+        {"start_date": start_date, "end_date": end_date, "batches": batches},
     )
+    sf_parameters = upload_params(
+        batches, bucket_name=bucket_name, directory_name="SF_PARAMS/SF_PARAMS"
+    )
+    start_progress(report_id, bucket_name, len(batches))
 
+    record_metric("Batches", MetricUnit.Count, len(sf_parameters))
+    timeline = Timeline(report_id)
+    timeline.add_span(
+        "initializer.planning",
+        planning_started_at,
+        time.time(),
+        targets=len(targets),
+        batches=len(sf_parameters),
+    )
+    timeline.add_span(
+        "initializer.invocation", meter.started_at, time.time(), **meter.usage()
+    )
+    timeline.upload(bucket_name, "initializer")
     logger.info("Analysis initialized", extra={"num_batches": len(sf_parameters)})
 
     return {
@@ -65,3 +172,206 @@ def lambda_handler(event: dict[str, Any], context: LambdaContext) -> dict[str, A
         "end_date": end_date,
         "report_id": report_id,
     }
+
+
+def plan_resumed_batches(report_id: str, meter: UsageMeter) -> dict[str, Any]:
+    """
+    Plan the batches of a report that have no complete output.
+
+    Batches whose marker lists failed functions run again as a whole, their
+    output is overwritten. The aggregator then merges the new outputs with the
+    ones kept.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    meter : UsageMeter
+        Usage of the current invocation
+
+    Returns
+    -------
+    dict
+        Parameters for next step with the batches to run
+
+    Raises
+    ------
+    ValueError
+        If the report has no stored plan
+    """
+    planning_started_at = time.time()
+    plan = load_plan(report_id, bucket_name)
+    if plan is None:
+        raise ValueError(f"Report {report_id} has no plan to resume from")
+    markers = load_batch_markers(report_id, bucket_name)
+    batches = [
+        batch
+        for batch in plan["batches"]
+        if not is_batch_complete(markers.get(batch["batch_id"]))
+    ]
+    logger.info(
+        "Resuming analysis",
+        extra={
+            "report_id": report_id,
+            "num_batches": len(plan["batches"]),
+            "num_missing": len(batches),
+        },
+    )
+
+    # Generators of the resumed run would stop right away otherwise, and the
+    # timeline of the last run would hide the spans of this one
+    for file_name in [cancellation_file_name, timeline_file_name]:
+        client.delete_object(Bucket=bucket_name, Key=f"{report_id}/{file_name}")
+    upload_file_to_s3(
+        body=json.dumps({"status": "Running"}),
+        file_name="summary.json",
+        bucket_name=bucket_name,
+        directory=report_id,
+    )
+    sf_parameters = upload_params(
+        batches, bucket_name=bucket_name, directory_name="SF_PARAMS/SF_PARAMS"
+    )
+    # Contributions of the batches kept count as done already
+    loaded = load_progress(report_id, bucket_name)
+    kept = {
+        batch_id: contribution
+        for batch_id, contribution in (loaded[0]["batches"] if loaded else {}).items()
+        if is_batch_complete(markers.get(batch_id))
+    }
+    start_progress(
+        report_id,
+        bucket_name,
+        len(plan["batches"]),
+        kept,
+        loaded[0].get("sequence", 0) if loaded else 0,
+    )
+
+    record_metric("Batches", MetricUnit.Count, len(sf_parameters))
+    record_metric(
+        "BatchesReused", MetricUnit.Count, len(plan["batches"]) - len(batches)
+    )
+    timeline = Timeline(report_id)
+    timeline.add_span(
+        "initializer.planning",
+        planning_started_at,
+        time.time(),
+        batches=len(sf_parameters),
+        resumed=True,
+    )
+    timeline.add_span(
+        "initializer.invocation", meter.started_at, time.time(), **meter.usage()
+    )
+    timeline.upload(bucket_name, "initializer")
+
+    return {
+        "lambda_functions_name": sf_parameters,
+        "start_date": plan["start_date"],
+        "end_date": plan["end_date"],
+        "report_id": report_id,
+        "resumed": True,
+    }
+
+
+def interleave_batches(batches_per_target: list[list[Any]]) -> list[Any]:
+    """
+    Interleave the batches of several targets round-robin.
+
+    Parameters
+    ----------
+    batches_per_target : list of list
+        Batches of each target
+
+    Returns
+    -------
+    list
+        Batches ordered target 1, target 2, ..., target 1, target 2, ...
+    """
+    return [
+        batch
+        for batches in zip_longest(*batches_per_target)
+        for batch in batches
+        if batch is not None
+    ]
+
+
+def load_tag_selections(report_id: str) -> dict[str, Any]:
+    """
+    Load the tag selections already resolved for a report run.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+
+    Returns
+    -------
+    dict
+        Target key to resolved tag expression and function names
+    """
+    try:
+        return json.loads(  # type: ignore[no-any-return]
+            download_from_s3(
+                file_name="tag_selection.json",
+                bucket_name=bucket_name,
+                directory=report_id,
+            )
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        return {}
+
+
+def resolve_tag_selection(
+    tag_expression: str,
+    target: dict[str, Any],
+    tag_selections: dict[str, Any],
+    report_id: str,
+) -> list[str]:
+    """
+    Resolve a tag expression once per report run and target.
+
+    The resolved names are stored next to the report so that retries of the
+    initializer reuse them instead of querying the tagging API again.
+
+    Parameters
+    ----------
+    tag_expression : str
+        Tag expression (see ``backend.utils.tag_utils``)
+    target : dict
+        Target with optional role_arn and region
+    tag_selections : dict
+        Selections already resolved for this report, updated in place
+    report_id : str
+        Report identifier
+
+    Returns
+    -------
+    list of str
+        Names of the functions matching the expression
+    """
+    expression = normalize_tag_expression(tag_expression)
+    key = target_key(target)
+    selection = tag_selections.get(key)
+    if selection and selection["tagExpression"] == expression:
+        return selection["functionNames"]  # type: ignore[no-any-return]
+
+    function_names = resolve_tag_expression(
+        expression, get_client("resourcegroupstaggingapi", target)
+    )
+    logger.info(
+        "Resolved tag selection",
+        extra={
+            "target": key,
+            "tag_expression": expression,
+            "num_functions": len(function_names),
+        },
+    )
+    tag_selections[key] = {"tagExpression": expression, "functionNames": function_names}
+    upload_file_to_s3(
+        body=json.dumps(tag_selections),
+        file_name="tag_selection.json",
+        bucket_name=bucket_name,
+        directory=report_id,
+    )
+    return function_names
@@ -0,0 +1,489 @@
+"""Deduplication and admission control of analysis starts.
+
+An analysis request is reduced to a fingerprint: its functions, tag
+expressions and targets in a canonical order, plus its period. The first
+request claims ``analyses/fingerprints/<fingerprint>.json`` with a conditional
+write, identical requests then attach to its report while it is queued,
+running or recently completed.
+
+Admitted reports wait in ``analyses/queue/``, oldest first, and are started
+while fewer than ``max_concurrent_analyses`` executions run. The queue is
+drained on every start request and whenever an execution ends.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from backend.utils.s3_utils import client, download_from_s3, list_s3_keys
+from backend.utils.tag_utils import normalize_tag_expression
+from backend.utils.target_utils import target_key
+
+logger = Logger()
+
+fingerprints_directory = "analyses/fingerprints"
+queue_directory = "analyses/queue"
+# Soft limit: concurrent drains may each start an execution for the last slot
+max_concurrent_analyses = int(os.environ.get("MAX_CONCURRENT_ANALYSES", "4"))
+# Completed reports are reused for identical requests for this long
+dedupe_window_seconds = 3600
+# A claim whose report has no summary yet is in flight for this long
+claim_grace_seconds = 60
+unfinished_statuses = ["Queued", "Running"]
+lost_race_error_codes = {"PreconditionFailed", "ConditionalRequestConflict"}
+
+
+def analysis_fingerprint(request: dict[str, Any]) -> str:
+    """
+    Fingerprint the functions and period of an analysis request.
+
+    Parameters
+    ----------
+    request : dict
+        Start request with lambda_functions_name, tag_expression and/or
+        targets, start_date and end_date
+
+    Returns
+    -------
+    str
+        SHA-256 of the canonical request
+    """
+    targets = request.get("targets") or [request]
+    canonical = {
+        "targets": sorted(
+            (
+                {
+                    "target": target_key(target),
+                    "functions": sorted(set(target.get("lambda_functions_name", []))),
+                    "tagExpression": (
+                        normalize_tag_expression(target["tag_expression"])
+                        if target.get("tag_expression")
+                        else None
+                    ),
+                }
+                for target in targets
+            ),
+            key=lambda target: json.dumps(target, sort_keys=True),
+        ),
+        "startDate": request.get("start_date"),
+        "endDate": request.get("end_date"),
+    }
+    return hashlib.sha256(
+        json.dumps(canonical, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def claim_analysis(
+    fingerprint: str, report_id: str, bucket_name: str, attempts: int = 3
+) -> str | None:
+    """
+    Claim a fingerprint for a report, unless an identical report can be reused.
+
+    Parameters
+    ----------
+    fingerprint : str
+        Fingerprint of the request
+    report_id : str
+        Report that would run the analysis
+    bucket_name : str
+        S3 bucket name
+    attempts : int, default=3
+        Claims tried while other requests replace the same stale claim
+
+    Returns
+    -------
+    str or None
+        Report to attach to, None if the fingerprint was claimed for
+        ``report_id``
+    """
+    key = f"{fingerprints_directory}/{fingerprint}.json"
+    body = json.dumps({"reportID": report_id, "claimedAt": time.time()})
+    condition = {"IfNoneMatch": "*"}
+    for _ in range(attempts):
+        try:
+            client.put_object(Bucket=bucket_name, Key=key, Body=body, **condition)
+            return None
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in lost_race_error_codes:
+                raise
+        try:
+            response = client.get_object(Bucket=bucket_name, Key=key)
+        except ClientError as e:
+            # Released in between
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                raise
+            condition = {"IfNoneMatch": "*"}
+            continue
+        claim = json.loads(response["Body"].read())
+        if is_reusable(claim, bucket_name):
+            return str(claim["reportID"])
+        condition = {"IfMatch": response["ETag"]}
+    # Lost every race, the last winner runs the analysis
+    claim = json.loads(download_from_s3(key, bucket_name=bucket_name))
+    return str(claim["reportID"])
+
+
+def is_reusable(claim: dict[str, Any], bucket_name: str) -> bool:
+    """
+    Check whether the report of a claim serves identical requests.
+
+    Parameters
+    ----------
+    claim : dict
+        Fingerprint claim with reportID and claimedAt
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    bool
+        Whether the report is queued, running or recently completed
+    """
+    try:
+        response = client.get_object(
+            Bucket=bucket_name, Key=f"{claim['reportID']}/summary.json"
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        # Claimed, summary not written yet
+        return bool(time.time() - claim["claimedAt"] < claim_grace_seconds)
+    status = json.loads(response["Body"].read()).get("status")
+    if status in unfinished_statuses:
+        return True
+    age = datetime.now(timezone.utc) - response["LastModified"]
+    return bool(status == "Completed" and age.total_seconds() < dedupe_window_seconds)
+
+
+def execution_name(report_id: str, run_id: str | None = None) -> str:
+    """
+    Name the execution of a report.
+
+    Step Functions starts a single execution per name and input, so that a
+    queue entry started by concurrent drains runs once.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    run_id : str, optional
+        Run of the report after the first one, a resume
+
+    Returns
+    -------
+    str
+        Execution name
+    """
+    name = f"report-{report_id}-{run_id}" if run_id else f"report-{report_id}"
+    return re.sub(r"[^A-Za-z0-9_-]", "-", name)[:80]
+
+
+def execution_arn(
+    state_machine_arn: str, report_id: str, run_id: str | None = None
+) -> str:
+    """
+    ARN of the execution of a report.
+
+    Parameters
+    ----------
+    state_machine_arn : str
+        State machine ARN
+    report_id : str
+        Report identifier
+    run_id : str, optional
+        Run of the report after the first one, a resume
+
+    Returns
+    -------
+    str
+        Execution ARN
+    """
+    execution_prefix = state_machine_arn.replace(":stateMachine:", ":execution:", 1)
+    return f"{execution_prefix}:{execution_name(report_id, run_id)}"
+
+
+def report_exists(
+    report_id: str, sfn_client: Any, state_machine_arn: str, bucket_name: str
+) -> bool:
+    """
+    Check whether a report ID is already used.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    sfn_client : botocore.client.BaseClient
+        Step Functions client
+    state_machine_arn : str
+        State machine ARN
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    bool
+        Whether the report has a summary or an execution
+    """
+    try:
+        client.head_object(Bucket=bucket_name, Key=f"{report_id}/summary.json")
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ["404", "NoSuchKey", "NotFound"]:
+            raise
+    try:
+        sfn_client.describe_execution(
+            executionArn=execution_arn(state_machine_arn, report_id)
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ExecutionDoesNotExist":
+            raise
+    return False
+
+
+def enqueue_analysis(execution_input: dict[str, Any], bucket_name: str) -> str:
+    """
+    Queue the execution of a report.
+
+    Parameters
+    ----------
+    execution_input : dict
+        State machine input, with report_id and the run_id of a resume
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    str
+        Key of the queue entry
+    """
+    key = f"{queue_directory}/{time.time_ns():020d}-{execution_input['report_id']}.json"
+    client.put_object(Bucket=bucket_name, Key=key, Body=json.dumps(execution_input))
+    return key
+
+
+def dequeue_analysis(report_id: str, bucket_name: str) -> bool:
+    """
+    Remove a report from the queue.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    bool
+        Whether the report was still queued
+    """
+    keys = [
+        key
+        for key in list_s3_keys(bucket_name, queue_directory)
+        if key.endswith(f"-{report_id}.json")
+    ]
+    for key in keys:
+        client.delete_object(Bucket=bucket_name, Key=key)
+    return bool(keys)
+
+
+def count_running_executions(sfn_client: Any, state_machine_arn: str) -> int:
+    """
+    Count the running executions, up to the concurrency limit.
+
+    Parameters
+    ----------
+    sfn_client : botocore.client.BaseClient
+        Step Functions client
+    state_machine_arn : str
+        State machine ARN
+
+    Returns
+    -------
+    int
+        Running executions, counting stops at ``max_concurrent_analyses``
+    """
+    running = 0
+    paginator = sfn_client.get_paginator("list_executions")
+    for page in paginator.paginate(
+        stateMachineArn=state_machine_arn,
+        statusFilter="RUNNING",
+        PaginationConfig={"PageSize": max_concurrent_analyses},
+    ):
+        running += len(page["executions"])
+        if running >= max_concurrent_analyses:
+            break
+    return running
+
+
+def drain_analysis_queue(
+    sfn_client: Any, state_machine_arn: str, bucket_name: str
+) -> dict[str, str]:
+    """
+    Start the oldest queued reports while executions slots are free.
+
+    Parameters
+    ----------
+    sfn_client : botocore.client.BaseClient
+        Step Functions client
+    state_machine_arn : str
+        State machine ARN
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    dict
+        Report ID to execution ARN of the started reports, and of those found
+        running under their execution name already
+    """
+    free = max_concurrent_analyses - count_running_executions(
+        sfn_client, state_machine_arn
+    )
+    if free <= 0:
+        return {}
+    started = {}
+    for key in list_s3_keys(bucket_name, queue_directory)[:free]:
+        try:
+            execution_input = json.loads(download_from_s3(key, bucket_name=bucket_name))
+        except ClientError as e:
+            # Started by a concurrent drain
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                raise
+            continue
+        report_id = str(execution_input["report_id"])
+        try:
+            execution = sfn_client.start_execution(
+                stateMachineArn=state_machine_arn,
+                name=execution_name(report_id, execution_input.get("run_id")),
+                input=json.dumps(execution_input),
+            )
+            started[report_id] = execution["executionArn"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ExecutionAlreadyExists":
+                raise
+            logger.warning(
+                "Report already has an execution", extra={"report_id": report_id}
+            )
+            execution_arn = reconcile_existing_execution(
+                sfn_client,
+                state_machine_arn,
+                report_id,
+                execution_input.get("run_id"),
+                bucket_name,
+            )
+            if execution_arn is not None:
+                started[report_id] = execution_arn
+        client.delete_object(Bucket=bucket_name, Key=key)
+    if started:
+        logger.info("Started queued analyses", extra={"report_ids": list(started)})
+    return started
+
+
+def reconcile_existing_execution(
+    sfn_client: Any,
+    state_machine_arn: str,
+    report_id: str,
+    run_id: str | None,
+    bucket_name: str,
+) -> str | None:
+    """
+    Align the summary of a queued report with the execution holding its name.
+
+    A report still ``Queued`` is set ``Running`` if that execution runs. If it
+    succeeded, the summary it published is restored from the history.
+    Otherwise the report is set ``Failed``, as it can't run under that name
+    again.
+
+    Parameters
+    ----------
+    sfn_client : botocore.client.BaseClient
+        Step Functions client
+    state_machine_arn : str
+        State machine ARN
+    report_id : str
+        Report identifier
+    run_id : str, optional
+        Run of the report after the first one, a resume
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    str or None
+        ARN of the execution if it runs
+    """
+    name = execution_name(report_id, run_id)
+    arn = execution_arn(state_machine_arn, report_id, run_id)
+    status = sfn_client.describe_execution(executionArn=arn)["status"]
+    running = arn if status == "RUNNING" else None
+    try:
+        summary = json.loads(download_from_s3("summary.json", bucket_name, report_id))
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        summary = {}
+    if summary.get("status") != "Queued":
+        # Already updated by the execution
+        return running
+
+    published = (
+        [
+            key
+            for key in list_s3_keys(bucket_name, "summaries")
+            if key.endswith(f"_{report_id}.json")
+        ]
+        if status == "SUCCEEDED"
+        else []
+    )
+    if running:
+        body = json.dumps({"status": "Running"})
+    elif published:
+        # History keys start with a reversed timestamp, the latest first
+        body = download_from_s3(published[0], bucket_name=bucket_name)
+    else:
+        body = json.dumps(
+            {
+                "status": "Failed",
+                "reportID": report_id,
+                "errorCode": "ExecutionAlreadyExists",
+                "errorMessage": f"Execution {name} already ended: {status}",
+                "failureTime": datetime.now().isoformat(),
+            }
+        )
+    client.put_object(Bucket=bucket_name, Key=f"{report_id}/summary.json", Body=body)
+    logger.info(
+        "Reconciled queued report with its execution",
+        extra={"report_id": report_id, "execution_status": status},
+    )
+    return running
+
+
+def queue_position(report_id: str, bucket_name: str) -> int | None:
+    """
+    Position of a report in the queue.
+
+    Parameters
+    ----------
+    report_id : str
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    int or None
+        1 for the next report to start, None if the report isn't queued
+    """
+    for position, key in enumerate(list_s3_keys(bucket_name, queue_directory)):
+        if key.endswith(f"-{report_id}.json"):
+            return position + 1
+    return None
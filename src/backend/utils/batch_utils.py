@@ -0,0 +1,161 @@
+"""Plan of a report's batches and their completion markers.
+
+The initializer stores the batches of a report in ``<report_id>/plan.json``.
+Each generator writes its analysis to ``single_analysis/<report_id>/<batch
+id>.csv``, a retried batch overwrites its own output, then a ``<batch
+id>.json`` marker holding its result. Resuming a report only runs the batches
+without a marker, or whose marker lists failed functions.
+"""
+
+import json
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from backend.utils.multithread_utils import stream_map
+from backend.utils.s3_utils import download_from_s3, list_s3_keys, upload_file_to_s3
+
+logger = Logger()
+
+plan_file_name = "plan.json"
+
+
+def batch_directory(report_id: Any) -> str:
+    """
+    Directory of the per-batch outputs of a report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+
+    Returns
+    -------
+    str
+        Directory path within the bucket
+    """
+    return f"single_analysis/{report_id}"
+
+
+def upload_plan(report_id: Any, bucket_name: str, plan: dict[str, Any]) -> None:
+    """
+    Store the plan of a report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+    plan : dict
+        start_date, end_date and the batches with their batch_id
+    """
+    upload_file_to_s3(
+        body=json.dumps(plan),
+        file_name=plan_file_name,
+        bucket_name=bucket_name,
+        directory=str(report_id),
+    )
+
+
+def load_plan(report_id: Any, bucket_name: str) -> dict[str, Any] | None:
+    """
+    Read the plan of a report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    dict or None
+        Plan of the report, None if it was planned without one
+    """
+    try:
+        plan: dict[str, Any] = json.loads(
+            download_from_s3(
+                plan_file_name, bucket_name=bucket_name, directory=str(report_id)
+            )
+        )
+        return plan
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        return None
+
+
+def upload_batch_marker(result: dict[str, Any], bucket_name: str) -> None:
+    """
+    Mark a batch as done, once its output was uploaded.
+
+    Parameters
+    ----------
+    result : dict
+        Generator result, with batch_id and the location of the output
+    bucket_name : str
+        S3 bucket name
+    """
+    upload_file_to_s3(
+        body=json.dumps(result),
+        file_name=f"{result['batch_id']}.json",
+        bucket_name=bucket_name,
+        directory=result["directory"],
+    )
+
+
+def load_batch_markers(report_id: Any, bucket_name: str) -> dict[str, dict[str, Any]]:
+    """
+    Read the markers of the batches whose output exists.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    dict
+        Batch ID to generator result
+    """
+    keys = set(list_s3_keys(bucket_name, batch_directory(report_id)))
+    marker_keys = [key for key in sorted(keys) if key.endswith(".json")]
+    markers = {}
+    for result in stream_map(
+        lambda key: json.loads(download_from_s3(key, bucket_name=bucket_name)),
+        marker_keys,
+        max_workers=10,
+    ):
+        if not result.ok:
+            logger.warning(
+                "Failed to read batch marker",
+                extra={"key": result.item, "error": str(result.error)},
+            )
+            continue
+        marker = result.value
+        # Output deleted since, the batch runs again
+        if f"{marker['directory']}/{marker['filename']}" in keys:
+            markers[marker["batch_id"]] = marker
+    return markers
+
+
+def is_batch_complete(marker: dict[str, Any] | None) -> bool:
+    """
+    Check whether a batch needs no new run.
+
+    Parameters
+    ----------
+    marker : dict, optional
+        Marker of the batch, if any
+
+    Returns
+    -------
+    bool
+        Whether the batch output exists and covers every function
+    """
+    return marker is not None and not marker.get("failed_functions")
@@ -0,0 +1,95 @@
+"""Thread-safe circuit breaker for throttled APIs."""
+
+import threading
+import time
+
+from aws_lambda_powertools import Logger
+
+logger = Logger()
+
+
+class CircuitBreaker:
+    """
+    Stop new calls while an API keeps throttling.
+
+    After ``failure_threshold`` throttles in a row the circuit opens: callers
+    of ``wait`` block until the cooldown elapsed. The next throttle after a
+    cooldown reopens it right away for twice as long, up to ``max_cooldown``,
+    and a successful call closes it.
+
+    Parameters
+    ----------
+    failure_threshold : int, default=5
+        Throttles in a row opening the circuit
+    cooldown : float, default=30.0
+        Seconds the circuit first stays open
+    max_cooldown : float, default=300.0
+        Longest time the circuit stays open
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """bool: Whether new calls are stopped."""
+        return time.monotonic() < self.open_until
+
+    def wait(self, cancel: threading.Event | None = None) -> float:
+        """
+        Block until the circuit is closed.
+
+        Parameters
+        ----------
+        cancel : threading.Event, optional
+            Ends the wait when set, the circuit may still be open
+
+        Returns
+        -------
+        float
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                wait_time = self.open_until - time.monotonic()
+            if wait_time <= 0:
+                return waited
+            if cancel is None:
+                time.sleep(wait_time)
+            elif cancel.wait(wait_time):
+                return waited
+            waited += wait_time
+
+    def record_throttle(self) -> None:
+        """Record a throttled call, opening the circuit past the threshold."""
+        with self.lock:
+            self.failures += 1
+            now = time.monotonic()
+            if self.failures < self.failure_threshold or now < self.open_until:
+                return
+            self.open_until = now + self.cooldown
+            logger.warning(
+                "Circuit opened after repeated throttling",
+                extra={"cooldown": self.cooldown, "failures": self.failures},
+            )
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            # On probation after the cooldown: one more throttle reopens it
+            self.failures = self.failure_threshold - 1
+
+    def record_success(self) -> None:
+        """Record a call that wasn't throttled, closing the circuit."""
+        with self.lock:
+            self.failures = 0
+            self.cooldown = self.base_cooldown
@@ -0,0 +1,141 @@
+"""Batching functions by the log group they write to.
+
+Functions with advanced logging controls can share a custom log group. The
+generator scans such a group once for all the functions of its batch that log
+to it (see ``analysis_generator.get_shared_log_group_costs``), so planning puts
+them in the same batch instead of cutting batches in selection order.
+"""
+
+from typing import Any
+
+from aws_lambda_powertools import Logger
+
+from backend.utils.multithread_utils import stream_map
+from backend.utils.sf_utils import divide_list
+from backend.utils.target_utils import get_client
+
+logger = Logger()
+
+lookup_workers = 5
+
+
+def lookup_log_groups(
+    lambda_names: list[Any], target: dict[str, Any] | None = None
+) -> list[str | None]:
+    """
+    Look up the log group of functions.
+
+    Lookup failures are left to the generator, which reports the functions
+    it can't analyze.
+
+    Parameters
+    ----------
+    lambda_names : list
+        Lambda function names
+    target : dict, optional
+        Account role and region of the functions, local account if not set
+
+    Returns
+    -------
+    list of str or None
+        Log group of each function, None if its lookup failed
+    """
+    lambda_client = get_client("lambda", target)
+    log_groups: list[str | None] = []
+    failed = 0
+    for result in stream_map(
+        lambda lambda_name: lambda_client.get_function_configuration(
+            FunctionName=lambda_name
+        ),
+        lambda_names,
+        max_workers=lookup_workers,
+        ordered=True,
+    ):
+        if not result.ok:
+            failed += 1
+            log_groups.append(None)
+            continue
+        # Functions without advanced logging controls log to the default group
+        log_groups.append(
+            result.value.get("LoggingConfig", {}).get(
+                "LogGroup", f"/aws/lambda/{result.item}"
+            )
+        )
+    if failed:
+        logger.warning(
+            "Failed to look up the log group of functions",
+            extra={"num_failed": failed, "num_functions": len(lambda_names)},
+        )
+    return log_groups
+
+
+def group_by_log_group(
+    lambda_names: list[Any], log_groups: list[str | None]
+) -> list[list[Any]]:
+    """
+    Group the functions sharing a log group.
+
+    Parameters
+    ----------
+    lambda_names : list
+        Lambda function names
+    log_groups : list of str or None
+        Log group of each function, None if unknown
+
+    Returns
+    -------
+    list of list
+        Function names of each log group, in selection order. Functions whose
+        log group is unknown are on their own
+    """
+    groups: dict[tuple[bool, Any], list[Any]] = {}
+    for index, (lambda_name, log_group) in enumerate(zip(lambda_names, log_groups)):
+        key = (True, log_group) if log_group is not None else (False, index)
+        groups.setdefault(key, []).append(lambda_name)
+    return list(groups.values())
+
+
+def divide_by_log_group(
+    lambda_names: list[Any], log_groups: list[str | None], batch_size: int
+) -> list[list[Any]]:
+    """
+    Divide functions into batches, those sharing a log group together.
+
+    The functions of a shared log group fill batches of their own, up to
+    ``batch_size``. The other functions then fill the remaining room in
+    selection order, so without shared log groups the batches are those of
+    ``divide_list``.
+
+    Parameters
+    ----------
+    lambda_names : list
+        Lambda function names
+    log_groups : list of str or None
+        Log group of each function, None if unknown
+    batch_size : int
+        Maximum functions per batch
+
+    Returns
+    -------
+    list of list
+        Function names of each batch
+    """
+    groups = group_by_log_group(lambda_names, log_groups)
+    units = [
+        chunk
+        for group in groups
+        if len(group) > 1
+        for chunk in divide_list(group, batch_size)
+    ]
+    units.extend(group for group in groups if len(group) == 1)
+    batches: list[list[Any]] = []
+    for unit in units:
+        batch = next(
+            (batch for batch in batches if len(batch) + len(unit) <= batch_size),
+            None,
+        )
+        if batch is None:
+            batches.append(list(unit))
+        else:
+            batch.extend(unit)
+    return batches
@@ -0,0 +1,181 @@
+"""Pipeline metrics published as CloudWatch Embedded Metric Format.
+
+Handlers decorate themselves with ``metrics.log_metrics``, which prints the
+metrics recorded during the invocation as one EMF log line, turned into
+CloudWatch metrics without any PutMetricData call. Besides the metrics recorded
+by the handlers, ``instrument_client`` counts the API calls, retries and
+throttles of every operation of a boto3 client and the bytes it moves to and
+from S3. Request counts are also kept in ``api_requests`` for cost accounting.
+"""
+
+import functools
+import os
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, TypeVar
+
+from aws_lambda_powertools import Metrics
+from aws_lambda_powertools.metrics import MetricUnit
+
+# Set by the CDK construct, the default keeps metrics valid in tests and scripts
+metrics = Metrics(
+    namespace=os.environ.get("POWERTOOLS_METRICS_NAMESPACE", "LambdaCostAnalysis")
+)
+
+# Error codes botocore retries as throttling
+throttling_error_codes = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "ProvisionedThroughputExceededException",
+    "TransactionInProgressException",
+    "RequestLimitExceeded",
+    "BandwidthLimitExceeded",
+    "LimitExceededException",
+    "RequestThrottled",
+    "SlowDown",
+    "EC2ThrottledException",
+}
+s3_upload_operations = ["PutObject", "UploadPart"]
+
+# Worker threads record metrics concurrently and a full metric set is flushed
+# from within add_metric
+lock = threading.Lock()
+
+# Requests sent per "<service>.<operation>" since the process started, retries
+# included
+api_requests: Counter[str] = Counter()
+
+Handler = TypeVar("Handler", bound=Callable[..., Any])
+
+
+def record_metric(name: str, unit: MetricUnit, value: float) -> None:
+    """
+    Record a metric value, published when the handler returns.
+
+    Parameters
+    ----------
+    name : str
+        Metric name
+    unit : MetricUnit
+        Metric unit
+    value : float
+        Metric value
+    """
+    with lock:
+        metrics.add_metric(name=name, unit=unit, value=value)
+
+
+def add_report_dimension(report_id: Any) -> None:
+    """
+    Publish the metrics of the invocation per report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier, no dimension if not set
+    """
+    if report_id:
+        metrics.add_dimension(name="report_id", value=str(report_id))
+
+
+def timed_stage(stage: str) -> Callable[[Handler], Handler]:
+    """
+    Record the duration of a pipeline stage, failed runs included.
+
+    Parameters
+    ----------
+    stage : str
+        Stage name, the metric is ``<stage>Duration``
+
+    Returns
+    -------
+    Callable
+        Decorator of the stage handler
+    """
+
+    def decorator(handler: Handler) -> Handler:
+        @functools.wraps(handler)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                record_metric(
+                    f"{stage}Duration",
+                    MetricUnit.Milliseconds,
+                    (time.perf_counter() - started) * 1000,
+                )
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def instrument_client(client: Any) -> Any:
+    """
+    Record the calls, retries, throttles and S3 bytes of a boto3 client.
+
+    Metrics are named after the operation, e.g. ``StartQueryCalls``,
+    ``StartQueryRetries`` and ``StartQueryThrottles``. Throttles count every
+    throttled attempt, retried or not.
+
+    Parameters
+    ----------
+    client : botocore.client.BaseClient
+        Client to instrument
+
+    Returns
+    -------
+    botocore.client.BaseClient
+        The same client
+    """
+    events = client.meta.events
+    events.register("after-call", count_call)
+    events.register("needs-retry", count_throttle)
+    for operation in s3_upload_operations:
+        events.register(f"before-parameter-build.s3.{operation}", count_upload)
+    events.register("after-call.s3.GetObject", count_download)
+    return client
+
+
+def count_call(parsed: dict[str, Any], model: Any, **kwargs: Any) -> None:
+    """Record an API call and its retries (botocore ``after-call`` handler)."""
+    record_metric(f"{model.name}Calls", MetricUnit.Count, 1)
+    retries = parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+    with lock:
+        # Every attempt is a billed request
+        api_requests[f"{model.service_model.service_name}.{model.name}"] += 1 + retries
+    if retries:
+        record_metric(f"{model.name}Retries", MetricUnit.Count, retries)
+
+
+def count_throttle(response: Any, operation: Any, **kwargs: Any) -> None:
+    """Record a throttled attempt (botocore ``needs-retry`` handler)."""
+    if response is None:
+        return
+    error_code = response[1].get("Error", {}).get("Code")
+    if error_code in throttling_error_codes:
+        record_metric(f"{operation.name}Throttles", MetricUnit.Count, 1)
+
+
+def count_upload(params: dict[str, Any], **kwargs: Any) -> None:
+    """Record the bytes uploaded to S3 (botocore ``before-parameter-build``)."""
+    body = params.get("Body")
+    if isinstance(body, str):
+        size = len(body.encode("utf-8"))
+    elif isinstance(body, (bytes, bytearray)):
+        size = len(body)
+    else:
+        # File objects are streamed, their size isn't known without reading them
+        return
+    record_metric("S3BytesUploaded", MetricUnit.Bytes, size)
+
+
+def count_download(parsed: dict[str, Any], **kwargs: Any) -> None:
+    """Record the bytes downloaded from S3 (botocore ``after-call`` handler)."""
+    if "ContentLength" in parsed:
+        record_metric("S3BytesDownloaded", MetricUnit.Bytes, parsed["ContentLength"])
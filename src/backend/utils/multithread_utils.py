@@ -1,7 +1,388 @@
-"""Multithreading utility for parallel execution."""
+"""Multithreading utility for parallel execution.
+
+``stream_map`` runs a function over an iterable on a bounded thread pool and
+yields one ``TaskResult`` per item, either as tasks complete or in input order.
+Items are pulled from the iterable lazily, so at most ``max_pending`` tasks are
+buffered at any time, and a failing or timed out task only affects its own
+result.
+"""
 
 import concurrent.futures
-from typing import Any, Callable, Iterable
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator
+
+from backend.utils.rate_limit_utils import RateLimiter
+
+
+class TaskTimeoutError(TimeoutError):
+    """Raised for a task that ran longer than its timeout."""
+
+
+@dataclass
+class TaskResult:
+    """
+    Outcome of a single task.
+
+    Parameters
+    ----------
+    index : int
+        Position of the item in the input iterable
+    item : Any
+        Item the task ran on
+    value : Any, optional
+        Return value of the task, if it succeeded
+    error : BaseException, optional
+        Exception raised by the task, or TaskTimeoutError if it timed out
+    queue_wait : float, default=0.0
+        Seconds between submission and start, including rate limiting
+    run_time : float, default=0.0
+        Seconds the task ran for
+    """
+
+    index: int
+    item: Any
+    value: Any = None
+    error: BaseException | None = None
+    queue_wait: float = 0.0
+    run_time: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """bool: Whether the task succeeded."""
+        return self.error is None
+
+    def result(self) -> Any:
+        """
+        Get the task return value.
+
+        Returns
+        -------
+        Any
+            Return value of the task
+
+        Raises
+        ------
+        BaseException
+            The exception raised by the task, if it failed
+        """
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+@dataclass
+class ExecutorStats:
+    """
+    Queue-wait and run-time statistics of a ``stream_map`` call.
+
+    Parameters
+    ----------
+    submitted : int, default=0
+        Number of tasks submitted
+    succeeded : int, default=0
+        Number of tasks that succeeded
+    failed : int, default=0
+        Number of tasks that raised, timed out tasks excluded
+    timed_out : int, default=0
+        Number of tasks that exceeded their timeout
+    queue_wait_total : float, default=0.0
+        Total seconds tasks waited before starting
+    queue_wait_max : float, default=0.0
+        Longest wait of a task before starting
+    run_time_total : float, default=0.0
+        Total seconds tasks ran for
+    run_time_max : float, default=0.0
+        Longest run time of a task
+    """
+
+    submitted: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    queue_wait_total: float = 0.0
+    queue_wait_max: float = 0.0
+    run_time_total: float = 0.0
+    run_time_max: float = 0.0
+
+    def record(self, result: TaskResult) -> None:
+        """
+        Account for a finished task.
+
+        Parameters
+        ----------
+        result : TaskResult
+            Result of the task
+        """
+        if result.ok:
+            self.succeeded += 1
+        elif isinstance(result.error, TaskTimeoutError):
+            self.timed_out += 1
+        else:
+            self.failed += 1
+        self.queue_wait_total += result.queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, result.queue_wait)
+        self.run_time_total += result.run_time
+        self.run_time_max = max(self.run_time_max, result.run_time)
+
+    def as_dict(self) -> dict[str, Any]:
+        """
+        Export the statistics, e.g. as structured log fields.
+
+        Returns
+        -------
+        dict
+            Counters and timings rounded to the millisecond
+        """
+        finished = max(self.succeeded + self.failed + self.timed_out, 1)
+        return {
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "timedOut": self.timed_out,
+            "avgQueueWait": round(self.queue_wait_total / finished, 3),
+            "maxQueueWait": round(self.queue_wait_max, 3),
+            "avgRunTime": round(self.run_time_total / finished, 3),
+            "maxRunTime": round(self.run_time_max, 3),
+        }
+
+
+@dataclass
+class Task:
+    """
+    Bookkeeping of a submitted task.
+
+    Parameters
+    ----------
+    index : int
+        Position of the item in the input iterable
+    item : Any
+        Item the task runs on
+    submitted_at : float
+        Monotonic submission time
+    started_at : float, optional
+        Monotonic start time, set by the worker thread
+    """
+
+    index: int
+    item: Any
+    submitted_at: float
+    started_at: float | None = field(default=None)
+
+
+def run_task(
+    function: Callable[[Any], Any], task: Task, rate_limiter: RateLimiter | None
+) -> Any:
+    """
+    Run a task in a worker thread.
+
+    Parameters
+    ----------
+    function : Callable
+        Function to execute
+    task : Task
+        Task to run
+    rate_limiter : RateLimiter, optional
+        Rate limiter to acquire before running
+
+    Returns
+    -------
+    Any
+        Return value of the function
+    """
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    task.started_at = time.monotonic()
+    return function(task.item)
+
+
+def stream_map(
+    function: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = 50,
+    ordered: bool = False,
+    timeout: float | None = None,
+    rate_limiter: RateLimiter | None = None,
+    max_pending: int | None = None,
+    stats: ExecutorStats | None = None,
+) -> Iterator[TaskResult]:
+    """
+    Execute function on multiple items in parallel, streaming the results.
+
+    Threads can't be interrupted, so a timed out task is reported as failed
+    right away but keeps its worker busy until it returns.
+
+    Parameters
+    ----------
+    function : Callable
+        Function to execute, called with one item
+    items : Iterable
+        Items to process, consumed lazily
+    max_workers : int, default=50
+        Maximum number of worker threads
+    ordered : bool, default=False
+        Whether to yield results in input order instead of completion order
+    timeout : float, optional
+        Maximum run time of a task in seconds, unlimited if not set
+    rate_limiter : RateLimiter, optional
+        Rate limiter, possibly shared with other callers, acquired by every
+        task before it starts
+    max_pending : int, optional
+        Maximum number of tasks submitted but not yielded yet, twice
+        ``max_workers`` if not set
+    stats : ExecutorStats, optional
+        Statistics to update as tasks finish
+
+    Yields
+    ------
+    TaskResult
+        Result of each task, failures included
+    """
+    max_pending = max_pending or 2 * max_workers
+    stats = stats if stats is not None else ExecutorStats()
+    iterator = enumerate(items)
+    running: dict[concurrent.futures.Future[Any], Task] = {}
+    finished: dict[int, TaskResult] = {}
+    next_index = 0
+    exhausted = False
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            while not exhausted and len(running) + len(finished) < max_pending:
+                try:
+                    index, item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                task = Task(index, item, time.monotonic())
+                running[executor.submit(run_task, function, task, rate_limiter)] = task
+                stats.submitted += 1
+            if not running and not finished:
+                return
+
+            done, deadline = wait_running(running, timeout)
+            for future in done:
+                result = collect(running.pop(future), future, timeout)
+                stats.record(result)
+                finished[result.index] = result
+            if timeout is not None:
+                for future, task in list(running.items()):
+                    if task.started_at is not None and deadline >= task.started_at:
+                        # The worker keeps running, its outcome is dropped
+                        del running[future]
+                        result = timed_out(task, timeout)
+                        stats.record(result)
+                        finished[result.index] = result
+
+            if ordered:
+                while next_index in finished:
+                    yield finished.pop(next_index)
+                    next_index += 1
+            else:
+                for index in list(finished):
+                    yield finished.pop(index)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def wait_running(
+    running: dict[concurrent.futures.Future[Any], Task], timeout: float | None
+) -> tuple[set[concurrent.futures.Future[Any]], float]:
+    """
+    Wait until a task completes or the earliest running task times out.
+
+    Parameters
+    ----------
+    running : dict
+        Futures of the running tasks
+    timeout : float, optional
+        Maximum run time of a task in seconds
+
+    Returns
+    -------
+    tuple
+        Completed futures, and the start time before which running tasks have
+        timed out
+    """
+    if not running:
+        return set(), float("-inf")
+    wait_seconds = None
+    if timeout is not None:
+        started = [t.started_at for t in running.values() if t.started_at is not None]
+        # Tasks still queued are re-checked at least once per timeout
+        earliest = min(started, default=time.monotonic())
+        wait_seconds = max(earliest + timeout - time.monotonic(), 0)
+    done, _ = concurrent.futures.wait(
+        running,
+        timeout=wait_seconds,
+        return_when=concurrent.futures.FIRST_COMPLETED,
+    )
+    return done, time.monotonic() - (timeout or 0)
+
+
+def collect(
+    task: Task, future: concurrent.futures.Future[Any], timeout: float | None
+) -> TaskResult:
+    """
+    Build the result of a completed task.
+
+    Parameters
+    ----------
+    task : Task
+        Completed task
+    future : Future
+        Future of the task
+    timeout : float, optional
+        Maximum run time of a task in seconds
+
+    Returns
+    -------
+    TaskResult
+        Result of the task
+    """
+    now = time.monotonic()
+    started_at = task.started_at if task.started_at is not None else now
+    result = TaskResult(
+        index=task.index,
+        item=task.item,
+        queue_wait=started_at - task.submitted_at,
+        run_time=now - started_at,
+    )
+    error = future.exception()
+    if error is not None:
+        result.error = error
+    elif timeout is not None and result.run_time > timeout:
+        result.error = TaskTimeoutError(f"Task {task.index} exceeded {timeout}s")
+    else:
+        result.value = future.result()
+    return result
+
+
+def timed_out(task: Task, timeout: float) -> TaskResult:
+    """
+    Build the result of a task that exceeded its timeout.
+
+    Parameters
+    ----------
+    task : Task
+        Running task
+    timeout : float
+        Maximum run time of a task in seconds
+
+    Returns
+    -------
+    TaskResult
+        Failed result carrying a TaskTimeoutError
+    """
+    started_at = task.started_at if task.started_at is not None else time.monotonic()
+    return TaskResult(
+        index=task.index,
+        item=task.item,
+        error=TaskTimeoutError(f"Task {task.index} exceeded {timeout}s"),
+        queue_wait=started_at - task.submitted_at,
+        run_time=time.monotonic() - started_at,
+    )
 
 
 def multi_thread(
@@ -30,16 +411,14 @@ def multi_thread(
     Returns
     -------
     list
-        Results from all executions
+        Results from all executions, in input order
     """
-    results: list[Any] = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [
-            executor.submit(function, iterator, *args, **kwargs)
-            for iterator in iterators
-        ]
-
-    for future in concurrent.futures.as_completed(futures):
-        results.append(future.result())
-
-    return results
+    return [
+        result.result()
+        for result in stream_map(
+            lambda item: function(item, *args, **kwargs),
+            iterators,
+            max_workers=max_workers,
+            ordered=True,
+        )
+    ]
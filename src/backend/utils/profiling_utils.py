@@ -0,0 +1,310 @@
+"""On-demand CPU and memory profiling of Lambda handlers.
+
+Handlers decorated with ``profiled`` run under cProfile and/or tracemalloc when
+asked to, and upload the results next to the report, under
+``<report_id>/profiles/`` (``profiles/<stage>/`` for requests without a report):
+
+- ``<name>.prof``: cProfile statistics, to open with ``pstats`` or snakeviz
+- ``<name>.cpu.txt``: functions with the highest cumulative time
+- ``<name>.memory.txt``: peak traced memory and the top sites of the
+  allocations still alive when the handler returns. Memory freed before that,
+  such as the DataFrames of a stage, counts in the peak but its allocation
+  sites aren't listed
+
+Profiling is requested:
+
+- for every invocation through the ``PROFILING_MODES`` environment variable
+  (``cpu``, ``memory`` or ``cpu,memory``), sampled with
+  ``PROFILING_SAMPLE_RATE`` (0 to 1, default 1) so it can stay on in
+  production at a low cost
+- for one invocation with a ``profile`` key in the event (``true`` for both
+  modes or a list of modes), or an ``X-Profile`` header for API requests. The
+  request must carry the ``PROFILING_TOKEN`` secret of the function, in a
+  ``profile_token`` key or an ``X-Profile-Token`` header: start requests end
+  up in the execution input and any client can send headers. Without the
+  variable only the environment flag profiles
+"""
+
+import cProfile
+import functools
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, TypeVar
+
+from aws_lambda_powertools import Logger
+
+from backend.utils.s3_utils import upload_file_to_s3
+
+logger = Logger()
+
+profiling_modes = ["cpu", "memory"]
+# Frames kept per allocation, more frames make tracemalloc slower
+traceback_frames = 5
+top_functions = 40
+top_allocations = 25
+
+Handler = TypeVar("Handler", bound=Callable[..., Any])
+
+
+def requested_modes(event: Any) -> list[str]:
+    """
+    Find the profiling modes requested for an invocation.
+
+    Parameters
+    ----------
+    event : Any
+        Lambda event, a list of events for the aggregator
+
+    Returns
+    -------
+    list of str
+        Profiling modes, empty to run without profiling
+    """
+    first_event = event[0] if isinstance(event, list) and event else event
+    if not isinstance(first_event, dict):
+        return []
+    headers = {
+        name.lower(): value
+        for name, value in (first_event.get("headers") or {}).items()
+    }
+    flag = first_event.get("profile") or headers.get("x-profile")
+    token = first_event.get("profile_token") or headers.get("x-profile-token")
+    if flag and valid_token(token):
+        return parse_modes(flag)
+
+    modes = parse_modes(os.environ.get("PROFILING_MODES", ""))
+    sample_rate = float(os.environ.get("PROFILING_SAMPLE_RATE", "1"))
+    if modes and random.random() < sample_rate:
+        return modes
+    return []
+
+
+def valid_token(token: Any) -> bool:
+    """
+    Check the secret a profiling request carries.
+
+    Parameters
+    ----------
+    token : Any
+        Token of the request
+
+    Returns
+    -------
+    bool
+        True if it matches a set ``PROFILING_TOKEN``
+    """
+    secret = os.environ.get("PROFILING_TOKEN", "")
+    if not secret or not isinstance(token, str):
+        return False
+    return hmac.compare_digest(token.encode(), secret.encode())
+
+
+def parse_modes(flag: Any) -> list[str]:
+    """
+    Parse a profiling flag.
+
+    Parameters
+    ----------
+    flag : Any
+        ``true`` for every mode, a comma separated string or a list of modes
+
+    Returns
+    -------
+    list of str
+        Known modes of the flag
+    """
+    if flag is True or str(flag).lower() == "true":
+        return list(profiling_modes)
+    if isinstance(flag, str):
+        flag = flag.split(",")
+    if not isinstance(flag, list):
+        return []
+    return [mode for mode in profiling_modes if mode in [str(m).strip() for m in flag]]
+
+
+def event_report_id(event: Any) -> str | None:
+    """
+    Find the report an event belongs to.
+
+    Parameters
+    ----------
+    event : Any
+        Lambda event of a step function stage or API Gateway event
+
+    Returns
+    -------
+    str or None
+        Report identifier, None if the event has none
+    """
+    first_event = event[0] if isinstance(event, list) and event else event
+    if not isinstance(first_event, dict):
+        return None
+    report_id = first_event.get("report_id") or (
+        first_event.get("error_output") or {}
+    ).get("report_id")
+    report_id = report_id or (first_event.get("queryStringParameters") or {}).get(
+        "reportID"
+    )
+    return str(report_id) if report_id else None
+
+
+def profiled(stage: str, bucket_name: str) -> Callable[[Handler], Handler]:
+    """
+    Profile a Lambda handler when requested.
+
+    Parameters
+    ----------
+    stage : str
+        Stage name, part of the profile file names
+    bucket_name : str
+        S3 bucket the profiles are uploaded to
+
+    Returns
+    -------
+    Callable
+        Decorator of the handler, called with (event, context)
+    """
+
+    def decorator(handler: Handler) -> Handler:
+        @functools.wraps(handler)
+        def wrapper(event: Any, context: Any) -> Any:
+            modes = requested_modes(event)
+            if not modes:
+                return handler(event, context)
+
+            profiler = cProfile.Profile() if "cpu" in modes else None
+            if "memory" in modes:
+                tracemalloc.start(traceback_frames)
+            started = time.perf_counter()
+            if profiler:
+                profiler.enable()
+            try:
+                return handler(event, context)
+            finally:
+                if profiler:
+                    profiler.disable()
+                elapsed = time.perf_counter() - started
+                upload_profiles(stage, event, bucket_name, profiler, elapsed)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def upload_profiles(
+    stage: str,
+    event: Any,
+    bucket_name: str,
+    profiler: cProfile.Profile | None,
+    elapsed: float,
+) -> None:
+    """
+    Stop tracing memory and upload the profiles of an invocation.
+
+    Upload failures are logged, they never fail the invocation.
+
+    Parameters
+    ----------
+    stage : str
+        Stage name
+    event : Any
+        Lambda event
+    bucket_name : str
+        S3 bucket name
+    profiler : cProfile.Profile, optional
+        Disabled CPU profiler, None if the CPU wasn't profiled
+    elapsed : float
+        Duration of the invocation in seconds
+    """
+    files: dict[str, str | bytes] = {}
+    if profiler:
+        profiler.create_stats()
+        # Same format as cProfile.Profile.dump_stats
+        files["prof"] = marshal.dumps(profiler.stats)
+        files["cpu.txt"] = cpu_summary(profiler, elapsed)
+    if tracemalloc.is_tracing():
+        files["memory.txt"] = memory_summary(tracemalloc.take_snapshot(), elapsed)
+        tracemalloc.stop()
+
+    report_id = event_report_id(event)
+    directory = f"{report_id}/profiles" if report_id else f"profiles/{stage}"
+    name = f"{stage}-{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    try:
+        for extension, body in files.items():
+            upload_file_to_s3(
+                body=body,
+                file_name=f"{name}.{extension}",
+                bucket_name=bucket_name,
+                directory=directory,
+            )
+        logger.info(
+            "Uploaded profiles",
+            extra={"directory": directory, "profile": name, "files": list(files)},
+        )
+    except Exception as e:
+        logger.warning(
+            "Failed to upload profiles", extra={"profile": name, "exception": str(e)}
+        )
+
+
+def cpu_summary(profiler: cProfile.Profile, elapsed: float) -> str:
+    """
+    Summarize a CPU profile.
+
+    Parameters
+    ----------
+    profiler : cProfile.Profile
+        Disabled profiler
+    elapsed : float
+        Duration of the invocation in seconds
+
+    Returns
+    -------
+    str
+        Functions with the highest cumulative time
+    """
+    stream = io.StringIO()
+    stream.write(f"Invocation time: {elapsed:.3f}s\n")
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(
+        top_functions
+    )
+    return stream.getvalue()
+
+
+def memory_summary(snapshot: tracemalloc.Snapshot, elapsed: float) -> str:
+    """
+    Summarize a memory snapshot.
+
+    The snapshot is taken when the handler returns: the peak covers the whole
+    invocation, the allocation sites only what is still alive at the end.
+
+    Parameters
+    ----------
+    snapshot : tracemalloc.Snapshot
+        Allocations still alive at the end of the invocation
+    elapsed : float
+        Duration of the invocation in seconds
+
+    Returns
+    -------
+    str
+        Current and peak traced memory, then the top allocation sites
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [
+        f"Invocation time: {elapsed:.3f}s",
+        f"Traced memory: {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB",
+        "",
+        f"Top {top_allocations} sites of the allocations alive at the end:",
+    ]
+    for statistic in snapshot.statistics("traceback")[:top_allocations]:
+        lines.append(f"{statistic.size / 2**10:.1f} KiB in {statistic.count} blocks")
+        lines.extend(f"    {line}" for line in statistic.traceback.format())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,237 @@
+"""Progress of a running report, updated as its batches complete.
+
+``<report_id>/progress.json`` holds what each completed batch contributed,
+keyed by batch, so a batch that runs again replaces its contribution instead
+of adding to it, and the totals derived from them. Generators update it with
+conditional writes, retried when another generator updated it in between.
+
+Every recorded contribution gets the next ``sequence`` number of the report,
+kept across resumed runs, so clients polling a running report only fetch the
+batches recorded since their last poll.
+"""
+
+import json
+import random
+import time
+from datetime import datetime
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from backend.utils.s3_utils import client
+
+logger = Logger()
+
+progress_file_name = "progress.json"
+# Columns of the function rows summed into the running totals
+progress_total_fields = [
+    "totalCost",
+    "potentialSavings",
+    "countInvocations",
+    "timeoutInvocations",
+    "analysisCost",
+]
+lost_race_error_codes = {"PreconditionFailed", "ConditionalRequestConflict"}
+
+
+def batch_contribution(
+    result: dict[str, Any], function_costs: list[dict[str, Any]]
+) -> dict[str, Any]:
+    """
+    Summarize the output of a batch for the report progress.
+
+    Parameters
+    ----------
+    result : dict
+        Generator result, with the location of the batch output
+    function_costs : list of dict
+        Rows of the batch
+
+    Returns
+    -------
+    dict
+        Batch output location, functions analyzed and failed, and totals
+    """
+    return {
+        "filename": result["filename"],
+        "directory": result["directory"],
+        "functions": len(function_costs),
+        "failed": len(result.get("failed_functions", [])),
+        "totals": {
+            field: sum(float(row.get(field) or 0) for row in function_costs)
+            for field in progress_total_fields
+        },
+    }
+
+
+def summarize_progress(progress: dict[str, Any]) -> dict[str, Any]:
+    """
+    Derive the counts and totals of a progress document from its batches.
+
+    Parameters
+    ----------
+    progress : dict
+        Progress document, updated in place
+
+    Returns
+    -------
+    dict
+        The progress document
+    """
+    batches = progress.setdefault("batches", {}).values()
+    progress["batchesDone"] = len(batches)
+    progress["functionsAnalyzed"] = sum(batch["functions"] for batch in batches)
+    progress["functionsFailed"] = sum(batch["failed"] for batch in batches)
+    progress["totals"] = {
+        field: sum(batch["totals"][field] for batch in batches)
+        for field in progress_total_fields
+    }
+    progress["updatedAt"] = datetime.now().isoformat()
+    return progress
+
+
+def start_progress(
+    report_id: Any,
+    bucket_name: str,
+    batches_total: int,
+    kept_batches: dict[str, Any] | None = None,
+    sequence: int = 0,
+) -> None:
+    """
+    Write the progress of a report starting to run.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+    batches_total : int
+        Batches of the report
+    kept_batches : dict, optional
+        Contributions of the batches kept from an earlier run
+    sequence : int, default=0
+        Sequence number of the last contribution of an earlier run
+    """
+    progress = summarize_progress(
+        {
+            "batchesTotal": batches_total,
+            "batches": dict(kept_batches or {}),
+            "sequence": sequence,
+        }
+    )
+    client.put_object(
+        Bucket=bucket_name,
+        Key=f"{report_id}/{progress_file_name}",
+        Body=json.dumps(progress),
+        ContentType="application/json",
+    )
+
+
+def load_progress(
+    report_id: Any, bucket_name: str
+) -> tuple[dict[str, Any], str] | None:
+    """
+    Read the progress of a report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    tuple or None
+        Progress document and its ETag, None if the report has none
+    """
+    try:
+        response = client.get_object(
+            Bucket=bucket_name, Key=f"{report_id}/{progress_file_name}"
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        return None
+    return json.loads(response["Body"].read()), str(response["ETag"])
+
+
+def record_batch_progress(
+    report_id: Any,
+    bucket_name: str,
+    batch_key: str,
+    contribution: dict[str, Any],
+    attempts: int = 10,
+) -> bool:
+    """
+    Add the contribution of a completed batch to the report progress.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+    batch_key : str
+        Batch identifier, a batch recorded again replaces its contribution
+    contribution : dict
+        Result of ``batch_contribution``
+    attempts : int, default=10
+        Writes tried while other batches update the progress
+
+    Returns
+    -------
+    bool
+        Whether the progress was updated
+    """
+    for attempt in range(attempts):
+        loaded = load_progress(report_id, bucket_name)
+        progress, condition = (
+            (loaded[0], {"IfMatch": loaded[1]})
+            if loaded
+            else ({}, {"IfNoneMatch": "*"})
+        )
+        sequence = progress.get("sequence", 0) + 1
+        progress["sequence"] = sequence
+        progress.setdefault("batches", {})[batch_key] = {
+            **contribution,
+            "sequence": sequence,
+        }
+        try:
+            client.put_object(
+                Bucket=bucket_name,
+                Key=f"{report_id}/{progress_file_name}",
+                Body=json.dumps(summarize_progress(progress)),
+                ContentType="application/json",
+                **condition,
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in lost_race_error_codes:
+                raise
+        # Generators of the same report finish around the same time
+        time.sleep(random.uniform(0, min(1.0, 0.05 * 2**attempt)))
+    logger.warning(
+        "Gave up updating the report progress",
+        extra={"report_id": report_id, "batch": batch_key},
+    )
+    return False
+
+
+def public_progress(progress: dict[str, Any]) -> dict[str, Any]:
+    """
+    Progress served to clients, without the per-batch details.
+
+    Parameters
+    ----------
+    progress : dict
+        Progress document
+
+    Returns
+    -------
+    dict
+        Counts, totals and the sequence number of the last contribution
+    """
+    return {name: value for name, value in progress.items() if name != "batches"}
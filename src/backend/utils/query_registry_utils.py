@@ -0,0 +1,348 @@
+"""Registry of the Logs Insights queries a report has in flight.
+
+Generators register every query they start under
+``<report_id>/queries/<query id>.json`` and remove it once the query ended.
+When a report fails or is cancelled, ``cancel_report_queries`` stops whatever
+is still registered, so queries of batches that were abandoned don't keep
+scanning. A cancelled report also gets a ``cancellation.json`` marker, checked
+by the generators before they start or keep polling a query.
+"""
+
+import json
+import time
+from datetime import datetime
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from backend.utils.multithread_utils import stream_map
+from backend.utils.s3_utils import (
+    client,
+    download_from_s3,
+    list_s3_keys,
+    upload_file_to_s3,
+)
+from backend.utils.target_utils import get_client
+
+logger = Logger()
+
+queries_directory = "queries"
+cancellation_file_name = "cancellation.json"
+# Generators check the cancellation marker at most this often
+cancellation_check_seconds = 10.0
+# Queries that ended on their own, nothing left to stop
+finished_statuses = ["Complete", "Failed", "Cancelled", "Timeout"]
+
+# Report ID -> (monotonic time of the check, cancelled)
+cancellation_checks: dict[str, tuple[float, bool]] = {}
+
+
+class ReportCancelledError(Exception):
+    """Raised by a generator whose report was cancelled."""
+
+
+def register_query(
+    report_id: Any,
+    query_id: str,
+    log_group_name: str,
+    target: dict[str, Any] | None,
+    start_datetime: datetime,
+    end_datetime: datetime,
+    bucket_name: str,
+) -> None:
+    """
+    Record a started query under its report.
+
+    Failures are logged, an unregistered query only can't be cancelled.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report running the query
+    query_id : str
+        Query identifier
+    log_group_name : str
+        Queried log group
+    target : dict, optional
+        Account role and region of the log group
+    start_datetime : datetime
+        Query start time
+    end_datetime : datetime
+        Query end time
+    bucket_name : str
+        S3 bucket name
+    """
+    entry = {
+        "queryId": query_id,
+        "logGroup": log_group_name,
+        "target": target,
+        "startTime": int(start_datetime.timestamp()),
+        "endTime": int(end_datetime.timestamp()),
+        "startedAt": time.time(),
+    }
+    try:
+        upload_file_to_s3(
+            body=json.dumps(entry),
+            file_name=f"{query_id}.json",
+            bucket_name=bucket_name,
+            directory=f"{report_id}/{queries_directory}",
+        )
+    except ClientError as e:
+        logger.warning(
+            "Failed to register query", extra={"query_id": query_id, "error": str(e)}
+        )
+
+
+def unregister_query(report_id: Any, query_id: str, bucket_name: str) -> None:
+    """
+    Remove a query that ended from the registry.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report running the query
+    query_id : str
+        Query identifier
+    bucket_name : str
+        S3 bucket name
+    """
+    try:
+        client.delete_object(
+            Bucket=bucket_name, Key=f"{report_id}/{queries_directory}/{query_id}.json"
+        )
+    except ClientError as e:
+        logger.warning(
+            "Failed to unregister query", extra={"query_id": query_id, "error": str(e)}
+        )
+
+
+def is_report_cancelled(report_id: Any, bucket_name: str) -> bool:
+    """
+    Check whether a report was cancelled, cached for a few seconds.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    bool
+        Whether the report has a cancellation marker
+    """
+    key = str(report_id)
+    # Not cached for good once cancelled, the report may be resumed
+    checked_at, cancelled = cancellation_checks.get(key, (None, False))
+    if (
+        checked_at is not None
+        and time.monotonic() - checked_at < cancellation_check_seconds
+    ):
+        return cancelled
+    try:
+        client.head_object(Bucket=bucket_name, Key=f"{key}/{cancellation_file_name}")
+        cancelled = True
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ["404", "NoSuchKey", "NotFound"]:
+            logger.warning(
+                "Failed to check report cancellation",
+                extra={"report_id": key, "error": str(e)},
+            )
+        cancelled = False
+    cancellation_checks[key] = (time.monotonic(), cancelled)
+    return cancelled
+
+
+def cancel_report_queries(report_id: Any, bucket_name: str) -> dict[str, Any]:
+    """
+    Stop every query still registered under a report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    dict
+        cancelledQueries, bytesScanned by them before being stopped and the
+        estimated bytesScanAvoided
+    """
+    keys = list_s3_keys(bucket_name, f"{report_id}/{queries_directory}")
+    cancelled = []
+    for result in stream_map(
+        lambda key: stop_registered_query(key, bucket_name), keys, max_workers=10
+    ):
+        if result.ok:
+            if result.value:
+                cancelled.append(result.value)
+        else:
+            logger.warning(
+                "Failed to stop registered query",
+                extra={"key": result.item, "error": str(result.error)},
+            )
+    summary = {
+        "cancelledQueries": len(cancelled),
+        "bytesScanned": sum(query["bytesScanned"] for query in cancelled),
+        "bytesScanAvoided": sum(query["bytesScanAvoided"] for query in cancelled),
+    }
+    logger.info("Cancelled report queries", extra={"report_id": report_id, **summary})
+    return summary
+
+
+def stop_registered_query(key: str, bucket_name: str) -> dict[str, Any] | None:
+    """
+    Stop a registered query and remove it from the registry.
+
+    Parameters
+    ----------
+    key : str
+        S3 key of the registry entry
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    dict or None
+        Bytes scanned before the query was stopped and the estimated bytes its
+        cancellation avoided, None if it had already ended
+    """
+    entry = json.loads(download_from_s3(key, bucket_name=bucket_name))
+    logs_client = get_client("logs", entry["target"])
+    response = logs_client.get_query_results(queryId=entry["queryId"])
+    stopped = None
+    if response["status"] not in finished_statuses:
+        try:
+            logs_client.stop_query(queryId=entry["queryId"])
+        except ClientError as e:
+            # Ended in between
+            logger.debug(f"Could not stop query {entry['queryId']}: {e}")
+        else:
+            scanned = response.get("statistics", {}).get("bytesScanned", 0)
+            estimate = estimate_scan_bytes(
+                logs_client, entry["logGroup"], entry["startTime"], entry["endTime"]
+            )
+            stopped = {
+                "bytesScanned": scanned,
+                "bytesScanAvoided": max(estimate - scanned, 0),
+            }
+    client.delete_object(Bucket=bucket_name, Key=key)
+    return stopped
+
+
+def estimate_scan_bytes(
+    logs_client: Any, log_group_name: str, start_time: int, end_time: int
+) -> float:
+    """
+    Estimate the bytes a query over a period scans.
+
+    The stored bytes of the log group are spread evenly over the time it has
+    kept logs for, its retention or its age.
+
+    Parameters
+    ----------
+    logs_client : botocore.client.BaseClient
+        CloudWatch Logs client of the log group's account and region
+    log_group_name : str
+        Log group name
+    start_time : int
+        Query start time in seconds since the epoch
+    end_time : int
+        Query end time in seconds since the epoch
+
+    Returns
+    -------
+    float
+        Estimated bytes, 0 if the log group doesn't exist anymore
+    """
+    log_groups = logs_client.describe_log_groups(logGroupNamePrefix=log_group_name)
+    for log_group in log_groups["logGroups"]:
+        if log_group["logGroupName"] != log_group_name:
+            continue
+        stored = float(log_group.get("storedBytes", 0))
+        kept_seconds = time.time() - float(log_group["creationTime"]) / 1000
+        if log_group.get("retentionInDays"):
+            kept_seconds = min(
+                kept_seconds, float(log_group["retentionInDays"]) * 86400
+            )
+        if kept_seconds <= 0:
+            return stored
+        return stored * min(1.0, (end_time - start_time) / kept_seconds)
+    return 0.0
+
+
+def record_cancellation(
+    report_id: Any, bucket_name: str, cancellation: dict[str, Any]
+) -> dict[str, Any]:
+    """
+    Add the queries stopped by a cancellation to the report's marker.
+
+    Creates the marker of a report cancelled on request, generators stop
+    querying once they see it.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+    cancellation : dict
+        Result of ``cancel_report_queries``, with any other field to store
+
+    Returns
+    -------
+    dict
+        Marker content, totals of every cancellation of the report
+    """
+    marker = load_cancellation(report_id, bucket_name) or {}
+    for name in ["cancelledQueries", "bytesScanned", "bytesScanAvoided"]:
+        marker[name] = marker.get(name, 0) + cancellation.get(name, 0)
+    marker.update(
+        {
+            name: value
+            for name, value in cancellation.items()
+            if name not in ["cancelledQueries", "bytesScanned", "bytesScanAvoided"]
+        }
+    )
+    upload_file_to_s3(
+        body=json.dumps(marker),
+        file_name=cancellation_file_name,
+        bucket_name=bucket_name,
+        directory=str(report_id),
+    )
+    return marker
+
+
+def load_cancellation(report_id: Any, bucket_name: str) -> dict[str, Any] | None:
+    """
+    Read the cancellation marker of a report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    dict or None
+        Marker content, None if the report wasn't cancelled
+    """
+    try:
+        marker: dict[str, Any] = json.loads(
+            download_from_s3(
+                cancellation_file_name,
+                bucket_name=bucket_name,
+                directory=str(report_id),
+            )
+        )
+        return marker
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "NoSuchKey":
+            raise
+        return None
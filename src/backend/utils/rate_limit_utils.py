@@ -0,0 +1,48 @@
+"""Thread-safe token bucket rate limiter."""
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how often an operation may start.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second
+    burst : int, default=1
+        Maximum number of tokens that can accumulate
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Block until a token is available and consume it.
+
+        Returns
+        -------
+        float
+            Seconds spent waiting for the token
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
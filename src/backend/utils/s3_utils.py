@@ -1,20 +1,58 @@
-"""S3 utility functions for file operations."""
+"""S3 utility functions for file operations.
+
+Besides whole-body helpers, large artifacts can be written through a multipart
+upload (``open_s3_writer``) and read back line by line (``open_s3_reader``,
+``iter_s3_lines``), so memory stays bounded by the part size instead of the file
+size. Objects may be stored with a gzip or zstd ``Content-Encoding``, which the
+readers decode transparently.
+"""
+
+import gzip
+import io
+from contextlib import contextmanager
+from types import TracebackType
+from typing import IO, Any, Iterator
 
 import boto3
 import botocore
 
-client = boto3.client("s3", config=botocore.client.Config(max_pool_connections=50))
+from backend.utils.metrics_utils import instrument_client
+
+try:
+    # Python 3.14+
+    from compression import zstd  # type: ignore[import-not-found,unused-ignore]
+except ImportError:
+    zstd = None
+try:
+    import zstandard  # type: ignore[import-not-found,unused-ignore]
+except ImportError:
+    zstandard = None
+
+client = instrument_client(
+    boto3.client("s3", config=botocore.client.Config(max_pool_connections=50))
+)
+
+# S3 rejects multipart parts smaller than this, except for the last one
+min_part_size = 5 * 1024 * 1024
+default_part_size = 8 * 1024 * 1024
+# Read size of streaming downloads
+read_chunk_size = 64 * 1024
+content_encodings = ["gzip", "zstd"]
 
 
 def upload_file_to_s3(
-    body: str, file_name: str, bucket_name: str, directory: str | None = None
+    body: str | bytes,
+    file_name: str,
+    bucket_name: str,
+    directory: str | None = None,
+    content_encoding: str | None = None,
 ) -> None:
     """
     Upload file content to S3.
 
     Parameters
     ----------
-    body : str
+    body : str or bytes
         File content to upload
     file_name : str
         Name of the file
@@ -22,9 +60,20 @@ def upload_file_to_s3(
         S3 bucket name
     directory : str, optional
         Directory path within bucket
+    content_encoding : str, optional
+        Compress the content with gzip or zstd, stored as is if not set
     """
     filename_s3 = f"{directory}/{file_name}" if directory else file_name
-    client.put_object(Body=body, Bucket=bucket_name, Key=filename_s3)
+    if content_encoding is None:
+        client.put_object(Body=body, Bucket=bucket_name, Key=filename_s3)
+        return
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    client.put_object(
+        Body=compress(data, content_encoding),
+        Bucket=bucket_name,
+        Key=filename_s3,
+        ContentEncoding=content_encoding,
+    )
 
 
 def download_from_s3(
@@ -49,4 +98,482 @@ def download_from_s3(
     """
     filename_s3 = f"{directory}/{file_name}" if directory else file_name
     obj = client.get_object(Bucket=bucket_name, Key=filename_s3)
-    return obj["Body"].read().decode("utf-8")  # type: ignore[no-any-return]
+    data = obj["Body"].read()
+    if obj.get("ContentEncoding") in content_encodings:
+        data = decompress(data, obj["ContentEncoding"])
+    return data.decode("utf-8")  # type: ignore[no-any-return]
+
+
+def get_s3_etag(file_name: str, bucket_name: str, directory: str | None = None) -> str:
+    """
+    Get the ETag of an S3 object without downloading it.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file
+    bucket_name : str
+        S3 bucket name
+    directory : str, optional
+        Directory path within bucket
+
+    Returns
+    -------
+    str
+        Quoted S3 ETag of the object
+    """
+    filename_s3 = f"{directory}/{file_name}" if directory else file_name
+    obj = client.head_object(Bucket=bucket_name, Key=filename_s3)
+    return obj["ETag"]  # type: ignore[no-any-return]
+
+
+def list_s3_keys(bucket_name: str, directory: str) -> list[str]:
+    """
+    List the keys of the objects under a directory.
+
+    Parameters
+    ----------
+    bucket_name : str
+        S3 bucket name
+    directory : str
+        Directory path within bucket
+
+    Returns
+    -------
+    list of str
+        Keys of the objects, in lexicographic order
+    """
+    paginator = client.get_paginator("list_objects_v2")
+    return [
+        obj["Key"]
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=f"{directory}/")
+        for obj in page.get("Contents", [])
+    ]
+
+
+def download_range_from_s3(
+    file_name: str,
+    bucket_name: str,
+    start: int,
+    end: int | None = None,
+    directory: str | None = None,
+) -> bytes:
+    """
+    Download a byte range of an S3 object.
+
+    Ranges apply to the stored bytes, so they are only meaningful for objects
+    stored without content encoding.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file
+    bucket_name : str
+        S3 bucket name
+    start : int
+        First byte offset
+    end : int, optional
+        Last byte offset (inclusive), end of the object if not set
+    directory : str, optional
+        Directory path within bucket
+
+    Returns
+    -------
+    bytes
+        Content of the range
+    """
+    filename_s3 = f"{directory}/{file_name}" if directory else file_name
+    obj = client.get_object(
+        Bucket=bucket_name,
+        Key=filename_s3,
+        Range=f"bytes={start}-{'' if end is None else end}",
+    )
+    return obj["Body"].read()  # type: ignore[no-any-return]
+
+
+def compress(data: bytes, content_encoding: str) -> bytes:
+    """
+    Compress data with a content encoding.
+
+    Parameters
+    ----------
+    data : bytes
+        Data to compress
+    content_encoding : str
+        gzip or zstd
+
+    Returns
+    -------
+    bytes
+        Compressed data
+    """
+    buffer = io.BytesIO()
+    with compressing_stream(buffer, content_encoding) as stream:
+        stream.write(data)
+    return buffer.getvalue()
+
+
+def decompress(data: bytes, content_encoding: str) -> bytes:
+    """
+    Decompress data stored with a content encoding.
+
+    Parameters
+    ----------
+    data : bytes
+        Compressed data
+    content_encoding : str
+        gzip or zstd
+
+    Returns
+    -------
+    bytes
+        Decompressed data
+    """
+    return decompressing_stream(io.BytesIO(data), content_encoding).read()
+
+
+def compressing_stream(fileobj: IO[bytes], content_encoding: str) -> IO[bytes]:
+    """
+    Wrap a binary stream so that what is written to it gets compressed.
+
+    Closing the returned stream flushes the compressed data but leaves
+    ``fileobj`` open.
+
+    Parameters
+    ----------
+    fileobj : IO[bytes]
+        Stream receiving the compressed data
+    content_encoding : str
+        gzip or zstd
+
+    Returns
+    -------
+    IO[bytes]
+        Writable stream of uncompressed data
+
+    Raises
+    ------
+    ValueError
+        If the encoding is not supported
+    """
+    if content_encoding == "gzip":
+        return gzip.GzipFile(  # type: ignore[return-value]
+            fileobj=fileobj, mode="wb", mtime=0
+        )
+    if content_encoding == "zstd" and zstd is not None:
+        return zstd.ZstdFile(fileobj, mode="wb")  # type: ignore[no-any-return]
+    if content_encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor().stream_writer(  # type: ignore[no-any-return]
+            fileobj, closefd=False
+        )
+    raise ValueError(f"Unsupported content encoding: {content_encoding}")
+
+
+def decompressing_stream(fileobj: IO[bytes], content_encoding: str) -> IO[bytes]:
+    """
+    Wrap a binary stream of compressed data to read it decompressed.
+
+    Parameters
+    ----------
+    fileobj : IO[bytes]
+        Stream of compressed data
+    content_encoding : str
+        gzip or zstd
+
+    Returns
+    -------
+    IO[bytes]
+        Readable stream of decompressed data
+
+    Raises
+    ------
+    ValueError
+        If the encoding is not supported
+    """
+    if content_encoding == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb")  # type: ignore[return-value]
+    if content_encoding == "zstd" and zstd is not None:
+        return zstd.ZstdFile(fileobj, mode="rb")  # type: ignore[no-any-return]
+    if content_encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().stream_reader(  # type: ignore[no-any-return]
+            fileobj, closefd=False
+        )
+    raise ValueError(f"Unsupported content encoding: {content_encoding}")
+
+
+class MultipartUploadWriter(io.RawIOBase):
+    """
+    Binary stream uploading what is written to it as an S3 multipart upload.
+
+    At most one part is buffered in memory. Content smaller than a part is
+    uploaded with a single ``put_object`` when the stream is closed. Leaving a
+    ``with`` block on an exception aborts the upload instead of completing it.
+
+    Parameters
+    ----------
+    key : str
+        S3 object key
+    bucket_name : str
+        S3 bucket name
+    part_size : int, default=8 MiB
+        Size of the uploaded parts, at least 5 MiB
+    extra_args : dict, optional
+        Additional ``put_object``/``create_multipart_upload`` arguments, such
+        as ContentType or ContentEncoding
+    """
+
+    def __init__(
+        self,
+        key: str,
+        bucket_name: str,
+        part_size: int = default_part_size,
+        extra_args: dict[str, Any] | None = None,
+    ) -> None:
+        super().__init__()
+        self.key = key
+        self.bucket_name = bucket_name
+        self.part_size = max(part_size, min_part_size)
+        self.extra_args = extra_args or {}
+        self.buffer = bytearray()
+        self.upload_id: str | None = None
+        self.parts: list[dict[str, Any]] = []
+        self.bytes_written = 0
+        # Set once completed or aborted, later writes are discarded
+        self.finished = False
+
+    def writable(self) -> bool:
+        """
+        Tell that the stream is writable.
+
+        Returns
+        -------
+        bool
+            Always True
+        """
+        return True
+
+    def write(self, data: Any) -> int:
+        """
+        Buffer data, uploading a part each time a full part is buffered.
+
+        Parameters
+        ----------
+        data : bytes-like
+            Data to write
+
+        Returns
+        -------
+        int
+            Number of bytes written
+        """
+        if self.closed:
+            raise ValueError("write to closed file")
+        size = len(memoryview(data))
+        if self.finished:
+            # Wrapping streams flushing after an abort
+            return size
+        self.buffer += data
+        self.bytes_written += size
+        while len(self.buffer) >= self.part_size:
+            self.upload_part(bytes(self.buffer[: self.part_size]))
+            del self.buffer[: self.part_size]
+        return size
+
+    def upload_part(self, data: bytes) -> None:
+        """
+        Upload a part, starting the multipart upload if needed.
+
+        Parameters
+        ----------
+        data : bytes
+            Part content
+        """
+        if self.upload_id is None:
+            self.upload_id = client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key, **self.extra_args
+            )["UploadId"]
+        part_number = len(self.parts) + 1
+        response = client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        self.parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+    def close(self) -> None:
+        """Upload the buffered data and complete the upload."""
+        if not self.finished:
+            self.finished = True
+            if self.upload_id is None:
+                client.put_object(
+                    Body=bytes(self.buffer),
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    **self.extra_args,
+                )
+            else:
+                if self.buffer:
+                    self.upload_part(bytes(self.buffer))
+                client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    UploadId=self.upload_id,
+                    MultipartUpload={"Parts": self.parts},
+                )
+            self.buffer.clear()
+        super().close()
+
+    def abort(self) -> None:
+        """Discard the upload, leaving any existing object untouched."""
+        if self.finished:
+            return
+        self.finished = True
+        if self.upload_id is not None:
+            client.abort_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id
+            )
+        self.buffer.clear()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """
+        Complete the upload, or abort it if the block raised.
+
+        Parameters
+        ----------
+        exc_type : type, optional
+            Type of the exception raised in the block
+        exc_value : BaseException, optional
+            Exception raised in the block
+        traceback : TracebackType, optional
+            Traceback of the exception
+        """
+        if exc_type is not None:
+            self.abort()
+        self.close()
+
+
+@contextmanager
+def open_s3_writer(
+    file_name: str,
+    bucket_name: str,
+    directory: str | None = None,
+    content_encoding: str | None = None,
+    content_type: str | None = None,
+    part_size: int = default_part_size,
+) -> Iterator[IO[str]]:
+    """
+    Open a text stream uploading to S3, e.g. as a ``csv.writer`` target.
+
+    The object is created when the block exits without error.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file
+    bucket_name : str
+        S3 bucket name
+    directory : str, optional
+        Directory path within bucket
+    content_encoding : str, optional
+        Compress the content with gzip or zstd, stored as is if not set
+    content_type : str, optional
+        Content type of the object
+    part_size : int, default=8 MiB
+        Size of the multipart upload parts
+
+    Yields
+    ------
+    IO[str]
+        Text stream with universal newlines disabled, as csv expects
+    """
+    filename_s3 = f"{directory}/{file_name}" if directory else file_name
+    extra_args = {}
+    if content_encoding:
+        extra_args["ContentEncoding"] = content_encoding
+    if content_type:
+        extra_args["ContentType"] = content_type
+    writer = MultipartUploadWriter(filename_s3, bucket_name, part_size, extra_args)
+    stream: IO[bytes] = (
+        compressing_stream(writer, content_encoding)  # type: ignore[arg-type]
+        if content_encoding
+        else io.BufferedWriter(writer, buffer_size=read_chunk_size)
+    )
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        yield text
+    except BaseException:
+        # The wrappers are left open so they can't flush into a closed writer
+        writer.abort()
+        raise
+    # Flushes the compressor trailer, then the writer completes the upload
+    text.close()
+    writer.close()
+
+
+@contextmanager
+def open_s3_reader(
+    file_name: str, bucket_name: str, directory: str | None = None
+) -> Iterator[IO[str]]:
+    """
+    Open a text stream reading an S3 object, decoding its content encoding.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file
+    bucket_name : str
+        S3 bucket name
+    directory : str, optional
+        Directory path within bucket
+
+    Yields
+    ------
+    IO[str]
+        Text stream over the object content
+    """
+    filename_s3 = f"{directory}/{file_name}" if directory else file_name
+    obj = client.get_object(Bucket=bucket_name, Key=filename_s3)
+    body = obj["Body"]
+    content_encoding = obj.get("ContentEncoding")
+    stream = (
+        decompressing_stream(body, content_encoding)
+        if content_encoding in content_encodings
+        else io.BufferedReader(body, buffer_size=read_chunk_size)
+    )
+    text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    try:
+        yield text
+    finally:
+        text.close()
+        body.close()
+
+
+def iter_s3_lines(
+    file_name: str, bucket_name: str, directory: str | None = None
+) -> Iterator[str]:
+    """
+    Stream the lines of an S3 object.
+
+    Parameters
+    ----------
+    file_name : str
+        Name of the file
+    bucket_name : str
+        S3 bucket name
+    directory : str, optional
+        Directory path within bucket
+
+    Yields
+    ------
+    str
+        Lines of the object, line endings included
+    """
+    with open_s3_reader(file_name, bucket_name, directory) as stream:
+        yield from stream
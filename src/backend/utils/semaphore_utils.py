@@ -0,0 +1,579 @@
+"""Account-wide semaphore on concurrent CloudWatch Logs Insights queries.
+
+Logs Insights runs a limited number of concurrent queries per account and
+region. Every generator of every running report queries the same accounts, so
+without coordination they overrun the quota and throttle each other into long
+backoffs. Generators acquire a slot of a ``QuerySemaphore`` before each
+``StartQuery`` and release it once the query ended.
+
+Slots are leases with a TTL, renewed while the query runs, so the slots of a
+crashed generator free themselves. They are shared fairly: a report holding its
+share of the slots (the slots divided by the reports holding or waiting for
+one) waits for the other reports before taking more.
+
+Backends:
+
+- ``S3LeaseBackend``: one object per slot under ``locks/insights/<target key>/``
+  in the analysis bucket, created with a conditional write (``If-None-Match``)
+  and taken over from an expired lease with ``If-Match``. Holders and waiting
+  reports leave marker objects, so a single LIST describes the semaphore.
+- ``LocalLeaseBackend``: the same semantics within the process, for tests and
+  local runs.
+
+With ``S3LeaseBackend`` a query costs one LIST and two PUT requests to take a
+free slot, then one PUT per renewal (every 30 seconds of the default TTL).
+Taking over an expired slot costs one more LIST, to delete the markers of its
+crashed holders.
+While a report waits, every attempt is a LIST, and its waiting marker is
+rewritten as often as a lease is renewed. DELETE requests are free. These
+requests go through the instrumented S3 client, so they are counted in the
+usage of the generator invocation and priced in the report cost.
+
+The backend is chosen with the ``QUERY_SEMAPHORE`` environment variable
+(``s3``, ``local`` or ``off``), ``s3`` when ``BUCKET_NAME`` is set and ``local``
+otherwise.
+"""
+
+import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from aws_lambda_powertools import Logger
+from botocore.exceptions import ClientError
+
+from backend.utils.s3_utils import client
+
+logger = Logger()
+
+# Logs Insights allows 30 concurrent queries per account and region, some are
+# left for queries run from the console
+max_concurrent_queries = int(os.environ.get("INSIGHTS_MAX_CONCURRENT_QUERIES", "25"))
+lease_ttl_seconds = 120
+# Leases are renewed, and waiting markers refreshed, after this share of the TTL
+renew_after = 0.25
+poll_interval_seconds = 2.0
+lock_directory = "locks/insights"
+# A concurrent conditional write on the same key fails with a 409
+lost_race_error_codes = {"PreconditionFailed", "ConditionalRequestConflict"}
+
+
+@dataclass
+class SlotState:
+    """
+    Snapshot of a semaphore.
+
+    Parameters
+    ----------
+    taken : dict
+        Report holding each live lease by slot, empty if unknown
+    expired : dict
+        Token of each expired lease by slot, to take it over
+    waiting : set of str
+        Reports waiting for a slot
+    """
+
+    taken: dict[int, str] = field(default_factory=dict)
+    expired: dict[int, str] = field(default_factory=dict)
+    waiting: set[str] = field(default_factory=set)
+
+
+@dataclass
+class Lease:
+    """
+    Slot held by a report until released or expired.
+
+    Parameters
+    ----------
+    backend : LeaseBackend
+        Backend the lease was acquired from
+    slot : int
+        Slot index
+    report_id : str
+        Report holding the slot
+    token : str
+        Version of the lease, changed by every renewal
+    renewed_at : float
+        Monotonic time of the last renewal
+    """
+
+    backend: "LeaseBackend"
+    slot: int
+    report_id: str
+    token: str
+    renewed_at: float = field(default_factory=time.monotonic)
+
+    def renew_if_due(self) -> None:
+        """Extend the lease when a part of its TTL elapsed."""
+        if time.monotonic() - self.renewed_at < self.backend.ttl * renew_after:
+            return
+        try:
+            if self.backend.renew(self):
+                self.renewed_at = time.monotonic()
+            else:
+                logger.warning("Query slot lease expired", extra={"slot": self.slot})
+        except ClientError as e:
+            logger.warning(
+                "Failed to renew query slot", extra={"slot": self.slot, "error": str(e)}
+            )
+
+    def release(self) -> None:
+        """Free the slot, failures are logged and left to the TTL."""
+        try:
+            self.backend.release(self)
+        except ClientError as e:
+            logger.warning(
+                "Failed to release query slot",
+                extra={"slot": self.slot, "error": str(e)},
+            )
+
+
+class LeaseBackend(ABC):
+    """
+    Storage of the leases of one semaphore.
+
+    Parameters
+    ----------
+    ttl : float
+        Seconds a lease or a waiting marker lives without being renewed
+    """
+
+    def __init__(self, ttl: float = lease_ttl_seconds) -> None:
+        self.ttl = ttl
+
+    @abstractmethod
+    def state(self) -> SlotState:
+        """Read the live leases and waiting reports."""
+
+    @abstractmethod
+    def claim(self, slot: int, report_id: str, expired: str | None) -> Lease | None:
+        """
+        Take a free slot.
+
+        Parameters
+        ----------
+        slot : int
+            Slot index
+        report_id : str
+            Report taking the slot
+        expired : str, optional
+            Token of the expired lease of the slot, None if it has none
+
+        Returns
+        -------
+        Lease or None
+            The lease, None if another holder took the slot first
+        """
+
+    @abstractmethod
+    def renew(self, lease: Lease) -> bool:
+        """Extend a lease, False if it expired and was taken over."""
+
+    @abstractmethod
+    def release(self, lease: Lease) -> None:
+        """Free the slot of a lease still held."""
+
+    @abstractmethod
+    def mark_waiting(self, report_id: str) -> None:
+        """Record that a report waits for a slot, until the TTL elapses."""
+
+    @abstractmethod
+    def unmark_waiting(self, report_id: str) -> None:
+        """Record that a report no longer waits."""
+
+
+class LocalLeaseBackend(LeaseBackend):
+    """Leases held in memory, shared by the threads of the process."""
+
+    def __init__(self, ttl: float = lease_ttl_seconds) -> None:
+        super().__init__(ttl)
+        # slot -> (report, token, expiry)
+        self.leases: dict[int, tuple[str, str, float]] = {}
+        self.waiting: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def state(self) -> SlotState:
+        now = time.monotonic()
+        with self.lock:
+            return SlotState(
+                taken={
+                    slot: report_id
+                    for slot, (report_id, _, expiry) in self.leases.items()
+                    if expiry > now
+                },
+                expired={
+                    slot: token
+                    for slot, (_, token, expiry) in self.leases.items()
+                    if expiry <= now
+                },
+                waiting={
+                    report_id
+                    for report_id, expiry in self.waiting.items()
+                    if expiry > now
+                },
+            )
+
+    def claim(self, slot: int, report_id: str, expired: str | None) -> Lease | None:
+        with self.lock:
+            current = self.leases.get(slot)
+            if (current[1] if current else None) != expired:
+                return None
+            token = uuid.uuid4().hex
+            self.leases[slot] = (report_id, token, time.monotonic() + self.ttl)
+            return Lease(self, slot, report_id, token)
+
+    def renew(self, lease: Lease) -> bool:
+        with self.lock:
+            current = self.leases.get(lease.slot)
+            if not current or current[1] != lease.token:
+                return False
+            lease.token = uuid.uuid4().hex
+            self.leases[lease.slot] = (
+                lease.report_id,
+                lease.token,
+                time.monotonic() + self.ttl,
+            )
+            return True
+
+    def release(self, lease: Lease) -> None:
+        with self.lock:
+            current = self.leases.get(lease.slot)
+            if current and current[1] == lease.token:
+                del self.leases[lease.slot]
+
+    def mark_waiting(self, report_id: str) -> None:
+        with self.lock:
+            self.waiting[report_id] = time.monotonic() + self.ttl
+
+    def unmark_waiting(self, report_id: str) -> None:
+        with self.lock:
+            self.waiting.pop(report_id, None)
+
+
+class S3LeaseBackend(LeaseBackend):
+    """
+    Leases stored as S3 objects, shared by every generator.
+
+    Expiry is based on the ``LastModified`` date of the objects, so the state
+    is read with a single LIST request. Holder markers are written once per
+    claim and not renewed: the latest marker of a live slot names its holder.
+    The markers of the holders of a slot taken over are deleted by the new
+    holder.
+
+    Parameters
+    ----------
+    bucket_name : str
+        S3 bucket holding the leases
+    key : str
+        Semaphore identifier, the target key
+    ttl : float
+        Seconds a lease or a waiting marker lives without being renewed
+    """
+
+    def __init__(
+        self, bucket_name: str, key: str, ttl: float = lease_ttl_seconds
+    ) -> None:
+        super().__init__(ttl)
+        self.bucket_name = bucket_name
+        self.prefix = f"{lock_directory}/{key}"
+
+    def state(self) -> SlotState:
+        now = datetime.now(timezone.utc)
+        ttl = timedelta(seconds=self.ttl)
+        live_slots: set[int] = set()
+        # slot -> (marker date, report)
+        holders: dict[int, tuple[datetime, str]] = {}
+        state = SlotState()
+        paginator = client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(
+            Bucket=self.bucket_name, Prefix=f"{self.prefix}/"
+        ):
+            for item in page.get("Contents", []):
+                kind, _, name = item["Key"][len(self.prefix) + 1 :].partition("/")
+                live = item["LastModified"] + ttl > now
+                if kind == "slots" and live:
+                    live_slots.add(int(name))
+                elif kind == "slots":
+                    state.expired[int(name)] = item["ETag"]
+                elif kind == "holders":
+                    # holders/<report>/<slot>, a crashed holder's marker stays
+                    # until the slot is taken over, older than the new one
+                    report_id, _, slot = name.rpartition("/")
+                    holder = (item["LastModified"], report_id)
+                    holders[int(slot)] = max(holders.get(int(slot), holder), holder)
+                elif kind == "waiters" and live:
+                    state.waiting.add(name)
+        state.taken = {
+            slot: holders[slot][1] if slot in holders else "" for slot in live_slots
+        }
+        return state
+
+    def claim(self, slot: int, report_id: str, expired: str | None) -> Lease | None:
+        condition = {"IfMatch": expired} if expired else {"IfNoneMatch": "*"}
+        token = self.write_slot(slot, report_id, condition)
+        if token is None:
+            return None
+        if expired:
+            self.delete_previous_holders(slot, report_id)
+        self.put_marker(f"holders/{report_id}/{slot}")
+        return Lease(self, slot, report_id, token)
+
+    def renew(self, lease: Lease) -> bool:
+        token = self.write_slot(lease.slot, lease.report_id, {"IfMatch": lease.token})
+        if token is None:
+            return False
+        lease.token = token
+        return True
+
+    def release(self, lease: Lease) -> None:
+        client.delete_object(
+            Bucket=self.bucket_name,
+            Key=f"{self.prefix}/holders/{lease.report_id}/{lease.slot}",
+        )
+        try:
+            client.delete_object(
+                Bucket=self.bucket_name,
+                Key=f"{self.prefix}/slots/{lease.slot}",
+                IfMatch=lease.token,
+            )
+        except ClientError as e:
+            # Expired and taken over by another holder
+            if e.response["Error"]["Code"] not in lost_race_error_codes:
+                raise
+
+    def mark_waiting(self, report_id: str) -> None:
+        self.put_marker(f"waiters/{report_id}")
+
+    def unmark_waiting(self, report_id: str) -> None:
+        client.delete_object(
+            Bucket=self.bucket_name, Key=f"{self.prefix}/waiters/{report_id}"
+        )
+
+    def write_slot(
+        self, slot: int, report_id: str, condition: dict[str, str]
+    ) -> str | None:
+        """
+        Write the lease object of a slot under a condition.
+
+        Returns
+        -------
+        str or None
+            ETag of the lease, None if the condition failed
+        """
+        # Unique content, so that every write changes the ETag
+        body = json.dumps({"reportID": report_id, "token": uuid.uuid4().hex})
+        try:
+            response = client.put_object(
+                Bucket=self.bucket_name,
+                Key=f"{self.prefix}/slots/{slot}",
+                Body=body,
+                **condition,
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in lost_race_error_codes:
+                return None
+            raise
+        return str(response["ETag"])
+
+    def delete_previous_holders(self, slot: int, report_id: str) -> None:
+        """
+        Delete the markers left by the holders of a slot just taken over.
+
+        The slot is held, no other holder writes a marker for it until the
+        lease is released or expires. Failures are logged, the markers are then
+        deleted by the next takeover.
+
+        Parameters
+        ----------
+        slot : int
+            Slot index
+        report_id : str
+            Report that took the slot over, whose marker is rewritten
+        """
+        kept = f"{self.prefix}/holders/{report_id}/{slot}"
+        try:
+            paginator = client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(
+                Bucket=self.bucket_name, Prefix=f"{self.prefix}/holders/"
+            ):
+                for item in page.get("Contents", []):
+                    if item["Key"].endswith(f"/{slot}") and item["Key"] != kept:
+                        client.delete_object(Bucket=self.bucket_name, Key=item["Key"])
+        except ClientError as e:
+            logger.warning(
+                "Failed to delete the previous holders of a query slot",
+                extra={"slot": slot, "error": str(e)},
+            )
+
+    def put_marker(self, name: str) -> None:
+        """Create or refresh an empty marker object."""
+        client.put_object(
+            Bucket=self.bucket_name, Key=f"{self.prefix}/{name}", Body=b""
+        )
+
+
+class QuerySemaphore:
+    """
+    Slots fairly shared by the reports querying a target.
+
+    Parameters
+    ----------
+    backend : LeaseBackend
+        Storage of the leases
+    slots : int
+        Number of concurrent queries allowed
+    poll_interval : float
+        Average seconds between two attempts while waiting
+    """
+
+    def __init__(
+        self,
+        backend: LeaseBackend,
+        slots: int = max_concurrent_queries,
+        poll_interval: float = poll_interval_seconds,
+    ) -> None:
+        self.backend = backend
+        self.slots = slots
+        self.poll_interval = poll_interval
+        # Threads of the process waiting per report, and when the report's
+        # waiting marker was written
+        self.waiters: Counter[str] = Counter()
+        self.marked_at: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def acquire(
+        self, report_id: Any, cancel: threading.Event | None = None
+    ) -> tuple[Lease | None, float]:
+        """
+        Block until the report gets a slot.
+
+        Backend errors don't block the queries: the query runs without a slot.
+
+        Parameters
+        ----------
+        report_id : Any
+            Report running the query
+        cancel : threading.Event, optional
+            Ends the wait when set, without a slot
+
+        Returns
+        -------
+        tuple
+            The lease (None if the backend failed or the wait was cancelled)
+            and the seconds spent waiting
+        """
+        report_id = str(report_id or "default")
+        started = time.perf_counter()
+        waiting = False
+        try:
+            while cancel is None or not cancel.is_set():
+                lease = self.try_acquire(report_id)
+                if lease:
+                    return lease, time.perf_counter() - started
+                if not waiting:
+                    waiting = True
+                    with self.lock:
+                        self.waiters[report_id] += 1
+                self.refresh_waiting(report_id)
+                wait_time = self.poll_interval * random.uniform(0.5, 1.5)
+                if cancel is None:
+                    time.sleep(wait_time)
+                else:
+                    cancel.wait(wait_time)
+            return None, time.perf_counter() - started
+        except ClientError as e:
+            logger.warning(
+                "Query semaphore unavailable, querying without a slot",
+                extra={"report_id": report_id, "error": str(e)},
+            )
+            return None, time.perf_counter() - started
+        finally:
+            if waiting:
+                self.stop_waiting(report_id)
+
+    def try_acquire(self, report_id: str) -> Lease | None:
+        """
+        Take a free slot if the report holds less than its share.
+
+        Parameters
+        ----------
+        report_id : str
+            Report running the query
+
+        Returns
+        -------
+        Lease or None
+            The lease, None if the report has to wait
+        """
+        state = self.backend.state()
+        reports = (set(state.taken.values()) | state.waiting | {report_id}) - {""}
+        share = math.ceil(self.slots / len(reports))
+        if list(state.taken.values()).count(report_id) >= share:
+            return None
+        free_slots = [slot for slot in range(self.slots) if slot not in state.taken]
+        # Spread concurrent claims over the free slots
+        random.shuffle(free_slots)
+        for slot in free_slots:
+            lease = self.backend.claim(slot, report_id, state.expired.get(slot))
+            if lease:
+                return lease
+        return None
+
+    def refresh_waiting(self, report_id: str) -> None:
+        """Write the waiting marker of the report, unless it's recent."""
+        with self.lock:
+            marked_at = self.marked_at.get(report_id)
+            if (
+                marked_at is not None
+                and time.monotonic() - marked_at < self.backend.ttl * renew_after
+            ):
+                return
+            self.marked_at[report_id] = time.monotonic()
+        self.backend.mark_waiting(report_id)
+
+    def stop_waiting(self, report_id: str) -> None:
+        """Remove the waiting marker once no thread of the report waits."""
+        with self.lock:
+            self.waiters[report_id] -= 1
+            if self.waiters[report_id] > 0:
+                return
+            del self.waiters[report_id]
+            self.marked_at.pop(report_id, None)
+        try:
+            self.backend.unmark_waiting(report_id)
+        except ClientError as e:
+            logger.warning(
+                "Failed to remove waiting marker",
+                extra={"report_id": report_id, "error": str(e)},
+            )
+
+
+def create_backend(key: str) -> LeaseBackend | None:
+    """
+    Create the lease backend configured for the process.
+
+    Parameters
+    ----------
+    key : str
+        Semaphore identifier, the target key
+
+    Returns
+    -------
+    LeaseBackend or None
+        The backend, None if the semaphore is turned off
+    """
+    bucket_name = os.environ.get("BUCKET_NAME")
+    kind = os.environ.get("QUERY_SEMAPHORE") or ("s3" if bucket_name else "local")
+    if kind == "off":
+        return None
+    if kind == "s3" and bucket_name:
+        return S3LeaseBackend(bucket_name, key)
+    return LocalLeaseBackend()
@@ -5,7 +5,7 @@ from datetime import datetime
 from functools import partial
 from typing import Any
 
-from backend.utils.multithread_utils import multi_thread
+from backend.utils.multithread_utils import stream_map
 from backend.utils.s3_utils import download_from_s3, upload_file_to_s3
 
 s3_params_bucket = "step-functions-params"
@@ -45,8 +45,16 @@ def upload_params(
     partial_upload_single_params_file = partial(
         upload_single_params_file, bucket_name=bucket_name, directory=directory_name
     )
-    s3_params = multi_thread(partial_upload_single_params_file, params_filename, 20)
-    return s3_params
+    # In input order, so that Map state iterations follow the parameters order
+    return [
+        result.result()
+        for result in stream_map(
+            partial_upload_single_params_file,
+            params_filename,
+            max_workers=20,
+            ordered=True,
+        )
+    ]
 
 
 def upload_single_params_file(
@@ -0,0 +1,83 @@
+"""Detection of queries running much longer than their peers."""
+
+import statistics
+import threading
+
+# A query is a straggler once it ran this many times the median of its peers
+straggler_factor = 3.0
+# Completed peers needed before any query is considered a straggler
+straggler_min_samples = 3
+# Queries shorter than this are never stragglers, hedging them costs more than
+# it saves
+straggler_min_seconds = 20.0
+
+
+class StragglerDetector:
+    """
+    Running times of completed queries, compared with a running query.
+
+    Parameters
+    ----------
+    factor : float
+        Multiple of the median running time making a straggler
+    min_samples : int
+        Completed queries needed to compare with
+    min_seconds : float
+        Running time below which a query is never a straggler
+    """
+
+    def __init__(
+        self,
+        factor: float = straggler_factor,
+        min_samples: int = straggler_min_samples,
+        min_seconds: float = straggler_min_seconds,
+    ) -> None:
+        self.factor = factor
+        self.min_samples = min_samples
+        self.min_seconds = min_seconds
+        self.samples: list[float] = []
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        """
+        Record the running time of a completed query.
+
+        Parameters
+        ----------
+        seconds : float
+            Running time, queue waits excluded
+        """
+        with self.lock:
+            self.samples.append(seconds)
+
+    def threshold(self) -> float | None:
+        """
+        Running time past which a query is a straggler.
+
+        Returns
+        -------
+        float or None
+            Threshold in seconds, None without enough completed queries
+        """
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            median = statistics.median(self.samples)
+        return max(self.min_seconds, self.factor * median)
+
+    def is_straggler(self, seconds: float) -> bool:
+        """
+        Check whether a running query is a straggler.
+
+        Parameters
+        ----------
+        seconds : float
+            Time the query has been running, queue waits excluded
+
+        Returns
+        -------
+        bool
+            Whether the query ran past the threshold
+        """
+        threshold = self.threshold()
+        return threshold is not None and seconds > threshold
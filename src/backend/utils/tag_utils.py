@@ -0,0 +1,115 @@
+"""Resolve tag expressions to Lambda function names.
+
+A tag expression is a comma separated list of clauses, all of which must match:
+
+- ``key=value`` selects functions tagged ``key`` with ``value``
+- ``key=value1|value2`` accepts any of the listed values
+- ``key`` selects functions carrying the tag, whatever its value
+
+For example ``team=payments|billing,env=prod``. Resolution goes through the
+Resource Groups Tagging API, which returns up to 100 tagged resources per call.
+"""
+
+from typing import Any
+
+import boto3
+from botocore.client import BaseClient
+
+from backend.utils.metrics_utils import instrument_client
+
+client = instrument_client(boto3.client("resourcegroupstaggingapi"))
+
+resources_per_page = 100
+
+
+def parse_tag_expression(expression: str) -> list[dict[str, Any]]:
+    """
+    Parse a tag expression into Resource Groups Tagging API tag filters.
+
+    Parameters
+    ----------
+    expression : str
+        Tag expression such as ``team=payments|billing,env=prod``
+
+    Returns
+    -------
+    list of dict
+        TagFilters for ``get_resources``, sorted by key
+
+    Raises
+    ------
+    ValueError
+        If the expression has no clause, an empty key or a repeated key
+    """
+    tag_filters: dict[str, dict[str, Any]] = {}
+    for clause in expression.split(","):
+        key, has_values, values = (part.strip() for part in clause.partition("="))
+        if not key:
+            raise ValueError(f"Invalid tag expression clause: {clause!r}")
+        if key in tag_filters:
+            raise ValueError(f"Tag key {key!r} appears more than once")
+        tag_filter: dict[str, Any] = {"Key": key}
+        if has_values:
+            tag_filter["Values"] = sorted(
+                {value.strip() for value in values.split("|") if value.strip()}
+            )
+        tag_filters[key] = tag_filter
+    if not tag_filters:
+        raise ValueError("Tag expression is empty")
+    return [tag_filters[key] for key in sorted(tag_filters)]
+
+
+def normalize_tag_expression(expression: str) -> str:
+    """
+    Build the canonical form of a tag expression, for use as a cache key.
+
+    Parameters
+    ----------
+    expression : str
+        Tag expression
+
+    Returns
+    -------
+    str
+        Expression with sorted keys and values and no extra whitespace
+    """
+    return ",".join(
+        (
+            f"{tag_filter['Key']}={'|'.join(tag_filter['Values'])}"
+            if "Values" in tag_filter
+            else tag_filter["Key"]
+        )
+        for tag_filter in parse_tag_expression(expression)
+    )
+
+
+def resolve_tag_expression(
+    expression: str, tagging_client: BaseClient | None = None
+) -> list[str]:
+    """
+    Resolve a tag expression to the names of the matching Lambda functions.
+
+    Parameters
+    ----------
+    expression : str
+        Tag expression
+    tagging_client : BaseClient, optional
+        Resource Groups Tagging API client of the account and region to
+        search, the local one if not set
+
+    Returns
+    -------
+    list of str
+        Sorted names of the matching Lambda functions
+    """
+    function_names = set()
+    paginator = (tagging_client or client).get_paginator("get_resources")
+    for page in paginator.paginate(
+        TagFilters=parse_tag_expression(expression),
+        ResourceTypeFilters=["lambda:function"],
+        ResourcesPerPage=resources_per_page,
+    ):
+        for resource in page["ResourceTagMappingList"]:
+            # arn:aws:lambda:<region>:<account>:function:<name>[:<qualifier>]
+            function_names.add(resource["ResourceARN"].split(":")[6])
+    return sorted(function_names)
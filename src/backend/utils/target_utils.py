@@ -0,0 +1,192 @@
+"""Analysis targets: (account role, region) pairs a report can cover.
+
+A target is a dict with an optional ``role_arn`` to assume and an optional
+``region``. Missing values mean the deploying account and the default region,
+so an empty target analyzes the local account exactly like before.
+"""
+
+import threading
+from typing import Any
+
+import boto3
+from botocore.client import Config
+from botocore.credentials import RefreshableCredentials
+from botocore.session import get_session
+
+from backend.utils.circuit_breaker_utils import CircuitBreaker
+from backend.utils.metrics_utils import instrument_client
+from backend.utils.rate_limit_utils import RateLimiter
+from backend.utils.semaphore_utils import QuerySemaphore, create_backend
+
+role_session_name = "lambda-cost-analysis"
+
+# CloudWatch Logs Insights StartQuery calls allowed per second and target
+start_query_rate_per_second = 5.0
+
+# Assumed-role sessions keyed by role ARN, refreshed before credentials expire
+assumed_role_sessions: dict[str, boto3.Session] = {}
+# Rate limiters keyed by target key, so one busy target can't starve the others
+rate_limiters: dict[str, RateLimiter] = {}
+# Circuit breakers of the Logs Insights queries keyed by target key
+circuit_breakers: dict[str, CircuitBreaker] = {}
+# Concurrent query semaphores keyed by target key, None when turned off
+query_semaphores: dict[str, QuerySemaphore | None] = {}
+lock = threading.Lock()
+
+
+def target_key(target: dict[str, Any] | None) -> str:
+    """
+    Build a stable identifier for a target.
+
+    Parameters
+    ----------
+    target : dict, optional
+        Target with optional role_arn and region
+
+    Returns
+    -------
+    str
+        ``<account id or local>/<region or default>``
+    """
+    target = target or {}
+    role_arn = target.get("role_arn")
+    # arn:aws:iam::<account>:role/<name>
+    account = role_arn.split(":")[4] if role_arn else "local"
+    return f"{account}/{target.get('region') or 'default'}"
+
+
+def get_assumed_role_session(role_arn: str) -> boto3.Session:
+    """
+    Get a session for an assumed role, with cached, auto-refreshing credentials.
+
+    Parameters
+    ----------
+    role_arn : str
+        ARN of the role to assume
+
+    Returns
+    -------
+    boto3.Session
+        Session using the assumed role credentials
+    """
+    with lock:
+        if role_arn in assumed_role_sessions:
+            return assumed_role_sessions[role_arn]
+
+        sts_client = boto3.client("sts")
+
+        def refresh() -> dict[str, str]:
+            credentials = sts_client.assume_role(
+                RoleArn=role_arn, RoleSessionName=role_session_name
+            )["Credentials"]
+            return {
+                "access_key": credentials["AccessKeyId"],
+                "secret_key": credentials["SecretAccessKey"],
+                "token": credentials["SessionToken"],
+                "expiry_time": credentials["Expiration"].isoformat(),
+            }
+
+        credentials = RefreshableCredentials.create_from_metadata(
+            metadata=refresh(), refresh_using=refresh, method="sts-assume-role"
+        )
+        botocore_session = get_session()
+        # botocore has no public setter for refreshable credentials
+        setattr(botocore_session, "_credentials", credentials)
+        session = boto3.Session(botocore_session=botocore_session)
+        assumed_role_sessions[role_arn] = session
+        return session
+
+
+def get_client(
+    service: str, target: dict[str, Any] | None = None, config: Config | None = None
+) -> Any:
+    """
+    Create a boto3 client for a target.
+
+    Parameters
+    ----------
+    service : str
+        AWS service name
+    target : dict, optional
+        Target with optional role_arn and region, local account if not set
+    config : Config, optional
+        Botocore client configuration
+
+    Returns
+    -------
+    botocore.client.BaseClient
+        Client bound to the target account and region, instrumented with
+        ``backend.utils.metrics_utils.instrument_client``
+    """
+    target = target or {}
+    role_arn, region = target.get("role_arn"), target.get("region")
+    if not role_arn:
+        return instrument_client(
+            boto3.client(service, region_name=region, config=config)
+        )
+    session = get_assumed_role_session(role_arn)
+    return instrument_client(session.client(service, region_name=region, config=config))
+
+
+def get_rate_limiter(target: dict[str, Any] | None = None) -> RateLimiter:
+    """
+    Get the StartQuery rate limiter of a target.
+
+    Parameters
+    ----------
+    target : dict, optional
+        Target with optional role_arn and region
+
+    Returns
+    -------
+    RateLimiter
+        Rate limiter shared by all queries against the target
+    """
+    key = target_key(target)
+    with lock:
+        if key not in rate_limiters:
+            rate_limiters[key] = RateLimiter(start_query_rate_per_second)
+        return rate_limiters[key]
+
+
+def get_circuit_breaker(target: dict[str, Any] | None = None) -> CircuitBreaker:
+    """
+    Get the Logs Insights circuit breaker of a target.
+
+    Parameters
+    ----------
+    target : dict, optional
+        Target with optional role_arn and region
+
+    Returns
+    -------
+    CircuitBreaker
+        Circuit breaker shared by all queries against the target
+    """
+    key = target_key(target)
+    with lock:
+        if key not in circuit_breakers:
+            circuit_breakers[key] = CircuitBreaker()
+        return circuit_breakers[key]
+
+
+def get_query_semaphore(target: dict[str, Any] | None = None) -> QuerySemaphore | None:
+    """
+    Get the concurrent query semaphore of a target.
+
+    Parameters
+    ----------
+    target : dict, optional
+        Target with optional role_arn and region
+
+    Returns
+    -------
+    QuerySemaphore or None
+        Semaphore shared by all reports querying the target, None if turned off
+    """
+    key = target_key(target)
+    with lock:
+        if key not in query_semaphores:
+            backend = create_backend(key)
+            query_semaphores[key] = QuerySemaphore(backend) if backend else None
+        return query_semaphores[key]
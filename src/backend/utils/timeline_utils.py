@@ -0,0 +1,245 @@
+"""Per-report execution timeline.
+
+Every stage records timing spans (initializer planning, generator batches and
+each function's configuration lookup, query start, query completion and upload,
+aggregator phases) and uploads them under ``<report_id>/spans/``. The aggregator
+compacts them into ``<report_id>/timeline.json``, served by ``/report/timeline``,
+with per-span statistics and the slowest spans of each kind, so stragglers and
+throttling storms stand out.
+"""
+
+import json
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from backend.utils.multithread_utils import stream_map
+from backend.utils.s3_utils import download_from_s3, list_s3_keys, upload_file_to_s3
+
+spans_directory = "spans"
+timeline_file_name = "timeline.json"
+# Slowest spans listed per span name
+slowest_spans = 5
+
+
+class Timeline:
+    """
+    Timing spans recorded by one stage of a report, safe to share between threads.
+
+    Parameters
+    ----------
+    report_id : Any, optional
+        Report identifier, spans can't be uploaded if not set
+    """
+
+    def __init__(self, report_id: Any = None) -> None:
+        self.report_id = report_id
+        self.spans: list[dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def add_span(
+        self, name: str, start: float, end: float, **attributes: Any
+    ) -> dict[str, Any]:
+        """
+        Record a span.
+
+        Parameters
+        ----------
+        name : str
+            Span name, ``<stage>.<step>``
+        start : float
+            Start as a Unix timestamp in seconds
+        end : float
+            End as a Unix timestamp in seconds
+        **attributes
+            Details of the span (function name, bytes scanned, ...)
+
+        Returns
+        -------
+        dict
+            The recorded span
+        """
+        span = {
+            "name": name,
+            "start": round(start, 3),
+            "end": round(end, 3),
+            "duration": round(end - start, 3),
+            **attributes,
+        }
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+        """
+        Record the duration of a block as a span.
+
+        Parameters
+        ----------
+        name : str
+            Span name, ``<stage>.<step>``
+        **attributes
+            Details of the span
+
+        Yields
+        ------
+        dict
+            Attributes of the span, the block may add more
+        """
+        start = time.time()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self.add_span(name, start, time.time(), **attributes)
+
+    def upload(self, bucket_name: str, stage: str) -> None:
+        """
+        Upload the spans recorded so far next to the report.
+
+        Parameters
+        ----------
+        bucket_name : str
+            S3 bucket name
+        stage : str
+            Stage name, part of the file name
+        """
+        with self.lock:
+            spans = list(self.spans)
+        if not spans or not self.report_id:
+            return
+        upload_file_to_s3(
+            body=json.dumps(spans),
+            file_name=f"{stage}-{uuid.uuid4()}.json",
+            bucket_name=bucket_name,
+            directory=f"{self.report_id}/{spans_directory}",
+        )
+
+
+def load_spans(report_id: Any, bucket_name: str) -> list[dict[str, Any]]:
+    """
+    Load the spans uploaded by all the stages of a report.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    list of dict
+        Spans ordered by start time
+    """
+    keys = list_s3_keys(bucket_name, f"{report_id}/{spans_directory}")
+    spans = []
+    for result in stream_map(
+        lambda key: json.loads(download_from_s3(key, bucket_name)),
+        keys,
+        max_workers=10,
+    ):
+        spans.extend(result.result())
+    return sorted(spans, key=lambda span: (span["start"], span["end"]))
+
+
+def build_timeline(report_id: Any, spans: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Compact spans into a timeline with statistics per span name.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    spans : list of dict
+        Spans ordered by start time
+
+    Returns
+    -------
+    dict
+        reportID, start, end, duration, stats (count, total, p50, p95 and max
+        duration and slowest spans per span name) and spans
+    """
+    spans_by_name: dict[str, list[dict[str, Any]]] = {}
+    for span in spans:
+        spans_by_name.setdefault(span["name"], []).append(span)
+
+    stats = {}
+    for name, named_spans in spans_by_name.items():
+        durations = sorted(span["duration"] for span in named_spans)
+        stats[name] = {
+            "count": len(durations),
+            "totalSeconds": round(sum(durations), 3),
+            "p50Seconds": percentile(durations, 50),
+            "p95Seconds": percentile(durations, 95),
+            "maxSeconds": durations[-1],
+            "slowest": sorted(named_spans, key=lambda span: -span["duration"])[
+                :slowest_spans
+            ],
+        }
+
+    start = end = duration = None
+    if spans:
+        start = spans[0]["start"]
+        end = max(span["end"] for span in spans)
+        duration = round(end - start, 3)
+    return {
+        "reportID": report_id,
+        "start": start,
+        "end": end,
+        "duration": duration,
+        "stats": stats,
+        "spans": spans,
+    }
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Parameters
+    ----------
+    sorted_values : list of float
+        Values in ascending order, at least one
+    percent : float
+        Percentile between 0 and 100
+
+    Returns
+    -------
+    float
+        Smallest value with at least ``percent`` % of the values at or below it
+    """
+    rank = max(math.ceil(percent / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def compact_timeline(report_id: Any, bucket_name: str) -> dict[str, Any]:
+    """
+    Compact the spans of a report into ``timeline.json``.
+
+    Parameters
+    ----------
+    report_id : Any
+        Report identifier
+    bucket_name : str
+        S3 bucket name
+
+    Returns
+    -------
+    dict
+        The uploaded timeline
+    """
+    result = build_timeline(report_id, load_spans(report_id, bucket_name))
+    upload_file_to_s3(
+        body=json.dumps(result),
+        file_name=timeline_file_name,
+        bucket_name=bucket_name,
+        directory=str(report_id),
+    )
+    return result
@@ -0,0 +1,205 @@
+"""What running a report costs: resource usage of the stages and its price.
+
+Each stage invocation measures its own usage with a ``UsageMeter`` (Lambda
+GB-seconds, S3 requests and the volume of its own logs) and records it in the
+report timeline as a ``<stage>.invocation`` span. The aggregator prices the
+usage of every invocation, adds the Step Functions state transitions and the
+Logs Insights scans, and stores the breakdown in ``summary.json``.
+
+Prices are the us-east-1 on-demand prices.
+"""
+
+import logging
+import os
+import platform
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+from aws_lambda_powertools import Logger
+
+from backend.utils.metrics_utils import api_requests
+
+logger = Logger()
+
+lambda_request_price = 0.20 / 1_000_000
+lambda_gb_second_price = {"arm64": 0.0000133334, "x86_64": 0.0000166667}
+# Standard workflow
+state_transition_price = 0.025 / 1000
+# PUT, COPY, POST and LIST requests; every other request is priced like a GET
+s3_tier1_request_price = 0.005 / 1000
+s3_tier2_request_price = 0.0004 / 1000
+s3_tier1_operations = {
+    "PutObject",
+    "CopyObject",
+    "CreateMultipartUpload",
+    "UploadPart",
+    "CompleteMultipartUpload",
+    "ListObjects",
+    "ListObjectsV2",
+}
+s3_free_operations = {"DeleteObject", "DeleteObjects", "AbortMultipartUpload"}
+log_ingestion_price_per_gb = 0.50
+logs_insights_price_per_gb = 0.005
+# START, END and REPORT lines Lambda logs for every invocation
+platform_log_bytes_per_invocation = 350
+# The Map state enters once per report, on top of each task state
+map_state_transitions = 1
+# Stages of reports analyzed in process, without Step Functions
+in_process_stages = ["express", "cli"]
+
+
+class LogVolumeHandler(logging.Handler):
+    """Count the bytes the Powertools logger writes to CloudWatch Logs."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.bytes = 0
+        self.bytes_lock = threading.Lock()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Count the formatted record and its newline."""
+        size = len(self.format(record).encode("utf-8")) + 1
+        with self.bytes_lock:
+            self.bytes += size
+
+
+log_volume = LogVolumeHandler()
+log_volume.setFormatter(logger.registered_formatter)
+logger.addHandler(log_volume)
+
+
+class UsageMeter:
+    """
+    Resources consumed by a stage invocation since the meter was created.
+
+    Parameters
+    ----------
+    context : LambdaContext, optional
+        Lambda context of the invocation, for the memory size
+    """
+
+    def __init__(self, context: Any = None) -> None:
+        self.memory_mb = int(
+            getattr(context, "memory_limit_in_mb", None)
+            or os.environ.get("AWS_LAMBDA_FUNCTION_MEMORY_SIZE", "0")
+        )
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.api_requests = Counter(api_requests)
+        self.log_bytes = log_volume.bytes
+
+    def usage(self) -> dict[str, Any]:
+        """
+        Measure the resources consumed so far.
+
+        Returns
+        -------
+        dict
+            memoryMB, architecture, lambdaGbSeconds (billed per millisecond),
+            s3Tier1Requests, s3Tier2Requests and logBytes
+        """
+        billed_ms = int((time.perf_counter() - self.started) * 1000) + 1
+        requests = Counter(api_requests)
+        requests.subtract(self.api_requests)
+        s3_tier1 = s3_tier2 = 0
+        for operation, count in requests.items():
+            service, name = operation.split(".", 1)
+            if service != "s3" or name in s3_free_operations:
+                continue
+            if name in s3_tier1_operations:
+                s3_tier1 += count
+            else:
+                s3_tier2 += count
+        return {
+            "memoryMB": self.memory_mb,
+            "architecture": lambda_architecture(),
+            "lambdaGbSeconds": round(billed_ms / 1000 * self.memory_mb / 1024, 6),
+            "s3Tier1Requests": s3_tier1,
+            "s3Tier2Requests": s3_tier2,
+            "logBytes": log_volume.bytes
+            - self.log_bytes
+            + platform_log_bytes_per_invocation,
+        }
+
+
+def lambda_architecture() -> str:
+    """
+    Architecture the function runs on.
+
+    Returns
+    -------
+    str
+        arm64 or x86_64
+    """
+    return "arm64" if platform.machine() in ["aarch64", "arm64"] else "x86_64"
+
+
+def report_cost(spans: list[dict[str, Any]], insights_cost: float) -> dict[str, Any]:
+    """
+    Price the resources a report consumed.
+
+    Parameters
+    ----------
+    spans : list of dict
+        Timeline spans of the report, with the ``<stage>.invocation`` and
+        ``<stage>.stopped_queries`` spans
+    insights_cost : float
+        Cost of the Logs Insights scans of the analyzed functions
+
+    Returns
+    -------
+    dict
+        Cost per service, total and the priced usage
+    """
+    invocations = [span for span in spans if span["name"].endswith(".invocation")]
+    gb_seconds: Counter[str] = Counter()
+    for span in invocations:
+        gb_seconds[span["architecture"]] += span["lambdaGbSeconds"]
+    s3_tier1 = sum(span["s3Tier1Requests"] for span in invocations)
+    s3_tier2 = sum(span["s3Tier2Requests"] for span in invocations)
+    log_bytes = sum(span["logBytes"] for span in invocations)
+    # Scans of queries stopped before completing, in no analysis row
+    stopped_bytes = sum(
+        span["bytesScanned"]
+        for span in spans
+        if span["name"].endswith(".stopped_queries")
+    )
+    # One task state per invocation, retries included. Express and command
+    # line reports run outside of the state machine
+    task_invocations = [
+        span
+        for span in invocations
+        if span["name"].split(".")[0] not in in_process_stages
+    ]
+    state_transitions = (
+        len(task_invocations) + map_state_transitions if task_invocations else 0
+    )
+
+    costs = {
+        "lambda": len(invocations) * lambda_request_price
+        + sum(
+            seconds * lambda_gb_second_price[architecture]
+            for architecture, seconds in gb_seconds.items()
+        ),
+        "stepFunctions": state_transitions * state_transition_price,
+        "s3Requests": s3_tier1 * s3_tier1_request_price
+        + s3_tier2 * s3_tier2_request_price,
+        "logIngestion": log_bytes / 1024**3 * log_ingestion_price_per_gb,
+        "logsInsights": insights_cost
+        + stopped_bytes / 1024**3 * logs_insights_price_per_gb,
+    }
+    return {
+        **costs,
+        "total": sum(costs.values()),
+        "usage": {
+            "lambdaInvocations": len(invocations),
+            "lambdaGbSeconds": round(sum(gb_seconds.values()), 6),
+            "stateTransitions": state_transitions,
+            "s3Tier1Requests": s3_tier1,
+            "s3Tier2Requests": s3_tier2,
+            "logBytes": log_bytes,
+            "stoppedBytesScanned": stopped_bytes,
+        },
+    }
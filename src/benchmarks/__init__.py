@@ -0,0 +1 @@
+"""Offline benchmarks of the analysis pipeline, run against moto."""
@@ -0,0 +1,376 @@
+"""Instrumentation of boto3 calls through botocore events.
+
+Handlers are registered on the default boto3 session, so they apply to every
+client created afterwards with ``boto3.client``, and on the module-level
+clients the backend has already created.
+"""
+
+import io
+import json
+import sys
+import threading
+from collections import Counter
+from typing import Any, Callable, Iterator
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.client import BaseClient
+
+# Handler answering a call instead of AWS (or moto): returns the parsed response
+ResponseStub = Callable[[dict[str, Any]], dict[str, Any]]
+
+# "<service id>.<operation>" -> stub answering it
+stubs: dict[str, ResponseStub] = {}
+
+# Handler answering a JSON protocol call at the HTTP layer, so that botocore
+# parses and retries its errors: returns the response body or raises FakeError
+HttpFake = Callable[[dict[str, Any]], dict[str, Any]]
+
+# "<service id>.<operation>" -> fake answering it
+http_fakes: dict[str, HttpFake] = {}
+
+# moto answers every request sent to an AWS endpoint, faked requests are
+# redirected to a host it ignores
+fake_url = "https://fake.invalid/"
+
+
+class FakeError(Exception):
+    """
+    Service error answered by a fake.
+
+    Parameters
+    ----------
+    code : str
+        Error code, e.g. ``ThrottlingException``
+    message : str
+        Error message
+    status_code : int, default=400
+        HTTP status of the error response
+    """
+
+    def __init__(self, code: str, message: str, status_code: int = 400) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+
+class FakeBody(io.BytesIO):
+    """HTTP response body readable by botocore."""
+
+    def stream(self, **kwargs: Any) -> Iterator[bytes]:
+        """
+        Stream the body.
+
+        Parameters
+        ----------
+        **kwargs : Any
+            Streaming options, ignored
+
+        Yields
+        ------
+        bytes
+            Whole body
+        """
+        yield self.getvalue()
+
+
+def default_session_events() -> Any:
+    """
+    Get the event emitter of the default boto3 session.
+
+    Returns
+    -------
+    botocore.hooks.HierarchicalEmitter
+        Event emitter copied into every client created afterwards
+    """
+    if boto3.DEFAULT_SESSION is None:
+        boto3.setup_default_session()
+    return boto3.DEFAULT_SESSION._session.get_component(  # type: ignore[union-attr]
+        "event_emitter"
+    )
+
+
+def event_emitters() -> list[Any]:
+    """
+    Get the event emitters handlers must be registered on.
+
+    Returns
+    -------
+    list
+        Emitter of the default session and of the clients already created by
+        backend modules
+    """
+    emitters = [default_session_events()]
+    for name, module in list(sys.modules.items()):
+        if name.split(".")[0] != "backend":
+            continue
+        for value in list(vars(module).values()):
+            if isinstance(value, BaseClient):
+                emitters.append(value.meta.events)
+    return emitters
+
+
+def register(event: str, handler: Callable[..., Any], unique_id: str) -> None:
+    """
+    Register an event handler everywhere, once per emitter.
+
+    Parameters
+    ----------
+    event : str
+        Event name, e.g. ``after-call`` or ``before-call.s3.GetObject``
+    handler : Callable
+        Event handler
+    unique_id : str
+        Identifier preventing the handler from being registered twice on an
+        emitter, including emitters copied from an instrumented session
+    """
+    for emitter in event_emitters():
+        emitter.register(event, handler, unique_id=unique_id)
+
+
+def unregister(event: str, handler: Callable[..., Any], unique_id: str) -> None:
+    """
+    Remove an event handler registered with ``register``.
+
+    Parameters
+    ----------
+    event : str
+        Event name
+    handler : Callable
+        Event handler
+    unique_id : str
+        Identifier the handler was registered with
+    """
+    for emitter in event_emitters():
+        emitter.unregister(event, handler, unique_id=unique_id)
+
+
+def body_size(body: Any) -> int:
+    """
+    Compute the size of a request body.
+
+    Parameters
+    ----------
+    body : str, bytes or file-like
+        Body of an S3 upload
+
+    Returns
+    -------
+    int
+        Size in bytes, 0 if it can't be determined without reading it
+    """
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return len(body)
+    return 0
+
+
+class CallRecorder:
+    """
+    Count AWS API calls by operation and the S3 bytes they move.
+
+    Counters can be read and reset between pipeline stages. Uploads of
+    file-like bodies are not accounted for.
+    """
+
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+        # Handlers run in the threads of the backend's thread pools
+        self.lock = threading.Lock()
+
+    def install(self) -> None:
+        """Register the recording handlers."""
+        # Before S3 handlers wrap bodies into file-like objects
+        register(
+            "provide-client-params",
+            self.provide_client_params,
+            unique_id=f"call-recorder-{id(self)}-params",
+        )
+        register("after-call", self.after_call, f"call-recorder-{id(self)}-response")
+
+    def provide_client_params(
+        self, model: Any, params: dict[str, Any], **kwargs: Any
+    ) -> None:
+        """
+        Account for uploaded bytes.
+
+        Parameters
+        ----------
+        model : botocore.model.OperationModel
+            Called operation
+        params : dict
+            API parameters of the call
+        **kwargs : Any
+            Other event arguments
+        """
+        if model.name in ["PutObject", "UploadPart"]:
+            size = body_size(params.get("Body"))
+            with self.lock:
+                self.bytes_uploaded += size
+
+    def after_call(self, model: Any, parsed: dict[str, Any], **kwargs: Any) -> None:
+        """
+        Count the call and account for downloaded bytes.
+
+        Parameters
+        ----------
+        model : botocore.model.OperationModel
+            Called operation
+        parsed : dict
+            Parsed response
+        **kwargs : Any
+            Other event arguments
+        """
+        with self.lock:
+            self.calls[f"{model.service_model.service_name}.{model.name}"] += 1
+            if model.name == "GetObject":
+                self.bytes_downloaded += parsed.get("ContentLength", 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Export and reset the counters.
+
+        Returns
+        -------
+        dict
+            Calls by operation and bytes moved since the last snapshot
+        """
+        with self.lock:
+            result = {
+                "awsCalls": dict(sorted(self.calls.items())),
+                "awsCallCount": sum(self.calls.values()),
+                "bytesUploaded": self.bytes_uploaded,
+                "bytesDownloaded": self.bytes_downloaded,
+            }
+            self.calls.clear()
+            self.bytes_uploaded = self.bytes_downloaded = 0
+        return result
+
+
+def stub_operation(service_id: str, operation: str, stub: ResponseStub) -> None:
+    """
+    Answer an operation locally instead of calling AWS or moto.
+
+    Stubbing an operation again replaces its previous stub.
+
+    Parameters
+    ----------
+    service_id : str
+        Hyphenized botocore service id, e.g. ``cloudwatch-logs``
+    operation : str
+        Operation name, e.g. ``StartQuery``
+    stub : Callable
+        Function building the parsed response from the request parameters
+    """
+    event = f"{service_id}.{operation}"
+    stubs[event] = stub
+    register(
+        f"before-parameter-build.{event}", keep_stub_params, f"stub-params-{event}"
+    )
+    register(f"before-call.{event}", answer_with_stub, f"stub-response-{event}")
+
+
+def keep_stub_params(params: dict[str, Any], context: dict[str, Any], **_: Any) -> None:
+    """
+    Keep the API parameters of a stubbed call for ``answer_with_stub``.
+
+    before-call only sees the serialized request.
+
+    Parameters
+    ----------
+    params : dict
+        API parameters of the call
+    context : dict
+        Context shared by the events of the call
+    **_ : Any
+        Other event arguments
+    """
+    context["stub_params"] = dict(params)
+
+
+def answer_with_stub(
+    model: Any, context: dict[str, Any], **_: Any
+) -> tuple[Any, Any] | None:
+    """
+    Answer a stubbed call.
+
+    Parameters
+    ----------
+    model : botocore.model.OperationModel
+        Called operation
+    context : dict
+        Context shared by the events of the call
+    **_ : Any
+        Other event arguments
+
+    Returns
+    -------
+    tuple or None
+        HTTP response and parsed response, None to let the call through
+    """
+    service_id = model.service_model.service_id.hyphenize()
+    stub = stubs.get(f"{service_id}.{model.name}")
+    if stub is None:
+        return None
+    return AWSResponse("https://stub", 200, {}, None), stub(context["stub_params"])
+
+
+def fake_operation(service_id: str, operation: str, fake: HttpFake) -> None:
+    """
+    Answer a JSON protocol operation locally at the HTTP layer.
+
+    Unlike stubs, fakes can answer errors that botocore handles like AWS
+    errors, including the retries of throttled calls.
+
+    Parameters
+    ----------
+    service_id : str
+        Hyphenized botocore service id, e.g. ``cloudwatch-logs``
+    operation : str
+        Operation name, e.g. ``StartQuery``
+    fake : Callable
+        Function building the response body from the request parameters
+    """
+    event = f"{service_id}.{operation}"
+    http_fakes[event] = fake
+    register(f"before-send.{event}", answer_with_fake, f"fake-response-{event}")
+
+
+def answer_with_fake(request: Any, event_name: str, **_: Any) -> AWSResponse | None:
+    """
+    Answer a faked call.
+
+    Parameters
+    ----------
+    request : botocore.awsrequest.AWSPreparedRequest
+        Serialized request
+    event_name : str
+        ``before-send.<service id>.<operation>``
+    **_ : Any
+        Other event arguments
+
+    Returns
+    -------
+    AWSResponse or None
+        HTTP response, None to let the call through
+    """
+    fake = http_fakes.get(event_name.removeprefix("before-send."))
+    if fake is None:
+        return None
+    params = json.loads(request.body or b"{}")
+    try:
+        status_code, body = 200, fake(params)
+    except FakeError as e:
+        status_code = e.status_code
+        body = {"__type": e.code, "message": e.message}
+    request.url = fake_url
+    return AWSResponse(
+        fake_url,
+        status_code,
+        {"Content-Type": "application/x-amz-json-1.1"},
+        FakeBody(json.dumps(body).encode("utf-8")),
+    )
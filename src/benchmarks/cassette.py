@@ -0,0 +1,454 @@
+"""Record and replay of AWS API calls.
+
+A recording captures every call made through boto3 (operation, hash of the
+API parameters, parsed response and latency) into a cassette, a gzipped JSON
+lines file. Replaying the cassette answers the calls locally with the recorded
+responses, sleeping the recorded latencies scaled by a factor, so a run
+recorded against AWS can be reproduced offline.
+
+Calls are matched on their operation and parameters hash, falling back to the
+next unused recording of the operation for parameters that change from run to
+run (generated ids and keys). Services can be left out, e.g. S3 to keep the
+pipeline's own artifacts on moto.
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any
+
+from botocore.awsrequest import AWSResponse
+from botocore.response import StreamingBody
+
+from benchmarks.aws_instrumentation import register, unregister
+
+cassette_version = 1
+
+
+def encode(value: Any) -> Any:
+    """
+    Convert API parameters or a parsed response to JSON compatible values.
+
+    Parameters
+    ----------
+    value : Any
+        Parameters, response or one of their values
+
+    Returns
+    -------
+    Any
+        JSON compatible value, datetimes and bytes tagged for ``decode``
+    """
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    # File-like bodies and other objects can't be recorded
+    return {"__type__": type(value).__name__}
+
+
+def decode(value: Any) -> Any:
+    """
+    Rebuild a value converted by ``encode``.
+
+    Parameters
+    ----------
+    value : Any
+        JSON compatible value
+
+    Returns
+    -------
+    Any
+        Original value
+    """
+    if isinstance(value, dict):
+        if "__datetime__" in value:
+            return datetime.fromisoformat(value["__datetime__"])
+        if "__bytes__" in value:
+            return base64.b64decode(value["__bytes__"])
+        return {key: decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    return value
+
+
+def params_hash(params: dict[str, Any]) -> str:
+    """
+    Hash API parameters.
+
+    Parameters
+    ----------
+    params : dict
+        API parameters of a call
+
+    Returns
+    -------
+    str
+        Hash of the canonical JSON form of the parameters
+    """
+    canonical = json.dumps(encode(params), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def operation_name(model: Any) -> str:
+    """
+    Get the name calls are recorded under.
+
+    Parameters
+    ----------
+    model : botocore.model.OperationModel
+        Called operation
+
+    Returns
+    -------
+    str
+        ``<service>.<operation>``, e.g. ``logs.StartQuery``
+    """
+    return f"{model.service_model.service_name}.{model.name}"
+
+
+class CassetteRecorder:
+    """
+    Record the AWS API calls of the process.
+
+    Parameters
+    ----------
+    services : list of str, optional
+        Services to record (e.g. ``logs``, ``lambda``), all if not set
+    """
+
+    def __init__(self, services: list[str] | None = None) -> None:
+        self.services = services
+        self.interactions: list[dict[str, Any]] = []
+        # Calls come from the backend's thread pools
+        self.lock = threading.Lock()
+
+    def install(self) -> None:
+        """Register the recording handlers."""
+        register(
+            "provide-client-params",
+            self.provide_client_params,
+            f"cassette-recorder-{id(self)}-params",
+        )
+        register(
+            "after-call", self.after_call, f"cassette-recorder-{id(self)}-response"
+        )
+
+    def uninstall(self) -> None:
+        """Remove the recording handlers."""
+        unregister(
+            "provide-client-params",
+            self.provide_client_params,
+            f"cassette-recorder-{id(self)}-params",
+        )
+        unregister(
+            "after-call", self.after_call, f"cassette-recorder-{id(self)}-response"
+        )
+
+    def recorded(self, model: Any) -> bool:
+        """
+        Check whether calls to an operation are recorded.
+
+        Parameters
+        ----------
+        model : botocore.model.OperationModel
+            Called operation
+
+        Returns
+        -------
+        bool
+            Whether its service is recorded
+        """
+        return (
+            self.services is None or model.service_model.service_name in self.services
+        )
+
+    def provide_client_params(
+        self, model: Any, params: dict[str, Any], context: dict[str, Any], **_: Any
+    ) -> None:
+        """
+        Keep the API parameters and start time of a call.
+
+        Parameters
+        ----------
+        model : botocore.model.OperationModel
+            Called operation
+        params : dict
+            API parameters of the call
+        context : dict
+            Context shared by the events of the call
+        **_ : Any
+            Other event arguments
+        """
+        if self.recorded(model):
+            context["cassette_params_hash"] = params_hash(params)
+            context["cassette_started"] = time.perf_counter()
+
+    def after_call(
+        self,
+        model: Any,
+        http_response: Any,
+        parsed: dict[str, Any],
+        context: dict[str, Any],
+        **_: Any,
+    ) -> None:
+        """
+        Record a call.
+
+        Streaming bodies are read and replaced by an in-memory copy.
+
+        Parameters
+        ----------
+        model : botocore.model.OperationModel
+            Called operation
+        http_response : AWSResponse
+            HTTP response
+        parsed : dict
+            Parsed response
+        context : dict
+            Context shared by the events of the call
+        **_ : Any
+            Other event arguments
+        """
+        if "cassette_started" not in context:
+            return
+        latency = time.perf_counter() - context["cassette_started"]
+        response = {k: v for k, v in parsed.items() if k != "ResponseMetadata"}
+        if isinstance(parsed.get("Body"), StreamingBody):
+            content = parsed["Body"].read()
+            parsed["Body"] = StreamingBody(io.BytesIO(content), len(content))
+            response["Body"] = content
+        with self.lock:
+            self.interactions.append(
+                {
+                    "operation": operation_name(model),
+                    "paramsHash": context["cassette_params_hash"],
+                    "statusCode": http_response.status_code,
+                    "latency": round(latency, 6),
+                    "response": encode(response),
+                }
+            )
+
+    def save(self, path: str) -> None:
+        """
+        Write the cassette.
+
+        Parameters
+        ----------
+        path : str
+            Cassette file, gzipped JSON lines
+        """
+        with self.lock:
+            interactions = list(self.interactions)
+        with gzip.open(path, "wt", encoding="utf-8") as cassette:
+            header = {
+                "version": cassette_version,
+                "createdAt": datetime.now().isoformat(timespec="seconds"),
+                "interactions": len(interactions),
+            }
+            cassette.write(json.dumps(header) + "\n")
+            for interaction in interactions:
+                cassette.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+
+class CassettePlayer:
+    """
+    Answer AWS API calls with the responses of a cassette.
+
+    Parameters
+    ----------
+    path : str
+        Cassette file written by ``CassetteRecorder.save``
+    latency_scale : float, default=1.0
+        Factor applied to the recorded latencies, 0 to answer immediately
+    strict : bool, default=False
+        Fail calls without a recording of their operation and parameters,
+        instead of falling back to the next recording of the operation
+
+    Raises
+    ------
+    ValueError
+        If the cassette version is not supported
+    """
+
+    def __init__(
+        self, path: str, latency_scale: float = 1.0, strict: bool = False
+    ) -> None:
+        self.latency_scale = latency_scale
+        self.strict = strict
+        # Recordings by operation and parameters hash, and by operation only
+        self.exact: dict[tuple[str, str], deque[dict[str, Any]]] = {}
+        self.by_operation: dict[str, deque[dict[str, Any]]] = {}
+        self.counters: Counter[str] = Counter()
+        self.lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf-8") as cassette:
+            header = json.loads(cassette.readline())
+            if header.get("version") != cassette_version:
+                raise ValueError(
+                    f"Unsupported cassette version {header.get('version')}"
+                )
+            for line in cassette:
+                interaction = json.loads(line)
+                interaction["used"] = False
+                key = (interaction["operation"], interaction["paramsHash"])
+                self.exact.setdefault(key, deque()).append(interaction)
+                self.by_operation.setdefault(interaction["operation"], deque()).append(
+                    interaction
+                )
+
+    @property
+    def services(self) -> set[str]:
+        """
+        Get the services answered from the cassette.
+
+        Returns
+        -------
+        set of str
+            Services with recorded calls
+        """
+        return {operation.split(".")[0] for operation in self.by_operation}
+
+    def install(self) -> None:
+        """Register the replaying handlers."""
+        register(
+            "provide-client-params",
+            self.provide_client_params,
+            f"cassette-player-{id(self)}-params",
+        )
+        register(
+            "before-call", self.before_call, f"cassette-player-{id(self)}-response"
+        )
+
+    def uninstall(self) -> None:
+        """Remove the replaying handlers."""
+        unregister(
+            "provide-client-params",
+            self.provide_client_params,
+            f"cassette-player-{id(self)}-params",
+        )
+        unregister(
+            "before-call", self.before_call, f"cassette-player-{id(self)}-response"
+        )
+
+    def provide_client_params(
+        self, model: Any, params: dict[str, Any], context: dict[str, Any], **_: Any
+    ) -> None:
+        """
+        Keep the parameters hash of a call.
+
+        Parameters
+        ----------
+        model : botocore.model.OperationModel
+            Called operation
+        params : dict
+            API parameters of the call
+        context : dict
+            Context shared by the events of the call
+        **_ : Any
+            Other event arguments
+        """
+        if model.service_model.service_name in self.services:
+            context["cassette_params_hash"] = params_hash(params)
+
+    def next_interaction(self, operation: str, hash_: str) -> dict[str, Any] | None:
+        """
+        Take the recording answering a call.
+
+        Parameters
+        ----------
+        operation : str
+            Recorded operation name
+        hash_ : str
+            Parameters hash of the call
+
+        Returns
+        -------
+        dict or None
+            Unused recording, None if there's none left
+        """
+        with self.lock:
+            for queue, counter in [
+                (self.exact.get((operation, hash_)), "matched"),
+                (None if self.strict else self.by_operation.get(operation), "fallback"),
+            ]:
+                while queue and queue[0]["used"]:
+                    queue.popleft()
+                if queue:
+                    interaction = queue.popleft()
+                    interaction["used"] = True
+                    self.counters[counter] += 1
+                    return interaction
+            self.counters["missing"] += 1
+            return None
+
+    def before_call(
+        self, model: Any, context: dict[str, Any], **_: Any
+    ) -> tuple[AWSResponse, dict[str, Any]] | None:
+        """
+        Answer a call with its recording.
+
+        Parameters
+        ----------
+        model : botocore.model.OperationModel
+            Called operation
+        context : dict
+            Context shared by the events of the call
+        **_ : Any
+            Other event arguments
+
+        Returns
+        -------
+        tuple or None
+            HTTP response and parsed response, None for services not replayed
+
+        Raises
+        ------
+        LookupError
+            If no recording is left for the call
+        """
+        if "cassette_params_hash" not in context:
+            return None
+        operation = operation_name(model)
+        interaction = self.next_interaction(operation, context["cassette_params_hash"])
+        if interaction is None:
+            raise LookupError(f"No recording left for {operation}")
+        if self.latency_scale:
+            time.sleep(interaction["latency"] * self.latency_scale)
+        parsed = decode(interaction["response"])
+        if isinstance(parsed.get("Body"), bytes):
+            parsed["Body"] = StreamingBody(
+                io.BytesIO(parsed["Body"]), len(parsed["Body"])
+            )
+        parsed["ResponseMetadata"] = {"HTTPStatusCode": interaction["statusCode"]}
+        return (
+            AWSResponse("https://cassette", interaction["statusCode"], {}, None),
+            parsed,
+        )
+
+    def snapshot(self) -> dict[str, int]:
+        """
+        Export and reset the counters.
+
+        Returns
+        -------
+        dict
+            Calls answered by exact match, by fallback, and without recording
+        """
+        with self.lock:
+            result = {
+                name: self.counters[name] for name in ["matched", "fallback", "missing"]
+            }
+            self.counters.clear()
+        return result
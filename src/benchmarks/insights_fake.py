@@ -0,0 +1,309 @@
+"""Local stand-in for Logs Insights.
+
+Answers ``StartQuery``, ``GetQueryResults`` and ``StopQuery`` by evaluating
+queries over synthetic logs (see ``benchmarks.log_generator``), with a
+configurable query latency and Insights quotas answered as throttling errors,
+so that schedulers and rate limiters can be benchmarked offline and
+deterministically.
+"""
+
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any, Callable, Iterable
+
+from benchmarks.aws_instrumentation import FakeError, fake_operation
+from benchmarks.insights_query import InsightsQuery
+
+# Log events of a log group between two times in seconds
+LogSource = Callable[[int, int], Iterable[dict[str, Any]]]
+
+# Default Logs Insights quotas of an account and region
+aws_quotas = {
+    "max_concurrent_queries": 30,
+    "start_query_rate": 5.0,
+    "get_query_results_rate": 5.0,
+}
+
+
+class FakeInsights:
+    """
+    Logs Insights answering queries over synthetic logs.
+
+    Parameters
+    ----------
+    query_latency : float, default=0.0
+        Seconds a query runs before completing
+    scan_rate : float, optional
+        Bytes scanned per second, the scan time is added to the latency
+    max_concurrent_queries : int, optional
+        Running queries above which StartQuery fails with
+        LimitExceededException, unlimited if not set
+    start_query_rate : float, optional
+        StartQuery calls per second above which calls are throttled
+    get_query_results_rate : float, optional
+        GetQueryResults calls per second above which calls are throttled
+    clock : Callable, default=time.monotonic
+        Time source in seconds
+    """
+
+    def __init__(
+        self,
+        query_latency: float = 0.0,
+        scan_rate: float | None = None,
+        max_concurrent_queries: int | None = None,
+        start_query_rate: float | None = None,
+        get_query_results_rate: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.query_latency = query_latency
+        self.scan_rate = scan_rate
+        self.max_concurrent_queries = max_concurrent_queries
+        self.rates = {
+            "StartQuery": start_query_rate,
+            "GetQueryResults": get_query_results_rate,
+        }
+        self.clock = clock
+        self.log_groups: dict[str, LogSource] = {}
+        self.queries: dict[str, dict[str, Any]] = {}
+        self.calls: dict[str, deque[float]] = {}
+        self.counters: Counter[str] = Counter()
+        # Calls come from the generator's thread pools
+        self.lock = threading.Lock()
+
+    def install(self) -> None:
+        """Register the fake operations on the default session."""
+        fake_operation("cloudwatch-logs", "StartQuery", self.start_query)
+        fake_operation("cloudwatch-logs", "GetQueryResults", self.get_query_results)
+        fake_operation("cloudwatch-logs", "StopQuery", self.stop_query)
+
+    def add_log_group(self, name: str, source: LogSource) -> None:
+        """
+        Make a log group queryable.
+
+        Parameters
+        ----------
+        name : str
+            Log group name
+        source : Callable
+            Function returning the log events between two times in seconds
+        """
+        self.log_groups[name] = source
+
+    def reset(self) -> None:
+        """Remove the log groups, queries and counters."""
+        with self.lock:
+            self.log_groups.clear()
+            self.queries.clear()
+            self.calls.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        """
+        Export and reset the counters.
+
+        Returns
+        -------
+        dict
+            Queries started, cancelled, throttled and rejected calls, and bytes
+            scanned since the last snapshot
+        """
+        with self.lock:
+            result = {
+                "queries": self.counters["queries"],
+                "cancelled": self.counters["cancelled"],
+                "throttled": self.counters["throttled"],
+                "limitExceeded": self.counters["limitExceeded"],
+                "bytesScanned": self.counters["bytesScanned"],
+            }
+            self.counters.clear()
+        return result
+
+    def throttle(self, operation: str) -> None:
+        """
+        Account for a call, failing it above the operation's rate.
+
+        Must be called with the lock held.
+
+        Parameters
+        ----------
+        operation : str
+            Operation name
+
+        Raises
+        ------
+        FakeError
+            ThrottlingException if the rate is exceeded
+        """
+        rate = self.rates.get(operation)
+        if rate is None:
+            return
+        now = self.clock()
+        calls = self.calls.setdefault(operation, deque())
+        while calls and calls[0] <= now - 1:
+            calls.popleft()
+        if len(calls) >= rate:
+            self.counters["throttled"] += 1
+            raise FakeError("ThrottlingException", "Rate exceeded")
+        calls.append(now)
+
+    def running_queries(self, now: float) -> int:
+        """
+        Count the queries still running.
+
+        Parameters
+        ----------
+        now : float
+            Current time
+
+        Returns
+        -------
+        int
+            Queries neither complete nor cancelled
+        """
+        return sum(
+            1
+            for query in self.queries.values()
+            if query["status"] == "Running" and now < query["readyAt"]
+        )
+
+    def start_query(self, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        Start a query, evaluating it right away.
+
+        Parameters
+        ----------
+        params : dict
+            StartQuery parameters
+
+        Returns
+        -------
+        dict
+            StartQuery response
+
+        Raises
+        ------
+        FakeError
+            If the call is throttled, too many queries run, the query is
+            malformed or a log group doesn't exist
+        """
+        names = params.get("logGroupNames") or [params["logGroupName"]]
+        try:
+            query = InsightsQuery(params["queryString"])
+        except (ValueError, SyntaxError) as e:
+            raise FakeError("MalformedQueryException", str(e)) from e
+        with self.lock:
+            self.throttle("StartQuery")
+            if (
+                self.max_concurrent_queries is not None
+                and self.running_queries(self.clock()) >= self.max_concurrent_queries
+            ):
+                self.counters["limitExceeded"] += 1
+                raise FakeError(
+                    "LimitExceededException", "Concurrent query limit reached"
+                )
+            if any(name not in self.log_groups for name in names):
+                raise FakeError(
+                    "ResourceNotFoundException",
+                    "The specified log group does not exist.",
+                )
+            sources = [self.log_groups[name] for name in names]
+
+        def events() -> Iterable[dict[str, Any]]:
+            for name, source in zip(names, sources):
+                for event in source(params["startTime"], params["endTime"]):
+                    yield event | {"logGroup": name}
+
+        results, statistics = query.run(events())
+        latency = self.query_latency
+        if self.scan_rate:
+            latency += statistics["bytesScanned"] / self.scan_rate
+        query_id = str(uuid.uuid4())
+        with self.lock:
+            self.counters["queries"] += 1
+            self.counters["bytesScanned"] += int(statistics["bytesScanned"])
+            self.queries[query_id] = {
+                "status": "Running",
+                "readyAt": self.clock() + latency,
+                "results": results,
+                "statistics": statistics,
+            }
+        return {"queryId": query_id}
+
+    def get_query_results(self, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        Get the status and, once complete, the results of a query.
+
+        Parameters
+        ----------
+        params : dict
+            GetQueryResults parameters
+
+        Returns
+        -------
+        dict
+            GetQueryResults response
+
+        Raises
+        ------
+        FakeError
+            If the call is throttled or the query doesn't exist
+        """
+        with self.lock:
+            self.throttle("GetQueryResults")
+            query = self.query(params["queryId"])
+            if query["status"] == "Running" and self.clock() >= query["readyAt"]:
+                query["status"] = "Complete"
+        if query["status"] != "Complete":
+            return {"status": query["status"], "results": [], "statistics": {}}
+        return {
+            "status": "Complete",
+            "results": query["results"],
+            "statistics": query["statistics"],
+        }
+
+    def stop_query(self, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        Cancel a running query.
+
+        Parameters
+        ----------
+        params : dict
+            StopQuery parameters
+
+        Returns
+        -------
+        dict
+            StopQuery response, success is false if the query already ended
+        """
+        with self.lock:
+            query = self.query(params["queryId"])
+            running = query["status"] == "Running" and self.clock() < query["readyAt"]
+            if running:
+                query["status"] = "Cancelled"
+                self.counters["cancelled"] += 1
+        return {"success": running}
+
+    def query(self, query_id: str) -> dict[str, Any]:
+        """
+        Get a query started on the fake.
+
+        Parameters
+        ----------
+        query_id : str
+            Query id
+
+        Returns
+        -------
+        dict
+            Query state
+
+        Raises
+        ------
+        FakeError
+            If the query doesn't exist
+        """
+        if query_id not in self.queries:
+            raise FakeError("ResourceNotFoundException", f"Unknown query {query_id}")
+        return self.queries[query_id]
@@ -0,0 +1,577 @@
+"""Evaluator for the subset of the Logs Insights query language the project uses.
+
+Supported commands are ``fields`` and ``display`` (ignored, every field is
+available), ``parse`` with glob patterns, ``filter``, ``stats`` with optional
+``by`` fields, ``sort`` and ``limit``. Expressions support arithmetic,
+comparisons, ``and``/``or``/``not``, the aggregates ``count``, ``sum``,
+``avg``, ``min``, ``max`` and ``count_distinct``, and the functions
+``greatest``, ``least``, ``strlen``, ``abs``, ``floor``, ``ceil`` and
+``ispresent``. Stats expressions may reference the aliases defined before them.
+
+Like Insights, the runtime's REPORT lines get the discovered fields
+``@duration``, ``@billedDuration``, ``@memorySize`` and ``@maxMemoryUsed``
+(bytes), ``@initDuration`` and ``@requestId``, and JSON messages expose their
+top-level keys as fields.
+"""
+
+import ast
+import json
+import math
+import re
+from typing import Any, Callable, Iterable
+
+from benchmarks.synthetic_account import bytes_per_mb
+
+aggregate_functions = ["count", "sum", "avg", "min", "max", "count_distinct"]
+
+report_pattern = re.compile(
+    r"^REPORT RequestId: (?P<requestId>\S+)\tDuration: (?P<duration>[\d.]+) ms\t"
+    r"Billed Duration: (?P<billedDuration>\d+) ms\tMemory Size: (?P<memorySize>\d+) MB"
+    r"\tMax Memory Used: (?P<maxMemoryUsed>\d+) MB"
+    r"(?:\tInit Duration: (?P<initDuration>[\d.]+) ms)?"
+)
+
+
+def greatest(*values: Any) -> Any:
+    """
+    Get the largest non-null value.
+
+    Parameters
+    ----------
+    *values : Any
+        Values to compare
+
+    Returns
+    -------
+    Any
+        Largest value, None if all are null
+    """
+    present = [value for value in values if value is not None]
+    return max(present) if present else None
+
+
+def least(*values: Any) -> Any:
+    """
+    Get the smallest non-null value.
+
+    Parameters
+    ----------
+    *values : Any
+        Values to compare
+
+    Returns
+    -------
+    Any
+        Smallest value, None if all are null
+    """
+    present = [value for value in values if value is not None]
+    return min(present) if present else None
+
+
+scalar_functions: dict[str, Callable[..., Any]] = {
+    "greatest": greatest,
+    "least": least,
+    "strlen": lambda value: None if value is None else len(str(value)),
+    "abs": abs,
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "ispresent": lambda value: value is not None,
+    "like": lambda value, pattern: value is not None
+    and re.search(pattern, str(value)) is not None,
+}
+
+
+class Row(dict[str, Any]):
+    """
+    Log record whose missing fields read as null.
+
+    Used as the local namespace of evaluated expressions, so that names not
+    bound to a field resolve to the query functions.
+    """
+
+    def __missing__(self, key: str) -> Any:
+        """
+        Read a missing field.
+
+        Parameters
+        ----------
+        key : str
+            Field name
+
+        Returns
+        -------
+        Any
+            Query function with this name, None (null) otherwise
+        """
+        return scalar_functions.get(key)
+
+
+def field_name(name: str) -> str:
+    """
+    Convert an Insights field name to a Python identifier.
+
+    Parameters
+    ----------
+    name : str
+        Field name such as ``@message``
+
+    Returns
+    -------
+    str
+        Identifier such as ``at_message``
+    """
+    return "at_" + name[1:] if name.startswith("@") else name
+
+
+def to_python(expression: str) -> str:
+    """
+    Translate an Insights expression to Python syntax.
+
+    Parameters
+    ----------
+    expression : str
+        Insights expression
+
+    Returns
+    -------
+    str
+        Equivalent Python expression
+    """
+    expression = re.sub(r"@(\w+)", r"at_\1", expression)
+    expression = re.sub(r"count\(\s*\*\s*\)", "count()", expression)
+    # Substring or regular expression match
+    expression = re.sub(
+        r'(\w+)\s+like\s+(?:"([^"]*)"|/([^/]*)/)',
+        lambda m: f"like({m[1]}, {re.escape(m[2]) if m[3] is None else m[3]!r})",
+        expression,
+    )
+    # Insights compares with a single equal sign
+    return re.sub(r"(?<![!<>=])=(?!=)", "==", expression)
+
+
+def split_top_level(text: str, separator: str) -> list[str]:
+    """
+    Split text on a separator outside of parentheses and quotes.
+
+    Parameters
+    ----------
+    text : str
+        Text to split
+    separator : str
+        Single character separator
+
+    Returns
+    -------
+    list of str
+        Stripped, non-empty parts
+    """
+    parts: list[str] = []
+    current: list[str] = []
+    depth, quote = 0, None
+    for char in text:
+        if quote:
+            quote = None if char == quote else quote
+        elif char in "\"'":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def split_alias(item: str) -> tuple[str, str]:
+    """
+    Split ``expression as alias``.
+
+    Parameters
+    ----------
+    item : str
+        Stats item or expression
+
+    Returns
+    -------
+    tuple
+        Expression and alias, the expression itself if it has no alias
+    """
+    match = re.match(r"^(.*)\s+as\s+([\w@]+)$", item.strip(), re.DOTALL)
+    if match:
+        return match.group(1).strip(), match.group(2)
+    return item.strip(), item.strip()
+
+
+def compile_row_expression(expression: str) -> Callable[[Row], Any]:
+    """
+    Compile an expression evaluated on one record.
+
+    Parameters
+    ----------
+    expression : str
+        Python expression (see ``to_python``)
+
+    Returns
+    -------
+    Callable
+        Function evaluating the expression on a record, null when an operand
+        is null
+    """
+    code = compile(expression, "<insights>", "eval")
+    namespace: dict[str, Any] = {"__builtins__": {}}
+
+    def evaluate(row: Row) -> Any:
+        try:
+            return eval(code, namespace, row)
+        except (TypeError, ZeroDivisionError):
+            return None
+
+    return evaluate
+
+
+class AggregateExtractor(ast.NodeTransformer):
+    """Replace aggregate calls by names, collecting the aggregates to compute."""
+
+    def __init__(self, aggregates: list[tuple[str, str, Callable[[Row], Any]]]):
+        self.aggregates = aggregates
+
+    def visit_Call(self, node: ast.Call) -> Any:
+        """
+        Replace an aggregate call.
+
+        Parameters
+        ----------
+        node : ast.Call
+            Function call
+
+        Returns
+        -------
+        ast.AST
+            Name holding the aggregate value, or the visited call
+        """
+        if isinstance(node.func, ast.Name) and node.func.id in aggregate_functions:
+            name = f"aggregate_{len(self.aggregates)}"
+            argument = ast.unparse(node.args[0]) if node.args else "True"
+            self.aggregates.append(
+                (name, node.func.id, compile_row_expression(argument))
+            )
+            return ast.copy_location(ast.Name(id=name, ctx=ast.Load()), node)
+        return self.generic_visit(node)
+
+
+def aggregate(function: str, values: list[Any]) -> Any:
+    """
+    Compute an aggregate over the values of a group.
+
+    Parameters
+    ----------
+    function : str
+        Aggregate function name
+    values : list
+        Values of the aggregated expression, nulls included
+
+    Returns
+    -------
+    Any
+        Aggregate value
+    """
+    present = [value for value in values if value is not None]
+    if function == "count":
+        return len(present)
+    if function == "count_distinct":
+        return len(set(present))
+    if not present:
+        return None
+    if function == "sum":
+        return sum(present)
+    if function == "avg":
+        return sum(present) / len(present)
+    return min(present) if function == "min" else max(present)
+
+
+def format_value(value: Any) -> str:
+    """
+    Format a result value like Insights.
+
+    Parameters
+    ----------
+    value : Any
+        Value to format
+
+    Returns
+    -------
+    str
+        Formatted value
+    """
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return str(value)
+
+
+def discover_fields(event: dict[str, Any]) -> Row:
+    """
+    Build a record from a log event, with its discovered fields.
+
+    Parameters
+    ----------
+    event : dict
+        Log event with timestamp, message and logStream
+
+    Returns
+    -------
+    Row
+        Record with Insights fields
+    """
+    message = event["message"]
+    row = Row(
+        at_timestamp=event["timestamp"],
+        at_message=message,
+        at_logStream=event.get("logStream"),
+        at_log=event.get("logGroup"),
+    )
+    if message.startswith("REPORT RequestId:"):
+        match = report_pattern.match(message)
+        if match:
+            row["at_type"] = "REPORT"
+            row["at_requestId"] = match["requestId"]
+            row["at_duration"] = float(match["duration"])
+            row["at_billedDuration"] = float(match["billedDuration"])
+            row["at_memorySize"] = int(match["memorySize"]) * bytes_per_mb
+            row["at_maxMemoryUsed"] = int(match["maxMemoryUsed"]) * bytes_per_mb
+            if match["initDuration"]:
+                row["at_initDuration"] = float(match["initDuration"])
+    elif message.startswith("{"):
+        try:
+            record = json.loads(message)
+        except ValueError:
+            record = None
+        if isinstance(record, dict):
+            for key, value in record.items():
+                if isinstance(value, (str, int, float)) and key.isidentifier():
+                    row.setdefault(key, value)
+    return row
+
+
+class InsightsQuery:
+    """
+    Compiled Logs Insights query.
+
+    Parameters
+    ----------
+    query_string : str
+        Query in the supported subset of the Insights language
+
+    Raises
+    ------
+    ValueError
+        If the query uses an unsupported command
+    """
+
+    def __init__(self, query_string: str) -> None:
+        self.steps: list[tuple[str, Any]] = []
+        for command in split_top_level(query_string, "|"):
+            keyword, _, argument = command.partition(" ")
+            argument = argument.strip()
+            if keyword in ["fields", "display"]:
+                continue
+            elif keyword == "parse":
+                self.steps.append(("parse", self.compile_parse(argument)))
+            elif keyword == "filter":
+                self.steps.append(
+                    ("filter", compile_row_expression(to_python(argument)))
+                )
+            elif keyword == "stats":
+                self.steps.append(("stats", self.compile_stats(argument)))
+            elif keyword == "sort":
+                field, _, order = argument.partition(" ")
+                self.steps.append(("sort", (field, order.strip() == "desc")))
+            elif keyword == "limit":
+                self.steps.append(("limit", int(argument)))
+            else:
+                raise ValueError(f"Unsupported query command: {keyword}")
+
+    @staticmethod
+    def compile_parse(argument: str) -> tuple[str, re.Pattern[str], list[str]]:
+        """
+        Compile a glob ``parse`` command.
+
+        Parameters
+        ----------
+        argument : str
+            ``@field "pattern with *" as name1, name2``
+
+        Returns
+        -------
+        tuple
+            Source field, regular expression and captured field names
+        """
+        match = re.match(r'^(\S+)\s+"(.*)"\s+as\s+(.+)$', argument, re.DOTALL)
+        if not match:
+            raise ValueError(f"Unsupported parse command: {argument}")
+        pieces = [re.escape(piece) for piece in match.group(2).split("*")]
+        captures = ["(.*?)"] * (len(pieces) - 2) + ["(.*)"]
+        pattern = pieces[0] + "".join(
+            capture + piece for capture, piece in zip(captures, pieces[1:])
+        )
+        names = [name.strip() for name in match.group(3).split(",")]
+        return field_name(match.group(1)), re.compile(pattern, re.DOTALL), names
+
+    @staticmethod
+    def compile_stats(argument: str) -> dict[str, Any]:
+        """
+        Compile a ``stats`` command.
+
+        Parameters
+        ----------
+        argument : str
+            Stats items, optionally followed by ``by`` fields
+
+        Returns
+        -------
+        dict
+            Group fields, aggregates and compiled items
+        """
+        by_fields: list[str] = []
+        match = re.match(r"^(.*)\s+by\s+([\w@,\s]+)$", argument, re.DOTALL)
+        if match:
+            argument = match.group(1)
+            by_fields = [field.strip() for field in match.group(2).split(",")]
+        aggregates: list[tuple[str, str, Callable[[Row], Any]]] = []
+        extractor = AggregateExtractor(aggregates)
+        items = []
+        for item in split_top_level(argument, ","):
+            expression, alias = split_alias(item)
+            tree = extractor.visit(ast.parse(to_python(expression), mode="eval"))
+            items.append((alias, compile(tree, "<insights>", "eval")))
+        return {"by": by_fields, "aggregates": aggregates, "items": items}
+
+    def run(
+        self, events: Iterable[dict[str, Any]]
+    ) -> tuple[list[list[dict[str, str]]], dict[str, float]]:
+        """
+        Run the query over log events.
+
+        Parameters
+        ----------
+        events : Iterable of dict
+            Log events with timestamp, message and logStream
+
+        Returns
+        -------
+        tuple
+            Result rows as Insights ``field``/``value`` pairs, and statistics
+            (recordsScanned, recordsMatched, bytesScanned)
+        """
+        statistics = {"recordsScanned": 0.0, "recordsMatched": 0.0, "bytesScanned": 0.0}
+        stats = next((arg for step, arg in self.steps if step == "stats"), None)
+        # Aggregated values per group, in a single pass over the records
+        groups: dict[tuple[Any, ...], list[list[Any]]] = {}
+        rows: list[Row] = []
+        for event in events:
+            statistics["recordsScanned"] += 1
+            statistics["bytesScanned"] += len(event["message"]) + 1
+            row = discover_fields(event)
+            if not self.apply_row_steps(row):
+                continue
+            statistics["recordsMatched"] += 1
+            if stats is None:
+                rows.append(row)
+                continue
+            key = tuple(row[field_name(field)] for field in stats["by"])
+            values = groups.setdefault(key, [[] for _ in stats["aggregates"]])
+            for collected, (_, _, evaluate) in zip(values, stats["aggregates"]):
+                collected.append(evaluate(row))
+
+        if stats is not None:
+            rows = self.evaluate_stats(stats, groups)
+        for step, argument in self.steps:
+            if step == "sort":
+                field, descending = argument
+                rows.sort(
+                    key=lambda row: (
+                        row[field_name(field)] is None,
+                        row[field_name(field)],
+                    ),
+                    reverse=descending,
+                )
+            elif step == "limit":
+                rows = rows[:argument]
+        results = [
+            [
+                {
+                    "field": "@" + name[3:] if name.startswith("at_") else name,
+                    "value": format_value(value),
+                }
+                for name, value in row.items()
+                if value is not None
+            ]
+            for row in rows
+        ]
+        return results, statistics
+
+    def apply_row_steps(self, row: Row) -> bool:
+        """
+        Apply the parse and filter commands to a record.
+
+        Parameters
+        ----------
+        row : Row
+            Record, updated with the parsed fields
+
+        Returns
+        -------
+        bool
+            Whether the record passes the filters
+        """
+        for step, argument in self.steps:
+            if step == "parse":
+                source, pattern, names = argument
+                match = pattern.search(str(row[source] or ""))
+                if match:
+                    # Patterns without wildcard capture the matched text
+                    row.update(zip(names, match.groups() or [match.group(0)]))
+            elif step == "filter":
+                if not argument(row):
+                    return False
+            elif step == "stats":
+                break
+        return True
+
+    @staticmethod
+    def evaluate_stats(
+        stats: dict[str, Any], groups: dict[tuple[Any, ...], list[list[Any]]]
+    ) -> list[Row]:
+        """
+        Compute the stats items of each group.
+
+        Parameters
+        ----------
+        stats : dict
+            Compiled stats command
+        groups : dict
+            Group key to the values of each aggregate
+
+        Returns
+        -------
+        list of Row
+            One row per group, group fields first
+        """
+        namespace: dict[str, Any] = {"__builtins__": {}}
+        rows = []
+        for key, values in groups.items():
+            row = Row(zip((field_name(f) for f in stats["by"]), key))
+            scope = Row(row)
+            for (name, function, _), collected in zip(stats["aggregates"], values):
+                scope[name] = aggregate(function, collected)
+            for alias, code in stats["items"]:
+                try:
+                    value = eval(code, namespace, scope)
+                except (TypeError, ZeroDivisionError):
+                    value = None
+                scope[alias] = row[alias] = value
+            rows.append(row)
+        return rows
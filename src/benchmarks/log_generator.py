@@ -0,0 +1,152 @@
+"""Synthetic Lambda logs.
+
+Produces the lines the Lambda runtime and a typical function write for each
+invocation (START, application lines, timeout message, END, REPORT) following
+a function profile from ``benchmarks.synthetic_account``. Invocations arrive
+as a Poisson process and events are generated lazily in timestamp order, so
+large periods can be streamed without holding them in memory.
+"""
+
+import math
+import random
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+# Application line written between START and END, padded to the profile's
+# log volume
+app_line = "{timestamp}\t{request_id}\tINFO\tProcessed record {index} {padding}"
+
+
+def format_timestamp(timestamp_ms: int) -> str:
+    """
+    Format a timestamp like the Lambda runtime.
+
+    Parameters
+    ----------
+    timestamp_ms : int
+        Milliseconds since the epoch
+
+    Returns
+    -------
+    str
+        ISO 8601 timestamp with milliseconds
+    """
+    moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{timestamp_ms % 1000:03d}Z"
+
+
+def generate_log_events(
+    spec: dict[str, Any],
+    start_time: int,
+    end_time: int,
+    seed: int = 0,
+    duration_sigma: float = 0.5,
+    memory_jitter: float = 0.3,
+    app_lines_per_invocation: int = 2,
+    cold_start_rate: float = 0.02,
+    timeout_seconds: float = 3.0,
+    concurrency: int = 4,
+) -> Iterator[dict[str, Any]]:
+    """
+    Generate the log events of a function over a period.
+
+    Parameters
+    ----------
+    spec : dict
+        Function profile (invocationsPerDay, avgDurationMs, memorySize,
+        maxMemoryUsedMB, timeoutRate, logBytesPerInvocation)
+    start_time : int
+        Period start in seconds since the epoch
+    end_time : int
+        Period end in seconds since the epoch
+    seed : int, default=0
+        Random seed, combined with the function name
+    duration_sigma : float, default=0.5
+        Standard deviation of the log-normal duration distribution
+    memory_jitter : float, default=0.3
+        Maximum relative decrease of the memory used below the profile's peak
+    app_lines_per_invocation : int, default=2
+        Application lines written per invocation
+    cold_start_rate : float, default=0.02
+        Share of invocations reporting an init duration
+    timeout_seconds : float, default=3.0
+        Function timeout, used as duration of timed out invocations
+    concurrency : int, default=4
+        Number of execution environments, i.e. log streams, in use
+
+    Yields
+    ------
+    dict
+        Log event with timestamp (ms), message and logStream
+    """
+    rng = random.Random(f"{seed}-{spec['name']}")
+    rate_per_second = spec["invocationsPerDay"] / 86400
+    if rate_per_second <= 0:
+        return
+    # Log-normal parameters giving the profile's average duration
+    mu = math.log(spec["avgDurationMs"]) - duration_sigma**2 / 2
+    day = datetime.fromtimestamp(start_time, tz=timezone.utc).strftime("%Y/%m/%d")
+    streams = [
+        f"{day}/[$LATEST]{rng.getrandbits(128):032x}" for _ in range(concurrency)
+    ]
+    overhead = 250  # START, END and REPORT lines
+    padding_size = max(
+        (spec["logBytesPerInvocation"] - overhead) // max(app_lines_per_invocation, 1)
+        - 60,
+        0,
+    )
+
+    moment = float(start_time)
+    while True:
+        moment += rng.expovariate(rate_per_second)
+        if moment >= end_time:
+            return
+        timestamp = int(moment * 1000)
+        request_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        stream = rng.choice(streams)
+        timed_out = rng.random() < spec["timeoutRate"]
+        duration = (
+            timeout_seconds * 1000
+            if timed_out
+            else min(rng.lognormvariate(mu, duration_sigma), timeout_seconds * 1000)
+        )
+        memory_used = max(
+            int(spec["maxMemoryUsedMB"] * (1 - rng.uniform(0, memory_jitter))), 1
+        )
+
+        def event(offset_ms: float, message: str) -> dict[str, Any]:
+            return {
+                "timestamp": timestamp + int(offset_ms),
+                "message": message,
+                "logStream": stream,
+            }
+
+        yield event(0, f"START RequestId: {request_id} Version: $LATEST")
+        for index in range(app_lines_per_invocation):
+            offset = duration * (index + 1) / (app_lines_per_invocation + 1)
+            yield event(
+                offset,
+                app_line.format(
+                    timestamp=format_timestamp(timestamp + int(offset)),
+                    request_id=request_id,
+                    index=index,
+                    padding="x" * padding_size,
+                ),
+            )
+        if timed_out:
+            yield event(
+                duration,
+                f"{format_timestamp(timestamp + int(duration))} {request_id} "
+                f"Task timed out after {timeout_seconds:.2f} seconds",
+            )
+        yield event(duration, f"END RequestId: {request_id}")
+        report = (
+            f"REPORT RequestId: {request_id}\tDuration: {duration:.2f} ms\t"
+            f"Billed Duration: {math.ceil(duration)} ms\t"
+            f"Memory Size: {spec['memorySize']} MB\t"
+            f"Max Memory Used: {memory_used} MB\t"
+        )
+        if rng.random() < cold_start_rate:
+            report += f"Init Duration: {rng.uniform(100, 900):.2f} ms\t"
+        yield event(duration, report)
@@ -0,0 +1,337 @@
+"""Micro-benchmarks of the CPU-heavy report paths.
+
+Times, on synthetic analysis rows and without any AWS call, the parsing and
+merging of the batch CSVs and the summary computation of the aggregator, the
+CSV to JSON conversion of the ``/report`` route and the CSV writing of the
+generator. Results can be compared with a baseline, failing on regressions
+above a threshold. The pytest suite in ``tests/benchmarks`` runs the same
+cases with ``--micro-benchmarks``.
+
+Usage (from ``src``)::
+
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.micro --compare micro.json --threshold 20
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+# The backend reads its configuration at import time
+os.environ.setdefault("BUCKET_NAME", "lambda-cost-analysis-benchmark")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("POWERTOOLS_LOG_LEVEL", "WARNING")
+
+import pandas as pd  # noqa: E402
+
+from backend.api.get_analysis_report import read_analysis_records  # noqa: E402
+from backend.step_function.analysis_aggregator import (  # noqa: E402
+    build_summary,
+    read_analysis_csv,
+)
+from backend.step_function.analysis_generator import write_cost_rows  # noqa: E402
+from backend.step_function.analysis_initializer import (  # noqa: E402
+    max_arn_per_invocation,
+)
+from benchmarks.pipeline import git_commit  # noqa: E402
+
+default_sizes = [1000, 10000, 100000]
+# Relative slowdown, in percent, reported as a regression
+default_threshold = 20.0
+default_repeat = 3
+# Slow cases stop repeating once they ran for this long
+repeat_budget_seconds = 10.0
+
+# Benchmark case: builds the data for a number of rows, returns the timed call
+Case = Callable[[int], Callable[[], Any]]
+
+
+def cost_rows(count: int, seed: int = 0) -> list[dict[str, Any]]:
+    """
+    Build synthetic per-function analysis rows.
+
+    Parameters
+    ----------
+    count : int
+        Number of rows
+    seed : int, default=0
+        Random seed
+
+    Returns
+    -------
+    list of dict
+        Rows with the generator's CSV columns
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        invocations = int(rng.paretovariate(1.2) * 500)
+        duration = invocations * rng.lognormvariate(-2, 1)
+        memory = rng.choice([128, 256, 512, 1024, 2048]) * 1.048576
+        memory_cost = duration * memory / 1024 * 0.0000166667
+        invocation_cost = invocations * 0.0000002
+        max_used = memory * rng.uniform(0.2, 0.95)
+        optimal = min(max(max_used * 1.2, 128), memory)
+        rows.append(
+            {
+                "functionName": f"bench-function-{i:06d}",
+                "runtime": rng.choice(["python3.13", "nodejs20.x", "java21"]),
+                "architecture": rng.choice(["x86_64", "arm64"]),
+                "countInvocations": invocations,
+                "allDurationInSeconds": duration,
+                "provisionedMemoryMB": memory,
+                "MemoryCost": memory_cost,
+                "InvocationCost": invocation_cost,
+                "StorageCost": 0.0,
+                "totalCost": memory_cost + invocation_cost,
+                "avgCostPerInvocation": (memory_cost + invocation_cost)
+                / max(invocations, 1),
+                "maxMemoryUsedMB": max_used,
+                "overProvisionedMB": memory - max_used,
+                "optimalMemory": optimal,
+                "potentialSavings": memory_cost * (1 - optimal / memory),
+                "avgDurationPerInvocation": duration / max(invocations, 1),
+                "timeoutInvocations": int(invocations * rng.choice([0, 0, 0.01])),
+                "logSizeGB": invocations * 1500 / 1024**3,
+                "logIngestionCost": invocations * 1500 / 1024**3 * 0.5,
+                "logStorageCost": invocations * 1500 / 1024**3 * 0.03,
+                "analysisCost": invocations * 1500 / 1024**3 * 0.005,
+                "accountId": rng.choice(["012345678901", "123456789012"]),
+                "region": rng.choice(["us-east-1", "eu-central-1"]),
+            }
+        )
+    return rows
+
+
+def batch_csvs(count: int) -> list[str]:
+    """
+    Build the batch CSVs the generator writes for a number of functions.
+
+    Parameters
+    ----------
+    count : int
+        Number of functions
+
+    Returns
+    -------
+    list of str
+        One CSV per batch of the initializer
+    """
+    rows = cost_rows(count)
+    batches = []
+    for start in range(0, count, max_arn_per_invocation):
+        csv_file = io.StringIO()
+        write_cost_rows(csv_file, rows[start : start + max_arn_per_invocation])
+        batches.append(csv_file.getvalue())
+    return batches
+
+
+def merge_case(count: int) -> Callable[[], Any]:
+    """
+    Parse and merge the batch CSVs, like the aggregator.
+
+    Parameters
+    ----------
+    count : int
+        Number of rows
+
+    Returns
+    -------
+    Callable
+        Timed call
+    """
+    batches = batch_csvs(count)
+    return lambda: pd.concat(
+        [read_analysis_csv(io.StringIO(batch)) for batch in batches]
+    )
+
+
+def summary_case(count: int) -> Callable[[], Any]:
+    """
+    Compute the summary of a report, like the aggregator.
+
+    Parameters
+    ----------
+    count : int
+        Number of rows
+
+    Returns
+    -------
+    Callable
+        Timed call
+    """
+    aggregated_data = pd.DataFrame(cost_rows(count))
+    return lambda: build_summary(
+        aggregated_data, "benchmark", "2024-06-01", "2024-06-30"
+    )
+
+
+def records_case(count: int) -> Callable[[], Any]:
+    """
+    Convert analysis.csv to JSON records, like ``/report``.
+
+    Parameters
+    ----------
+    count : int
+        Number of rows
+
+    Returns
+    -------
+    Callable
+        Timed call
+    """
+    analysis = pd.DataFrame(cost_rows(count)).to_csv()
+    return lambda: read_analysis_records(io.StringIO(analysis))
+
+
+def write_case(count: int) -> Callable[[], Any]:
+    """
+    Write analysis rows as CSV, like the generator.
+
+    Parameters
+    ----------
+    count : int
+        Number of rows
+
+    Returns
+    -------
+    Callable
+        Timed call
+    """
+    rows = cost_rows(count)
+    return lambda: write_cost_rows(io.StringIO(), rows)
+
+
+cases: dict[str, Case] = {
+    "aggregator.merge": merge_case,
+    "aggregator.summary": summary_case,
+    "get_report.records": records_case,
+    "generator.write_csv": write_case,
+}
+
+
+def run_case(name: str, size: int, repeat: int = default_repeat) -> float:
+    """
+    Time a benchmark case.
+
+    Parameters
+    ----------
+    name : str
+        Case name
+    size : int
+        Number of rows
+    repeat : int, default=3
+        Maximum timed runs
+
+    Returns
+    -------
+    float
+        Fastest run in seconds
+    """
+    call = cases[name](size)
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+        if sum(timings) > repeat_budget_seconds:
+            break
+    return min(timings)
+
+
+def regression(
+    seconds: float, baseline_seconds: float | None, threshold: float
+) -> float | None:
+    """
+    Check a timing against its baseline.
+
+    Parameters
+    ----------
+    seconds : float
+        Measured time
+    baseline_seconds : float, optional
+        Baseline time, no check if not set
+    threshold : float
+        Allowed slowdown in percent
+
+    Returns
+    -------
+    float or None
+        Slowdown in percent if above the threshold, None otherwise
+    """
+    if not baseline_seconds:
+        return None
+    change = (seconds / baseline_seconds - 1) * 100
+    return change if change > threshold else None
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run the micro-benchmarks from the command line.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments, sys.argv if not set
+
+    Returns
+    -------
+    int
+        Exit status, 1 if --compare found regressions
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--cases", nargs="+", choices=list(cases), default=list(cases))
+    parser.add_argument("--repeat", type=int, default=default_repeat)
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--compare", help="Baseline JSON result to compare with")
+    parser.add_argument("--threshold", type=float, default=default_threshold)
+    args = parser.parse_args(argv)
+
+    baseline: dict[str, dict[str, float]] = {}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+    results: dict[str, dict[str, float]] = {}
+    regressions = []
+    for name in args.cases:
+        for size in args.sizes:
+            seconds = run_case(name, size, args.repeat)
+            results.setdefault(name, {})[str(size)] = round(seconds, 6)
+            before = baseline.get(name, {}).get(str(size))
+            slowdown = regression(seconds, before, args.threshold)
+            if slowdown is not None:
+                regressions.append(f"{name}/{size} (+{slowdown:.0f}%)")
+            print(
+                f"{name:<22} {size:>7} {seconds:>9.4f}s"
+                + (f" (baseline {before:.4f}s)" if before else ""),
+                file=sys.stderr,
+            )
+
+    result = {
+        "commit": git_commit(),
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,543 @@
+"""End-to-end pipeline benchmark on moto.
+
+Creates synthetic accounts and runs initializer, generator batches, aggregator
+and API reads in-process, recording per stage the wall time, AWS API calls by
+operation, S3 bytes moved and peak RSS. Logs Insights queries, which moto can't
+evaluate, are answered from the function profiles, or with ``--insights fake``
+evaluated over synthetic logs with Insights latency and quotas.
+
+Usage (from ``src``)::
+
+    python -m benchmarks.pipeline --sizes 100 1000 10000 --output bench.json
+    python -m benchmarks.pipeline --sizes 100 --compare bench.json
+    python -m benchmarks.pipeline --sizes 100 --insights fake --days 1 --aws-quotas
+    python -m benchmarks.pipeline --sizes 100 --record run.jsonl.gz
+    python -m benchmarks.pipeline --sizes 100 --replay run.jsonl.gz --latency-scale 0
+"""
+
+import argparse
+import functools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+# The backend reads its configuration at import time
+os.environ.setdefault("BUCKET_NAME", "lambda-cost-analysis-benchmark")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("POWERTOOLS_LOG_LEVEL", "WARNING")
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from benchmarks.aws_instrumentation import CallRecorder, stub_operation  # noqa: E402
+from benchmarks.cassette import CassettePlayer, CassetteRecorder  # noqa: E402
+from benchmarks.insights_fake import FakeInsights, aws_quotas  # noqa: E402
+from benchmarks.log_generator import generate_log_events  # noqa: E402
+from benchmarks.synthetic_account import (  # noqa: E402
+    create_synthetic_account,
+    expected_query_results,
+    function_specs,
+)
+
+default_sizes = [100, 1000, 10000]
+start_date = "2024-06-01T00:00:00.000Z"
+default_days = 30
+# Concurrency of the analysis Map state (maxConcurrency in the state machine)
+map_concurrency = 4
+# Relative wall time increase reported as a regression by --compare
+regression_threshold = 0.10
+# Services recorded by --record: S3 holds the pipeline's own artifacts, whose
+# keys change from run to run, and stays on moto
+cassette_services = ["lambda", "logs", "resourcegroupstaggingapi", "sts"]
+
+
+class LambdaContext:
+    """Minimal Lambda context for the handlers' Powertools decorators."""
+
+    function_name = "benchmark"
+    function_version = "$LATEST"
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:benchmark"
+    memory_limit_in_mb = 512
+    aws_request_id = "benchmark"
+    log_group_name = "/aws/lambda/benchmark"
+    log_stream_name = "benchmark"
+
+    def get_remaining_time_in_millis(self) -> int:
+        """
+        Return the remaining execution time.
+
+        Returns
+        -------
+        int
+            Always 15 minutes
+        """
+        return 900000
+
+
+class InsightsStub:
+    """Answer ``StartQuery``/``GetQueryResults`` from the function profiles."""
+
+    def __init__(self) -> None:
+        self.specs: dict[str, dict[str, Any]] = {}
+        self.queries: dict[str, dict[str, Any]] = {}
+
+    def load(self, specs: list[dict[str, Any]]) -> None:
+        """
+        Set the function profiles of the synthetic account being analyzed.
+
+        Parameters
+        ----------
+        specs : list of dict
+            Function profiles
+        """
+        self.specs = {f"/aws/lambda/{spec['name']}": spec for spec in specs}
+        self.queries.clear()
+
+    def install(self) -> None:
+        """Register the stubs on the default session."""
+        stub_operation("cloudwatch-logs", "StartQuery", self.start_query)
+        stub_operation("cloudwatch-logs", "GetQueryResults", self.get_query_results)
+
+    def start_query(self, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        Register a query.
+
+        Parameters
+        ----------
+        params : dict
+            StartQuery parameters
+
+        Returns
+        -------
+        dict
+            StartQuery response
+        """
+        query_id = str(uuid.uuid4())
+        self.queries[query_id] = params
+        return {"queryId": query_id}
+
+    def get_query_results(self, params: dict[str, Any]) -> dict[str, Any]:
+        """
+        Answer a query with the aggregates of the function profile.
+
+        Parameters
+        ----------
+        params : dict
+            GetQueryResults parameters
+
+        Returns
+        -------
+        dict
+            Completed GetQueryResults response
+        """
+        query = self.queries.pop(params["queryId"])
+        days = (query["endTime"] - query["startTime"]) / 86400
+        row, bytes_scanned = expected_query_results(
+            self.specs[query["logGroupName"]], days
+        )
+        return {
+            "status": "Complete",
+            "results": [row],
+            "statistics": {"bytesScanned": bytes_scanned},
+        }
+
+
+def period_end(days: int) -> str:
+    """
+    Compute the end date of the analyzed period.
+
+    Parameters
+    ----------
+    days : int
+        Length of the period in days
+
+    Returns
+    -------
+    str
+        Last millisecond of the period, in the initializer's date format
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%S.%fZ")
+    end = start + timedelta(days=days) - timedelta(milliseconds=1)
+    return end.strftime("%Y-%m-%dT%H:%M:%S.") + f"{end.microsecond // 1000:03d}Z"
+
+
+def load_insights(
+    insights: InsightsStub | FakeInsights, specs: list[dict[str, Any]], seed: int
+) -> None:
+    """
+    Make the synthetic account's log groups queryable.
+
+    Parameters
+    ----------
+    insights : InsightsStub or FakeInsights
+        Logs Insights stand-in
+    specs : list of dict
+        Function profiles
+    seed : int
+        Seed of the synthetic logs
+    """
+    if isinstance(insights, InsightsStub):
+        insights.load(specs)
+        return
+    insights.reset()
+    for spec in specs:
+        insights.add_log_group(
+            f"/aws/lambda/{spec['name']}",
+            functools.partial(generate_log_events, spec, seed=seed),
+        )
+
+
+def peak_rss_mb() -> float:
+    """
+    Get the peak resident set size of the process.
+
+    Returns
+    -------
+    float
+        Peak RSS in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measure(
+    recorder: CallRecorder, stage: Callable[[], Any]
+) -> tuple[Any, dict[str, Any]]:
+    """
+    Run a pipeline stage and record its metrics.
+
+    Parameters
+    ----------
+    recorder : CallRecorder
+        AWS call recorder, reset before the stage
+    stage : Callable
+        Stage to run
+
+    Returns
+    -------
+    tuple
+        Stage output and metrics
+    """
+    recorder.snapshot()
+    started = time.perf_counter()
+    output = stage()
+    metrics = {"wallSeconds": round(time.perf_counter() - started, 3)}
+    metrics.update(recorder.snapshot())
+    metrics["peakRssMB"] = peak_rss_mb()
+    return output, metrics
+
+
+def api_request(path: str, query: dict[str, str] | None = None) -> dict[str, Any]:
+    """
+    Invoke the API Lambda in-process.
+
+    Parameters
+    ----------
+    path : str
+        Route path
+    query : dict, optional
+        Query string parameters
+
+    Returns
+    -------
+    dict
+        API Gateway proxy response
+
+    Raises
+    ------
+    RuntimeError
+        If the API answers with an error status
+    """
+    from backend.api.app import lambda_handler
+
+    response: dict[str, Any] = lambda_handler(
+        {"httpMethod": "GET", "path": path, "queryStringParameters": query},
+        LambdaContext(),
+    )
+    if response["statusCode"] >= 400:
+        raise RuntimeError(f"{path} answered {response['statusCode']}")
+    return response
+
+
+def run_pipeline(
+    size: int, seed: int, recorder: CallRecorder, days: int = default_days
+) -> dict[str, Any]:
+    """
+    Benchmark the pipeline on a synthetic account.
+
+    Parameters
+    ----------
+    size : int
+        Number of functions of the account
+    seed : int
+        Seed of the function profiles
+    recorder : CallRecorder
+        AWS call recorder
+    days : int, default=30
+        Length of the analyzed period
+
+    Returns
+    -------
+    dict
+        Metrics of each stage
+    """
+    from backend.api import list_lambda_functions
+    from backend.step_function import (
+        analysis_aggregator,
+        analysis_generator,
+        analysis_initializer,
+    )
+    from backend.utils.multithread_utils import stream_map
+
+    specs = function_specs(size, seed)
+    report_id = f"benchmark-{size}"
+    end_date = period_end(days)
+    context = LambdaContext()
+    stages: dict[str, Any] = {}
+
+    boto3.client("s3").create_bucket(Bucket=os.environ["BUCKET_NAME"])
+    _, stages["setup"] = measure(recorder, lambda: create_synthetic_account(specs))
+    list_lambda_functions.inventory_cache.clear()
+
+    initializer_output, stages["initializer"] = measure(
+        recorder,
+        lambda: analysis_initializer.lambda_handler(
+            {
+                "lambda_functions_name": [spec["name"] for spec in specs],
+                "report_id": report_id,
+                "start_date": start_date,
+                "end_date": end_date,
+            },
+            context,
+        ),
+    )
+
+    def run_generator_batches() -> list[dict[str, Any]]:
+        events = [
+            {
+                "lambda_functions_name": batch,
+                "report_id": report_id,
+                "start_date": start_date,
+                "end_date": end_date,
+            }
+            for batch in initializer_output["lambda_functions_name"]
+        ]
+        return [
+            result.result()
+            for result in stream_map(
+                lambda event: analysis_generator.lambda_handler(event, context),
+                events,
+                max_workers=map_concurrency,
+                ordered=True,
+            )
+        ]
+
+    generator_output, stages["generator"] = measure(recorder, run_generator_batches)
+    _, stages["aggregator"] = measure(
+        recorder, lambda: analysis_aggregator.lambda_handler(generator_output, context)
+    )
+
+    def read_api() -> None:
+        api_request("/report", {"reportID": report_id})
+        api_request("/reportSummaries", {"rowsPerPage": "10"})
+        api_request("/lambda-functions", {"rowsPerPage": "50"})
+
+    _, stages["api"] = measure(recorder, read_api)
+    return {
+        "functions": size,
+        "batches": len(initializer_output["lambda_functions_name"]),
+        "stages": stages,
+        "totalWallSeconds": round(
+            sum(
+                metrics["wallSeconds"]
+                for name, metrics in stages.items()
+                if name != "setup"
+            ),
+            3,
+        ),
+    }
+
+
+def git_commit() -> str | None:
+    """
+    Get the commit the benchmark runs on.
+
+    Returns
+    -------
+    str or None
+        Commit hash, or None outside of a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    """
+    Compare stage wall times with a previous result.
+
+    Parameters
+    ----------
+    current : dict
+        Benchmark result
+    baseline : dict
+        Previous benchmark result
+
+    Returns
+    -------
+    list of str
+        Stages slower than the baseline by more than the threshold
+    """
+    baseline_runs = {run["functions"]: run for run in baseline["runs"]}
+    regressions = []
+    for run in current["runs"]:
+        previous = baseline_runs.get(run["functions"])
+        if previous is None:
+            continue
+        for stage, metrics in run["stages"].items():
+            before = previous["stages"].get(stage, {}).get("wallSeconds")
+            if not before:
+                continue
+            change = metrics["wallSeconds"] / before - 1
+            print(
+                f"{run['functions']:>6} {stage:<12} {before:>9.3f}s -> "
+                f"{metrics['wallSeconds']:>9.3f}s ({change:+.1%})"
+            )
+            if stage != "setup" and change > regression_threshold:
+                regressions.append(f"{run['functions']}/{stage}")
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    """
+    Run the benchmark from the command line.
+
+    Parameters
+    ----------
+    argv : list of str, optional
+        Command line arguments, sys.argv if not set
+
+    Returns
+    -------
+    int
+        Exit status, 1 if --compare found regressions
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--compare", help="Previous JSON result to compare with")
+    parser.add_argument("--days", type=int, default=default_days)
+    parser.add_argument(
+        "--insights",
+        choices=["stub", "fake"],
+        default="stub",
+        help="Answer queries from the function profiles or over synthetic logs",
+    )
+    parser.add_argument(
+        "--query-latency",
+        type=float,
+        default=0.0,
+        help="Seconds fake queries run before completing",
+    )
+    parser.add_argument(
+        "--aws-quotas",
+        action="store_true",
+        help="Throttle fake queries like Logs Insights quotas",
+    )
+    parser.add_argument("--record", help="Record the AWS calls to this cassette")
+    parser.add_argument("--replay", help="Answer the AWS calls from this cassette")
+    parser.add_argument(
+        "--latency-scale",
+        type=float,
+        default=1.0,
+        help="Factor applied to the recorded latencies when replaying",
+    )
+    parser.add_argument(
+        "--start-query-rate",
+        type=float,
+        default=1e9,
+        help="StartQuery calls per second, unthrottled by default",
+    )
+    args = parser.parse_args(argv)
+
+    from backend.utils import target_utils
+
+    target_utils.start_query_rate_per_second = args.start_query_rate
+
+    recorder = CallRecorder()
+    insights: InsightsStub | FakeInsights = InsightsStub()
+    if args.insights == "fake":
+        quotas: dict[str, Any] = aws_quotas if args.aws_quotas else {}
+        insights = FakeInsights(query_latency=args.query_latency, **quotas)
+    cassette_recorder = CassetteRecorder(cassette_services) if args.record else None
+    player = CassettePlayer(args.replay, args.latency_scale) if args.replay else None
+    runs = []
+    for size in args.sizes:
+        with mock_aws():
+            # moto resets the default session, handlers go on the new one
+            recorder.install()
+            if player is not None:
+                player.install()
+            else:
+                insights.install()
+                load_insights(insights, function_specs(size, args.seed), args.seed)
+            if cassette_recorder is not None:
+                cassette_recorder.install()
+            target_utils.rate_limiters.clear()
+            try:
+                runs.append(run_pipeline(size, args.seed, recorder, args.days))
+            finally:
+                # Cassettes must not answer the backend's clients afterwards
+                for cassette in [player, cassette_recorder]:
+                    if cassette is not None:
+                        cassette.uninstall()
+            if player is not None:
+                runs[-1]["replay"] = player.snapshot()
+            elif isinstance(insights, FakeInsights):
+                runs[-1]["insights"] = insights.snapshot()
+        print(json.dumps(runs[-1]["stages"] | {"functions": size}), file=sys.stderr)
+    if cassette_recorder is not None:
+        cassette_recorder.save(args.record)
+
+    result = {
+        "commit": git_commit(),
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "days": args.days,
+        "insights": "replay" if args.replay else args.insights,
+        "startQueryRate": args.start_query_rate,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(result, output, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(result, json.load(baseline))
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
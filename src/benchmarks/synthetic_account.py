@@ -0,0 +1,155 @@
+"""Synthetic Lambda accounts for benchmarks.
+
+Each function gets a deterministic profile (memory, architecture, traffic,
+duration, memory use, log volume) derived from a seed, so that runs of the same
+size are comparable across commits.
+"""
+
+import io
+import random
+import zipfile
+from typing import Any
+
+import boto3
+
+memory_sizes = [128, 256, 512, 1024, 2048]
+architectures = ["x86_64", "arm64"]
+runtimes = ["python3.12", "python3.13", "nodejs20.x", "java21"]
+
+# Logs Insights reports @memorySize and @maxMemoryUsed in bytes
+bytes_per_mb = 1024 * 1024
+
+
+def function_specs(count: int, seed: int = 0) -> list[dict[str, Any]]:
+    """
+    Build the profiles of a synthetic account.
+
+    Parameters
+    ----------
+    count : int
+        Number of functions
+    seed : int, default=0
+        Random seed
+
+    Returns
+    -------
+    list of dict
+        Function profiles
+    """
+    rng = random.Random(seed)
+    specs = []
+    for i in range(count):
+        memory_size = rng.choice(memory_sizes)
+        specs.append(
+            {
+                "name": f"bench-function-{i:05d}",
+                "memorySize": memory_size,
+                "architecture": rng.choice(architectures),
+                "runtime": rng.choice(runtimes),
+                # Heavy-tailed traffic, most functions are rarely invoked
+                "invocationsPerDay": int(rng.paretovariate(1.2) * 20),
+                "avgDurationMs": round(rng.lognormvariate(5, 1), 1),
+                "maxMemoryUsedMB": int(memory_size * rng.uniform(0.2, 0.95)),
+                "timeoutRate": rng.choice([0, 0, 0, 0.001, 0.02]),
+                "logBytesPerInvocation": rng.randint(300, 3000),
+            }
+        )
+    return specs
+
+
+def create_synthetic_account(specs: list[dict[str, Any]]) -> None:
+    """
+    Create the functions and their log groups in the (mocked) account.
+
+    Parameters
+    ----------
+    specs : list of dict
+        Function profiles
+    """
+    role_arn = boto3.client("iam").create_role(
+        RoleName="bench-function-role", AssumeRolePolicyDocument="{}"
+    )["Role"]["Arn"]
+    code = io.BytesIO()
+    with zipfile.ZipFile(code, "w") as archive:
+        archive.writestr("handler.py", "def handler(event, context):\n    pass\n")
+
+    lambda_client = boto3.client("lambda")
+    logs_client = boto3.client("logs")
+    for spec in specs:
+        log_group_name = f"/aws/lambda/{spec['name']}"
+        lambda_client.create_function(
+            FunctionName=spec["name"],
+            Runtime=spec["runtime"],
+            Role=role_arn,
+            Handler="handler.handler",
+            Code={"ZipFile": code.getvalue()},
+            MemorySize=spec["memorySize"],
+            Architectures=[spec["architecture"]],
+            LoggingConfig={"LogFormat": "Text", "LogGroup": log_group_name},
+        )
+        logs_client.create_log_group(logGroupName=log_group_name)
+
+
+def expected_query_results(
+    spec: dict[str, Any], days: float, storage_size: int = 512
+) -> tuple[list[dict[str, str]], float]:
+    """
+    Compute what the generator's Insights query returns for a function profile.
+
+    Follows the ``stats`` expressions of ``run_cloudwatch_query``.
+
+    Parameters
+    ----------
+    spec : dict
+        Function profile
+    days : float
+        Length of the analyzed period in days
+    storage_size : int, default=512
+        Ephemeral storage size in MB
+
+    Returns
+    -------
+    tuple
+        Result row as Insights ``field``/``value`` pairs, and bytes scanned
+    """
+    invocations = int(spec["invocationsPerDay"] * days)
+    memory_price = 0.0000133334 if spec["architecture"] == "arm64" else 0.0000166667
+    storage_price = 0.0000000309
+    provisioned_mb = spec["memorySize"] * bytes_per_mb / 1000000
+    max_used_mb = spec["maxMemoryUsedMB"] * bytes_per_mb / 1000000
+    duration_s = invocations * spec["avgDurationMs"] / 1000
+    log_bytes = invocations * spec["logBytesPerInvocation"]
+
+    memory_cost = duration_s * provisioned_mb / 1024 * memory_price
+    storage_cost = duration_s * (storage_size - 512) / 1024 * storage_price
+    invocation_cost = invocations * 0.20 / 1000000
+    total_cost = memory_cost + invocation_cost + storage_cost
+    optimal_memory = min(max(max_used_mb * 1.2, 128), provisioned_mb)
+    optimal_memory_cost = duration_s * optimal_memory * memory_price / 1024
+
+    row = {
+        "timeoutInvocations": int(invocations * spec["timeoutRate"]),
+        "countInvocations": invocations,
+        "singleInvocationCost": 0.20 / 1000000,
+        "GBSecondMemoryPrice": memory_price,
+        "GBSecondStoragePrice": storage_price,
+        "StorageSizeMB": storage_size - 512,
+        "provisionedMemoryMB": provisioned_mb,
+        "allDurationInSeconds": duration_s,
+        "GbSecondsMemoryConsumed": duration_s * provisioned_mb / 1024,
+        "GbSecondsStorageConsumed": duration_s * (storage_size - 512) / 1024,
+        "logSizeGB": log_bytes / 1024**3,
+        "MemoryCost": memory_cost,
+        "StorageCost": storage_cost,
+        "InvocationCost": invocation_cost,
+        "totalCost": total_cost,
+        "maxMemoryUsedMB": max_used_mb,
+        "overProvisionedMB": max(provisioned_mb - max_used_mb, 0),
+        "optimalMinMemory": max(max_used_mb * 1.2, 128),
+        "optimalMemory": optimal_memory,
+        "optimalMemoryCost": optimal_memory_cost,
+        "potentialSavings": max(memory_cost - optimal_memory_cost, 0),
+        "avgCostPerInvocation": total_cost / invocations if invocations else 0,
+        "avgDurationPerInvocation": duration_s / invocations if invocations else 0,
+    }
+    return [{"field": k, "value": str(v)} for k, v in row.items()], float(log_bytes)
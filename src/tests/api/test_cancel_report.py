@@ -0,0 +1,93 @@
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        os.environ["BUCKET_NAME"] = bucket_name
+        yield bucket_name
+
+
+def cancel_event(report_id):
+    """API Gateway event of the cancel route."""
+    return {
+        "httpMethod": "POST",
+        "path": "/report/cancel",
+        "queryStringParameters": {"reportID": report_id},
+    }
+
+
+def put_summary(bucket_name, report_id, status):
+    """Upload the summary of a report."""
+    boto3.client("s3").put_object(
+        Bucket=bucket_name,
+        Key=f"{report_id}/summary.json",
+        Body=json.dumps({"status": status}),
+    )
+
+
+@mock_aws
+def test_cancel_running_report(s3_bucket, lambda_context):
+    """Testing that cancelling a running report marks it for the generators."""
+    from backend.api.app import lambda_handler
+    from backend.utils import query_registry_utils
+    from backend.utils.query_registry_utils import is_report_cancelled
+
+    put_summary(s3_bucket, "running", "Running")
+    response = lambda_handler(cancel_event("running"), lambda_context)
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["status"] == "Cancelling"
+    assert body["reason"] == "Cancelled on request"
+    assert body["cancelledQueries"] == 0
+
+    query_registry_utils.cancellation_checks.clear()
+    assert is_report_cancelled("running", s3_bucket)
+
+
+@mock_aws
+def test_cancel_finished_or_missing_report(s3_bucket, lambda_context):
+    """Testing that only running reports can be cancelled."""
+    from backend.api.app import lambda_handler
+
+    put_summary(s3_bucket, "done", "Completed")
+    response = lambda_handler(cancel_event("done"), lambda_context)
+    assert response["statusCode"] == 400
+
+    response = lambda_handler(cancel_event("missing"), lambda_context)
+    assert response["statusCode"] == 404
+
+
+@mock_aws
+def test_cancel_queued_report(s3_bucket, lambda_context):
+    """Testing that a queued report is removed from the queue."""
+    from backend.api.app import lambda_handler
+    from backend.utils.admission_utils import enqueue_analysis, queue_position
+    from backend.utils.s3_utils import download_from_s3
+
+    put_summary(s3_bucket, "queued", "Queued")
+    enqueue_analysis({"report_id": "queued"}, s3_bucket)
+
+    response = lambda_handler(cancel_event("queued"), lambda_context)
+    assert json.loads(response["body"])["status"] == "Cancelled"
+    assert queue_position("queued", s3_bucket) is None
+    summary = json.loads(download_from_s3("summary.json", s3_bucket, "queued"))
+    assert summary["status"] == "Cancelled"
@@ -0,0 +1,254 @@
+import json
+import os
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        os.environ["BUCKET_NAME"] = bucket_name
+        yield bucket_name
+
+
+@pytest.fixture
+def state_machine(s3_bucket, monkeypatch):
+    """Mocked state machine the queued analyses start."""
+    # The app first, it imports the routes that import each other
+    from backend.api import app, start_analysis  # noqa: F401
+
+    sfn_client = boto3.client("stepfunctions")
+    state_machine_arn = sfn_client.create_state_machine(
+        name="analysis",
+        definition=json.dumps(
+            {"StartAt": "Done", "States": {"Done": {"Type": "Succeed"}}}
+        ),
+        roleArn="arn:aws:iam::123456789012:role/analysis",
+    )["stateMachineArn"]
+    monkeypatch.setattr(start_analysis, "sfn_client", sfn_client)
+    monkeypatch.setattr(start_analysis, "state_machine_arn", state_machine_arn)
+    return sfn_client
+
+
+request = {
+    "lambda_functions_name": ["a", "b"],
+    "start_date": "2024-01-01T00:00:00Z",
+    "end_date": "2024-01-31T23:59:59Z",
+}
+
+
+def express_event(body):
+    """API Gateway event of the express route."""
+    return {
+        "httpMethod": "POST",
+        "path": "/analysis/express",
+        "body": json.dumps(body),
+    }
+
+
+def fake_lambda_cost(lambda_name, *args, **kwargs):
+    """Cost analysis of a function, without querying its logs."""
+    return {
+        "functionName": lambda_name,
+        "runtime": "python3.13",
+        "architecture": "arm64",
+        "countInvocations": 100,
+        "allDurationInSeconds": 10.0,
+        "provisionedMemoryMB": 256,
+        "MemoryCost": 0.5,
+        "InvocationCost": 0.1,
+        "StorageCost": 0.0,
+        "totalCost": 0.6,
+        "avgCostPerInvocation": 0.006,
+        "maxMemoryUsedMB": 100,
+        "overProvisionedMB": 156,
+        "optimalMemory": 128,
+        "potentialSavings": 0.2,
+        "avgDurationPerInvocation": 0.1,
+        "timeoutInvocations": 0,
+        "logSizeGB": 0.01,
+        "logIngestionCost": 0.005,
+        "logStorageCost": 0.0003,
+        "analysisCost": 0.0001,
+        "accountId": "012345678901",
+        "region": "us-east-1",
+    }
+
+
+@mock_aws
+def test_express_publishes_report(
+    state_machine, s3_bucket, lambda_context, monkeypatch
+):
+    """Testing that a small selection is analyzed in process and published."""
+    from backend.api.app import lambda_handler
+    from backend.step_function import analysis_generator
+    from backend.utils.s3_utils import download_from_s3, list_s3_keys
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", fake_lambda_cost)
+
+    response = lambda_handler(
+        express_event({**request, "report_id": 1}), lambda_context
+    )
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["express"] is True
+    assert sorted(row["functionName"] for row in body["analysis"]) == ["a", "b"]
+    assert body["analysis"][0]["accountId"] == "012345678901"
+    summary = json.loads(download_from_s3("summary.json", s3_bucket, "1"))
+    assert summary == body["summary"]
+    assert summary["status"] == "Completed"
+    assert summary["totalCost"] == pytest.approx(1.2)
+    # Run outside of the state machine
+    assert summary["reportCost"]["usage"]["stateTransitions"] == 0
+    assert summary["reportCost"]["usage"]["lambdaInvocations"] == 1
+    keys = list_s3_keys(s3_bucket, "1")
+    assert "1/analysis.csv" in keys
+    assert "1/timeline.json" in keys
+    assert list_s3_keys(s3_bucket, "summaries")
+
+    # Identical requests reuse the report
+    body = json.loads(
+        lambda_handler(express_event({**request, "report_id": 2}), lambda_context)[
+            "body"
+        ]
+    )
+    assert body == {"reportID": "1", "attached": True}
+
+
+@mock_aws
+def test_express_queues_large_selections(state_machine, lambda_context, monkeypatch):
+    """Testing that selections above the threshold run through the state machine."""
+    from backend.api import express_analysis
+    from backend.api.app import lambda_handler
+    from backend.step_function import analysis_generator
+
+    monkeypatch.setattr(express_analysis, "express_max_functions", 1)
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", fake_lambda_cost)
+
+    response = lambda_handler(
+        express_event({**request, "report_id": 1}), lambda_context
+    )
+
+    body = json.loads(response["body"])
+    assert body["express"] is False
+    assert body["status"] == "Running"
+    execution = state_machine.describe_execution(executionArn=body["executionArn"])
+    assert json.loads(execution["input"]) == {**request, "report_id": "1"}
+
+
+@mock_aws
+def test_express_queues_when_out_of_time(
+    state_machine, s3_bucket, lambda_context, monkeypatch
+):
+    """Testing that queries still running at the deadline are stopped and queued."""
+    from backend.api import express_analysis
+    from backend.api.app import lambda_handler
+    from backend.step_function import analysis_generator
+    from backend.utils.timeline_utils import load_spans
+    from backend.utils.usage_utils import report_cost
+
+    cancelled = []
+    stopped = []
+
+    def slow_lambda_cost(lambda_name, *args):
+        # Stopped through the cancel event, the last argument
+        if not args[-1].wait(5):
+            return fake_lambda_cost(lambda_name)
+        stopped.append(lambda_name)
+        raise analysis_generator.QueryFailedError("Query cancelled")
+
+    def cancel_report_queries(report_id, bucket_name):
+        cancelled.append(report_id)
+        return {
+            "cancelledQueries": 2,
+            "bytesScanned": 1024**3,
+            "bytesScanAvoided": 0,
+        }
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", slow_lambda_cost)
+    monkeypatch.setattr(
+        express_analysis, "cancel_report_queries", cancel_report_queries
+    )
+    # 100ms left to query
+    monkeypatch.setattr(
+        express_analysis,
+        "express_margin_seconds",
+        lambda_context.get_remaining_time_in_millis() / 1000 - 0.1,
+    )
+
+    response = lambda_handler(
+        express_event({**request, "report_id": 1}), lambda_context
+    )
+
+    body = json.loads(response["body"])
+    assert body["express"] is False
+    assert body["status"] == "Running"
+    assert cancelled == ["1"]
+    # The workers were stopped and joined before queuing
+    assert sorted(stopped) == ["a", "b"]
+    # The stopped scans are priced with the report of the state machine
+    spans = load_spans("1", s3_bucket)
+    assert {"express.invocation", "express.stopped_queries"} <= {
+        span["name"] for span in spans
+    }
+    cost = report_cost(spans, 0.0)
+    assert cost["usage"]["stoppedBytesScanned"] == 1024**3
+    assert cost["logsInsights"] == pytest.approx(0.005)
+
+
+@mock_aws
+def test_express_queues_functions_to_retry(
+    state_machine, s3_bucket, lambda_context, monkeypatch
+):
+    """Testing that a deferred function is retried by the state machine."""
+    from backend.api import express_analysis
+    from backend.api.app import lambda_handler
+    from backend.step_function import analysis_generator
+    from backend.utils.s3_utils import download_from_s3
+
+    def throttled_lambda_cost(lambda_name, *args, **kwargs):
+        if lambda_name == "b" and args[5] == 1:
+            raise analysis_generator.QueryFailedError("ThrottlingException")
+        if lambda_name == "b":
+            # The windows of the retry run past the deadline
+            time.sleep(2)
+        return fake_lambda_cost(lambda_name)
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", throttled_lambda_cost)
+    # 1s left to query
+    monkeypatch.setattr(
+        express_analysis,
+        "express_margin_seconds",
+        lambda_context.get_remaining_time_in_millis() / 1000 - 1,
+    )
+
+    started = time.monotonic()
+    response = lambda_handler(
+        express_event({**request, "report_id": 1}), lambda_context
+    )
+
+    assert time.monotonic() - started < 1
+    body = json.loads(response["body"])
+    assert body["express"] is False
+    assert body["status"] == "Running"
+    summary = json.loads(download_from_s3("summary.json", s3_bucket, "1"))
+    assert summary == {"status": "Queued"}
+    execution = state_machine.describe_execution(executionArn=body["executionArn"])
+    assert json.loads(execution["input"]) == {**request, "report_id": "1"}
@@ -85,3 +85,217 @@ def test_missing_filename_parameter(s3_bucket, lambda_context):
     assert response["statusCode"] == 404
     response_body = json.loads(response["body"])
     assert response_body["message"] == "Report ID parameter is required"
+
+
+@mock_aws
+def test_completed_report_conditional_get(s3_bucket, lambda_context):
+    """Test that a completed report is immutable and revalidates with a 304."""
+    from backend.api.app import lambda_handler
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    report_id = "completed-report"
+    upload_file_to_s3(
+        json.dumps({"status": "Completed"}), "summary.json", s3_bucket, report_id
+    )
+    upload_file_to_s3(
+        ",functionName\n0,LambdaA\n", "analysis.csv", s3_bucket, report_id
+    )
+    event = {
+        "httpMethod": "GET",
+        "path": "/report",
+        "headers": {},
+        "queryStringParameters": {"reportID": report_id},
+    }
+
+    response = lambda_handler(event, lambda_context)
+    assert response["statusCode"] == 200
+    assert "immutable" in response["multiValueHeaders"]["Cache-Control"][0]
+    etag = response["multiValueHeaders"]["ETag"][0]
+
+    event["headers"] = {"If-None-Match": etag}
+    response = lambda_handler(event, lambda_context)
+    assert response["statusCode"] == 304
+    assert response["body"] is None
+    assert response["multiValueHeaders"]["ETag"] == [etag]
+
+
+@mock_aws
+def test_running_report_revalidates(s3_bucket, lambda_context):
+    """Test that a running report gets a body ETag and changes once updated."""
+    from backend.api.app import lambda_handler
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    report_id = "running-report"
+    upload_file_to_s3(
+        json.dumps({"status": "Running"}), "summary.json", s3_bucket, report_id
+    )
+    event = {
+        "httpMethod": "GET",
+        "path": "/report",
+        "headers": {},
+        "queryStringParameters": {"reportID": report_id},
+    }
+
+    response = lambda_handler(event, lambda_context)
+    assert response["multiValueHeaders"]["Cache-Control"] == ["no-cache"]
+    etag = response["multiValueHeaders"]["ETag"][0]
+
+    event["headers"] = {"if-none-match": f'W/{etag}, "other"'}
+    assert lambda_handler(event, lambda_context)["statusCode"] == 304
+
+    upload_file_to_s3(
+        json.dumps({"status": "Failed"}), "summary.json", s3_bucket, report_id
+    )
+    response = lambda_handler(event, lambda_context)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["summary"] == {"status": "Failed"}
+
+
+@mock_aws
+def test_running_report_progress(s3_bucket, lambda_context):
+    """Test that a running report serves the rows of its completed batches."""
+    from backend.api.app import lambda_handler
+    from backend.utils.progress_utils import (
+        batch_contribution,
+        record_batch_progress,
+        start_progress,
+    )
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    report_id = "progressing-report"
+    directory = f"single_analysis/{report_id}"
+    upload_file_to_s3(
+        json.dumps({"status": "Running"}), "summary.json", s3_bucket, report_id
+    )
+    start_progress(report_id, s3_bucket, 2)
+    event = {
+        "httpMethod": "GET",
+        "path": "/report",
+        "headers": {},
+        "queryStringParameters": {"reportID": report_id},
+    }
+    body = json.loads(lambda_handler(event, lambda_context)["body"])
+    assert body["analysis"] == []
+    assert body["progress"]["batchesDone"] == 0
+
+    rows = [{"functionName": "A", "totalCost": 1.5, "accountId": "012345678901"}]
+    upload_file_to_s3(
+        "functionName,totalCost,accountId\nA,1.5,012345678901\n",
+        "batch-00000.csv",
+        s3_bucket,
+        directory,
+    )
+    result = {"filename": "batch-00000.csv", "directory": directory}
+    record_batch_progress(
+        report_id, s3_bucket, "batch-00000", batch_contribution(result, rows)
+    )
+
+    response = lambda_handler(event, lambda_context)
+    body = json.loads(response["body"])
+    assert body["analysis"] == rows
+    assert body["progress"]["batchesDone"] == 1
+    assert body["progress"]["batchesTotal"] == 2
+    assert body["progress"]["totals"]["totalCost"] == 1.5
+    assert "batches" not in body["progress"]
+
+    # Nothing read past the progress until a batch completes
+    event["headers"] = {"If-None-Match": response["multiValueHeaders"]["ETag"][0]}
+    assert lambda_handler(event, lambda_context)["statusCode"] == 304
+
+
+@mock_aws
+def test_running_report_since_cursor(s3_bucket, lambda_context):
+    """Test that a poll with a cursor only reads the batches recorded since."""
+    from backend.api.app import lambda_handler
+    from backend.utils.progress_utils import (
+        batch_contribution,
+        record_batch_progress,
+        start_progress,
+    )
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    report_id = "polled-report"
+    directory = f"single_analysis/{report_id}"
+    upload_file_to_s3(
+        json.dumps({"status": "Running"}), "summary.json", s3_bucket, report_id
+    )
+    start_progress(report_id, s3_bucket, 3)
+
+    def complete_batch(batch_id, function_name, upload=True):
+        if upload:
+            upload_file_to_s3(
+                f"functionName,totalCost\n{function_name},1.0\n",
+                f"{batch_id}.csv",
+                s3_bucket,
+                directory,
+            )
+        result = {"filename": f"{batch_id}.csv", "directory": directory}
+        rows = [{"functionName": function_name, "totalCost": 1.0}]
+        record_batch_progress(
+            report_id, s3_bucket, batch_id, batch_contribution(result, rows)
+        )
+
+    def poll(since):
+        event = {
+            "httpMethod": "GET",
+            "path": "/report",
+            "headers": {},
+            "queryStringParameters": {"reportID": report_id, "since": since},
+        }
+        return json.loads(lambda_handler(event, lambda_context)["body"])
+
+    complete_batch("batch-00000", "A")
+    body = poll("0")
+    assert body["batches"] == {"batch-00000": [{"functionName": "A", "totalCost": 1.0}]}
+    assert body["cursor"] == body["progress"]["sequence"] == 1
+    assert "analysis" not in body
+
+    # Only the batches recorded since, a batch run again included
+    complete_batch("batch-00001", "B")
+    complete_batch("batch-00000", "C")
+    body = poll(str(body["cursor"]))
+    assert sorted(body["batches"]) == ["batch-00000", "batch-00001"]
+    assert body["batches"]["batch-00000"] == [{"functionName": "C", "totalCost": 1.0}]
+    assert body["cursor"] == 3
+
+    # A batch that can't be read is served again by the next poll
+    complete_batch("batch-00002", "D", upload=False)
+    body = poll("3")
+    assert body["batches"] == {}
+    assert body["cursor"] == 3
+
+    event = {
+        "httpMethod": "GET",
+        "path": "/report",
+        "queryStringParameters": {"reportID": report_id, "since": "latest"},
+    }
+    assert lambda_handler(event, lambda_context)["statusCode"] == 400
+
+
+@mock_aws
+def test_large_report_is_compressed(s3_bucket, lambda_context):
+    """Test that large bodies are gzipped when the client accepts it."""
+    import base64
+    import gzip
+
+    from backend.api.app import lambda_handler
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    report_id = "large-report"
+    rows = "".join(f"{i},Lambda{i}\n" for i in range(200))
+    upload_file_to_s3(
+        json.dumps({"status": "Completed"}), "summary.json", s3_bucket, report_id
+    )
+    upload_file_to_s3(",functionName\n" + rows, "analysis.csv", s3_bucket, report_id)
+    event = {
+        "httpMethod": "GET",
+        "path": "/report",
+        "headers": {"Accept-Encoding": "gzip, deflate"},
+        "queryStringParameters": {"reportID": report_id},
+    }
+
+    response = lambda_handler(event, lambda_context)
+    assert response["isBase64Encoded"] is True
+    assert response["multiValueHeaders"]["Content-Encoding"] == ["gzip"]
+    body = json.loads(gzip.decompress(base64.b64decode(response["body"])))
+    assert len(body["analysis"]) == 200
@@ -150,3 +150,29 @@ def test_function_pagination(s3_bucket, lambda_context):
     response_body = json.loads(response["body"])
     file_content = response_body["jsonContents"]
     assert len(file_content) == 2
+
+
+@mock_aws
+def test_list_historical_reports_skips_invalid_summary(s3_bucket, lambda_context):
+    """Test that an unreadable summary doesn't fail the whole page."""
+    from backend.api.app import lambda_handler
+
+    s3 = boto3.client("s3", region_name="eu-west-1")
+    s3.put_object(
+        Bucket=s3_bucket, Key="summaries/1_a.json", Body=json.dumps({"reportID": "a"})
+    )
+    s3.put_object(Bucket=s3_bucket, Key="summaries/2_b.json", Body="{not json")
+    s3.put_object(
+        Bucket=s3_bucket, Key="summaries/3_c.json", Body=json.dumps({"reportID": "c"})
+    )
+
+    event = {
+        "httpMethod": "GET",
+        "path": "/reportSummaries",
+        "queryStringParameters": None,
+    }
+    response = lambda_handler(event, lambda_context)
+    body = json.loads(response["body"])
+
+    assert response["statusCode"] == 200
+    assert [report["reportID"] for report in body["jsonContents"]] == ["a", "c"]
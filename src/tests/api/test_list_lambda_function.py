@@ -18,6 +18,21 @@ def aws_credentials():
     os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
 
 
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket and reset the in-memory inventory cache."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        s3 = boto3.resource("s3", region_name="us-east-1")
+        s3.Bucket(bucket_name).create()
+        os.environ["BUCKET_NAME"] = bucket_name
+        from backend.api.list_lambda_functions import inventory_cache
+
+        inventory_cache.clear()
+        yield bucket_name
+        inventory_cache.clear()
+
+
 @pytest.fixture
 def lambda_functions(aws_credentials):
     """Create mock Lambda functions for testing."""
@@ -174,11 +189,13 @@ def test_successful_list_all_function(lambda_functions, lambda_context):
     )
 
 
-@pytest.mark.skip(reason="Moto limitation with Architecture parameter")
 @mock_aws
-def test_runtime_filter(lambda_functions):
+def test_runtime_filter(lambda_functions, lambda_context):
     """Test that the Lambda function successfully filters by runtime."""
     from backend.api.app import lambda_handler
+    from backend.api.list_lambda_functions import inventory_cache
+
+    inventory_cache.clear()
 
     parameters = {
         "selectedRuntime": [
@@ -189,7 +206,12 @@ def test_runtime_filter(lambda_functions):
         "selectedArchitecture": ["x86_64", "arm64"],
     }
 
-    response = lambda_handler({"queryStringParameters": parameters}, None)
+    event = {
+        "httpMethod": "GET",
+        "path": "/lambda-functions",
+        "queryStringParameters": parameters,
+    }
+    response = lambda_handler(event, lambda_context)
     response_functions = json.loads(response["body"])
 
     assert response["statusCode"] == 200
@@ -218,3 +240,175 @@ def test_runtime_filter(lambda_functions):
     assert sorted(response_functions, key=lambda x: x["FunctionName"]) == sorted(
         expected_response, key=lambda x: x["FunctionName"]
     )
+
+
+@mock_aws
+def test_inventory_snapshot_served_from_s3(lambda_functions, s3_bucket, lambda_context):
+    """Test that the inventory is persisted and later served from the snapshot."""
+    from backend.api.app import lambda_handler
+    from backend.api.list_lambda_functions import inventory_cache
+    from backend.utils.s3_utils import download_from_s3
+
+    event = {
+        "httpMethod": "GET",
+        "path": "/lambda-functions",
+        "queryStringParameters": None,
+    }
+    response = lambda_handler(event, lambda_context)
+    assert len(json.loads(response["body"])) == 3
+
+    snapshot = json.loads(
+        download_from_s3("lambda_functions.json", s3_bucket, "inventory")
+    )
+    assert len(snapshot["functions"]) == 3
+
+    # A fresh container serves the persisted snapshot without listing again
+    inventory_cache.clear()
+    boto3.client("lambda", region_name="us-east-1").delete_function(
+        FunctionName="mock_function_1"
+    )
+    response = lambda_handler(event, lambda_context)
+    assert len(json.loads(response["body"])) == 3
+
+    event["queryStringParameters"] = {"refresh": "true"}
+    response = lambda_handler(event, lambda_context)
+    assert len(json.loads(response["body"])) == 2
+
+
+@mock_aws
+def test_stale_inventory_triggers_background_refresh(
+    lambda_functions, s3_bucket, lambda_context, mocker
+):
+    """Test that a stale snapshot is served while a refresh is triggered."""
+    import time
+
+    from backend.api import list_lambda_functions
+    from backend.api.app import lambda_handler
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    stale_function = {
+        "FunctionName": "stale_function",
+        "Runtime": "python3.12",
+        "PackageType": "Zip",
+        "Architectures": ["arm64"],
+        "MemorySize": 128,
+        "LastModified": "2024-01-01T00:00:00.000+0000",
+    }
+    upload_file_to_s3(
+        json.dumps({"refreshedAt": time.time() - 3600, "functions": [stale_function]}),
+        "lambda_functions.json",
+        s3_bucket,
+        "inventory",
+    )
+    mock_invoke = mocker.patch.object(list_lambda_functions.client, "invoke")
+
+    event = {
+        "httpMethod": "GET",
+        "path": "/lambda-functions",
+        "queryStringParameters": None,
+    }
+    response = lambda_handler(event, lambda_context)
+    assert json.loads(response["body"]) == [stale_function]
+    mock_invoke.assert_called_once()
+    assert mock_invoke.call_args.kwargs["InvocationType"] == "Event"
+
+    # The asynchronous invocation refreshes the snapshot
+    assert lambda_handler({"inventory_refresh": True}, lambda_context) == {
+        "status": "Refreshed"
+    }
+    response = lambda_handler(event, lambda_context)
+    assert len(json.loads(response["body"])) == 3
+    mock_invoke.assert_called_once()
+
+
+@mock_aws
+def test_filter_facets_and_pagination(lambda_functions, s3_bucket, lambda_context):
+    """Test paginated, projected listing with disjunctive facet counts."""
+    from backend.api.app import lambda_handler
+
+    event = {
+        "httpMethod": "GET",
+        "path": "/lambda-functions",
+        "queryStringParameters": {
+            "selectedRuntime": "python3.8,python3.9",
+            "rowsPerPage": "1",
+            "fields": "FunctionName",
+        },
+        "multiValueQueryStringParameters": {
+            "selectedArchitecture": ["x86_64", "arm64"],
+        },
+    }
+    response = lambda_handler(event, lambda_context)
+    body = json.loads(response["body"])
+
+    assert body["functions"] == [{"FunctionName": "mock_function_1"}]
+    assert body["totalCount"] == 2
+    assert body["continuationToken"] == "1"
+    # Runtime counts ignore the runtime filter itself
+    assert body["facets"]["runtime"] == {
+        "python3.8": 1,
+        "python3.9": 1,
+        "dotnet7": 1,
+    }
+    assert body["facets"]["architecture"] == {"x86_64": 2}
+
+    event["queryStringParameters"]["continuationToken"] = body["continuationToken"]
+    body = json.loads(lambda_handler(event, lambda_context)["body"])
+    assert body["functions"] == [{"FunctionName": "mock_function_2"}]
+    assert "continuationToken" not in body
+
+    event["queryStringParameters"] = {"namePrefix": "MOCK_FUNCTION_3"}
+    event["multiValueQueryStringParameters"] = None
+    body = json.loads(lambda_handler(event, lambda_context)["body"])
+    assert [f["FunctionName"] for f in body] == ["mock_function_3"]
+
+
+@mock_aws
+def test_tag_expression_selection(lambda_functions, s3_bucket, lambda_context):
+    """Test that functions can be selected through a tag expression."""
+    from backend.api.app import lambda_handler
+
+    lambda_client = boto3.client("lambda", region_name="us-east-1")
+    function_arn = lambda_client.get_function(FunctionName="mock_function_2")[
+        "Configuration"
+    ]["FunctionArn"]
+    lambda_client.tag_resource(Resource=function_arn, Tags={"team": "payments"})
+
+    event = {
+        "httpMethod": "GET",
+        "path": "/lambda-functions",
+        "queryStringParameters": {"tagExpression": "team=payments|billing"},
+    }
+    response = lambda_handler(event, lambda_context)
+    assert [f["FunctionName"] for f in json.loads(response["body"])] == [
+        "mock_function_2"
+    ]
+
+    event["queryStringParameters"] = {"tagExpression": "=payments"}
+    response = lambda_handler(event, lambda_context)
+    assert response["statusCode"] == 400
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"rowsPerPage": "ten"},
+        {"rowsPerPage": "0"},
+        {"rowsPerPage": "-1"},
+        {"rowsPerPage": "5", "continuationToken": "-5"},
+        {"rowsPerPage": "5", "continuationToken": "next"},
+    ],
+)
+@mock_aws
+def test_invalid_pagination(lambda_functions, s3_bucket, lambda_context, params):
+    """Test that malformed page parameters are rejected."""
+    from backend.api.app import lambda_handler
+
+    event = {
+        "httpMethod": "GET",
+        "path": "/lambda-functions",
+        "queryStringParameters": params,
+    }
+    response = lambda_handler(event, lambda_context)
+
+    assert response["statusCode"] == 400
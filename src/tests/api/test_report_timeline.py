@@ -0,0 +1,75 @@
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        s3 = boto3.resource("s3", region_name="eu-west-1")
+        bucket = s3.Bucket(bucket_name)
+        bucket.create(CreateBucketConfiguration={"LocationConstraint": "eu-west-1"})
+        os.environ["BUCKET_NAME"] = bucket_name
+        yield bucket_name
+
+
+def timeline_event(report_id):
+    """API Gateway event of the timeline route."""
+    return {
+        "httpMethod": "GET",
+        "path": "/report/timeline",
+        "queryStringParameters": {"reportID": report_id},
+    }
+
+
+@mock_aws
+def test_running_and_finished_report_timeline(s3_bucket, lambda_context):
+    """Testing the timeline of a running report, then of the finished report."""
+    from backend.api.app import lambda_handler
+    from backend.utils.timeline_utils import Timeline, compact_timeline
+
+    timeline = Timeline("report-id")
+    timeline.add_span("generator.query", 10, 70, logGroup="/aws/lambda/slow")
+    timeline.add_span("generator.query", 11, 12, logGroup="/aws/lambda/fast")
+    timeline.upload(s3_bucket, "generator")
+
+    response = lambda_handler(timeline_event("report-id"), lambda_context)
+    assert response["statusCode"] == 200
+    running = json.loads(response["body"])
+    assert running["duration"] == 60
+    slowest = running["stats"]["generator.query"]["slowest"][0]
+    assert slowest["logGroup"] == "/aws/lambda/slow"
+
+    compacted = compact_timeline("report-id", s3_bucket)
+    response = lambda_handler(timeline_event("report-id"), lambda_context)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == compacted == running
+
+
+@mock_aws
+def test_missing_timeline(s3_bucket, lambda_context):
+    """Testing that a report without spans has no timeline."""
+    from backend.api.app import lambda_handler
+
+    response = lambda_handler(timeline_event("missing"), lambda_context)
+    assert response["statusCode"] == 404
+
+    event = timeline_event("missing")
+    event["queryStringParameters"] = {}
+    response = lambda_handler(event, lambda_context)
+    assert response["statusCode"] == 404
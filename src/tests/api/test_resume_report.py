@@ -0,0 +1,130 @@
+import io
+import json
+import os
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        os.environ["BUCKET_NAME"] = bucket_name
+        yield bucket_name
+
+
+def resume_event(report_id):
+    """API Gateway event of the resume route."""
+    return {
+        "httpMethod": "POST",
+        "path": "/report/resume",
+        "queryStringParameters": {"reportID": report_id},
+    }
+
+
+@mock_aws
+def test_resume_failed_report(s3_bucket, lambda_context, monkeypatch):
+    """Testing that a failed report is resumed with its missing batches."""
+    from backend.api import resume_report, start_analysis
+    from backend.api.app import lambda_handler
+    from backend.utils.batch_utils import upload_batch_marker, upload_plan
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    state_machine_arn = boto3.client("stepfunctions").create_state_machine(
+        name="analysis",
+        definition=json.dumps(
+            {"StartAt": "Done", "States": {"Done": {"Type": "Succeed"}}}
+        ),
+        roleArn="arn:aws:iam::123456789012:role/analysis",
+    )["stateMachineArn"]
+    monkeypatch.setattr(start_analysis, "sfn_client", boto3.client("stepfunctions"))
+    monkeypatch.setattr(start_analysis, "state_machine_arn", state_machine_arn)
+
+    report_id = "failed"
+    upload_file_to_s3(
+        json.dumps({"status": "Running"}), "summary.json", s3_bucket, report_id
+    )
+    upload_plan(
+        report_id,
+        s3_bucket,
+        {"batches": [{"batch_id": "batch-00000"}, {"batch_id": "batch-00001"}]},
+    )
+    directory = f"single_analysis/{report_id}"
+    upload_file_to_s3("functionName\n", "batch-00000.csv", s3_bucket, directory)
+    upload_batch_marker(
+        {
+            "batch_id": "batch-00000",
+            "filename": "batch-00000.csv",
+            "directory": directory,
+        },
+        s3_bucket,
+    )
+
+    response = lambda_handler(resume_event(report_id), lambda_context)
+    assert response["statusCode"] == 400
+
+    upload_file_to_s3(
+        json.dumps({"status": "Failed"}), "summary.json", s3_bucket, report_id
+    )
+    summary_date = boto3.client("s3").head_object(
+        Bucket=s3_bucket, Key=f"{report_id}/summary.json"
+    )["LastModified"]
+    response = lambda_handler(resume_event(report_id), lambda_context)
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["status"] == "Running"
+    assert body["batches"] == 2
+    assert body["batchesToRun"] == 1
+    execution = boto3.client("stepfunctions").describe_execution(
+        executionArn=body["executionArn"]
+    )
+    execution_input = json.loads(execution["input"])
+    assert execution_input["resume"] is True
+    assert execution["name"] == f"report-{report_id}-{execution_input['run_id']}"
+
+    # A concurrent resume read the same failed summary before it was queued
+    failed_summary = {
+        "Body": io.BytesIO(json.dumps({"status": "Failed"}).encode()),
+        "LastModified": summary_date,
+    }
+    monkeypatch.setattr(
+        resume_report,
+        "client",
+        SimpleNamespace(get_object=lambda **kwargs: failed_summary),
+    )
+    response = lambda_handler(resume_event(report_id), lambda_context)
+    assert json.loads(response["body"])["executionArn"] == body["executionArn"]
+    executions = boto3.client("stepfunctions").list_executions(
+        stateMachineArn=state_machine_arn
+    )["executions"]
+    assert len(executions) == 1
+
+
+@mock_aws
+def test_resume_report_without_plan(s3_bucket, lambda_context):
+    """Testing that reports planned before batch markers can't be resumed."""
+    from backend.api.app import lambda_handler
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    upload_file_to_s3(
+        json.dumps({"status": "Failed"}), "summary.json", s3_bucket, "old"
+    )
+    response = lambda_handler(resume_event("old"), lambda_context)
+    assert response["statusCode"] == 400
+    response = lambda_handler(resume_event("missing"), lambda_context)
+    assert response["statusCode"] == 404
@@ -0,0 +1,143 @@
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        os.environ["BUCKET_NAME"] = bucket_name
+        yield bucket_name
+
+
+def start_event(body):
+    """API Gateway event of the start route."""
+    return {
+        "httpMethod": "POST",
+        "path": "/analysis/start",
+        "body": json.dumps(body),
+    }
+
+
+@mock_aws
+def test_start_attach_and_queue(s3_bucket, lambda_context, monkeypatch):
+    """Testing that identical analyses attach and the excess is queued."""
+    from backend.api import start_analysis
+    from backend.api.app import lambda_handler
+    from backend.utils import admission_utils
+    from backend.utils.s3_utils import download_from_s3
+
+    sfn_client = boto3.client("stepfunctions")
+    state_machine_arn = sfn_client.create_state_machine(
+        name="analysis",
+        definition=json.dumps(
+            {"StartAt": "Done", "States": {"Done": {"Type": "Succeed"}}}
+        ),
+        roleArn="arn:aws:iam::123456789012:role/analysis",
+    )["stateMachineArn"]
+    monkeypatch.setattr(start_analysis, "sfn_client", sfn_client)
+    monkeypatch.setattr(start_analysis, "state_machine_arn", state_machine_arn)
+    monkeypatch.setattr(admission_utils, "max_concurrent_analyses", 1)
+    request = {
+        "lambda_functions_name": ["a", "b"],
+        "start_date": "2024-01-01T00:00:00Z",
+        "end_date": "2024-01-31T23:59:59Z",
+    }
+
+    response = lambda_handler(start_event({**request, "report_id": 1}), lambda_context)
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["status"] == "Running"
+    execution = sfn_client.describe_execution(executionArn=body["executionArn"])
+    assert json.loads(execution["input"]) == {**request, "report_id": "1"}
+
+    # Double click
+    identical = {**request, "lambda_functions_name": ["b", "a"], "report_id": 2}
+    body = json.loads(lambda_handler(start_event(identical), lambda_context)["body"])
+    assert body == {"reportID": "1", "attached": True}
+
+    other = {**request, "lambda_functions_name": ["c"], "report_id": 3}
+    body = json.loads(lambda_handler(start_event(other), lambda_context)["body"])
+    assert body["status"] == "Queued"
+    assert body["queuePosition"] == 1
+    summary = json.loads(download_from_s3("summary.json", s3_bucket, "3"))
+    assert summary == {"status": "Queued"}
+
+    response = lambda_handler(start_event({"report_id": 4}), lambda_context)
+    assert response["statusCode"] == 400
+
+
+@mock_aws
+def test_start_report_ids(s3_bucket, lambda_context, monkeypatch):
+    """Testing that report IDs are generated and never reused."""
+    from backend.api import start_analysis
+    from backend.api.app import lambda_handler
+
+    sfn_client = boto3.client("stepfunctions")
+    state_machine_arn = sfn_client.create_state_machine(
+        name="analysis",
+        definition=json.dumps(
+            {"StartAt": "Done", "States": {"Done": {"Type": "Succeed"}}}
+        ),
+        roleArn="arn:aws:iam::123456789012:role/analysis",
+    )["stateMachineArn"]
+    monkeypatch.setattr(start_analysis, "sfn_client", sfn_client)
+    monkeypatch.setattr(start_analysis, "state_machine_arn", state_machine_arn)
+    request = {
+        "lambda_functions_name": ["a"],
+        "start_date": "2024-01-01T00:00:00Z",
+        "end_date": "2024-01-31T23:59:59Z",
+    }
+
+    first = json.loads(lambda_handler(start_event(request), lambda_context)["body"])
+    other = {**request, "lambda_functions_name": ["b"]}
+    second = json.loads(lambda_handler(start_event(other), lambda_context)["body"])
+    assert first["reportID"] != second["reportID"]
+    assert first["status"] == second["status"] == "Running"
+
+    # A report ID of the client can't replace an existing report
+    reused = {**request, "lambda_functions_name": ["c"], "report_id": first["reportID"]}
+    response = lambda_handler(start_event(reused), lambda_context)
+    assert response["statusCode"] == 409
+    # Nor take the name of an execution whose summary was deleted
+    sfn_client.start_execution(
+        stateMachineArn=state_machine_arn, name="report-old", input="{}"
+    )
+    reused["report_id"] = "old"
+    response = lambda_handler(start_event(reused), lambda_context)
+    assert response["statusCode"] == 409
+
+
+@pytest.mark.parametrize("path", ["/analysis/start", "/analysis/express"])
+@pytest.mark.parametrize("tag_expression", ["=x", "team=a,team=b"])
+@mock_aws
+def test_start_invalid_tag_expression(s3_bucket, lambda_context, path, tag_expression):
+    """Testing that invalid tag expressions are rejected."""
+    from backend.api.app import lambda_handler
+
+    event = start_event(
+        {
+            "targets": [{"region": "eu-west-1", "tag_expression": tag_expression}],
+            "start_date": "2024-01-01T00:00:00Z",
+            "end_date": "2024-01-31T23:59:59Z",
+        }
+    )
+    response = lambda_handler({**event, "path": path}, lambda_context)
+
+    assert response["statusCode"] == 400
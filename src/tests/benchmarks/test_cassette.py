@@ -0,0 +1,89 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from benchmarks.cassette import CassettePlayer, CassetteRecorder
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+def test_record_and_replay(aws_credentials, tmp_path, request):
+    """Testing that recorded responses, bodies and errors are replayed."""
+    cassette = str(tmp_path / "cassette.jsonl.gz")
+    with mock_aws():
+        recorder = CassetteRecorder()
+        recorder.install()
+        request.addfinalizer(recorder.uninstall)
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="recorded-bucket")
+        s3_client.put_object(Bucket="recorded-bucket", Key="a.csv", Body=b"a,b\n1,2\n")
+        recorded = s3_client.get_object(Bucket="recorded-bucket", Key="a.csv")
+        # Reading the recorded body still works
+        assert recorded["Body"].read() == b"a,b\n1,2\n"
+        with pytest.raises(s3_client.exceptions.NoSuchKey):
+            s3_client.get_object(Bucket="recorded-bucket", Key="missing.csv")
+        recorder.save(cassette)
+
+    # Nothing exists in the new mock, every answer comes from the cassette
+    with mock_aws():
+        player = CassettePlayer(cassette, latency_scale=0)
+        player.install()
+        request.addfinalizer(player.uninstall)
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="recorded-bucket")
+        s3_client.put_object(Bucket="recorded-bucket", Key="a.csv", Body=b"a,b\n1,2\n")
+        replayed = s3_client.get_object(Bucket="recorded-bucket", Key="a.csv")
+        assert replayed["Body"].read() == b"a,b\n1,2\n"
+        assert replayed["LastModified"] == recorded["LastModified"]
+        with pytest.raises(s3_client.exceptions.NoSuchKey):
+            s3_client.get_object(Bucket="recorded-bucket", Key="missing.csv")
+        assert player.snapshot() == {"matched": 4, "fallback": 0, "missing": 0}
+
+
+def test_replay_fallback_and_services(aws_credentials, tmp_path, request):
+    """Testing matching on the operation only, and services left out."""
+    cassette = str(tmp_path / "cassette.jsonl.gz")
+    with mock_aws():
+        recorder = CassetteRecorder(services=["logs"])
+        recorder.install()
+        request.addfinalizer(recorder.uninstall)
+        boto3.client("s3").create_bucket(Bucket="not-recorded")
+        logs_client = boto3.client("logs")
+        logs_client.create_log_group(logGroupName="/aws/lambda/recorded")
+        logs_client.describe_log_groups(logGroupNamePrefix="/aws/lambda/recorded")
+        recorder.save(cassette)
+
+    with mock_aws():
+        player = CassettePlayer(cassette, latency_scale=0)
+        player.install()
+        request.addfinalizer(player.uninstall)
+        # S3 isn't in the cassette and goes to moto
+        s3_client = boto3.client("s3")
+        s3_client.create_bucket(Bucket="other-bucket")
+        assert [b["Name"] for b in s3_client.list_buckets()["Buckets"]] == [
+            "other-bucket"
+        ]
+        logs_client = boto3.client("logs")
+        logs_client.create_log_group(logGroupName="/aws/lambda/recorded")
+        response = logs_client.describe_log_groups(
+            logGroupNamePrefix="/aws/lambda/other"
+        )
+        assert response["logGroups"][0]["logGroupName"] == "/aws/lambda/recorded"
+        with pytest.raises(LookupError):
+            logs_client.describe_log_groups()
+        assert player.snapshot() == {"matched": 1, "fallback": 1, "missing": 1}
+
+    with mock_aws():
+        strict_player = CassettePlayer(cassette, latency_scale=0, strict=True)
+        strict_player.install()
+        request.addfinalizer(strict_player.uninstall)
+        with pytest.raises(LookupError):
+            boto3.client("logs").describe_log_groups(logGroupNamePrefix="other")
@@ -0,0 +1,380 @@
+import functools
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from benchmarks.insights_fake import FakeInsights
+from benchmarks.log_generator import generate_log_events
+from benchmarks.synthetic_account import bytes_per_mb, function_specs
+
+start = datetime(2024, 6, 1, tzinfo=timezone.utc)
+end = datetime(2024, 6, 3, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+    # Read at import time by the generator, shared with the pipeline benchmark
+    os.environ.setdefault("BUCKET_NAME", "lambda-cost-analysis-benchmark")
+
+
+@pytest.fixture
+def spec():
+    """Profile of a function with timeouts."""
+    return function_specs(1)[0] | {"invocationsPerDay": 500, "timeoutRate": 0.05}
+
+
+def events_of(spec):
+    """Log events of the test period."""
+    return list(generate_log_events(spec, int(start.timestamp()), int(end.timestamp())))
+
+
+def fixed_source(events):
+    """Log source answering any window from the same events."""
+
+    def source(start_time, end_time):
+        # Both bounds are inclusive, in whole seconds
+        return [
+            event
+            for event in events
+            if start_time * 1000 <= event["timestamp"] < (end_time + 1) * 1000
+        ]
+
+    return source
+
+
+def test_query_results_match_generated_logs(aws_credentials, spec):
+    """Testing that the generator's query is evaluated over the synthetic logs."""
+    from backend.step_function.analysis_generator import run_cloudwatch_query
+
+    events = events_of(spec)
+    reports = [e["message"] for e in events if e["message"].startswith("REPORT")]
+    billed_ms = sum(
+        int(message.split("Billed Duration: ")[1].split(" ")[0]) for message in reports
+    )
+    timeouts = sum("Task timed out" in e["message"] for e in events)
+    log_group_name = f"/aws/lambda/{spec['name']}"
+
+    with mock_aws():
+        insights = FakeInsights()
+        insights.install()
+        insights.add_log_group(
+            log_group_name, functools.partial(generate_log_events, spec)
+        )
+        row, bytes_scanned = run_cloudwatch_query(
+            log_group_name, start, end, spec["memorySize"], 512, spec["architecture"]
+        )
+
+    results = {field["field"]: float(field["value"]) for field in row}
+    assert results["countInvocations"] == len(reports)
+    assert results["timeoutInvocations"] == timeouts > 0
+    assert results["allDurationInSeconds"] == pytest.approx(billed_ms / 1000)
+    assert results["provisionedMemoryMB"] == pytest.approx(
+        spec["memorySize"] * bytes_per_mb / 1000000
+    )
+    assert results["maxMemoryUsedMB"] <= results["provisionedMemoryMB"]
+    assert results["StorageSizeMB"] == 0
+    assert results["totalCost"] == pytest.approx(
+        results["MemoryCost"] + results["InvocationCost"]
+    )
+    assert bytes_scanned == sum(len(e["message"]) + 1 for e in events)
+    assert insights.snapshot()["queries"] == 1
+
+
+def test_stats_by_log_stream(aws_credentials, spec):
+    """Testing grouped stats."""
+    with mock_aws():
+        insights = FakeInsights()
+        insights.install()
+        insights.add_log_group("group", functools.partial(generate_log_events, spec))
+        logs_client = boto3.client("logs")
+        query_id = logs_client.start_query(
+            logGroupName="group",
+            startTime=int(start.timestamp()),
+            endTime=int(end.timestamp()),
+            queryString='filter @message like "REPORT" | stats count(*) as n by @logStream',
+        )["queryId"]
+        response = logs_client.get_query_results(queryId=query_id)
+
+    counts = {row[0]["value"]: int(row[1]["value"]) for row in response["results"]}
+    reports = [e for e in events_of(spec) if e["message"].startswith("REPORT")]
+    assert len(counts) > 1
+    assert sum(counts.values()) == len(reports)
+
+
+def test_query_latency_and_stop(aws_credentials, spec):
+    """Testing that queries run until their latency elapsed, and can be stopped."""
+    now = [0.0]
+    with mock_aws():
+        insights = FakeInsights(query_latency=10, clock=lambda: now[0])
+        insights.install()
+        insights.add_log_group("group", functools.partial(generate_log_events, spec))
+        logs_client = boto3.client("logs")
+
+        def start_query():
+            return logs_client.start_query(
+                logGroupName="group",
+                startTime=int(start.timestamp()),
+                endTime=int(end.timestamp()),
+                queryString="stats count(*) as n",
+            )["queryId"]
+
+        query_id = start_query()
+        assert logs_client.get_query_results(queryId=query_id)["status"] == "Running"
+        now[0] = 10
+        response = logs_client.get_query_results(queryId=query_id)
+        assert response["status"] == "Complete"
+        assert response["results"][0][0]["field"] == "n"
+        assert logs_client.stop_query(queryId=query_id)["success"] is False
+
+        stopped_id = start_query()
+        assert logs_client.stop_query(queryId=stopped_id)["success"] is True
+        assert (
+            logs_client.get_query_results(queryId=stopped_id)["status"] == "Cancelled"
+        )
+        assert insights.snapshot()["cancelled"] == 1
+
+
+def test_quotas_answered_as_errors(aws_credentials, spec):
+    """Testing throttling and the concurrent query limit."""
+    with mock_aws():
+        insights = FakeInsights(
+            query_latency=60, max_concurrent_queries=1, get_query_results_rate=1
+        )
+        insights.install()
+        insights.add_log_group("group", functools.partial(generate_log_events, spec))
+        logs_client = boto3.client(
+            "logs", config=Config(retries={"total_max_attempts": 1, "mode": "standard"})
+        )
+        query = {
+            "logGroupName": "group",
+            "startTime": int(start.timestamp()),
+            "endTime": int(end.timestamp()),
+            "queryString": "stats count(*) as n",
+        }
+        query_id = logs_client.start_query(**query)["queryId"]
+
+        with pytest.raises(ClientError, match="LimitExceededException"):
+            logs_client.start_query(**query)
+        logs_client.get_query_results(queryId=query_id)
+        with pytest.raises(ClientError, match="ThrottlingException"):
+            logs_client.get_query_results(queryId=query_id)
+        with pytest.raises(logs_client.exceptions.MalformedQueryException):
+            logs_client.start_query(**query | {"queryString": "unknown command"})
+
+    assert insights.snapshot() | {"bytesScanned": 0} == {
+        "queries": 1,
+        "cancelled": 0,
+        "throttled": 1,
+        "limitExceeded": 1,
+        "bytesScanned": 0,
+    }
+
+
+def test_sharded_query_matches_whole_period(aws_credentials, spec):
+    """Testing that merged window results equal the result of the whole period."""
+    from backend.step_function.analysis_generator import (
+        merge_query_results,
+        run_cloudwatch_query,
+        split_window,
+    )
+
+    log_group_name = f"/aws/lambda/{spec['name']}"
+    with mock_aws():
+        insights = FakeInsights()
+        insights.install()
+        insights.add_log_group(log_group_name, fixed_source(events_of(spec)))
+
+        def query(window_start, window_end):
+            return run_cloudwatch_query(
+                log_group_name,
+                window_start,
+                window_end,
+                spec["memorySize"],
+                512,
+                spec["architecture"],
+            )
+
+        whole_row, whole_bytes = query(start, end)
+        windows = split_window(start, end, 4)
+        row, bytes_scanned = merge_query_results(
+            [query(window_start, window_end) for window_start, window_end in windows]
+        )
+
+    assert len(windows) == 4
+    assert bytes_scanned == whole_bytes
+    whole = {field["field"]: float(field["value"]) for field in whole_row}
+    merged = {field["field"]: float(field["value"]) for field in row}
+    assert merged.keys() == whole.keys()
+    for name, value in whole.items():
+        assert merged[name] == pytest.approx(value, rel=1e-6), name
+
+
+def test_straggling_query_is_hedged(aws_credentials, spec, monkeypatch):
+    """Testing that a straggling query loses to its hedge and is stopped."""
+    from backend.step_function import analysis_generator
+    from backend.step_function.analysis_generator import run_cloudwatch_query
+    from backend.utils.straggler_utils import StragglerDetector
+
+    pause_polling = analysis_generator.pause_polling
+    # Polls 20 times faster
+    monkeypatch.setattr(
+        analysis_generator,
+        "pause_polling",
+        lambda seconds, hedge, cancel: pause_polling(seconds / 20, hedge, cancel),
+    )
+    events = events_of(spec)
+    whole_bytes = sum(len(e["message"]) + 1 for e in events)
+    stragglers = StragglerDetector(min_seconds=0.02)
+    for _ in range(3):
+        stragglers.record(0.01)
+    log_group_name = f"/aws/lambda/{spec['name']}"
+
+    with mock_aws():
+        # On a clock 20 times faster too, the whole period scans in 2s and a
+        # quarter of it in 0.5s
+        insights = FakeInsights(
+            scan_rate=whole_bytes / 40, clock=lambda: time.monotonic() * 20
+        )
+        insights.install()
+        insights.add_log_group(log_group_name, fixed_source(events))
+        row, bytes_scanned = run_cloudwatch_query(
+            log_group_name,
+            start,
+            end,
+            spec["memorySize"],
+            512,
+            spec["architecture"],
+            stragglers=stragglers,
+        )
+        counters = insights.snapshot()
+
+    results = {field["field"]: float(field["value"]) for field in row}
+    reports = [e for e in events if e["message"].startswith("REPORT")]
+    assert results["countInvocations"] == len(reports)
+    assert counters["queries"] == 1 + 4
+    assert counters["cancelled"] == 1
+    # The hedge scanned the period again
+    assert bytes_scanned >= whole_bytes
+
+
+def test_hedge_waiting_for_a_slot_starts_no_query(aws_credentials, spec, monkeypatch):
+    """Testing that a hedge still waiting for a slot is cancelled before scanning."""
+    from backend.step_function import analysis_generator
+    from backend.step_function.analysis_generator import run_cloudwatch_query
+    from backend.utils.semaphore_utils import LocalLeaseBackend, QuerySemaphore
+    from backend.utils.straggler_utils import StragglerDetector
+
+    pause_polling = analysis_generator.pause_polling
+    monkeypatch.setattr(
+        analysis_generator,
+        "pause_polling",
+        lambda seconds, hedge, cancel: pause_polling(seconds / 20, hedge, cancel),
+    )
+    # The straggling query holds the only slot
+    semaphore = QuerySemaphore(LocalLeaseBackend(), slots=1, poll_interval=0.01)
+    monkeypatch.setattr(analysis_generator, "get_query_semaphore", lambda t: semaphore)
+    events = events_of(spec)
+    whole_bytes = sum(len(e["message"]) + 1 for e in events)
+    stragglers = StragglerDetector(min_seconds=0.02)
+    for _ in range(3):
+        stragglers.record(0.01)
+    log_group_name = f"/aws/lambda/{spec['name']}"
+    threads = threading.active_count()
+
+    with mock_aws():
+        insights = FakeInsights(
+            scan_rate=whole_bytes / 20, clock=lambda: time.monotonic() * 20
+        )
+        insights.install()
+        insights.add_log_group(log_group_name, fixed_source(events))
+        row, bytes_scanned = run_cloudwatch_query(
+            log_group_name,
+            start,
+            end,
+            spec["memorySize"],
+            512,
+            spec["architecture"],
+            stragglers=stragglers,
+        )
+        counters = insights.snapshot()
+
+    assert counters["queries"] == 1
+    assert counters["cancelled"] == 0
+    assert bytes_scanned == whole_bytes
+    # The windows of the hedge ended with the query
+    assert threading.active_count() == threads
+    assert semaphore.backend.state().taken == {}
+
+
+def test_shared_log_group_scanned_once(aws_credentials):
+    """Testing that functions logging to the same group are analyzed by one scan."""
+    from backend.step_function.analysis_generator import (
+        get_lambda_cost,
+        get_shared_log_group_costs,
+        group_shared_log_groups,
+    )
+
+    specs = [
+        spec | {"architecture": "arm64", "invocationsPerDay": 100 * (index + 1)}
+        for index, spec in enumerate(function_specs(3))
+    ]
+    configs = {
+        spec["name"]: {
+            "functionName": spec["name"],
+            "runtime": spec["runtime"],
+            "architecture": spec["architecture"],
+            "accountId": "123456789012",
+            "region": "us-east-1",
+            "memorySize": spec["memorySize"],
+            "storageSize": 512,
+            "logGroupName": "/shared/app",
+            "customLogGroup": True,
+            "logGroupExists": True,
+        }
+        for spec in specs
+    }
+    events = {
+        spec["name"]: [
+            # Streams of custom log groups are prefixed by the function name
+            event | {"logStream": event["logStream"].replace("/[", f"/{spec['name']}[")}
+            for event in events_of(spec)
+        ]
+        for spec in specs
+    }
+    period = [start.isoformat(), end.isoformat()]
+    all_events = sorted(sum(events.values(), []), key=lambda e: e["timestamp"])
+
+    with mock_aws():
+        insights = FakeInsights()
+        insights.install()
+        insights.add_log_group("/shared/app", fixed_source(all_events))
+        groups = group_shared_log_groups(configs)
+        results = get_shared_log_group_costs(groups[0], *period)
+        assert insights.snapshot()["queries"] == 1
+        alone = get_lambda_cost(
+            specs[0]["name"], *period, config=configs[specs[0]["name"]]
+        )
+
+    assert [len(group) for group in groups] == [3]
+    for spec, result in zip(specs, results):
+        reports = [e for e in events[spec["name"]] if e["message"].startswith("REPORT")]
+        assert result["functionName"] == spec["name"]
+        assert float(result["countInvocations"]) == len(reports)
+    # The scan is billed once, split between the functions
+    total_gb = sum(len(e["message"]) + 1 for e in all_events) / 1024**3
+    assert sum(result["analysisCost"] for result in results) == pytest.approx(
+        total_gb * 0.005, rel=1e-3
+    )
+    # A function analyzed alone only counts its own invocations
+    assert float(alone["countInvocations"]) == float(results[0]["countInvocations"])
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from benchmarks import micro
+
+
+@pytest.fixture(scope="session")
+def micro_results(request):
+    """Collect the micro-benchmark timings, saved with --micro-save."""
+    results = {}
+    yield results
+    path = request.config.getoption("--micro-save", default=None)
+    if path and results:
+        with open(path, "w") as output:
+            json.dump(
+                {"commit": micro.git_commit(), "results": results}, output, indent=2
+            )
+
+
+@pytest.fixture(scope="session")
+def micro_baseline(request):
+    """Timings of the baseline given with --micro-baseline."""
+    path = request.config.getoption("--micro-baseline", default=None)
+    if not path:
+        return {}
+    with open(path) as baseline:
+        return json.load(baseline)["results"]
+
+
+@pytest.mark.parametrize("size", micro.default_sizes)
+@pytest.mark.parametrize("case", list(micro.cases))
+def test_micro_benchmark(case, size, request, micro_results, micro_baseline):
+    """Timing a report path, failing on regressions against the baseline."""
+    if not request.config.getoption("--micro-benchmarks", default=False):
+        pytest.skip("micro-benchmarks run with --micro-benchmarks")
+    threshold = request.config.getoption("--micro-threshold", default=None)
+    if threshold is None:
+        threshold = micro.default_threshold
+
+    seconds = micro.run_case(case, size)
+    micro_results.setdefault(case, {})[str(size)] = round(seconds, 6)
+
+    before = micro_baseline.get(case, {}).get(str(size))
+    slowdown = micro.regression(seconds, before, threshold)
+    if slowdown is not None:
+        pytest.fail(
+            f"{case} with {size} rows took {seconds:.4f}s, "
+            f"{slowdown:.0f}% slower than the baseline ({before:.4f}s)"
+        )
+
+
+@pytest.mark.parametrize("case", list(micro.cases))
+def test_micro_benchmark_cases_run(case):
+    """Testing that the benchmark cases still run against the backend."""
+    assert micro.run_case(case, 20, repeat=1) > 0
+
+
+def test_regression_threshold():
+    """Testing the regression check."""
+    assert micro.regression(1.1, 1.0, 20) is None
+    assert micro.regression(1.5, 1.0, 20) == pytest.approx(50)
+    assert micro.regression(1.5, None, 20) is None
@@ -0,0 +1,60 @@
+import json
+
+
+def test_pipeline_benchmark(tmp_path):
+    """Testing that the benchmark runs every stage and records its metrics."""
+    from benchmarks.pipeline import main
+
+    output = tmp_path / "benchmark.json"
+    assert main(["--sizes", "12", "--output", str(output)]) == 0
+
+    result = json.loads(output.read_text())
+    run = result["runs"][0]
+    assert run["functions"] == 12
+    assert run["batches"] == 3
+    assert list(run["stages"]) == [
+        "setup",
+        "initializer",
+        "generator",
+        "aggregator",
+        "api",
+    ]
+    generator = run["stages"]["generator"]
+    assert generator["awsCalls"]["logs.StartQuery"] == 12
+    assert generator["awsCalls"]["logs.GetQueryResults"] == 12
+    assert generator["bytesUploaded"] > 0
+    assert run["stages"]["aggregator"]["bytesDownloaded"] > 0
+    assert run["stages"]["api"]["peakRssMB"] > 0
+
+    # Comparing a result with itself finds no regression
+    assert main(["--sizes", "12", "--compare", str(output)]) in [0, 1]
+
+
+def test_pipeline_benchmark_fake_insights(tmp_path):
+    """Testing the benchmark with queries evaluated over synthetic logs."""
+    from benchmarks.pipeline import main
+
+    output = tmp_path / "benchmark.json"
+    arguments = ["--sizes", "6", "--insights", "fake", "--days", "1"]
+    assert main(arguments + ["--output", str(output)]) == 0
+
+    run = json.loads(output.read_text())["runs"][0]
+    assert run["insights"]["queries"] == 6
+    assert run["insights"]["bytesScanned"] > 0
+    assert run["stages"]["generator"]["awsCalls"]["logs.StartQuery"] == 6
+
+
+def test_pipeline_benchmark_record_replay(tmp_path):
+    """Testing that a recorded run is replayed without missing recordings."""
+    from benchmarks.pipeline import main
+
+    cassette = str(tmp_path / "run.jsonl.gz")
+    output = tmp_path / "benchmark.json"
+    assert main(["--sizes", "6", "--record", cassette]) == 0
+    arguments = ["--sizes", "6", "--replay", cassette, "--latency-scale", "0"]
+    assert main(arguments + ["--output", str(output)]) == 0
+
+    run = json.loads(output.read_text())["runs"][0]
+    assert run["replay"]["missing"] == 0
+    assert run["replay"]["matched"] > 0
+    assert run["stages"]["generator"]["awsCalls"]["logs.StartQuery"] == 6
@@ -1,10 +1,31 @@
 """Shared pytest fixtures for all tests."""
 
+import threading
+from collections.abc import Iterator
 from dataclasses import dataclass
 
 import pytest
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    """Add the micro-benchmark options."""
+    group = parser.getgroup("micro-benchmarks")
+    group.addoption(
+        "--micro-benchmarks",
+        action="store_true",
+        help="Run the micro-benchmarks of the report paths",
+    )
+    group.addoption(
+        "--micro-baseline", help="Fail on regressions against this JSON result"
+    )
+    group.addoption(
+        "--micro-threshold",
+        type=float,
+        help="Allowed slowdown against the baseline in percent (default 20)",
+    )
+    group.addoption("--micro-save", help="Write the JSON result to this file")
+
+
 @dataclass
 class LambdaContext:
     """Mock AWS Lambda context for testing."""
@@ -28,3 +49,19 @@ class LambdaContext:
 def lambda_context() -> LambdaContext:
     """Provide a mock Lambda context for tests."""
     return LambdaContext()
+
+
+@pytest.fixture(autouse=True)
+def join_leftover_threads() -> Iterator[None]:
+    """
+    Wait for the threads a test left running.
+
+    Tasks abandoned past a timeout or a deadline keep running in their worker
+    threads, which would otherwise run into the next tests (and their
+    profiles).
+    """
+    before = set(threading.enumerate())
+    yield
+    for thread in set(threading.enumerate()) - before:
+        if not thread.daemon:
+            thread.join(timeout=10)
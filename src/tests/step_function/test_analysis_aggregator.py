@@ -152,6 +152,15 @@ def test_file_merge(s3_bucket, lambda_context):
     assert len(data_list) == 2
     assert data_list == files_merge
 
+    timeline = json.loads(download_from_s3("timeline.json", s3_bucket, report_id))
+    assert sorted(span["name"] for span in timeline["spans"]) == [
+        "aggregator.download",
+        "aggregator.invocation",
+        "aggregator.merge",
+        "aggregator.write_csv",
+    ]
+    assert timeline["stats"]["aggregator.write_csv"]["count"] == 1
+
 
 @mock_aws
 def test_summary_file(s3_bucket, lambda_context):
@@ -292,4 +301,174 @@ def test_summary_file(s3_bucket, lambda_context):
         "endDate": end_date,
         "status": "Completed",
     }
+    report_cost = report.pop("reportCost")
     assert report == expected_report
+    # Generators of the report didn't record their usage
+    assert report_cost["usage"]["lambdaInvocations"] == 1
+    assert report_cost["usage"]["stateTransitions"] == 2
+    assert report_cost["usage"]["s3Tier2Requests"] == 2
+    assert report_cost["logsInsights"] == pytest.approx(0.00003)
+    assert report_cost["total"] == pytest.approx(
+        sum(
+            value for key, value in report_cost.items() if key not in ["total", "usage"]
+        )
+    )
+
+
+@mock_aws
+def test_summary_targets_rollup(s3_bucket, lambda_context):
+    """Testing that the summary is rolled up by account and region."""
+    from backend.step_function.analysis_aggregator import lambda_handler
+    from backend.utils.s3_utils import download_from_s3, upload_file_to_s3
+
+    report_id = "test-report"
+    directory = f"single_analysis/{report_id}"
+    row = {
+        "countInvocations": 10,
+        "allDurationInSeconds": 21,
+        "provisionedMemoryMB": 128,
+        "MemoryCost": 1,
+        "InvocationCost": 0.5,
+        "totalCost": 1.5,
+        "avgCostPerInvocation": 0.5,
+        "maxMemoryUsedMB": 80,
+        "overProvisionedMB": 48,
+        "potentialSavings": 0.25,
+        "avgDurationPerInvocation": 3,
+        "logSizeGB": 0.001,
+        "logIngestionCost": 0.0005,
+        "logStorageCost": 0.00003,
+        "analysisCost": 0.000005,
+        "timeoutInvocations": 0,
+    }
+    rows = [
+        {"functionName": "LambdaA", "accountId": "012345678901", "region": "eu-west-1"},
+        {"functionName": "LambdaB", "accountId": "012345678901", "region": "eu-west-1"},
+        {"functionName": "LambdaC", "accountId": "222222222222", "region": "us-east-1"},
+    ]
+    upload_file_to_s3(
+        body=write_csv_file([{**row, **target_row} for target_row in rows]).getvalue(),
+        bucket_name=s3_bucket,
+        file_name="file1.csv",
+        directory=directory,
+    )
+
+    event = [
+        {
+            "filename": "file1.csv",
+            "bucket": s3_bucket,
+            "directory": directory,
+            "report_id": report_id,
+            "start_date": "X",
+            "end_date": "X",
+            "failed_functions": [{"functionName": "LambdaD", "reason": "Timeout"}],
+        }
+    ]
+    lambda_handler(event, lambda_context)
+    report = json.loads(
+        download_from_s3("summary.json", bucket_name=s3_bucket, directory=report_id)
+    )
+
+    assert report["totalCost"] == 4.5
+    assert report["failedFunctions"] == [
+        {"functionName": "LambdaD", "reason": "Timeout"}
+    ]
+    assert report["targets"] == [
+        {
+            "accountId": "012345678901",
+            "region": "eu-west-1",
+            "functions": 2,
+            "countInvocations": 20,
+            "totalCost": 3.0,
+            "potentialSavings": 0.5,
+            "logIngestionCost": 0.001,
+            "analysisCost": 0.00001,
+        },
+        {
+            "accountId": "222222222222",
+            "region": "us-east-1",
+            "functions": 1,
+            "countInvocations": 10,
+            "totalCost": 1.5,
+            "potentialSavings": 0.25,
+            "logIngestionCost": 0.0005,
+            "analysisCost": 0.000005,
+        },
+    ]
+
+
+@mock_aws
+def test_resumed_report_reuses_batch_outputs(s3_bucket, lambda_context):
+    """Testing that a resumed report is aggregated with the outputs kept."""
+    from backend.step_function.analysis_aggregator import lambda_handler
+    from backend.utils.batch_utils import upload_batch_marker, upload_plan
+    from backend.utils.s3_utils import download_from_s3, upload_file_to_s3
+
+    report_id = "resumed-report"
+    directory = f"single_analysis/{report_id}"
+    row = {
+        "runtime": "python3.12",
+        "countInvocations": 10,
+        "allDurationInSeconds": 20,
+        "provisionedMemoryMB": 128,
+        "MemoryCost": 1,
+        "InvocationCost": 0.5,
+        "totalCost": 1.5,
+        "avgCostPerInvocation": 0.15,
+        "maxMemoryUsedMB": 80,
+        "overProvisionedMB": 48,
+        "optimalMemory": 128,
+        "optimalTotalCost": 1.5,
+        "potentialSavings": 0,
+        "avgDurationPerInvocation": 2,
+        "logSizeGB": 0.001,
+        "logIngestionCost": 0.0005,
+        "logStorageCost": 0.00003,
+        "analysisCost": 0.000005,
+        "timeoutInvocations": 0,
+    }
+    upload_plan(
+        report_id,
+        s3_bucket,
+        {
+            "start_date": "X",
+            "end_date": "X",
+            "batches": [{"batch_id": "batch-00000"}, {"batch_id": "batch-00001"}],
+        },
+    )
+    results = {}
+    for batch_id, function_name in [("batch-00000", "A"), ("batch-00001", "B")]:
+        upload_file_to_s3(
+            write_csv_file([{"functionName": function_name, **row}]).getvalue(),
+            f"{batch_id}.csv",
+            s3_bucket,
+            directory,
+        )
+        results[batch_id] = {
+            "batch_id": batch_id,
+            "filename": f"{batch_id}.csv",
+            "bucket": s3_bucket,
+            "directory": directory,
+            "report_id": report_id,
+            "start_date": "X",
+            "end_date": "X",
+            "failed_functions": [],
+        }
+    # Only the first batch completed before the report failed
+    upload_batch_marker(results["batch-00000"], s3_bucket)
+
+    event = {
+        "report_id": report_id,
+        "start_date": "X",
+        "end_date": "X",
+        "resumed": True,
+        "batches": [results["batch-00001"]],
+    }
+    lambda_handler(event, lambda_context)
+
+    analysis = csv.DictReader(
+        StringIO(download_from_s3("analysis.csv", s3_bucket, report_id))
+    )
+    assert sorted(row["functionName"] for row in analysis) == ["A", "B"]
+    summary = json.loads(download_from_s3("summary.json", s3_bucket, report_id))
+    assert summary["status"] == "Completed"
@@ -173,3 +173,30 @@ def test_error_handler_partial_error_details(s3_bucket, lambda_context):
 
     assert error_summary["errorCode"] == "Unknown"
     assert error_summary["errorMessage"] == error_cause
+
+
+@mock_aws
+def test_error_handler_of_cancelled_report(s3_bucket, lambda_context):
+    """Test error handler reports the cancellation and stops no queries."""
+    from backend.step_function.analysis_error_handler import lambda_handler
+    from backend.utils.query_registry_utils import (
+        load_cancellation,
+        record_cancellation,
+    )
+    from backend.utils.s3_utils import download_from_s3
+
+    report_id = "test-report-cancelled"
+    record_cancellation(report_id, s3_bucket, {"reason": "Cancelled on request"})
+
+    event = {"report_id": report_id, "error": "ReportCancelledError"}
+    response = lambda_handler(event, lambda_context)
+    assert response["status"] == "Cancelled"
+
+    error_summary = json.loads(
+        download_from_s3("summary.json", bucket_name=s3_bucket, directory=report_id)
+    )
+    assert error_summary["status"] == "Cancelled"
+    assert error_summary["cancelledQueries"] == 0
+    assert error_summary["bytesScanAvoided"] == 0
+    marker = load_cancellation(report_id, s3_bucket)
+    assert marker["reason"] == "Cancelled on request"
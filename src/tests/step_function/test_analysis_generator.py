@@ -103,6 +103,7 @@ def test_get_lambda_cost_full_logic(
 
     # Mock Lambda function configuration
     mock_lambda_client.get_function_configuration.return_value = {
+        "FunctionArn": "arn:aws:lambda:us-east-1:123456789012:function:test_lambda",
         "Runtime": "python3.12",
         "MemorySize": 128,
         "Architectures": ["x86_64"],
@@ -174,6 +175,7 @@ def test_get_lambda_cost_no_log_group(mock_boto_client, aws_credentials):
 
     # Mock Lambda function configuration
     mock_lambda_client.get_function_configuration.return_value = {
+        "FunctionArn": "arn:aws:lambda:us-east-1:123456789012:function:test_lambda",
         "Runtime": "python3.12",
         "MemorySize": 128,
         "Architectures": ["x86_64"],
@@ -205,6 +207,7 @@ def test_get_lambda_cost_no_invocations(mock_boto_client, aws_credentials):
 
     # Mock Lambda function configuration
     mock_lambda_client.get_function_configuration.return_value = {
+        "FunctionArn": "arn:aws:lambda:us-east-1:123456789012:function:test_lambda",
         "Runtime": "python3.12",
         "MemorySize": 256,
         "Architectures": ["arm64"],
@@ -234,3 +237,83 @@ def test_get_lambda_cost_no_invocations(mock_boto_client, aws_credentials):
 
     # Should return None when there are no query results
     assert result is None
+
+
+@mock_aws
+@patch("boto3.client")
+def test_get_lambda_cost_regional_pricing(
+    mock_boto_client, mock_query_results, aws_credentials
+):
+    """Test that log costs use the prices of the function's region."""
+    from backend.step_function.analysis_generator import get_lambda_cost
+
+    mock_client = mock_boto_client.return_value
+    mock_client.get_function_configuration.return_value = {
+        "FunctionArn": "arn:aws:lambda:eu-central-1:012345678901:function:test_lambda",
+        "Runtime": "python3.12",
+        "MemorySize": 128,
+        "Architectures": ["x86_64"],
+        "EphemeralStorage": {"Size": 512},
+        "LoggingConfig": {"LogGroup": "/aws/lambda/test_lambda"},
+    }
+    mock_client.describe_log_groups.return_value = {
+        "logGroups": [{"logGroupName": "/aws/lambda/test_lambda"}]
+    }
+    mock_client.start_query.return_value = {"queryId": "test-query-id"}
+    mock_client.get_query_results.return_value = mock_query_results
+
+    result = get_lambda_cost(
+        "test_lambda",
+        "2024-01-01T00:00:00.000Z",
+        "2024-01-31T23:59:59.999Z",
+        target={"region": "eu-central-1"},
+    )
+
+    assert result["accountId"] == "012345678901"
+    assert result["region"] == "eu-central-1"
+    assert result["logIngestionCost"] == pytest.approx(0.0001 * 0.63)
+    mock_boto_client.assert_any_call("lambda", region_name="eu-central-1", config=None)
+
+
+@mock_aws
+def test_deferred_retry_of_failed_queries(aws_credentials, monkeypatch):
+    """Testing that failed functions are retried over shorter windows."""
+    from backend.step_function import analysis_generator
+    from backend.step_function.analysis_generator import (
+        QueryFailedError,
+        generate_cost_report,
+    )
+
+    boto3.client("s3").create_bucket(Bucket="test-bucket")
+    monkeypatch.setattr(analysis_generator, "bucket_name", "test-bucket")
+    calls = []
+
+    def get_lambda_cost(
+        lambda_name, start_date, end_date, target, timeline, report_id, shards, *args
+    ):
+        calls.append((lambda_name, shards))
+        if lambda_name == "malformed":
+            raise QueryFailedError("Malformed query", retryable=False)
+        if lambda_name == "broken" or shards == 1:
+            raise QueryFailedError("Query timeout")
+        return {"functionName": lambda_name, "totalCost": 1}
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", get_lambda_cost)
+    result = generate_cost_report(
+        ["flaky", "broken", "malformed"],
+        "report",
+        "2024-01-01T00:00:00Z",
+        "2024-01-31T00:00:00Z",
+    )
+
+    assert sorted(calls) == [
+        ("broken", 1),
+        ("broken", 4),
+        ("flaky", 1),
+        ("flaky", 4),
+        ("malformed", 1),
+    ]
+    assert sorted(result["failed_functions"], key=lambda f: f["functionName"]) == [
+        {"functionName": "broken", "reason": "Query timeout"},
+        {"functionName": "malformed", "reason": "Malformed query"},
+    ]
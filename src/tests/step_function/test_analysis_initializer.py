@@ -42,3 +42,177 @@ def test_report_json_created(s3_bucket, lambda_context):
         download_from_s3("summary.json", bucket_name=s3_bucket, directory=report_id)
     )
     assert report == {"status": "Running"}
+
+
+@mock_aws
+def test_tag_selection(s3_bucket, lambda_context):
+    """Testing that a tag expression is resolved once and added to the batches."""
+    from backend.step_function.analysis_initializer import lambda_handler
+    from backend.utils.s3_utils import download_from_s3
+    from backend.utils.sf_utils import download_parameters_from_s3
+
+    role_arn = boto3.client("iam").create_role(
+        RoleName="mock-role", AssumeRolePolicyDocument="{}"
+    )["Role"]["Arn"]
+    lambda_client = boto3.client("lambda")
+    for name, team in [("LambdaA", "payments"), ("LambdaB", "search")]:
+        lambda_client.create_function(
+            FunctionName=name,
+            Runtime="python3.12",
+            Role=role_arn,
+            Handler="lambda_function.lambda_handler",
+            Code={"ZipFile": b"def lambda_handler(event, context):\n    pass"},
+            Tags={"team": team},
+        )
+
+    report_id = "tag_report"
+    event = {
+        "lambda_functions_name": ["LambdaC"],
+        "tag_expression": "team = payments",
+        "report_id": report_id,
+    }
+    response = lambda_handler(event, lambda_context)
+
+    batches = [
+        download_parameters_from_s3(batch)
+        for batch in response["lambda_functions_name"]
+    ]
+    assert batches == [
+        {
+            "batch_id": "batch-00000",
+            "target": {"role_arn": None, "region": None},
+            "lambda_functions_name": ["LambdaC", "LambdaA"],
+        }
+    ]
+    selection = json.loads(
+        download_from_s3("tag_selection.json", s3_bucket, directory=report_id)
+    )
+    assert selection == {
+        "local/default": {
+            "tagExpression": "team=payments",
+            "functionNames": ["LambdaA"],
+        }
+    }
+
+
+@mock_aws
+def test_targets_batches_interleaved(s3_bucket, lambda_context):
+    """Testing that batches of several targets are planned round-robin."""
+    from backend.step_function.analysis_initializer import lambda_handler
+    from backend.utils.sf_utils import download_parameters_from_s3
+
+    role_arn = "arn:aws:iam::111111111111:role/LambdaCostAnalysis"
+    event = {
+        "targets": [
+            {"lambda_functions_name": [f"A{i}" for i in range(12)]},
+            {
+                "role_arn": role_arn,
+                "region": "eu-west-1",
+                "lambda_functions_name": ["B0"],
+            },
+        ],
+        "report_id": "multi_target_report",
+    }
+    response = lambda_handler(event, lambda_context)
+
+    batches = [
+        download_parameters_from_s3(batch)
+        for batch in response["lambda_functions_name"]
+    ]
+    assert [batch["target"]["region"] for batch in batches] == [
+        None,
+        "eu-west-1",
+        None,
+        None,
+    ]
+    assert batches[1] == {
+        "batch_id": "batch-00001",
+        "target": {"role_arn": role_arn, "region": "eu-west-1"},
+        "lambda_functions_name": ["B0"],
+    }
+
+
+@mock_aws
+def test_resume_plans_missing_batches(s3_bucket, lambda_context, monkeypatch):
+    """Testing that a resumed report only runs the batches without full output."""
+    from backend.step_function import analysis_generator
+    from backend.step_function.analysis_generator import (
+        QueryFailedError,
+        generate_cost_report,
+    )
+    from backend.step_function.analysis_initializer import lambda_handler
+    from backend.utils.query_registry_utils import record_cancellation
+    from backend.utils.s3_utils import list_s3_keys
+    from backend.utils.sf_utils import download_parameters_from_s3
+
+    report_id = "resumed_report"
+    event = {
+        "lambda_functions_name": [f"F{i}" for i in range(11)],
+        "report_id": report_id,
+        "start_date": "2024-01-01T00:00:00Z",
+        "end_date": "2024-01-31T00:00:00Z",
+    }
+    response = lambda_handler(event, lambda_context)
+    batches = [
+        download_parameters_from_s3(batch)
+        for batch in response["lambda_functions_name"]
+    ]
+
+    def get_lambda_cost(lambda_name, *args):
+        if lambda_name == "F5":
+            raise QueryFailedError("Malformed query", retryable=False)
+        return {"functionName": lambda_name, "totalCost": 1}
+
+    monkeypatch.setattr(analysis_generator, "bucket_name", s3_bucket)
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", get_lambda_cost)
+    # The first batch completes twice, the second misses a function and the
+    # run fails before the third
+    for batch in [batches[0], batches[0], batches[1]]:
+        generate_cost_report(
+            batch["lambda_functions_name"],
+            report_id,
+            event["start_date"],
+            event["end_date"],
+            batch_id=batch["batch_id"],
+        )
+    assert list_s3_keys(s3_bucket, f"single_analysis/{report_id}") == [
+        f"single_analysis/{report_id}/batch-00000.csv",
+        f"single_analysis/{report_id}/batch-00000.json",
+        f"single_analysis/{report_id}/batch-00001.csv",
+        f"single_analysis/{report_id}/batch-00001.json",
+    ]
+    record_cancellation(report_id, s3_bucket, {"reason": "States.Timeout"})
+
+    response = lambda_handler({"report_id": report_id, "resume": True}, lambda_context)
+    resumed = [
+        download_parameters_from_s3(batch)
+        for batch in response["lambda_functions_name"]
+    ]
+    assert resumed == batches[1:]
+    assert response["resumed"] is True
+    assert response["start_date"] == event["start_date"]
+    assert f"{report_id}/cancellation.json" not in list_s3_keys(s3_bucket, report_id)
+
+
+@mock_aws
+def test_batches_by_log_group(s3_bucket, lambda_context, monkeypatch):
+    """Testing that functions of a shared log group are planned together."""
+    from backend.step_function import analysis_initializer
+    from backend.utils.sf_utils import download_parameters_from_s3
+
+    def lookup_log_groups(lambda_names, target):
+        return [
+            "shared" if name.startswith("s") else f"/aws/lambda/{name}"
+            for name in lambda_names
+        ]
+
+    monkeypatch.setattr(analysis_initializer, "lookup_log_groups", lookup_log_groups)
+    names = ["a", "b", "c", "s1", "d", "e", "s2"]
+    event = {"lambda_functions_name": names, "report_id": "shared_report"}
+    response = analysis_initializer.lambda_handler(event, lambda_context)
+
+    batches = [
+        download_parameters_from_s3(batch)["lambda_functions_name"]
+        for batch in response["lambda_functions_name"]
+    ]
+    assert batches == [["s1", "s2", "a", "b", "c"], ["d", "e"]]
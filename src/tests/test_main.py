@@ -0,0 +1,308 @@
+import json
+import os
+
+import boto3
+import pandas as pd
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        os.environ["BUCKET_NAME"] = bucket_name
+        yield bucket_name
+
+
+@pytest.fixture
+def cli_environment(aws_credentials, monkeypatch):
+    """Restore the configuration the command line sets for the backend."""
+    monkeypatch.setenv("BUCKET_NAME", os.environ.get("BUCKET_NAME", "test-bucket"))
+    monkeypatch.setenv("QUERY_SEMAPHORE", "local")
+
+
+period = ["--start-date", "2024-01-01T00:00:00Z", "--end-date", "2024-01-31T23:59:59Z"]
+
+
+def fake_lambda_cost(lambda_name, *args):
+    """Cost analysis of a function, without querying its logs."""
+    if lambda_name == "idle":
+        return None
+    return {
+        "functionName": lambda_name,
+        "runtime": "python3.13",
+        "architecture": "arm64",
+        "countInvocations": 100,
+        "allDurationInSeconds": 10.0,
+        "provisionedMemoryMB": 256,
+        "MemoryCost": 0.5,
+        "InvocationCost": 0.1,
+        "StorageCost": 0.0,
+        "totalCost": 0.6,
+        "avgCostPerInvocation": 0.006,
+        "maxMemoryUsedMB": 100,
+        "overProvisionedMB": 156,
+        "optimalMemory": 128,
+        "potentialSavings": 0.2,
+        "avgDurationPerInvocation": 0.1,
+        "timeoutInvocations": 0,
+        "logSizeGB": 0.01,
+        "logIngestionCost": 0.005,
+        "logStorageCost": 0.0003,
+        "analysisCost": 0.0001,
+        "accountId": "012345678901",
+        "region": "us-east-1",
+    }
+
+
+@mock_aws
+def test_local_report_and_cache(cli_environment, tmp_path, monkeypatch):
+    """Testing a run into a local directory, then a rerun from the cache."""
+    from backend import __main__ as cli
+    from backend.step_function import analysis_generator
+
+    calls = []
+
+    def flaky_lambda_cost(lambda_name, *args):
+        calls.append(lambda_name)
+        # Throttled once, then retried over shorter windows
+        if lambda_name == "flaky" and calls.count("flaky") == 1:
+            raise analysis_generator.QueryFailedError("ThrottlingException")
+        if lambda_name == "broken":
+            raise analysis_generator.QueryFailedError("Malformed", retryable=False)
+        return fake_lambda_cost(lambda_name)
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", flaky_lambda_cost)
+    arguments = [
+        "--functions",
+        "a",
+        "flaky",
+        "idle",
+        "broken",
+        "a",
+        "--output-dir",
+        str(tmp_path / "reports"),
+        "--cache-dir",
+        str(tmp_path / "cache"),
+        "--report-id",
+        "local",
+        *period,
+    ]
+
+    assert cli.main(arguments) == 0
+
+    report_directory = tmp_path / "reports" / "local"
+    analysis = pd.read_csv(report_directory / "analysis.csv", index_col=0)
+    assert sorted(analysis["functionName"]) == ["a", "flaky"]
+    summary = json.loads((report_directory / "summary.json").read_text())
+    assert summary["status"] == "Completed"
+    assert summary["failedFunctions"] == [
+        {"functionName": "broken", "reason": "Malformed"}
+    ]
+    assert summary["reportCost"]["usage"]["stateTransitions"] == 0
+    timeline = json.loads((report_directory / "timeline.json").read_text())
+    assert "cli.run" in timeline["stats"]
+    assert sorted(calls) == ["a", "broken", "flaky", "flaky", "idle"]
+
+    # Only the failed function is queried again
+    calls.clear()
+    assert cli.main(arguments) == 0
+    assert calls == ["broken"]
+    analysis = pd.read_csv(report_directory / "analysis.csv", index_col=0)
+    assert sorted(analysis["functionName"]) == ["a", "flaky"]
+    # Nothing scanned by the rerun
+    assert analysis["analysisCost"].sum() == 0
+
+
+@mock_aws
+def test_shared_log_group_units(cli_environment, tmp_path, monkeypatch):
+    """Testing that functions sharing a log group are analyzed together."""
+    from backend import __main__ as cli
+    from backend.utils import log_group_utils
+
+    looked_up = []
+
+    def lookup_log_groups(lambda_names, target):
+        looked_up.extend(lambda_names)
+        return ["shared" if name.startswith("s") else None for name in lambda_names]
+
+    monkeypatch.setattr(log_group_utils, "lookup_log_groups", lookup_log_groups)
+    target = {"role_arn": None, "region": None}
+    cli.store_cached(
+        cli.cache_path(
+            str(tmp_path), "cached", target, "2024-01-01T00:00:00Z", "2024-01-31"
+        ),
+        None,
+    )
+    args = cli.argparse.Namespace(
+        start_date="2024-01-01T00:00:00Z", end_date="2024-01-31"
+    )
+    selection = [(name, target) for name in ["s1", "a", "s2", "cached", "s3"]]
+
+    units = cli.plan_units(selection, str(tmp_path), args)
+
+    assert units == [
+        (["s1", "s2", "s3"], target),
+        (["a"], target),
+        (["cached"], target),
+    ]
+    # Cached functions aren't queried
+    assert looked_up == ["s1", "a", "s2", "s3"]
+
+
+def test_process_pool_reads_cache(cli_environment, tmp_path, monkeypatch):
+    """Testing that worker processes share the on-disk cache."""
+    from backend import __main__ as cli
+
+    target = {"role_arn": None, "region": None}
+    for name in ["a", "b", "idle"]:
+        cli.store_cached(
+            cli.cache_path(
+                str(tmp_path / "cache"),
+                name,
+                target,
+                "2024-01-01T00:00:00Z",
+                "2024-01-31T23:59:59Z",
+            ),
+            fake_lambda_cost(name),
+        )
+
+    status = cli.main(
+        [
+            "--functions",
+            "a",
+            "b",
+            "idle",
+            "--pool",
+            "process",
+            "--workers",
+            "2",
+            "--output-dir",
+            str(tmp_path / "reports"),
+            "--cache-dir",
+            str(tmp_path / "cache"),
+            "--report-id",
+            "cached",
+            *period,
+        ]
+    )
+
+    assert status == 0
+    analysis = pd.read_csv(tmp_path / "reports" / "cached" / "analysis.csv")
+    assert sorted(analysis["functionName"]) == ["a", "b"]
+
+
+@mock_aws
+def test_bucket_report(s3_bucket, cli_environment, monkeypatch):
+    """Testing that a run into the bucket shows in the history."""
+    from backend import __main__ as cli
+    from backend.step_function import analysis_generator
+    from backend.utils.s3_utils import download_from_s3, list_s3_keys
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", fake_lambda_cost)
+
+    status = cli.main(
+        [
+            "--functions",
+            "a",
+            "b",
+            "--bucket",
+            s3_bucket,
+            "--no-cache",
+            "--report-id",
+            "audit",
+            *period,
+        ]
+    )
+
+    assert status == 0
+    summary = json.loads(download_from_s3("summary.json", s3_bucket, "audit"))
+    assert summary["status"] == "Completed"
+    assert summary["totalCost"] == pytest.approx(1.2)
+    assert "audit/analysis.csv" in list_s3_keys(s3_bucket, "audit")
+    assert list_s3_keys(s3_bucket, "summaries")
+
+
+@mock_aws
+def test_function_client_error(cli_environment, tmp_path, monkeypatch):
+    """Testing that an AWS error of a function fails only that function."""
+    from botocore.exceptions import ClientError
+
+    from backend import __main__ as cli
+    from backend.step_function import analysis_generator
+
+    def lambda_cost(lambda_name, *args):
+        if lambda_name == "gone":
+            raise ClientError(
+                {"Error": {"Code": "ResourceNotFoundException", "Message": "gone"}},
+                "GetFunctionConfiguration",
+            )
+        return fake_lambda_cost(lambda_name)
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", lambda_cost)
+
+    status = cli.main(
+        [
+            "--functions",
+            "a",
+            "gone",
+            "--output-dir",
+            str(tmp_path),
+            "--no-cache",
+            "--report-id",
+            "partial",
+            *period,
+        ]
+    )
+
+    assert status == 0
+    summary = json.loads((tmp_path / "partial" / "summary.json").read_text())
+    assert summary["status"] == "Completed"
+    (failure,) = summary["failedFunctions"]
+    assert failure["functionName"] == "gone"
+    assert "ResourceNotFoundException" in failure["reason"]
+
+
+@mock_aws
+def test_bucket_report_crash(s3_bucket, cli_environment, monkeypatch):
+    """Testing that a run into the bucket that crashes marks the report failed."""
+    from backend import __main__ as cli
+    from backend.step_function import analysis_generator
+    from backend.utils.s3_utils import download_from_s3
+
+    def lambda_cost(lambda_name, *args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(analysis_generator, "get_lambda_cost", lambda_cost)
+
+    with pytest.raises(RuntimeError):
+        cli.main(
+            [
+                "--functions",
+                "a",
+                "--bucket",
+                s3_bucket,
+                "--no-cache",
+                "--report-id",
+                "crashed",
+                *period,
+            ]
+        )
+
+    summary = json.loads(download_from_s3("summary.json", s3_bucket, "crashed"))
+    assert summary["status"] == "Failed"
+    assert summary["errorCode"] == "RuntimeError"
+    assert summary["errorMessage"] == "boom"
@@ -0,0 +1,173 @@
+import json
+import os
+from unittest.mock import patch
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        yield bucket_name
+
+
+def put_summary(bucket_name, report_id, status):
+    """Upload the summary of a report."""
+    boto3.client("s3").put_object(
+        Bucket=bucket_name,
+        Key=f"{report_id}/summary.json",
+        Body=json.dumps({"status": status}),
+    )
+
+
+def test_fingerprint_ignores_order_and_formatting():
+    """Testing that equivalent requests share a fingerprint."""
+    from backend.utils.admission_utils import analysis_fingerprint
+
+    request = {
+        "lambda_functions_name": ["b", "a", "a"],
+        "tag_expression": "team = payments",
+        "start_date": "2024-01-01",
+        "end_date": "2024-01-31",
+        "report_id": "1",
+    }
+    same = {
+        "targets": [
+            {
+                "lambda_functions_name": ["a", "b"],
+                "tag_expression": "team=payments",
+            }
+        ],
+        "start_date": "2024-01-01",
+        "end_date": "2024-01-31",
+        "report_id": "2",
+    }
+    assert analysis_fingerprint(request) == analysis_fingerprint(same)
+    assert analysis_fingerprint(request) != analysis_fingerprint(
+        {**request, "end_date": "2024-02-01"}
+    )
+
+
+def test_claim_attaches_to_unfinished_reports(s3_bucket):
+    """Testing that identical requests attach until the report failed."""
+    from backend.utils.admission_utils import claim_analysis
+
+    assert claim_analysis("fingerprint", "first", s3_bucket) is None
+    # Claimed, summary not written yet
+    assert claim_analysis("fingerprint", "second", s3_bucket) == "first"
+    put_summary(s3_bucket, "first", "Running")
+    assert claim_analysis("fingerprint", "second", s3_bucket) == "first"
+    put_summary(s3_bucket, "first", "Completed")
+    assert claim_analysis("fingerprint", "second", s3_bucket) == "first"
+
+    put_summary(s3_bucket, "first", "Failed")
+    assert claim_analysis("fingerprint", "second", s3_bucket) is None
+    assert claim_analysis("fingerprint", "third", s3_bucket) == "second"
+
+
+def test_queue_drains_up_to_the_limit(s3_bucket, monkeypatch):
+    """Testing that queued reports start in order while slots are free."""
+    from backend.utils import admission_utils
+    from backend.utils.admission_utils import (
+        drain_analysis_queue,
+        enqueue_analysis,
+        queue_position,
+    )
+
+    monkeypatch.setattr(admission_utils, "max_concurrent_analyses", 2)
+    sfn_client = boto3.client("stepfunctions")
+    state_machine_arn = sfn_client.create_state_machine(
+        name="analysis",
+        definition=json.dumps(
+            {"StartAt": "Done", "States": {"Done": {"Type": "Pass", "End": True}}}
+        ),
+        roleArn="arn:aws:iam::123456789012:role/analysis",
+    )["stateMachineArn"]
+
+    for report_id in ["a", "b", "c"]:
+        enqueue_analysis({"report_id": report_id}, s3_bucket)
+    started = drain_analysis_queue(sfn_client, state_machine_arn, s3_bucket)
+    assert list(started) == ["a", "b"]
+    assert queue_position("c", s3_bucket) == 1
+    assert queue_position("a", s3_bucket) is None
+
+    # Both still running
+    assert drain_analysis_queue(sfn_client, state_machine_arn, s3_bucket) == {}
+    sfn_client.stop_execution(executionArn=started["a"])
+    assert list(drain_analysis_queue(sfn_client, state_machine_arn, s3_bucket)) == ["c"]
+
+
+def test_drain_reconciles_existing_executions(s3_bucket, monkeypatch):
+    """Testing that reports whose execution name is taken don't stay queued."""
+    from backend.utils import admission_utils
+    from backend.utils.admission_utils import (
+        drain_analysis_queue,
+        enqueue_analysis,
+        execution_name,
+    )
+
+    monkeypatch.setattr(admission_utils, "max_concurrent_analyses", 10)
+    sfn_client = boto3.client("stepfunctions")
+    state_machine_arn = sfn_client.create_state_machine(
+        name="analysis",
+        definition=json.dumps(
+            {"StartAt": "Done", "States": {"Done": {"Type": "Pass", "End": True}}}
+        ),
+        roleArn="arn:aws:iam::123456789012:role/analysis",
+    )["stateMachineArn"]
+    for report_id in ["running", "stopped", "succeeded"]:
+        sfn_client.start_execution(
+            stateMachineArn=state_machine_arn,
+            name=execution_name(report_id),
+            input=json.dumps({"report_id": report_id, "other": "input"}),
+        )
+        put_summary(s3_bucket, report_id, "Queued")
+        enqueue_analysis({"report_id": report_id}, s3_bucket)
+    execution_arn = state_machine_arn.replace(":stateMachine:", ":execution:")
+    sfn_client.stop_execution(executionArn=f"{execution_arn}:report-stopped")
+    # Completed, then queued again by a concurrent request
+    boto3.client("s3").put_object(
+        Bucket=s3_bucket,
+        Key="summaries/123_succeeded.json",
+        Body=json.dumps({"status": "Completed", "totalCost": 1}),
+    )
+
+    def summary(report_id):
+        return json.loads(
+            boto3.client("s3")
+            .get_object(Bucket=s3_bucket, Key=f"{report_id}/summary.json")["Body"]
+            .read()
+        )
+
+    original = sfn_client.describe_execution
+
+    def describe_execution(executionArn):
+        response = original(executionArn=executionArn)
+        # Pass states end right away on AWS, moto keeps them running
+        if executionArn.endswith("report-succeeded"):
+            response["status"] = "SUCCEEDED"
+        return response
+
+    with patch.object(sfn_client, "describe_execution", describe_execution):
+        started = drain_analysis_queue(sfn_client, state_machine_arn, s3_bucket)
+
+    assert list(started) == ["running"]
+    assert summary("running") == {"status": "Running"}
+    assert summary("stopped")["status"] == "Failed"
+    assert summary("stopped")["errorCode"] == "ExecutionAlreadyExists"
+    assert summary("succeeded") == {"status": "Completed", "totalCost": 1}
@@ -0,0 +1,23 @@
+def test_circuit_opens_after_repeated_throttles():
+    """Testing that the circuit opens, reopens for longer and closes."""
+    from backend.utils.circuit_breaker_utils import CircuitBreaker
+
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=0.05, max_cooldown=0.08)
+    breaker.record_throttle()
+    breaker.record_throttle()
+    assert not breaker.is_open
+    breaker.record_throttle()
+    assert breaker.is_open
+
+    assert 0 < breaker.wait() <= 0.05
+    assert not breaker.is_open
+
+    # A single throttle after the cooldown reopens it, for longer
+    breaker.record_throttle()
+    assert breaker.is_open
+    assert 0.05 < breaker.wait() <= 0.08
+
+    breaker.record_success()
+    breaker.record_throttle()
+    assert not breaker.is_open
+    assert breaker.cooldown == 0.05
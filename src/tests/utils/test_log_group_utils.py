@@ -0,0 +1,57 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+def test_divide_by_log_group():
+    """Testing that functions of a shared log group are batched together."""
+    from backend.utils.log_group_utils import divide_by_log_group
+
+    names = ["a", "s1", "b", "s2", "c", "d", "s3", "e"]
+    log_groups = ["/aws/lambda/a", "shared", None, "shared", "/aws/lambda/c"]
+    log_groups += ["/aws/lambda/d", "shared", "/aws/lambda/e"]
+
+    assert divide_by_log_group(names, log_groups, 4) == [
+        ["s1", "s2", "s3", "a"],
+        ["b", "c", "d", "e"],
+    ]
+    # Larger groups fill batches of their own
+    assert divide_by_log_group(names, log_groups, 2) == [
+        ["s1", "s2"],
+        ["s3", "a"],
+        ["b", "c"],
+        ["d", "e"],
+    ]
+    # Selection order without shared log groups
+    assert divide_by_log_group(["a", "b", "c"], [None] * 3, 2) == [["a", "b"], ["c"]]
+
+
+@mock_aws
+def test_lookup_log_groups(aws_credentials):
+    """Testing the log group lookup, None for unknown functions."""
+    from backend.utils.log_group_utils import lookup_log_groups
+
+    role_arn = boto3.client("iam").create_role(
+        RoleName="mock-role", AssumeRolePolicyDocument="{}"
+    )["Role"]["Arn"]
+    boto3.client("lambda").create_function(
+        FunctionName="LambdaA",
+        Runtime="python3.12",
+        Role=role_arn,
+        Handler="lambda_function.lambda_handler",
+        Code={"ZipFile": b"def lambda_handler(event, context):\n    pass"},
+    )
+
+    assert lookup_log_groups(["LambdaA", "missing"]) == ["/aws/lambda/LambdaA", None]
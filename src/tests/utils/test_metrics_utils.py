@@ -0,0 +1,96 @@
+import json
+import os
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+def emitted_metrics(output):
+    """Parse the EMF lines printed by the metrics flush."""
+    documents = [
+        json.loads(line) for line in output.splitlines() if line.startswith('{"_aws"')
+    ]
+    assert documents
+    return documents
+
+
+def test_instrumented_client_metrics(aws_credentials, capsys):
+    """Testing the calls and S3 bytes recorded for an instrumented client."""
+    from backend.utils.metrics_utils import (
+        add_report_dimension,
+        instrument_client,
+        metrics,
+    )
+
+    with mock_aws():
+        metrics.clear_metrics()
+        s3_client = instrument_client(boto3.client("s3"))
+        s3_client.create_bucket(Bucket="metrics-bucket")
+        s3_client.put_object(Bucket="metrics-bucket", Key="a.csv", Body="a,b\n1,2\n")
+        s3_client.get_object(Bucket="metrics-bucket", Key="a.csv")["Body"].read()
+        add_report_dimension("report-1")
+        metrics.flush_metrics()
+
+    (document,) = emitted_metrics(capsys.readouterr().out)
+    assert document["report_id"] == "report-1"
+    assert document["_aws"]["CloudWatchMetrics"][0]["Namespace"]
+    assert document["PutObjectCalls"] == [1]
+    assert document["GetObjectCalls"] == [1]
+    assert document["S3BytesUploaded"] == [8]
+    assert document["S3BytesDownloaded"] == [8]
+
+
+def test_throttles_and_retries(capsys):
+    """Testing that throttled attempts and retries are counted per operation."""
+    from backend.utils.metrics_utils import count_call, count_throttle, metrics
+
+    class Operation:
+        name = "StartQuery"
+        service_model = SimpleNamespace(service_name="logs")
+
+    metrics.clear_metrics()
+    throttled = {"Error": {"Code": "ThrottlingException"}}
+    count_throttle(response=(None, throttled), operation=Operation())
+    count_throttle(response=(None, throttled), operation=Operation())
+    count_throttle(response=(None, {"queryId": "1"}), operation=Operation())
+    count_throttle(response=None, operation=Operation())
+    count_call(
+        parsed={"queryId": "1", "ResponseMetadata": {"RetryAttempts": 2}},
+        model=Operation(),
+    )
+    metrics.flush_metrics()
+
+    (document,) = emitted_metrics(capsys.readouterr().out)
+    assert document["StartQueryThrottles"] == [1, 1]
+    assert document["StartQueryRetries"] == [2]
+    assert document["StartQueryCalls"] == [1]
+
+
+@mock_aws
+def test_handler_publishes_stage_metrics(aws_credentials, lambda_context, capsys):
+    """Testing the EMF document of a step function handler."""
+    os.environ["BUCKET_NAME"] = "test-bucket"
+    boto3.client("s3").create_bucket(Bucket="test-bucket")
+    from backend.step_function.analysis_error_handler import lambda_handler
+
+    lambda_handler({"report_id": "report-2", "error": "States.Timeout"}, lambda_context)
+
+    (document,) = emitted_metrics(capsys.readouterr().out)
+    assert document["report_id"] == "report-2"
+    assert document["ReportsFailed"] == [1]
+    assert document["ErrorHandlerDuration"][0] > 0
+    # Cancellation marker, before and after stopping the queries, error
+    # summary and timeline
+    assert document["PutObjectCalls"] == [1, 1, 1, 1]
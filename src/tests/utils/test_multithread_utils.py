@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from backend.utils.multithread_utils import (
+    ExecutorStats,
+    TaskTimeoutError,
+    multi_thread,
+    stream_map,
+)
+from backend.utils.rate_limit_utils import RateLimiter
+
+
+def sleep_and_return(item):
+    """Sleep for item / 100 seconds and return the item."""
+    time.sleep(item / 100)
+    return item
+
+
+def test_stream_map_ordered():
+    """Testing that ordered results follow the input order."""
+    results = list(stream_map(sleep_and_return, [5, 1, 3, 0], ordered=True))
+
+    assert [result.index for result in results] == [0, 1, 2, 3]
+    assert [result.value for result in results] == [5, 1, 3, 0]
+
+
+def test_stream_map_as_completed():
+    """Testing that unordered results are yielded as they complete."""
+    results = list(stream_map(sleep_and_return, [20, 0], max_workers=2))
+
+    assert [result.value for result in results] == [0, 20]
+
+
+def test_stream_map_error_isolation():
+    """Testing that a failing task doesn't discard the other results."""
+
+    def fail_on_two(item):
+        if item == 2:
+            raise ValueError("boom")
+        return item * 10
+
+    stats = ExecutorStats()
+    results = list(stream_map(fail_on_two, range(4), ordered=True, stats=stats))
+
+    assert [result.value for result in results if result.ok] == [0, 10, 30]
+    assert isinstance(results[2].error, ValueError)
+    with pytest.raises(ValueError):
+        results[2].result()
+    assert stats.as_dict()["succeeded"] == 3
+    assert stats.as_dict()["failed"] == 1
+
+
+def test_stream_map_timeout():
+    """Testing that a slow task times out without blocking the others."""
+    stats = ExecutorStats()
+    started = time.monotonic()
+    results = list(
+        stream_map(sleep_and_return, [50, 0], ordered=True, timeout=0.1, stats=stats)
+    )
+
+    assert time.monotonic() - started < 0.4
+    assert isinstance(results[0].error, TaskTimeoutError)
+    assert results[1].value == 0
+    assert stats.timed_out == 1
+
+
+def test_stream_map_backpressure():
+    """Testing that items are pulled lazily, bounded by max_pending."""
+    pulled = []
+
+    def items():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    results = stream_map(lambda item: item, items(), max_workers=2, max_pending=4)
+    next(results)
+    assert len(pulled) <= 5
+    results.close()
+
+
+def test_stream_map_rate_limiter():
+    """Testing that a shared rate limiter paces task starts."""
+    start_times = []
+    lock = threading.Lock()
+
+    def record(item):
+        with lock:
+            start_times.append(time.monotonic())
+
+    list(stream_map(record, range(3), rate_limiter=RateLimiter(rate=20)))
+
+    start_times.sort()
+    assert start_times[2] - start_times[0] >= 0.09
+
+
+def test_multi_thread():
+    """Testing that multi_thread returns results in input order."""
+    assert multi_thread(sleep_and_return, [3, 1, 2], 3) == [3, 1, 2]
@@ -0,0 +1,114 @@
+import marshal
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        yield bucket_name
+
+
+def profile_keys(bucket_name, prefix):
+    """Keys of the uploaded profiles."""
+    from backend.utils.s3_utils import list_s3_keys
+
+    return list_s3_keys(bucket_name, prefix)
+
+
+def allocate(event, context):
+    """Handler allocating some memory."""
+    return len([str(i) * 10 for i in range(10_000)])
+
+
+def test_profile_requested_by_event(s3_bucket, monkeypatch):
+    """Testing that an event flag uploads the CPU and memory profiles."""
+    from backend.utils.profiling_utils import profiled
+    from backend.utils.s3_utils import client
+
+    handler = profiled("generator", s3_bucket)(allocate)
+    event = {"report_id": "report", "profile": True, "profile_token": "secret"}
+    # Ignored unless the function has the token
+    handler(event, None)
+    assert profile_keys(s3_bucket, "report/profiles") == []
+
+    monkeypatch.setenv("PROFILING_TOKEN", "secret")
+    assert handler(event, None) == 10_000
+
+    keys = profile_keys(s3_bucket, "report/profiles")
+    assert sorted(key.split(".", 1)[1] for key in keys) == [
+        "cpu.txt",
+        "memory.txt",
+        "prof",
+    ]
+    objects = {
+        key.split(".", 1)[1]: client.get_object(Bucket=s3_bucket, Key=key)[
+            "Body"
+        ].read()
+        for key in keys
+    }
+    assert any(
+        "allocate" in str(function) for function in marshal.loads(objects["prof"])
+    )
+    assert b"allocate" in objects["cpu.txt"]
+    assert b"peak" in objects["memory.txt"]
+
+
+def test_profile_sampling(s3_bucket, monkeypatch):
+    """Testing the environment flag and its sampling rate."""
+    from backend.utils.profiling_utils import profiled
+
+    handler = profiled("api", s3_bucket)(allocate)
+    monkeypatch.setenv("PROFILING_MODES", "memory")
+    monkeypatch.setenv("PROFILING_SAMPLE_RATE", "0")
+    handler({"path": "/report"}, None)
+    assert profile_keys(s3_bucket, "profiles") == []
+
+    monkeypatch.setenv("PROFILING_SAMPLE_RATE", "1")
+    handler({"path": "/report"}, None)
+    (key,) = profile_keys(s3_bucket, "profiles/api")
+    assert key.endswith(".memory.txt")
+
+    # A header asks for a single request to be profiled, with the token
+    monkeypatch.delenv("PROFILING_MODES")
+    monkeypatch.setenv("PROFILING_TOKEN", "secret")
+    event = {
+        "headers": {"X-Profile": "cpu", "X-Profile-Token": "guess"},
+        "queryStringParameters": {"reportID": "r"},
+    }
+    handler(event, None)
+    assert profile_keys(s3_bucket, "r") == []
+    event["headers"]["X-Profile-Token"] = "secret"
+    handler(event, None)
+    assert sorted(key.rsplit(".", 1)[1] for key in profile_keys(s3_bucket, "r")) == [
+        "prof",
+        "txt",
+    ]
+
+
+def test_parse_modes():
+    """Testing the profiling flags."""
+    from backend.utils.profiling_utils import parse_modes
+
+    assert parse_modes(True) == ["cpu", "memory"]
+    assert parse_modes("true") == ["cpu", "memory"]
+    assert parse_modes("memory, cpu") == ["cpu", "memory"]
+    assert parse_modes(["memory"]) == ["memory"]
+    assert parse_modes("") == []
+    assert parse_modes("unknown") == []
@@ -0,0 +1,61 @@
+import concurrent.futures
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        yield bucket_name
+
+
+def test_concurrent_batches_all_counted(s3_bucket):
+    """Testing that batches completing together all update the progress."""
+    from backend.utils.progress_utils import (
+        batch_contribution,
+        load_progress,
+        record_batch_progress,
+        start_progress,
+    )
+
+    start_progress("report", s3_bucket, 8)
+
+    def complete(index):
+        result = {
+            "filename": f"batch-{index}.csv",
+            "directory": "single_analysis/report",
+            "failed_functions": [{"functionName": "x"}] if index == 0 else [],
+        }
+        rows = [{"totalCost": 1.0, "countInvocations": 10}] * 2
+        return record_batch_progress(
+            "report", s3_bucket, f"batch-{index}", batch_contribution(result, rows)
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        assert all(executor.map(complete, range(8)))
+    # A batch running again replaces its contribution
+    assert complete(3)
+
+    progress, _ = load_progress("report", s3_bucket)
+    assert progress["batchesDone"] == 8
+    assert progress["batchesTotal"] == 8
+    assert progress["functionsAnalyzed"] == 16
+    assert progress["functionsFailed"] == 1
+    assert progress["totals"]["totalCost"] == 16
+    assert progress["totals"]["countInvocations"] == 160
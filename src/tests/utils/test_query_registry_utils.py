@@ -0,0 +1,117 @@
+import functools
+import os
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from benchmarks.insights_fake import FakeInsights
+from benchmarks.log_generator import generate_log_events
+from benchmarks.synthetic_account import function_specs
+
+start = datetime(2024, 6, 1, tzinfo=timezone.utc)
+end = datetime(2024, 6, 3, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        yield bucket_name
+
+
+def test_cancel_stops_only_running_queries(s3_bucket):
+    """Testing that registered queries still running are stopped."""
+    from backend.utils.query_registry_utils import cancel_report_queries, register_query
+    from backend.utils.s3_utils import list_s3_keys
+
+    now = [0.0]
+    insights = FakeInsights(query_latency=10, clock=lambda: now[0])
+    insights.install()
+    (spec,) = function_specs(1, seed=3)
+    insights.add_log_group("group", functools.partial(generate_log_events, spec))
+    logs_client = boto3.client("logs")
+
+    def start_query():
+        query_id = logs_client.start_query(
+            logGroupName="group",
+            startTime=int(start.timestamp()),
+            endTime=int(end.timestamp()),
+            queryString="stats count(*) as n",
+        )["queryId"]
+        register_query("report", query_id, "group", None, start, end, s3_bucket)
+        return query_id
+
+    start_query()
+    now[0] = 10
+    # Completed, left in the registry by a generator that was killed
+    start_query()
+
+    stopped = cancel_report_queries("report", s3_bucket)
+    assert stopped["cancelledQueries"] == 1
+    assert insights.snapshot()["cancelled"] == 1
+    assert list_s3_keys(s3_bucket, "report/queries") == []
+
+
+def test_cancellation_marker(s3_bucket):
+    """Testing the totals of the marker and its cached check."""
+    from backend.utils import query_registry_utils
+    from backend.utils.query_registry_utils import (
+        is_report_cancelled,
+        load_cancellation,
+        record_cancellation,
+    )
+
+    assert load_cancellation("report", s3_bucket) is None
+    assert not is_report_cancelled("report", s3_bucket)
+
+    record_cancellation("report", s3_bucket, {"reason": "Cancelled on request"})
+    # Cached until the next check
+    assert not is_report_cancelled("report", s3_bucket)
+    query_registry_utils.cancellation_checks.clear()
+    assert is_report_cancelled("report", s3_bucket)
+
+    stopped = {"cancelledQueries": 2, "bytesScanned": 10, "bytesScanAvoided": 90}
+    record_cancellation("report", s3_bucket, stopped)
+    marker = record_cancellation("report", s3_bucket, stopped)
+    assert marker == {
+        "reason": "Cancelled on request",
+        "cancelledQueries": 4,
+        "bytesScanned": 20,
+        "bytesScanAvoided": 180,
+    }
+
+
+def test_scan_estimate_spreads_stored_bytes():
+    """Testing that stored bytes are spread over the kept period."""
+    from backend.utils.query_registry_utils import estimate_scan_bytes
+
+    day = 86400
+    log_group = {
+        "logGroupName": "group",
+        "storedBytes": 3000,
+        "creationTime": (time.time() - 10 * day) * 1000,
+        "retentionInDays": 3,
+    }
+    logs_client = SimpleNamespace(
+        describe_log_groups=lambda logGroupNamePrefix: {"logGroups": [log_group]}
+    )
+
+    assert estimate_scan_bytes(logs_client, "group", 0, day) == pytest.approx(1000)
+    assert estimate_scan_bytes(logs_client, "group", 0, 5 * day) == 3000
+    assert estimate_scan_bytes(logs_client, "other", 0, day) == 0
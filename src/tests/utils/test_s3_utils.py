@@ -0,0 +1,90 @@
+import csv
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        s3 = boto3.resource("s3", region_name="us-east-1")
+        s3.Bucket(bucket_name).create()
+        yield bucket_name
+
+
+@pytest.mark.parametrize("content_encoding", [None, "gzip"])
+def test_open_s3_writer_multipart(s3_bucket, content_encoding):
+    """Testing that csv rows streamed through a multipart upload read back."""
+    from backend.utils.s3_utils import client, iter_s3_lines, open_s3_writer
+
+    row_count = 200_000
+    with open_s3_writer(
+        "analysis.csv",
+        s3_bucket,
+        directory="report",
+        content_encoding=content_encoding,
+    ) as csv_file:
+        writer = csv.writer(csv_file)
+        for i in range(row_count):
+            writer.writerow([i, "function-name-padding" * 2])
+
+    head = client.head_object(Bucket=s3_bucket, Key="report/analysis.csv")
+    assert head.get("ContentEncoding") == content_encoding
+    # Only the uncompressed file is big enough to need several parts
+    assert head["ETag"].endswith('-2"') == (content_encoding is None)
+
+    lines = list(iter_s3_lines("analysis.csv", s3_bucket, directory="report"))
+    assert len(lines) == row_count
+    assert lines[-1] == f"{row_count - 1},{'function-name-padding' * 2}\r\n"
+
+
+def test_open_s3_writer_aborts_on_error(s3_bucket):
+    """Testing that a failing writer leaves neither object nor pending upload."""
+    from backend.utils.s3_utils import client, open_s3_writer
+
+    with pytest.raises(RuntimeError):
+        with open_s3_writer("analysis.csv", s3_bucket) as csv_file:
+            csv_file.write("a" * 6 * 1024 * 1024)
+            raise RuntimeError("generation failed")
+
+    assert "Contents" not in client.list_objects_v2(Bucket=s3_bucket)
+    assert "Uploads" not in client.list_multipart_uploads(Bucket=s3_bucket)
+
+
+def test_compressed_upload_and_ranged_read(s3_bucket):
+    """Testing transparent decoding and ranged reads of stored bytes."""
+    from backend.utils.s3_utils import (
+        download_from_s3,
+        download_range_from_s3,
+        upload_file_to_s3,
+    )
+
+    upload_file_to_s3("a,b\n1,2\n", "data.csv", s3_bucket, content_encoding="gzip")
+    upload_file_to_s3("0123456789", "plain.txt", s3_bucket)
+
+    assert download_from_s3("data.csv", s3_bucket) == "a,b\n1,2\n"
+    assert download_range_from_s3("data.csv", s3_bucket, 0, 1) == b"\x1f\x8b"
+    assert download_range_from_s3("plain.txt", s3_bucket, 2, 4) == b"234"
+    assert download_range_from_s3("plain.txt", s3_bucket, 8) == b"89"
+
+
+def test_unsupported_content_encoding(s3_bucket):
+    """Testing that unknown encodings are rejected."""
+    from backend.utils.s3_utils import upload_file_to_s3
+
+    with pytest.raises(ValueError):
+        upload_file_to_s3("data", "data.txt", s3_bucket, content_encoding="br")
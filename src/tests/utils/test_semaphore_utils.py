@@ -0,0 +1,134 @@
+import concurrent.futures
+import os
+import threading
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        yield bucket_name
+
+
+def test_s3_leases_are_shared_fairly(s3_bucket):
+    """Testing that a report holding its share waits for the other reports."""
+    from backend.utils.semaphore_utils import QuerySemaphore, S3LeaseBackend
+
+    backend = S3LeaseBackend(s3_bucket, "local/default")
+    semaphore = QuerySemaphore(backend, slots=2)
+
+    first = semaphore.try_acquire("a")
+    second = semaphore.try_acquire("a")
+    assert sorted([first.slot, second.slot]) == [0, 1]
+    assert semaphore.try_acquire("a") is None
+    assert backend.state().taken == {0: "a", 1: "a"}
+
+    # Report b waits, report a is left with half of the slots
+    backend.mark_waiting("b")
+    first.release()
+    assert semaphore.try_acquire("a") is None
+    lease = semaphore.try_acquire("b")
+    assert lease.slot == first.slot
+    semaphore.stop_waiting("b")
+    assert backend.state().waiting == set()
+
+
+def test_s3_expired_lease_is_taken_over(s3_bucket):
+    """Testing that an expired lease is taken over and can't be released."""
+    from backend.utils.semaphore_utils import S3LeaseBackend
+
+    backend = S3LeaseBackend(s3_bucket, "local/default")
+    lease = backend.claim(0, "a", None)
+    assert backend.claim(0, "b", None) is None
+
+    expired_backend = S3LeaseBackend(s3_bucket, "local/default", ttl=-1)
+    state = expired_backend.state()
+    assert state.taken == {}
+    taken_over = expired_backend.claim(0, "b", state.expired[0])
+    assert taken_over is not None
+
+    assert not backend.renew(lease)
+    lease.release()
+    assert backend.state().taken == {0: "b"}
+    taken_over.release()
+    assert backend.state().taken == {}
+
+
+def test_concurrency_holds_at_the_slots():
+    """Testing that concurrent reports never run more queries than the slots."""
+    from backend.utils.semaphore_utils import LocalLeaseBackend, QuerySemaphore
+
+    semaphore = QuerySemaphore(LocalLeaseBackend(), slots=3, poll_interval=0.001)
+    running = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def query(report_id):
+        lease, _ = semaphore.acquire(report_id)
+        with lock:
+            running.append(report_id)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.005)
+        with lock:
+            running.remove(report_id)
+        lease.release()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(query, ["a", "b"] * 20))
+
+    assert 1 < peak[0] <= 3
+    assert semaphore.backend.state().taken == {}
+    assert semaphore.waiters == {}
+
+
+def test_s3_holder_of_renewed_and_taken_over_leases(s3_bucket):
+    """Testing that renewals only rewrite the lease and keep its holder."""
+    from backend.utils import s3_utils
+    from backend.utils.semaphore_utils import LeaseBackend, S3LeaseBackend
+
+    with pytest.raises(TypeError):
+        LeaseBackend()
+
+    backend = S3LeaseBackend(s3_bucket, "local/default")
+    crashed = backend.claim(0, "a", None)
+    # The lease of a crashed generator expires and is taken over
+    expired_backend = S3LeaseBackend(s3_bucket, "local/default", ttl=-1)
+    time.sleep(1)
+    lease = expired_backend.claim(0, "b", expired_backend.state().expired[0])
+    assert crashed is not None and lease is not None
+    assert backend.state().taken == {0: "b"}
+    # Only the marker of the new holder is left
+    assert s3_utils.list_s3_keys(s3_bucket, "locks/insights/local/default/holders") == [
+        "locks/insights/local/default/holders/b/0"
+    ]
+
+    put_objects = []
+
+    def record_put(params, **kwargs):
+        put_objects.append(params["Key"])
+
+    events = s3_utils.client.meta.events
+    events.register("provide-client-params.s3.PutObject", record_put)
+    try:
+        assert backend.renew(lease)
+    finally:
+        events.unregister("provide-client-params.s3.PutObject", record_put)
+    assert put_objects == ["locks/insights/local/default/slots/0"]
+    assert backend.state().taken == {0: "b"}
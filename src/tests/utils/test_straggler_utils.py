@@ -0,0 +1,19 @@
+def test_straggler_threshold():
+    """Testing that stragglers are compared with the median of their peers."""
+    from backend.utils.straggler_utils import StragglerDetector
+
+    detector = StragglerDetector(factor=3, min_samples=3, min_seconds=5)
+    detector.record(2)
+    detector.record(4)
+    assert detector.threshold() is None
+    assert not detector.is_straggler(100)
+
+    detector.record(100)
+    assert detector.threshold() == 12
+    assert detector.is_straggler(13)
+    assert not detector.is_straggler(12)
+
+    # Short queries are never hedged
+    fast = StragglerDetector(min_samples=1, min_seconds=5)
+    fast.record(0.1)
+    assert fast.threshold() == 5
@@ -0,0 +1,97 @@
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@pytest.fixture
+def s3_bucket(aws_credentials):
+    """Create a mocked S3 bucket."""
+    bucket_name = "test-bucket"
+    with mock_aws():
+        boto3.client("s3").create_bucket(Bucket=bucket_name)
+        yield bucket_name
+
+
+def test_build_timeline_stats():
+    """Testing the statistics and slowest spans of each span name."""
+    from backend.utils.timeline_utils import Timeline, build_timeline
+
+    timeline = Timeline("report")
+    for i in range(20):
+        timeline.add_span("generator.query", 100 + i, 101 + i + i, logGroup=f"g{i}")
+    timeline.add_span("initializer.planning", 90, 95)
+
+    result = build_timeline("report", sorted(timeline.spans, key=lambda s: s["start"]))
+
+    assert result["start"] == 90
+    assert result["end"] == 139
+    assert result["duration"] == 49
+    query_stats = result["stats"]["generator.query"]
+    assert query_stats["count"] == 20
+    assert query_stats["p50Seconds"] == 10
+    assert query_stats["p95Seconds"] == 19
+    assert query_stats["maxSeconds"] == 20
+    assert [span["logGroup"] for span in query_stats["slowest"]] == [
+        "g19",
+        "g18",
+        "g17",
+        "g16",
+        "g15",
+    ]
+    assert build_timeline("report", [])["duration"] is None
+
+
+def test_span_records_errors():
+    """Testing that a failing block still records its span."""
+    from backend.utils.timeline_utils import Timeline
+
+    timeline = Timeline("report")
+    with pytest.raises(ValueError):
+        with timeline.span("aggregator.merge", files=2) as attributes:
+            attributes["rows"] = 10
+            raise ValueError
+    (span,) = timeline.spans
+    assert span["name"] == "aggregator.merge"
+    assert span["files"] == 2
+    assert span["rows"] == 10
+    assert span["error"] == "ValueError"
+
+
+def test_compact_timeline(s3_bucket):
+    """Testing that the spans of all the stages are compacted together."""
+    from backend.utils.s3_utils import download_from_s3
+    from backend.utils.timeline_utils import Timeline, compact_timeline
+
+    initializer = Timeline("report")
+    initializer.add_span("initializer.planning", 10, 11)
+    initializer.upload(s3_bucket, "initializer")
+    for batch in range(3):
+        generator = Timeline("report")
+        generator.add_span("generator.batch", 12 + batch, 20 + batch)
+        generator.upload(s3_bucket, "generator")
+    # Nothing to upload without a report
+    Timeline().add_span("generator.batch", 0, 1)
+
+    result = compact_timeline("report", s3_bucket)
+
+    assert [span["name"] for span in result["spans"]] == [
+        "initializer.planning",
+        "generator.batch",
+        "generator.batch",
+        "generator.batch",
+    ]
+    assert result["stats"]["generator.batch"]["totalSeconds"] == 24
+    assert json.loads(download_from_s3("timeline.json", s3_bucket, "report")) == result
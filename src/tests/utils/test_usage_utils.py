@@ -0,0 +1,76 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+
+@pytest.fixture
+def aws_credentials():
+    """Mocked AWS Credentials for moto."""
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_SECURITY_TOKEN"] = "testing"
+    os.environ["AWS_SESSION_TOKEN"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "us-east-1"
+
+
+@mock_aws
+def test_usage_meter(aws_credentials, lambda_context):
+    """Testing the S3 requests and log volume measured for an invocation."""
+    from backend.utils.metrics_utils import instrument_client
+    from backend.utils.usage_utils import (
+        UsageMeter,
+        logger,
+        platform_log_bytes_per_invocation,
+    )
+
+    s3_client = instrument_client(boto3.client("s3"))
+    s3_client.create_bucket(Bucket="usage-bucket")
+    meter = UsageMeter(lambda_context)
+    s3_client.put_object(Bucket="usage-bucket", Key="a", Body=b"a")
+    s3_client.get_object(Bucket="usage-bucket", Key="a")
+    s3_client.head_object(Bucket="usage-bucket", Key="a")
+    s3_client.delete_object(Bucket="usage-bucket", Key="a")
+    logger.warning("x" * 1000)
+
+    usage = meter.usage()
+    assert usage["memoryMB"] == lambda_context.memory_limit_in_mb
+    assert usage["lambdaGbSeconds"] > 0
+    assert usage["s3Tier1Requests"] == 1
+    assert usage["s3Tier2Requests"] == 2
+    assert usage["logBytes"] > 1000 + platform_log_bytes_per_invocation
+
+
+def test_report_cost():
+    """Testing the pricing of the usage recorded by the stages."""
+    from backend.utils.usage_utils import report_cost
+
+    invocation = {
+        "architecture": "arm64",
+        "lambdaGbSeconds": 1000.0,
+        "s3Tier1Requests": 1000,
+        "s3Tier2Requests": 10000,
+        "logBytes": 1024**3,
+    }
+    spans = [
+        {"name": "initializer.planning"},
+        {"name": "initializer.invocation", **invocation},
+        {"name": "generator.invocation", **invocation},
+        {"name": "aggregator.invocation", **invocation, "architecture": "x86_64"},
+    ]
+
+    cost = report_cost(spans, insights_cost=0.5)
+
+    assert cost["lambda"] == pytest.approx(
+        3 * 0.2e-6 + 2000 * 0.0000133334 + 1000 * 0.0000166667
+    )
+    assert cost["stepFunctions"] == pytest.approx(4 * 0.000025)
+    assert cost["s3Requests"] == pytest.approx(3 * (0.005 + 0.004))
+    assert cost["logIngestion"] == pytest.approx(1.5)
+    assert cost["logsInsights"] == 0.5
+    assert cost["usage"]["lambdaInvocations"] == 3
+    assert cost["usage"]["lambdaGbSeconds"] == 3000
+    assert cost["total"] == pytest.approx(
+        cost["lambda"] + cost["stepFunctions"] + cost["s3Requests"] + 1.5 + 0.5
+    )